@@ -22,10 +22,16 @@ import asyncio
 from datetime import datetime
 
 # Import our application modules
-from .config import RATE_LIMITS
+from .config import RATE_LIMITS, INCREMENTAL_SUMMARY_CONFIG, RETRIEVAL_CONFIG
 from .progress import ProgressTracker, generate_progress_stream, cancel_task_by_id
 from .youtube_processor import YouTubeProcessor
 from .webpage_analyzer import WebPageAnalyzer
+from .token_budget import plan_prompt, count_tokens
+from .retrieval import build_transcript_index, pack_segments, unpack_segments
+from .session_store import SessionStore, get_session_store_stats
+from .async_llm import async_streaming_enabled, get_async_llm
+from .llm_metrics import set_llm_context, get_task_breakdown, render_metrics, CONTENT_TYPE_LATEST
+from .stage_dag import StageGraph, StageCancelled, get_stage_stats
 from .client_side_api import register_client_side_api_routes
 
 # Initialize Flask app
@@ -263,16 +269,18 @@ def extract_transcript():
                     progress.cancel()
                     return
                 
-                progress.update('getting_info', 30, 'Getting video information...')
-                video_info = processor.get_video_info(video_id)
-                
-                # Check for cancellation before getting transcript
-                if progress.is_cancelled():
+                # Video metadata and the transcript are fetched in parallel
+                progress.update('getting_transcript', 30, 'Processing video...')
+                stages = StageGraph('extract_transcript', progress)
+                stages.add('video_info', lambda results: processor.get_video_info(video_id))
+                stages.add('transcript', lambda results: processor.get_transcript(video_id, progress))
+                try:
+                    stage_results = stages.run()
+                except StageCancelled:
                     progress.cancel()
                     return
-                
-                progress.update('getting_transcript', 60, 'Processing video...')
-                transcript = processor.get_transcript(video_id, progress)
+                video_info = stage_results['video_info']
+                transcript = stage_results['transcript']
                 
                 # Check for cancellation before completing
                 if progress.is_cancelled():
@@ -316,6 +324,8 @@ def summarize():
         progress = ProgressTracker(task_id)
         
         def process_summary():
+            nonlocal language  # Updated by auto-detection
+            set_llm_context('summary', task_id)
             try:
                 print(f"🔍 DEBUG: Starting process_summary for transcript length: {len(transcript)}")
                 
@@ -341,6 +351,20 @@ def summarize():
                     progress.cancel()
                     return
                 
+                def finish(summary):
+                    progress.complete({
+                        'summary': summary,
+                        'model_used': 'GPT-OSS-120B',
+                        'provider_used': 'DeepInfra'
+                    })
+                
+                if async_streaming_enabled():
+                    # Hand the answer stream to the async loop; this thread ends here
+                    processor.summarize_async(
+                        transcript, language, progress, on_complete=finish,
+                        on_error=lambda e: progress.error(f'Failed to generate summary: {str(e)}'))
+                    return
+                
                 print(f"🔍 DEBUG: About to call summarize_with_g4f_language with language: {language}")
                 summary = processor.summarize_with_g4f_language(transcript, language, progress)
                 print(f"🔍 DEBUG: Completed summarize_with_g4f_language, summary length: {len(summary) if summary else 0}")
@@ -350,11 +374,7 @@ def summarize():
                     progress.cancel()
                     return
                 
-                progress.complete({
-                    'summary': summary,
-                    'model_used': 'GPT-OSS-120B',
-                    'provider_used': 'DeepInfra'
-                })
+                finish(summary)
                 
             except Exception as e:
                 progress.error(f'Failed to generate summary: {str(e)}')
@@ -392,15 +412,21 @@ def summarize_video_stream():
             return jsonify({'error': 'Please enter a valid YouTube URL'}), 400
         
         # Check for active tasks to prevent concurrent operations
-        from .progress import progress_store, cleanup_stale_tasks
+        from .progress import cleanup_stale_tasks, get_active_task_ids, make_job_key, canonical_url, attach_to_job, start_or_attach_job
+        
+        # Identical request already running: share its progress stream and result
+        video_id = YouTubeProcessor().extract_video_id(url)
+        job_key = make_job_key('summarize_video', video_id or canonical_url(url), language)
+        shared_task_id = attach_to_job(job_key)
+        if shared_task_id:
+            return jsonify({'task_id': shared_task_id, 'stream_url': f'/progress/{shared_task_id}', 'coalesced': True})
         
         # Clean up any stale tasks first
         cleaned_count = cleanup_stale_tasks()
         if cleaned_count > 0:
             print(f"🧹 Cleaned up {cleaned_count} stale tasks")
         
-        active_tasks = [task_id for task_id, progress in progress_store.items() 
-                       if not progress.get('completed', False)]
+        active_tasks = get_active_task_ids()
         
         if len(active_tasks) > 0:
             print(f"🚫 VIDEO SUMMARIZE TASK CONFLICT: {len(active_tasks)} active tasks found: {active_tasks}")
@@ -408,11 +434,11 @@ def summarize_video_stream():
                 'error': 'Another task is currently running. Please wait for it to complete before summarizing.',
                 'active_tasks': len(active_tasks)
             }), 429  # Too Many Requests
-            return jsonify({'error': 'Please enter a valid YouTube URL'}), 400
         
-        # Generate unique task ID
-        task_id = str(uuid.uuid4())
-        progress = ProgressTracker(task_id)
+        # Generate unique task ID (or join an identical job that started in the meantime)
+        task_id, progress, attached = start_or_attach_job(job_key)
+        if attached:
+            return jsonify({'task_id': task_id, 'stream_url': f'/progress/{task_id}', 'coalesced': True})
         
         def get_localized_message(key, lang=language, **kwargs):
             """Get localized progress messages based on user's language preference"""
@@ -439,6 +465,7 @@ def summarize_video_stream():
         
         def process_video_in_background():
             nonlocal language  # Allow modification of outer scope variable
+            set_llm_context('video_summary', task_id)
             try:
                 print(f"🔍 DEBUG: process_video_in_background started")
                 print(f"🔍 DEBUG: URL: {url}")
@@ -462,25 +489,74 @@ def summarize_video_stream():
                     progress.cancel()
                     return
                 
-                progress.update('getting_info', 30, get_localized_message('processing'))
-                print(f"🔍 DEBUG: Getting video info for: {video_id}")
-                video_info = processor.get_video_info(video_id)
+                def fetch_video_info(results):
+                    print(f"🔍 DEBUG: Getting video info for: {video_id}")
+                    return processor.get_video_info(video_id)
                 
-                # Check for cancellation before getting transcript
-                if progress.is_cancelled():
+                def fetch_content(results):
+                    # Incremental mode: summarize long videos window by window while the transcript streams in
+                    if INCREMENTAL_SUMMARY_CONFIG['enabled']:
+                        try:
+                            incremental_result = processor.summarize_incremental(video_id, language, progress)
+                        except Exception as e:
+                            # e.g. the segment scrape broke off part way; the plain path has more fallbacks
+                            print(f"⚠️ Incremental summary failed, falling back to the full transcript: {e}")
+                            incremental_result = None
+                        if incremental_result:
+                            return incremental_result
+                    print(f"🔍 DEBUG: Getting transcript for: {video_id}")
+                    return {'transcript': processor.get_transcript(video_id, progress)}
+                
+                # Video metadata and the transcript don't depend on each other
+                progress.update('getting_transcript', 30, get_localized_message('extracting'))
+                stages = StageGraph('summarize_video', progress)
+                stages.add('video_info', fetch_video_info)
+                stages.add('content', fetch_content)
+                try:
+                    stage_results = stages.run()
+                except StageCancelled:
                     progress.cancel()
                     return
+                video_info = stage_results['video_info']
+                content = stage_results['content']
                 
-                progress.update('getting_transcript', 50, get_localized_message('extracting'))
-                print(f"🔍 DEBUG: Getting transcript for: {video_id}")
-                transcript = processor.get_transcript(video_id, progress)
+                def finish(summary, transcript):
+                    if not summary or summary.startswith('Error') or summary == 'Task cancelled by user':
+                        progress.error(f"Failed to generate summary: {summary}")
+                        return
+                    
+                    print(f"🔍 DEBUG: Summary generated, length: {len(summary)}")
+                    
+                    # Complete with final result
+                    progress.complete({
+                        'success': True,
+                        'summary': summary,
+                        'video_info': video_info,
+                        'video_id': video_id,
+                        'transcript_length': len(transcript),
+                        'ai_engine': 'Qwen/Qwen3-235B-A22B-Instruct-2507',
+                        'provider': 'DeepInfra'
+                    })
                 
+                if progress.is_cancelled():
+                    progress.cancel()
+                    return
+                transcript = content['transcript']
                 if not transcript or len(transcript.strip()) < 50:
                     progress.error("No valid transcript found for this video")
                     return
                 
-                print(f"🔍 DEBUG: Transcript extracted, length: {len(transcript)}")
-                progress.update('analyzing', 50, get_localized_message('analyzing'))
+                language = content.get('language', language)
+                summary_input = transcript
+                content_label = 'Transcript'
+                if content.get('section_notes'):
+                    # Long video: the final summary is the reduce step over the window notes
+                    print(f"🧩 Reducing {content['windows']} window summaries into the final summary")
+                    summary_input = content['section_notes']
+                    content_label = 'Section notes (chronological, with timestamps)'
+                else:
+                    print(f"🔍 DEBUG: Transcript extracted, length: {len(transcript)}")
+                    progress.update('analyzing', 50, get_localized_message('analyzing'))
                 
                 # Auto-detect language if requested
                 if language == 'auto':
@@ -490,24 +566,18 @@ def summarize_video_stream():
                 
                 # Generate summary with streaming
                 print(f"🔍 DEBUG: About to generate summary with streaming, language: {language}")
-                summary = processor.summarize_with_g4f_language(transcript, language, progress)
-                
-                if not summary or summary.startswith('Error') or summary == 'Task cancelled by user':
-                    progress.error(f"Failed to generate summary: {summary}")
+                if async_streaming_enabled():
+                    # Hand the answer stream to the async loop; this thread ends here
+                    processor.summarize_async(
+                        summary_input, language, progress,
+                        on_complete=lambda summary: finish(summary, transcript),
+                        on_error=lambda e: progress.error(f'Video analysis failed: {str(e)}'),
+                        content_label=content_label)
                     return
+                summary = processor.summarize_with_g4f_language(summary_input, language, progress,
+                                                                 content_label=content_label)
                 
-                print(f"🔍 DEBUG: Summary generated, length: {len(summary)}")
-                
-                # Complete with final result
-                progress.complete({
-                    'success': True,
-                    'summary': summary,
-                    'video_info': video_info,
-                    'video_id': video_id,
-                    'transcript_length': len(transcript),
-                    'ai_engine': 'Qwen/Qwen3-235B-A22B-Instruct-2507',
-                    'provider': 'DeepInfra'
-                })
+                finish(summary, transcript)
                     
             except Exception as e:
                 print(f"🔍 DEBUG: Error in process_video_in_background: {str(e)}")
@@ -550,6 +620,7 @@ def process_multiple_videos():
         
         def process_multiple():
             nonlocal language  # Allow modification of the outer scope language variable
+            set_llm_context('multi_video_summary', task_id)
             try:
                 # Check for cancellation at start
                 if progress.is_cancelled():
@@ -784,15 +855,8 @@ REMINDER: Synthesize - don't just summarize one video. Show how ALL videos conne
                     else:
                         progress.update('streaming_start', 85, 'Creating summary...')
                     
-                    # Attempt streaming for multi-video
-                    response = processor.g4f_client.chat.completions.create(
-                        model=processor.model,
-                        messages=[
-                            {"role": "user", "content": prompt}
-                        ],
-                        provider=processor.provider,
-                        stream=True
-                    )
+                    # Attempt streaming for multi-video (shared gateway handles model fallback)
+                    response = processor.make_ai_request_with_fallback(prompt, None, language, stream=True)
                     print(f"🔍 DEBUG: Multi-video streaming call successful, processing chunks...")
                     
                     # Process stream with real-time updates (more frequent updates for smoothness)
@@ -833,39 +897,15 @@ REMINDER: Synthesize - don't just summarize one video. Show how ALL videos conne
                         progress.update('fallback', 87, 'Creating summary...')
                     
                     try:
-                        response = processor.g4f_client.chat.completions.create(
-                            model=processor.model,
-                            messages=[
-                                {"role": "user", "content": prompt}
-                            ],
-                            provider=processor.provider
-                        )
+                        response = processor.make_ai_request_with_fallback(prompt, None, language, stream=False)
                         summary = response.choices[0].message.content
                         
-                        # Real-time word-by-word streaming simulation for fallback (faster updates)
+                        # Send the finished summary at once; the browser paces the typing effect
                         if summary:
-                            import time
-                            words = summary.split()
-                            accumulated = ""
-                            
-                            for i, word in enumerate(words):
-                                if progress.is_cancelled():
-                                    progress.cancel()
-                                    return
-                                    
-                                accumulated += word + " "
-                                percentage = 87 + (i / len(words) * 10)  # 87% to 97%
-                                
-                                if language == 'ar':
-                                    progress.update('word_synthesis', percentage, 
-                                                  f'إنشاء الملخص... {percentage:.0f}%', 
-                                                  accumulated.strip())
-                                else:
-                                    progress.update('word_synthesis', percentage, 
-                                                  f'Creating summary... {percentage:.0f}%', 
-                                                  accumulated.strip())
-                                
-                                time.sleep(0.04)  # 40ms per word
+                            if language == 'ar':
+                                progress.update('word_synthesis', 97, 'إنشاء الملخص... 97%', summary)
+                            else:
+                                progress.update('word_synthesis', 97, 'Creating summary... 97%', summary)
                                 
                     except Exception as fallback_error:
                         error_msg = str(fallback_error)
@@ -928,15 +968,20 @@ def analyze_webpage_stream():
             return jsonify({'error': 'Please enter a valid URL (e.g., https://example.com)'}), 400
         
         # Check for active tasks to prevent concurrent operations
-        from .progress import progress_store, cleanup_stale_tasks
+        from .progress import cleanup_stale_tasks, get_active_task_ids, make_job_key, canonical_url, attach_to_job, start_or_attach_job
+        
+        # Identical request already running: share its progress stream and result
+        job_key = make_job_key('analyze_webpage', canonical_url(url), language)
+        shared_task_id = attach_to_job(job_key)
+        if shared_task_id:
+            return jsonify({'task_id': shared_task_id, 'stream_url': f'/progress/{shared_task_id}', 'coalesced': True})
         
         # Clean up any stale tasks first
         cleaned_count = cleanup_stale_tasks()
         if cleaned_count > 0:
             print(f"🧹 Cleaned up {cleaned_count} stale tasks")
         
-        active_tasks = [task_id for task_id, progress in progress_store.items() 
-                       if not progress.get('completed', False)]
+        active_tasks = get_active_task_ids()
         
         if len(active_tasks) > 0:
             print(f"🚫 WEBPAGE ANALYSIS TASK CONFLICT: {len(active_tasks)} active tasks found: {active_tasks}")
@@ -945,9 +990,10 @@ def analyze_webpage_stream():
                 'active_tasks': len(active_tasks)
             }), 429  # Too Many Requests
         
-        # Generate unique task ID
-        task_id = str(uuid.uuid4())
-        progress = ProgressTracker(task_id)
+        # Generate unique task ID (or join an identical job that started in the meantime)
+        task_id, progress, attached = start_or_attach_job(job_key)
+        if attached:
+            return jsonify({'task_id': task_id, 'stream_url': f'/progress/{task_id}', 'coalesced': True})
         
         def get_localized_message(key, lang=language, **kwargs):
             """Get localized progress messages based on user's language preference"""
@@ -971,6 +1017,7 @@ def analyze_webpage_stream():
             return message.format(**kwargs)
         
         def analyze_in_background():
+            set_llm_context('webpage_summary', task_id)
             try:
                 print(f"🔍 DEBUG: analyze_in_background started")
                 print(f"🔍 DEBUG: URL: {url}")
@@ -1156,6 +1203,7 @@ def generate_shorts_stream():
         
         # Check for active tasks to prevent overwhelming the system
         from .progress import progress_store, cleanup_stale_tasks, add_to_queue, get_processing_status
+        from .progress import make_job_key, canonical_url, start_or_attach_job
         
         # Clean up any stale tasks first
         cleaned_count = cleanup_stale_tasks()
@@ -1166,15 +1214,26 @@ def generate_shorts_stream():
         status = get_processing_status()
         print(f"🔍 PROCESSING STATUS: {status['active_tasks_count']}/{status['max_concurrent_tasks']} active, {status['queued_tasks_count']} queued")
         
-        # Generate unique task ID and add to queue
-        task_id = str(uuid.uuid4())
-        progress = ProgressTracker(task_id)
+        # Identical request already running: share its progress stream and clips (the work is queued once)
+        video_id = YouTubeProcessor().extract_video_id(url)
+        job_key = make_job_key('generate_shorts', video_id or canonical_url(url), language)
+        task_id, progress, attached = start_or_attach_job(job_key)
+        if attached:
+            return jsonify({
+                'task_id': task_id,
+                'stream_url': f'/progress/{task_id}',
+                'queue_position': progress_store[task_id].get('queue_position', 0),
+                'estimated_wait_minutes': progress_store[task_id].get('estimated_wait_minutes', 0),
+                'coalesced': True,
+                'concurrent_processing': True
+            })
         
         # Add to queue system
         queue_position = add_to_queue(task_id)
         
         if queue_position == -1:
             # Queue is full
+            progress.error('Server is currently at full capacity. Please try again later.')
             return jsonify({
                 'error': 'Server is currently at full capacity. Please try again later.',
                 'queue_full': True,
@@ -1231,7 +1290,7 @@ def generate_shorts_stream():
             return messages.get(key, {}).get(lang, messages.get(key, {}).get('en', key))
         
         def process_shorts_in_background():
-            nonlocal language  # Allow access to the language variable from outer scope
+            set_llm_context('shorts', task_id)
             try:
                 # Use the new concurrent processing wait system
                 from .progress import wait_for_processing_slot, get_queue_position
@@ -1265,62 +1324,59 @@ def generate_shorts_stream():
                     progress.cancel()
                     return
                 
-                progress.update('getting_info', 20, get_localized_message('processing'))
-                print(f"🔍 DEBUG: Getting video info for: {video_id}")
-                video_info = processor.get_video_info(video_id)
-                
-                # Check for cancellation before getting transcript
-                if progress.is_cancelled():
-                    progress.cancel()
-                    return
-                
-                progress.update('getting_transcript', 30, get_localized_message('extracting'))
-                print(f"🔍 DEBUG: Getting transcript WITH TIMESTAMPS for shorts: {video_id}")
-                
-                # Use the new timestamped method for shorts generation
-                try:
-                    transcript = processor.get_transcript_with_timestamps(video_id, progress)
-                    print(f"✅ Timestamped transcript extracted: {len(transcript)} segments")
-                except Exception as timestamp_error:
-                    progress.error(f"Failed to extract timestamps: {str(timestamp_error)}")
-                    return
-                
-                if not transcript or len(transcript) < 5:
-                    progress.error("No valid timestamped transcript found. This video may not have captions or timestamps available.")
-                    return
-                
-                print(f"🔍 DEBUG: Timestamped transcript extracted, segments: {len(transcript)}")
-                
-                # Auto-detect language if requested from transcript
-                if language == 'auto':
-                    # Extract text from timestamped transcript for language detection
-                    if isinstance(transcript, list) and len(transcript) > 0:
-                        transcript_text = ' '.join([seg.get('text', '') for seg in transcript[:10]])  # Sample first 10 segments
-                    else:
-                        transcript_text = str(transcript)
-                    
-                    detected_language = processor.detect_language(transcript_text)
-                    language = detected_language
-                    print(f"🌐 Auto-detected language for shorts: {'Arabic' if language == 'ar' else 'English'}")
-                
-                # Check for cancellation before video processing
-                if progress.check_stop_at_breakpoint():
-                    progress.cancel()
-                    return
-                
                 # Import VideoProcessor here to avoid circular imports
                 from .video_processor import VideoProcessor
                 
-                # Process video and generate clips
                 with VideoProcessor() as video_processor:
-                    if progress.check_stop_at_breakpoint():
+                    def fetch_transcript(results):
+                        # Use the new timestamped method for shorts generation
+                        print(f"🔍 DEBUG: Getting transcript WITH TIMESTAMPS for shorts: {video_id}")
+                        try:
+                            transcript = processor.get_transcript_with_timestamps(video_id, progress)
+                        except Exception as timestamp_error:
+                            raise Exception(f"Failed to extract timestamps: {str(timestamp_error)}")
+                        if not transcript or len(transcript) < 5:
+                            raise Exception("No valid timestamped transcript found. This video may not have captions or timestamps available.")
+                        print(f"✅ Timestamped transcript extracted: {len(transcript)} segments")
+                        return transcript
+                    
+                    def generate_clips(results):
+                        nonlocal language
+                        transcript = results['transcript']
+                        
+                        # Auto-detect language if requested from transcript
+                        if language == 'auto':
+                            # Extract text from timestamped transcript for language detection (first 10 segments)
+                            transcript_text = ' '.join([seg.get('text', '') for seg in transcript[:10]])
+                            language = processor.detect_language(transcript_text)
+                            print(f"🌐 Auto-detected language for shorts: {'Arabic' if language == 'ar' else 'English'}")
+                        
+                        print(f"🔍 DEBUG: Starting video processing for shorts with language: {language}")
+                        return video_processor.process_video_for_shorts(url, transcript, language, progress,
+                                                                        video_info=results['stream_info'])
+                    
+                    # oEmbed metadata, the transcript and the Tor stream lookup don't depend on each other
+                    progress.update('getting_transcript', 20, get_localized_message('processing'))
+                    stages = StageGraph('generate_shorts', progress)
+                    stages.add('video_info', lambda results: processor.get_video_info(video_id))
+                    stages.add('transcript', fetch_transcript)
+                    stages.add('stream_info', lambda results: video_processor.get_video_info_safe(url))
+                    stages.add('clips', generate_clips, depends_on=('transcript', 'stream_info'))
+                    try:
+                        stage_results = stages.run()
+                    except StageCancelled:
                         progress.cancel()
                         return
+                    except Exception as stage_error:
+                        progress.error(str(stage_error))
+                        return
                     
-                    print(f"🔍 DEBUG: Starting video processing for shorts with language: {language}")
-                    result = video_processor.process_video_for_shorts(url, transcript, language, progress)
-                    
+                    transcript = stage_results['transcript']
+                    result = stage_results['clips']
                     if not result.get('success'):
+                        if progress.check_stop_at_breakpoint():
+                            progress.cancel()
+                            return
                         progress.error(f"Failed to generate shorts: {result.get('error', 'Unknown error')}")
                         return
                     
@@ -1390,7 +1446,9 @@ def download_clip(task_id, clip_number):
 def debug_tasks():
     """Debug endpoint to see active tasks with concurrent processing info"""
     try:
-        from .progress import progress_store, cleanup_stale_tasks, get_processing_status
+        from .progress import progress_store, cleanup_stale_tasks, get_processing_status, get_job_leader, get_job_subscriber_count
+        from .browser_pool import get_browser_pool
+        from .page_readiness import get_page_readiness
         import time
         
         # Clean up stale tasks first
@@ -1400,9 +1458,11 @@ def debug_tasks():
         status = get_processing_status()
         
         active_tasks = []
-        for task_id, progress in progress_store.items():
+        for task_id, progress in list(progress_store.items()):
             active_tasks.append({
                 'task_id': task_id,
+                'job_leader': get_job_leader(task_id),  # Coalesced requests share their leader's job
+                'job_subscribers': get_job_subscriber_count(task_id),
                 'status': progress.get('status'),
                 'completed': progress.get('completed', False),
                 'start_time': progress.get('start_time'),
@@ -1410,14 +1470,69 @@ def debug_tasks():
                 'message': progress.get('message', ''),
                 'error': progress.get('error'),
                 'queue_position': progress.get('queue_position', -1),
-                'estimated_wait_minutes': progress.get('estimated_wait_minutes', 0)
+                'estimated_wait_minutes': progress.get('estimated_wait_minutes', 0),
+                'llm_calls': get_task_breakdown(get_job_leader(task_id))  # Per (feature, model) latency and tokens
             })
         
         return jsonify({
             'cleaned_stale_tasks': cleaned_count,
             'total_tasks_in_store': len(progress_store),
             'active_tasks': active_tasks,
-            'concurrent_processing_status': status
+            'concurrent_processing_status': status,
+            'stage_timings': get_stage_stats(),  # Moving-average stage durations per job type (queue ETA)
+            'browser_pool': get_browser_pool().get_stats(),  # Shared Crawl4AI browser of this worker
+            'page_readiness': get_page_readiness().get_stats()  # Learned per-domain page settle times
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+@limiter.exempt  # Scraped by Prometheus
+def prometheus_metrics():
+    """Prometheus exposition of LLM latency, throughput and error metrics"""
+    metrics = render_metrics()
+    if metrics is None:
+        return Response('prometheus_client is not installed\n', status=503, mimetype='text/plain')
+    return Response(metrics, mimetype=CONTENT_TYPE_LATEST)
+
+@app.route('/api/admin/llm-ranking')
+@limiter.exempt  # No rate limit on admin endpoint
+def llm_ranking():
+    """Admin endpoint showing the live model ranking and circuit breaker state"""
+    try:
+        from .llm_gateway import get_llm_gateway
+
+        models = get_llm_gateway().get_ranking()
+        return jsonify({
+            'models': models,
+            'open_circuits': sum(1 for model in models if model['circuit_state'] == 'open'),
+            'async_streams': get_async_llm().get_stats(),
+            'generated_at': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/llm-cache')
+@limiter.exempt  # No rate limit on admin endpoint
+def llm_cache_stats():
+    """Admin endpoint exporting LLM result cache hit/miss counters"""
+    try:
+        from .llm_cache import get_llm_cache
+
+        return jsonify(get_llm_cache().get_stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/sessions')
+@limiter.exempt  # No rate limit on admin endpoint
+def session_store_stats():
+    """Admin endpoint showing session store memory use, evictions and content interning"""
+    try:
+        stores = get_session_store_stats()
+        return jsonify({
+            'stores': stores,
+            'total_bytes': sum(store['bytes'] for store in stores.values()),
+            'generated_at': datetime.now().isoformat()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1489,7 +1604,7 @@ def get_clips(task_id):
 def cancel_task(task_id):
     """Cancel a queued or processing task"""
     try:
-        from .progress import progress_store, remove_from_queue, cancel_task_by_id
+        from .progress import progress_store, remove_from_queue, cancel_task_by_id, detach_from_job, get_job_leader
         
         if task_id not in progress_store:
             return jsonify({'error': 'Task not found'}), 404
@@ -1499,11 +1614,20 @@ def cancel_task(task_id):
         if task_progress.get('completed', False):
             return jsonify({'error': 'Task already completed'}), 400
         
+        # Shared (coalesced) job: other requests keep it running
+        if detach_from_job(task_id):
+            return jsonify({
+                'success': True,
+                'message': 'Task cancelled successfully',
+                'task_id': task_id
+            })
+        
         # Cancel the task using the existing cancel function
+        leader_id = get_job_leader(task_id)
         cancel_task_by_id(task_id)
         
         # Also remove from queue
-        remove_from_queue(task_id)
+        remove_from_queue(leader_id)
         
         print(f"🚫 CANCELLED: User cancelled task {task_id}")
         
@@ -1861,6 +1985,7 @@ def chat_agent_analyze():
         
         def generate():
             """Generate Server-Sent Events for analysis progress"""
+            set_llm_context('chat_analyze')
             yield "data: {\"type\": \"start\"}\n\n"
             
             # Set up progress callback
@@ -1904,7 +2029,8 @@ Structure your response with clear headers and organized bullet points."""
                         chat_agent.clear_cancel_flag(session_id)
                         
                         # Stream the summary response
-                        for update in chat_agent.ask_question_word_stream(session_id, summary_question, analysis_mode):
+                        for update in chat_agent.ask_question_word_stream(session_id, summary_question, analysis_mode,
+                                                                     cache_task='chat_summary'):
                             # Modify the update type to indicate it's an automatic summary
                             if update.get('type') == 'thinking':
                                 update['type'] = 'summary_thinking'
@@ -1952,6 +2078,7 @@ def chat_agent_ask():
         
         def generate():
             """Generate Server-Sent Events for streaming response"""
+            set_llm_context('chat')
             try:
                 yield "data: {\"type\": \"start\"}\n\n"
                 
@@ -2059,8 +2186,63 @@ def chat_agent_validate_session():
 # Video Chat API Routes - YouTube Video Analysis with Q&A
 # ============================================
 
-# Global storage for video chat sessions
-video_chat_sessions = {}
+# Global storage for video chat sessions (bounded; identical transcripts are stored once)
+video_chat_sessions = SessionStore('video_chat_sessions')
+
+def fetch_video_chat_transcript(processor, video_id):
+    """Transcript text and its timestamped segments ([] when only plain text is available)"""
+    try:
+        segments = list(processor.iter_transcript_segments(video_id))
+    except Exception as e:
+        print(f"⚠️ Timestamped transcript unavailable, using plain transcript: {e}")
+        segments = []
+    if segments:
+        return ' '.join(seg['text'] for seg in segments), segments
+    return processor.get_transcript(video_id), []
+
+def store_video_chat_session(session_id, video_id, video_info, transcript, segments, summary, language):
+    """Store a processed video and index its transcript for the questions that follow"""
+    session_data = video_chat_sessions[session_id] = {
+        'video_id': video_id,
+        'video_info': video_info,
+        'transcript': transcript,
+        'timed_transcript': pack_segments(segments),  # Interned text instead of thousands of segment dicts
+        'summary': summary,
+        'language': language,
+        'chat_history': []
+    }
+    video_chat_transcript_index(session_data)
+
+def video_chat_transcript_index(session_data):
+    """Retrieval index of a session's transcript (sessions on the same video share one)"""
+    index = session_data.get('retrieval_index')
+    if index is None:
+        timed_transcript = session_data.get('timed_transcript')
+        
+        def build():
+            started = time.time()
+            built = build_transcript_index(session_data['transcript'], unpack_segments(timed_transcript))
+            print(f"🔎 Video chat index: {len(built.chunks)} "
+                  f"{'timestamped windows' if timed_transcript else 'chunks'} in {time.time() - started:.2f}s")
+            return built
+        index = session_data['retrieval_index'] = video_chat_sessions.derived(
+            timed_transcript or session_data['transcript'], 'retrieval_index', build)
+    return index
+
+def video_chat_excerpt(session_data, question):
+    """Transcript sent with a question: all of it if small, else the windows that best match the question"""
+    max_tokens = RETRIEVAL_CONFIG['video_chat_tokens']
+    if not RETRIEVAL_CONFIG['enabled']:
+        return session_data['transcript']
+    index = video_chat_transcript_index(session_data)
+    if index.chunk_tokens.sum() <= max_tokens:
+        return '\n\n'.join(index.chunks)
+    excerpt = index.select(question, max_tokens)
+    if excerpt is None:
+        # Nothing matches (e.g. "what is this about?"): the summary carries the answer, add the opening
+        return index.head(max_tokens)
+    print(f"🔎 Retrieved {count_tokens(excerpt)} of {int(index.chunk_tokens.sum())} transcript tokens for the question")
+    return excerpt
 
 @app.route('/api/video-chat/process', methods=['POST'])
 @limiter.limit("10 per minute")
@@ -2115,7 +2297,7 @@ def process_youtube_video_for_chat(url, session_id):
         
         # Get transcript
         try:
-            transcript = processor.get_transcript(video_id)
+            transcript, segments = fetch_video_chat_transcript(processor, video_id)
             if not transcript or len(transcript.strip()) < 50:
                 return jsonify({
                     'type': 'error',
@@ -2145,14 +2327,7 @@ def process_youtube_video_for_chat(url, session_id):
             })
         
         # Store video session data
-        video_chat_sessions[session_id] = {
-            'video_id': video_id,
-            'video_info': video_info,
-            'transcript': transcript,
-            'summary': summary,
-            'language': detected_language,
-            'chat_history': []
-        }
+        store_video_chat_session(session_id, video_id, video_info, transcript, segments, summary, detected_language)
         
         # Create video info display
         video_display = f"""
@@ -2193,7 +2368,7 @@ def handle_video_qa(question, session_id):
             })
         
         session_data = video_chat_sessions[session_id]
-        transcript = session_data['transcript']
+        transcript = video_chat_excerpt(session_data, question)
         video_info = session_data['video_info']
         language = session_data.get('language', 'en')
         
@@ -2201,18 +2376,24 @@ def handle_video_qa(question, session_id):
         language_instruction = ""
         if language == 'ar':
             language_instruction = "\nIMPORTANT: The user is asking in Arabic context, so please respond in Arabic language."
+        timestamp_instruction = ""
+        if session_data.get('timed_transcript'):
+            timestamp_instruction = " When you mention a part of the video, cite its timestamp in the same [m:ss] form."
         
-        prompt = f"""You are analyzing a YouTube video and answering questions about its content. Here's the video information and transcript:
+        prompt = f"""You are analyzing a YouTube video and answering questions about its content. Here's the video information, its summary and the parts of the transcript that match the question:
 
 VIDEO TITLE: {video_info['title']}
 CHANNEL: {video_info['author']}
 
-FULL VIDEO TRANSCRIPT:
+VIDEO SUMMARY:
+{session_data.get('summary', '')}
+
+RELEVANT TRANSCRIPT EXCERPTS:
 {transcript}
 
 USER QUESTION: {question}
 
-Please answer the user's question based on the video content above. Be specific and reference relevant parts of the video when possible.{language_instruction}
+Please answer the user's question based on the video content above. Be specific and reference relevant parts of the video when possible.{timestamp_instruction}{language_instruction}
 
 FORMATTING GUIDELINES:
 - Use **bold** for important terms
@@ -2242,6 +2423,7 @@ ANSWER:"""
                 'answer': response_text,
                 'timestamp': time.time()
             })
+            video_chat_sessions.save(session_id, session_data)
             
             return jsonify({
                 'type': 'qa_response',
@@ -2282,6 +2464,7 @@ def video_chat_stream():
             return jsonify({'error': f'Message too long. Maximum 2000 characters allowed. Current length: {len(message)}'}), 400
         
         def generate_stream():
+            set_llm_context('video_chat')
             try:
                 # Check if message is a YouTube URL
                 is_youtube_url = any(pattern in message.lower() for pattern in ['youtube.com', 'youtu.be'])
@@ -2306,7 +2489,7 @@ def video_chat_stream():
                         video_info = processor.get_video_info(video_id)
                         yield f"data: {json.dumps({'type': 'progress', 'message': '📝 Extracting transcript...', 'progress': 50})}\n\n"
                         
-                        transcript = processor.get_transcript(video_id)
+                        transcript, segments = fetch_video_chat_transcript(processor, video_id)
                         if not transcript or len(transcript.strip()) < 50:
                             yield f"data: {json.dumps({'type': 'error', 'message': '❌ No transcript available'})}\n\n"
                             return
@@ -2348,9 +2531,6 @@ Share the key insights from this video including main topics, important conclusi
                                         # Send the accumulated text as-is to preserve formatting
                                         yield f"data: {json.dumps({'type': 'streaming', 'text': accumulated_text, 'progress': min(80 + len(accumulated_text.split()) // 10, 95)})}\n\n"
                                         
-                                        # Small delay for natural typing effect
-                                        time.sleep(0.05)
-                                        
                                         # Update tracking variables
                                         current_length = len(accumulated_text)
                                         if current_length == last_content_length:
@@ -2365,14 +2545,8 @@ Share the key insights from this video including main topics, important conclusi
                             summary = accumulated_text.strip()
                             
                             # Store session data
-                            video_chat_sessions[session_id] = {
-                                'video_id': video_id,
-                                'video_info': video_info,
-                                'transcript': transcript,
-                                'summary': summary,
-                                'language': detected_language,
-                                'chat_history': []
-                            }
+                            store_video_chat_session(session_id, video_id, video_info, transcript, segments,
+                                                     summary, detected_language)
                             
                             # Create final video display content without headers
                             video_display = summary
@@ -2385,22 +2559,12 @@ Share the key insights from this video including main topics, important conclusi
                             summary = processor.summarize_with_g4f_language(transcript, detected_language)
                             
                             if summary and not summary.startswith('Error'):
-                                # Simulate word-by-word for non-streaming
-                                words = summary.split()
-                                for i, word in enumerate(words):
-                                    current_text = " ".join(words[:i+1])
-                                    yield f"data: {json.dumps({'type': 'streaming', 'text': current_text, 'progress': min(80 + (i * 2), 95)})}\n\n"
-                                    time.sleep(0.05)  # Faster for simulated streaming
+                                # Send the finished summary at once; the browser renders it
+                                yield f"data: {json.dumps({'type': 'streaming', 'text': summary, 'progress': 95})}\n\n"
                                 
                                 # Store and complete without headers
-                                video_chat_sessions[session_id] = {
-                                    'video_id': video_id,
-                                    'video_info': video_info,
-                                    'transcript': transcript,
-                                    'summary': summary,
-                                    'language': detected_language,
-                                    'chat_history': []
-                                }
+                                store_video_chat_session(session_id, video_id, video_info, transcript, segments,
+                                                         summary, detected_language)
                                 
                                 video_display = summary
                                 yield f"data: {json.dumps({'type': 'complete', 'content': video_display, 'video_info': video_info})}\n\n"
@@ -2419,7 +2583,7 @@ Share the key insights from this video including main topics, important conclusi
                         return
                     
                     session_data = video_chat_sessions[session_id]
-                    transcript = session_data['transcript']
+                    transcript = video_chat_excerpt(session_data, message)
                     video_info = session_data['video_info']
                     language = session_data.get('language', 'en')
                     
@@ -2427,41 +2591,62 @@ Share the key insights from this video including main topics, important conclusi
                     language_instruction = ""
                     if language == 'ar':
                         language_instruction = "\nIMPORTANT: Please respond in Arabic language."
+                    timestamp_instruction = ""
+                    if session_data.get('timed_transcript'):
+                        timestamp_instruction = " When you mention a part of the video, cite its timestamp in the same [m:ss] form."
                     
-                    prompt = f"""You are analyzing a YouTube video and answering questions about its content.{language_instruction}
+                    prompt_template = """You are analyzing a YouTube video and answering questions about its content.{language_instruction}
 
-VIDEO TITLE: {video_info['title']}
-CHANNEL: {video_info['author']}
+VIDEO TITLE: {title}
+CHANNEL: {author}
 
-FULL VIDEO TRANSCRIPT:
-{transcript}
+VIDEO SUMMARY:
+{summary}
 
+RELEVANT TRANSCRIPT EXCERPTS:
+{transcript}
+{history}
 USER QUESTION: {message}
 
-Please answer the user's question based on the video content above. Be specific and reference relevant parts of the video when possible.
+Please answer the user's question based on the video content above. Be specific and reference relevant parts of the video when possible.{timestamp_instruction}
 
 Use **bold** for important terms, numbered lists for steps, and bullet points for key information.
 
 ANSWER:"""
+                    prompt_fields = {
+                        'language_instruction': language_instruction,
+                        'title': video_info['title'],
+                        'author': video_info['author'],
+                        'summary': session_data.get('summary', ''),
+                        'message': message,
+                        'timestamp_instruction': timestamp_instruction,
+                    }
+                    
+                    # Size transcript and earlier Q&A turns to the model context window
+                    previous_turns = [f"Q: {turn['question']}\nA: {turn['answer']}" for turn in session_data['chat_history']]
+                    budget = plan_prompt(prompt_template.format(transcript='', history='', **prompt_fields),
+                                         transcript, history=previous_turns)
+                    history_text = ''
+                    if budget['history']:
+                        history_text = "\nEARLIER QUESTIONS IN THIS CONVERSATION:\n" + "\n\n".join(budget['history']) + "\n"
+                    prompt = prompt_template.format(transcript=budget['content'], history=history_text, **prompt_fields)
+                    print(f"🧮 Video chat prompt budget: {budget['tokens']}")
 
                     try:
-                        # Use G4F to generate answer with streaming
-                        processor = YouTubeProcessor()
-                        response = processor.make_ai_request_with_fallback(prompt, None, language, stream=True)
+                        # Use G4F to generate answer with streaming (model I/O on the async loop when available)
+                        if async_streaming_enabled():
+                            deltas = get_async_llm().iter_text(prompt)
+                        else:
+                            from .llm_gateway import get_llm_gateway
+                            deltas, _ = get_llm_gateway().stream_text(prompt)
                         
                         accumulated_text = ""
                         
-                        for chunk in response:
-                            if hasattr(chunk, 'choices') and chunk.choices:
-                                delta_content = getattr(chunk.choices[0].delta, 'content', None)
-                                if delta_content:
-                                    accumulated_text += delta_content
-                                    
-                                    # Send the accumulated text as-is to preserve formatting
-                                    yield f"data: {json.dumps({'type': 'streaming', 'text': accumulated_text, 'progress': min(70 + len(accumulated_text.split()), 95)})}\n\n"
-                                    
-                                    # Small delay for natural typing effect
-                                    time.sleep(0.05)
+                        for delta_content in deltas:
+                            accumulated_text += delta_content
+                            
+                            # Send the accumulated text as-is to preserve formatting
+                            yield f"data: {json.dumps({'type': 'streaming', 'text': accumulated_text, 'progress': min(70 + len(accumulated_text.split()), 95)})}\n\n"
                         
                         # Use the accumulated text as the final answer
                         answer = accumulated_text.replace("ANSWER:", "").strip()
@@ -2472,6 +2657,7 @@ ANSWER:"""
                             'answer': answer,
                             'timestamp': time.time()
                         })
+                        video_chat_sessions.save(session_id, session_data)
                         
                         yield f"data: {json.dumps({'type': 'qa_response', 'question': message, 'answer': answer})}\n\n"
                         
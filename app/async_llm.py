@@ -0,0 +1,309 @@
+"""
+Asyncio streaming path for LLM requests.
+Token streams run as coroutines on one dedicated event loop thread, so the number of open
+streams no longer depends on how many OS threads are available. Bridges feed the streams
+into ProgressTracker tasks (no thread held while the answer streams) and into the
+synchronous SSE generators.
+"""
+
+import time
+import queue
+import asyncio
+import inspect
+import threading
+import contextvars
+
+from .config import ASYNC_LLM_CONFIG
+from .llm_gateway import get_llm_gateway, config_key, extract_stream_text
+from .llm_cache import get_llm_cache
+from .token_budget import count_tokens, count_message_tokens
+from .llm_metrics import (get_llm_context, set_llm_context, call_labels, observe_attempt,
+                          observe_fallback_depth)
+from .offline import make_llm_client, replay_enabled
+
+# Import G4F async client with fallback
+try:
+    from g4f.client import AsyncClient
+    ASYNC_CLIENT_AVAILABLE = True
+except ImportError:
+    ASYNC_CLIENT_AVAILABLE = False
+    print("⚠️ G4F AsyncClient not available - LLM streams will use worker threads")
+
+_END = object()
+
+
+class AsyncLLMStreamer:
+    """Fallback-chain token streaming on a dedicated event loop, sharing the gateway's health state and cache"""
+
+    def __init__(self, llm_gateway=None, settings=None):
+        self.llm_gateway = llm_gateway or get_llm_gateway()
+        self.settings = {**ASYNC_LLM_CONFIG, **(settings or {})}
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._stats = {'started': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'active': 0, 'peak_active': 0}
+
+    # ----- Event loop -----
+
+    def _ensure_loop(self):
+        """Start the streaming loop thread on first use (after gunicorn forks)"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='llm-async-loop', daemon=True).start()
+                    self._client = make_llm_client(lambda: AsyncClient(), is_async=True)
+                    self._semaphore = asyncio.Semaphore(self.settings['max_concurrent_streams'])
+                    self._loop = loop
+                    print("🔁 Async LLM streaming loop started")
+        return self._loop
+
+    def submit(self, coro):
+        """Run a coroutine on the streaming loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+            if key == 'active':
+                self._stats['peak_active'] = max(self._stats['peak_active'], self._stats['active'])
+
+    def get_stats(self):
+        """Counters for streams run on the loop"""
+        with self._lock:
+            return {**self._stats, 'loop_running': self._loop is not None and self._loop.is_running()}
+
+    def _in_background(self, func, *args):
+        """Run bookkeeping that may block (health file lock, cache files) on a worker thread without waiting.
+
+        Everything on the loop shares one thread, so a slow flock or disk write must not run there.
+        """
+        context = contextvars.copy_context()  # Keep the stream's metric labels
+        asyncio.get_running_loop().run_in_executor(None, context.run, func, *args)
+
+    # ----- Streaming -----
+
+    async def _open(self, config, messages):
+        """Start one model's stream and wait for its first chunk (bounded by first_token_timeout)"""
+        create_params = {'model': config['model'], 'messages': messages, 'stream': True}
+        if config.get('provider'):
+            create_params['provider'] = config['provider']
+        response = self._client.chat.completions.create(**create_params)
+        if inspect.isawaitable(response):
+            response = await response
+        chunks = response.__aiter__()
+        first_chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.settings['first_token_timeout'])
+        return first_chunk, chunks
+
+    async def astream(self, prompt=None, messages=None, cache_key=None):
+        """Async generator of text deltas through the fallback chain.
+
+        Models are tried in the gateway's ranking order until one produces a first chunk;
+        outcomes, token usage and completed results go to the same health state and cache
+        as the threaded path.
+        """
+        if messages is None:
+            messages = [{"role": "user", "content": prompt}]
+        gateway = self.llm_gateway
+        if cache_key is not None:
+            # Runs in its own asyncio task context, so this only labels this stream
+            set_llm_context(cache_key.split(':', 1)[0], get_llm_context()['task_id'])
+
+        cache = get_llm_cache()
+        keys = {config_key(config): config for config in gateway.model_configs}
+        if cache_key is not None:
+            text, model = await asyncio.to_thread(cache.get, cache_key, list(keys))
+            if text is not None:
+                print(f"♻️ LLM cache hit ({cache_key.split(':', 1)[0]}, {keys[model]['name']})")
+                yield text
+                return
+
+        prompt_tokens = count_message_tokens(messages)
+        last_error = None
+        candidates = await asyncio.to_thread(gateway.get_candidates, prompt_tokens)
+        for attempt, config in enumerate(candidates, 1):
+            labels = call_labels(config)
+            started = time.time()
+            try:
+                first_chunk, chunks = await self._open(config, messages)
+            except asyncio.CancelledError:
+                raise
+            except StopAsyncIteration:
+                last_error = Exception(f"Empty response from {config['name']}")
+                self._in_background(gateway.record_failure, config, last_error)
+                observe_attempt(labels, 'error', duration=time.time() - started, prompt_tokens=prompt_tokens)
+                continue
+            except Exception as e:
+                last_error = e
+                self._in_background(gateway.record_failure, config, e)
+                observe_attempt(labels, 'error', duration=time.time() - started, prompt_tokens=prompt_tokens)
+                print(f"❌ Model {config['name']} failed (async): {str(e)}")
+                continue
+
+            ttft = time.time() - started
+            self._in_background(gateway.record_success, config, ttft)
+            observe_fallback_depth(labels, attempt)
+            print(f"✅ Success with model: {config['name']} (async)")
+            first_token_at = time.time()
+            parts = [extract_stream_text(first_chunk)]
+            complete = False
+            outcome = 'cancelled'
+            try:
+                if parts[0]:
+                    yield parts[0]
+                async for chunk in chunks:
+                    text = extract_stream_text(chunk)
+                    if text:
+                        parts.append(text)
+                        yield text
+                complete = True
+                outcome = 'success'
+            except (asyncio.CancelledError, GeneratorExit):
+                raise
+            except Exception as e:
+                outcome = 'error'
+                self._in_background(gateway.record_failure, config, e)
+                raise
+            finally:
+                close = getattr(chunks, 'aclose', None)
+                if close and not complete:
+                    try:
+                        await close()
+                    except Exception:
+                        pass
+                output = ''.join(parts)
+                completion_tokens = count_tokens(output)
+                self._in_background(gateway.record_usage, config, prompt_tokens, completion_tokens)
+                observe_attempt(labels, outcome, ttft=ttft, duration=time.time() - started,
+                                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                if complete:
+                    self._in_background(gateway.record_throughput, config, completion_tokens,
+                                        time.time() - first_token_at)
+                    if cache_key is not None:
+                        self._in_background(cache.put, cache_key, config_key(config), output)
+            return
+
+        print("💥 All models failed (async)")
+        if last_error:
+            raise last_error
+        raise Exception("All AI models are currently unavailable. Please try again later.")
+
+    async def _collect(self, prompt, messages, cache_key, on_text, is_cancelled, context):
+        """Run one stream to completion, reporting the accumulated text at most every update interval"""
+        # Tasks start in the loop thread's context: restore the caller's metric labels
+        set_llm_context(context['feature'], context['task_id'])
+        async with self._semaphore:
+            self._count('started')
+            self._count('active')
+            text = ''
+            last_report = 0.0
+            stream = self.astream(prompt, messages, cache_key)
+            try:
+                async for delta in stream:
+                    if is_cancelled and is_cancelled():
+                        self._count('cancelled')
+                        return None
+                    text += delta
+                    now = time.monotonic()
+                    if on_text and now - last_report >= self.settings['progress_update_interval']:
+                        last_report = now
+                        on_text(text)
+                if on_text:
+                    on_text(text)
+                self._count('completed')
+                return text
+            except asyncio.CancelledError:
+                self._count('cancelled')
+                raise
+            except Exception:
+                self._count('failed')
+                raise
+            finally:
+                await stream.aclose()
+                self._count('active', -1)
+
+    # ----- Bridges -----
+
+    def stream_to_progress(self, prompt, progress, on_text, on_complete, on_error, cache_key=None):
+        """Stream a prompt on the loop and report through callbacks; returns immediately.
+
+        on_text(accumulated_text) is called as text arrives (e.g. progress.update),
+        on_complete(text) once the answer is complete and on_error(exception) if every
+        model failed. Nothing is called after the progress task is cancelled.
+        """
+        is_cancelled = progress.is_cancelled if progress is not None else None
+
+        def done(future):
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                on_error(error)
+                return
+            text = future.result()
+            if text is not None:
+                on_complete(text)
+            elif progress is not None:
+                progress.cancel()
+
+        future = self.submit(self._collect(prompt, None, cache_key, on_text, is_cancelled, get_llm_context()))
+        future.add_done_callback(done)
+        return future
+
+    def iter_text(self, prompt=None, messages=None, cache_key=None):
+        """Synchronous iterator of text deltas for SSE generators; the model I/O runs on the loop"""
+        deltas = queue.Queue()
+        context = get_llm_context()
+
+        async def pump():
+            set_llm_context(context['feature'], context['task_id'])
+            async with self._semaphore:
+                self._count('started')
+                self._count('active')
+                try:
+                    async for delta in self.astream(prompt, messages, cache_key):
+                        deltas.put(delta)
+                    self._count('completed')
+                    deltas.put(_END)
+                except asyncio.CancelledError:
+                    self._count('cancelled')
+                    raise
+                except Exception as e:
+                    self._count('failed')
+                    deltas.put(e)
+                finally:
+                    self._count('active', -1)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item = deltas.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Client disconnected or the caller stopped early: stop the stream on the loop too
+            if not future.done():
+                future.cancel()
+
+
+def async_streaming_enabled():
+    """True if LLM streams should run on the async loop"""
+    return ASYNC_LLM_CONFIG['enabled'] and (ASYNC_CLIENT_AVAILABLE or replay_enabled())
+
+
+_streamer = None
+_streamer_lock = threading.Lock()
+
+
+def get_async_llm():
+    """Get the process-wide async LLM streamer"""
+    global _streamer
+    if _streamer is None:
+        with _streamer_lock:
+            if _streamer is None:
+                _streamer = AsyncLLMStreamer()
+    return _streamer
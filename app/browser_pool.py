@@ -0,0 +1,264 @@
+"""
+Shared headless browser for Crawl4AI extraction.
+One Chromium per worker process stays open on a dedicated event loop thread while pages
+are being crawled, and is closed after a few idle minutes. Pages are crawled in a small
+pool of browser contexts (Crawl4AI sessions), each closed and replaced after a number of
+pages, so deep analyses no longer pay for a browser launch and several can run at once.
+Flask threads submit crawls through the synchronous crawl().
+
+The browser runs with a rendering profile from CRAWL_PROFILES; the 'text' profile
+aborts images, media, fonts and ad/tracker requests at request interception and uses a
+small viewport, since only the page text is extracted.
+"""
+
+import time
+import atexit
+import asyncio
+import threading
+import concurrent.futures
+from urllib.parse import urlparse
+
+from .config import CRAWL4AI_AVAILABLE, BROWSER_POOL_CONFIG, CRAWL_PROFILES
+
+if CRAWL4AI_AVAILABLE:
+    from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+
+class BrowserPool:
+    """Warm Crawl4AI browser with a bounded pool of reusable contexts"""
+
+    def __init__(self, settings=None):
+        self.settings = {**BROWSER_POOL_CONFIG, **(settings or {})}
+        profile = self.settings['profile']
+        self.profile = CRAWL_PROFILES[profile] if isinstance(profile, str) else profile  # Name or profile dict
+        self._blocked_types = frozenset(self.profile['blocked_resource_types'])
+        self._blocked_hosts = frozenset(self.profile['blocked_hosts'])
+        self._loop = None
+        self._crawler = None
+        self._browser_lock = None  # asyncio.Lock, created on the loop
+        self._slots = None  # asyncio.Queue of free contexts: {'id', 'pages'}
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._context_serial = 0
+        self._running = 0  # Crawls inside crawler.arun() (only changed on the loop)
+        self._restart_task = None
+        self._last_used = time.monotonic()
+        self._stats = {'crawls': 0, 'failed': 0, 'active': 0, 'peak_active': 0, 'browser_starts': 0,
+                       'idle_closes': 0, 'contexts_recycled': 0, 'wait_seconds': 0.0}
+        self._blocked = {}  # resource type (or 'ad_host') -> aborted requests
+
+    # ----- Event loop and browser -----
+
+    def _ensure_loop(self):
+        """Start the browser loop thread on first use (after gunicorn forks)"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='browser-pool-loop', daemon=True).start()
+                    asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                    self._loop = loop
+                    atexit.register(self.close)
+                    print("🔁 Browser pool loop started")
+        return self._loop
+
+    async def _setup(self):
+        self._browser_lock = asyncio.Lock()
+        self._slots = asyncio.Queue()
+        for _ in range(self.settings['max_contexts']):
+            self._slots.put_nowait(self._new_context())
+        if self.settings['idle_close_seconds']:
+            asyncio.get_running_loop().create_task(self._close_when_idle())
+
+    def _new_context(self):
+        self._context_serial += 1
+        return {'id': f"pool-{self._context_serial}", 'pages': 0}
+
+    async def _browser(self):
+        """The running crawler, launching Chromium if it is not up yet"""
+        async with self._browser_lock:
+            if self._crawler is None:
+                started = time.time()
+                profile = self.profile
+                crawler = AsyncWebCrawler(config=BrowserConfig(
+                    browser_type="chromium",
+                    headless=True,
+                    viewport_width=profile['viewport_width'],
+                    viewport_height=profile['viewport_height'],
+                    user_agent=self.settings['user_agent'],
+                    light_mode=profile['light_mode'],
+                    extra_args=list(profile['extra_args']),
+                    verbose=False
+                ))
+                if self._blocked_types or self._blocked_hosts:
+                    crawler.crawler_strategy.set_hook('on_page_context_created', self._install_blocking)
+                await crawler.start()
+                self._crawler = crawler
+                self._stats['browser_starts'] += 1
+                print(f"🌐 Headless browser started in {time.time() - started:.1f}s")
+            return self._crawler
+
+    async def _shutdown_browser(self, reason):
+        """Close the browser once no page is loading in it (call with the browser lock held)"""
+        # New crawls wait on the browser lock meanwhile; pages already loading get to finish
+        deadline = time.monotonic() + self.settings['crawl_timeout']
+        while self._running and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        crawler, self._crawler = self._crawler, None
+        if crawler is not None:
+            print(f"♻️ Closing headless browser ({reason})")
+            try:
+                await crawler.close()
+            except Exception as e:
+                print(f"⚠️ Browser close error: {e}")
+
+    async def _restart_browser(self):
+        async with self._browser_lock:
+            await self._shutdown_browser('relaunching after repeated failures')
+
+    async def _close_when_idle(self):
+        """Close the browser after idle_close_seconds without crawls, so idle workers don't keep a Chromium"""
+        idle_seconds = self.settings['idle_close_seconds']
+        while True:
+            await asyncio.sleep(min(idle_seconds / 4, 30))
+            if self._crawler is None or self._running or time.monotonic() - self._last_used < idle_seconds:
+                continue
+            async with self._browser_lock:
+                if self._crawler is not None and not self._running:
+                    await self._shutdown_browser(f'idle for {idle_seconds}s')
+                    self._count('idle_closes')
+
+    async def _close_context(self, crawler, context):
+        kill_session = getattr(crawler.crawler_strategy, 'kill_session', None)
+        if kill_session is None:
+            return
+        try:
+            await kill_session(context['id'])
+        except Exception as e:
+            print(f"⚠️ Could not close browser context {context['id']}: {e}")
+
+    # ----- Request blocking -----
+
+    async def _install_blocking(self, page, context=None, **kwargs):
+        """Crawl4AI hook: route the page's requests through the profile's blocking rules (once per tab)"""
+        if not getattr(page, '_pool_blocking', False):
+            await page.route('**/*', self._route)
+            page._pool_blocking = True
+        return page
+
+    def _blocked_host(self, url):
+        host = (urlparse(url).hostname or '').lower()
+        parts = host.split('.')
+        return any('.'.join(parts[index:]) in self._blocked_hosts for index in range(len(parts) - 1))
+
+    async def _route(self, route):
+        request = route.request
+        reason = None
+        if request.resource_type in self._blocked_types:
+            reason = request.resource_type
+        elif self._blocked_hosts and self._blocked_host(request.url):
+            reason = 'ad_host'
+        if reason is None:
+            await route.continue_()
+            return
+        with self._lock:
+            self._blocked[reason] = self._blocked.get(reason, 0) + 1
+        await route.abort('blockedbyclient')
+
+    # ----- Crawling -----
+
+    async def _crawl(self, url, run_config):
+        queued = time.time()
+        context = await self._slots.get()  # Waits while max_contexts pages are already loading
+        self._count('wait_seconds', time.time() - queued)
+        self._count('active')
+        crawler = None
+        recycle = False
+        try:
+            crawler = await self._browser()
+            self._running += 1  # No await since _browser(), so a shutdown can't slip in between
+            try:
+                # Pages of one context reuse its tab and cookies until the context is recycled
+                result = await crawler.arun(url=url, config=run_config.clone(session_id=context['id']))
+            finally:
+                self._running -= 1
+                self._last_used = time.monotonic()
+            self._failures = 0
+            context['pages'] += 1
+            recycle = context['pages'] >= self.settings['recycle_after_pages']
+            return result
+        except asyncio.CancelledError:
+            recycle = True  # The caller timed out; the tab may still be loading
+            raise
+        except Exception:
+            self._count('failed')
+            self._failures += 1
+            recycle = True
+            raise
+        finally:
+            self._count('active', -1)
+            self._count('crawls')
+            if recycle:
+                if crawler is not None:
+                    await self._close_context(crawler, context)
+                context = self._new_context()
+                self._count('contexts_recycled')
+            if self._failures >= self.settings['restart_after_failures']:
+                self._failures = 0
+                # In the background: the restart waits for the other pages still loading
+                self._restart_task = asyncio.get_running_loop().create_task(self._restart_browser())
+            self._slots.put_nowait(context)
+
+    def crawl(self, url, run_config, timeout=None):
+        """Crawl a page with Crawl4AI from any thread; returns the CrawlResult.
+
+        Raises TimeoutError if the page (including the wait for a free context) takes longer than timeout.
+        """
+        if not CRAWL4AI_AVAILABLE:
+            raise Exception("Crawl4AI is not installed")
+        timeout = timeout or self.settings['crawl_timeout']
+        future = asyncio.run_coroutine_threadsafe(self._crawl(url, run_config), self._ensure_loop())
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Crawl of {url} took longer than {timeout}s")
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+            if key == 'active':
+                self._stats['peak_active'] = max(self._stats['peak_active'], self._stats['active'])
+
+    def get_stats(self):
+        """Crawl counters, browser launches, context recycling and blocked requests"""
+        with self._lock:
+            return {**self._stats, 'wait_seconds': round(self._stats['wait_seconds'], 2),
+                    'max_contexts': self.settings['max_contexts'],
+                    'profile': self.settings['profile'] if isinstance(self.settings['profile'], str) else 'custom',
+                    'blocked_requests': dict(self._blocked),
+                    'browser_running': self._crawler is not None}
+
+    def close(self):
+        """Close the browser (at interpreter exit)"""
+        if self._loop is None or self._crawler is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._crawler.close(), self._loop).result(timeout=10)
+        except Exception as e:
+            print(f"⚠️ Browser close error: {e}")
+        self._crawler = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Get the process-wide browser pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool()
+    return _pool
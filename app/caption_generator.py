@@ -10,6 +10,37 @@ import json
 import re
 from typing import List, Dict, Union
 
+# Hook word categories (highlighted in captions, counted when ranking clip windows)
+HOOK_WORDS = {
+    # Attention grabbers
+    'shocking', 'amazing', 'incredible', 'unbelievable', 'mind-blowing',
+    'wow', 'omg', 'whoa', 'insane', 'crazy', 'wild', 'stunning',
+    
+    # Numbers and statistics (always engaging)
+    'million', 'billion', 'thousand', 'percent', 'times', 'years',
+    
+    # Emotional words
+    'love', 'hate', 'fear', 'angry', 'excited', 'surprised', 'shocked',
+    'happy', 'sad', 'terrified', 'devastated', 'thrilled',
+    
+    # Superlatives
+    'best', 'worst', 'biggest', 'smallest', 'fastest', 'slowest',
+    'first', 'last', 'only', 'never', 'always', 'most', 'least',
+    
+    # Action words
+    'revealed', 'exposed', 'discovered', 'found', 'caught', 'busted',
+    'failed', 'succeeded', 'won', 'lost', 'died', 'born', 'created',
+    
+    # Mystery/intrigue
+    'secret', 'hidden', 'mystery', 'unknown', 'conspiracy', 'truth',
+    'lie', 'fake', 'real', 'hoax', 'scam', 'exposed',
+    
+    # Money/success
+    'money', 'rich', 'poor', 'millionaire', 'billionaire', 'broke',
+    'success', 'failure', 'profit', 'loss', 'expensive', 'cheap'
+}
+
+
 class CaptionGenerator:
     def __init__(self):
         self.temp_files = []
@@ -505,42 +536,12 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
         # Check word characteristics
         word_lower = word.lower().strip('.,!?;:\'"')
         
-        # Hook word categories
-        hook_words = {
-            # Attention grabbers
-            'shocking', 'amazing', 'incredible', 'unbelievable', 'mind-blowing',
-            'wow', 'omg', 'whoa', 'insane', 'crazy', 'wild', 'stunning',
-            
-            # Numbers and statistics (always engaging)
-            'million', 'billion', 'thousand', 'percent', 'times', 'years',
-            
-            # Emotional words
-            'love', 'hate', 'fear', 'angry', 'excited', 'surprised', 'shocked',
-            'happy', 'sad', 'terrified', 'devastated', 'thrilled',
-            
-            # Superlatives
-            'best', 'worst', 'biggest', 'smallest', 'fastest', 'slowest',
-            'first', 'last', 'only', 'never', 'always', 'most', 'least',
-            
-            # Action words
-            'revealed', 'exposed', 'discovered', 'found', 'caught', 'busted',
-            'failed', 'succeeded', 'won', 'lost', 'died', 'born', 'created',
-            
-            # Mystery/intrigue
-            'secret', 'hidden', 'mystery', 'unknown', 'conspiracy', 'truth',
-            'lie', 'fake', 'real', 'hoax', 'scam', 'exposed',
-            
-            # Money/success
-            'money', 'rich', 'poor', 'millionaire', 'billionaire', 'broke',
-            'success', 'failure', 'profit', 'loss', 'expensive', 'cheap'
-        }
-        
         # Check if word contains digits (numbers are engaging)
         if any(char.isdigit() for char in word):
             return True
         
         # Check if it's in hook words list
-        if word_lower in hook_words:
+        if word_lower in HOOK_WORDS:
             return True
         
         # Check if word has emphasis punctuation
@@ -15,14 +15,20 @@ from bs4 import BeautifulSoup
 import webscout
 import threading
 import json
-import asyncio
 from concurrent.futures import ThreadPoolExecutor
-import g4f
-from g4f.client import Client
+from .language_detector import is_arabic_text
+from .llm_gateway import get_llm_gateway
+from .llm_cache import get_llm_cache, make_cache_key
+from .token_budget import plan_prompt, truncate_to_tokens, count_tokens
+from .config import TOKEN_BUDGET_CONFIG, RETRIEVAL_CONFIG
+from .retrieval import BM25Index
+from .session_store import SessionStore
+from .offline import offline_webscout_providers
+from .page_readiness import get_page_readiness
 
 # Import Crawl4AI components
 try:
-    from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+    from crawl4ai import CrawlerRunConfig, CacheMode
     CRAWL4AI_AVAILABLE = True
 except ImportError:
     CRAWL4AI_AVAILABLE = False
@@ -34,16 +40,16 @@ class ChatAgent:
         instance_id = f"ChatAgent_{int(time.time() * 1000)}"
         self.instance_id = instance_id
         # Working AI providers for fast analysis
-        self.ai_providers = [
+        self.ai_providers = offline_webscout_providers([
             ('Venice', webscout.Venice, 'chat'),
             ('ChatGPTClone', webscout.ChatGPTClone, 'chat'),
             ('ClaudeOnline', webscout.ClaudeOnline, 'ask'),
             ('OpenGPT', webscout.OpenGPT, 'chat'),
             ('Apriel', webscout.Apriel, 'chat')
-        ]
+        ])
         
-        # G4F client for deep analysis (same as webpage analyzer)
-        self.g4f_client = Client()
+        # Shared LLM gateway for deep analysis (same as webpage analyzer)
+        self.llm_gateway = get_llm_gateway()
         
         # Use same model configurations as webpage analyzer
         from .config import MODEL_CONFIGS
@@ -52,14 +58,16 @@ class ChatAgent:
         self.model = self.model_configs[0]["model"]
         self.provider = self.model_configs[0]["provider"]
         
-        # Store session data
-        self.sessions = {}
-        self.cancel_flags = {}
-        self.analyzing_sessions = {}  # Track sessions currently being analyzed
+        # Store session data (bounded, shared with the other workers; identical page content is stored once)
+        self.sessions = SessionStore('chat_sessions')
+        # Shared too, so a cancel or session check served by another worker sees the in-flight state
+        self.cancel_flags = SessionStore('chat_cancel_flags', {'intern_fields': (), 'ttl_seconds': 3600, 'refresh_seconds': 0.25})
+        self.analyzing_sessions = SessionStore('chat_analyzing', {'intern_fields': (), 'ttl_seconds': 600, 'refresh_seconds': 0.25})  # Track sessions currently being analyzed
         
-        # Content extraction settings
-        self.max_content_length_fast = 4000  # For Webscout providers
-        self.max_content_length_deep = 15000  # For G4F providers (can handle more)
+        # Prompt budgets in tokens (Arabic and English text tokenize very differently)
+        self.max_content_tokens_fast = TOKEN_BUDGET_CONFIG['chat_fast_content_tokens']  # For Webscout providers
+        self.max_content_tokens_deep = TOKEN_BUDGET_CONFIG['chat_deep_content_tokens']  # For G4F providers (can handle more)
+        self.max_question_tokens = TOKEN_BUDGET_CONFIG['chat_question_tokens']
         
         # User agent rotation for bot detection avoidance
         self.user_agents = [
@@ -91,15 +99,40 @@ class ChatAgent:
         
     def is_arabic_text(self, text):
         """Detect if the text contains Arabic characters"""
-        arabic_pattern = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
-        arabic_chars = len(arabic_pattern.findall(text))
-        total_chars = len([c for c in text if c.isalpha()])
-        
         # If more than 30% of alphabetic characters are Arabic, consider it Arabic text
-        if total_chars > 0:
-            return (arabic_chars / total_chars) > 0.3
-        return False
+        return is_arabic_text(text, threshold=0.3)
+    
+    def fit_question(self, question):
+        """Limit question length to the question token budget"""
+        fitted = truncate_to_tokens(question, self.max_question_tokens)
+        return question if fitted == question else fitted + "..."
+
+    def fit_content(self, content, question, max_tokens, session_data=None):
+        """Cut page content to its token budget (and to what the model window leaves after the question).
+        
+        With session_data, a page that does not fit is replaced by the chunks that best match the question.
+        """
+        if session_data is not None and RETRIEVAL_CONFIG['enabled'] and count_tokens(content) > max_tokens:
+            retrieved = self.get_retrieval_index(session_data).select(question, max_tokens)
+            if retrieved:
+                print(f"🔎 Retrieved {count_tokens(retrieved)} of {count_tokens(content)} page tokens for the question")
+                content = retrieved
+        fitted = plan_prompt(question, content, max_content_tokens=max_tokens)['content']
+        return content if fitted == content else fitted + "..."
     
+    def get_retrieval_index(self, session_data):
+        """BM25 index of the session's page content (built once per page content)"""
+        index = session_data.get('retrieval_index')
+        if index is None:
+            def build():
+                started = time.time()
+                built = BM25Index(session_data['content'])
+                print(f"🔎 Retrieval index: {len(built.chunks)} chunks in {time.time() - started:.2f}s")
+                return built
+            # Sessions on the same page share one index
+            index = session_data['retrieval_index'] = self.sessions.derived(session_data['content'], 'retrieval_index', build)
+        return index
+
     def decode_arabic_response(self, text):
         """Comprehensive decoding for Arabic text that may be URL-encoded or HTML-encoded"""
         if not text:
@@ -140,130 +173,112 @@ class ChatAgent:
             
         return decoded_text
         
-    async def scrape_with_crawl4ai(self, url):
+    def scrape_with_crawl4ai(self, url):
         """Advanced web scraping using Crawl4AI with dynamic content support"""
         try:
-            # Browser configuration for dynamic content
-            browser_config = BrowserConfig(
-                browser_type="chromium",
-                headless=True,
-                viewport_width=1920,
-                viewport_height=1080,
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                verbose=False
-            )
-            
             # Crawler configuration optimized for dynamic content
             crawler_config = CrawlerRunConfig(
                 cache_mode=CacheMode.BYPASS,  # Always get fresh content
                 page_timeout=40000,  # 40 seconds for complex sites
-                delay_before_return_html=4.0,  # Wait for dynamic content
                 excluded_tags=['script', 'style', 'noscript'],
                 screenshot=False,
                 verbose=False,
                 js_only=False  # Allow JavaScript execution
             )
 
-            async with AsyncWebCrawler(config=browser_config) as crawler:
-                # JavaScript to handle dynamic content and clean up page
-                js_code = """
-                // Remove ads and unwanted elements
-                const unwantedSelectors = [
-                    '[data-module="Advertisement"]', '.ad', '.advertisement', '.banner', '.ads',
-                    '.overlay', '.modal', '.popup', '.cookie-banner', '.newsletter-signup',
-                    '.social-share', '.sidebar-ads', '[id*="ad"]', '[class*="ad-"]',
-                    '.promo', '.promotion', '.sponsored', '.related-ads', '.google-ads'
-                ];
-                
-                unwantedSelectors.forEach(selector => {
-                    document.querySelectorAll(selector).forEach(el => {
-                        try { el.remove(); } catch(e) {}
-                    });
-                });
-                
-                // Close modals and dialogs
-                document.querySelectorAll('[role="dialog"], .dialog, .modal-backdrop').forEach(el => {
+            # JavaScript to handle dynamic content and clean up page
+            js_code = """
+            // Remove ads and unwanted elements
+            const unwantedSelectors = [
+                '[data-module="Advertisement"]', '.ad', '.advertisement', '.banner', '.ads',
+                '.overlay', '.modal', '.popup', '.cookie-banner', '.newsletter-signup',
+                '.social-share', '.sidebar-ads', '[id*="ad"]', '[class*="ad-"]',
+                '.promo', '.promotion', '.sponsored', '.related-ads', '.google-ads'
+            ];
+            
+            unwantedSelectors.forEach(selector => {
+                document.querySelectorAll(selector).forEach(el => {
                     try { el.remove(); } catch(e) {}
                 });
+            });
+            
+            // Close modals and dialogs
+            document.querySelectorAll('[role="dialog"], .dialog, .modal-backdrop').forEach(el => {
+                try { el.remove(); } catch(e) {}
+            });
+            
+            // Handle cookie banners
+            const dismissButtons = document.querySelectorAll(
+                '[data-testid*="accept"], [data-testid*="dismiss"], [aria-label*="close"], ' +
+                'button[class*="accept"], button[class*="dismiss"], .cookie-accept, .accept-cookies'
+            );
+            dismissButtons.forEach(btn => {
+                try { btn.click(); } catch(e) {}
+            });
+            
+            // Trigger lazy loading by scrolling (the crawl then waits for it to settle)
+            window.scrollTo(0, document.body.scrollHeight / 2);
+            await new Promise(resolve => setTimeout(resolve, 150));
+            window.scrollTo(0, document.body.scrollHeight);
+            """
+            
+            # Shared browser; returns once the page's DOM and network have gone quiet
+            result = get_page_readiness().crawl(url, crawler_config.clone(js_code=js_code))
+            
+            if result.success:
+                # Process the extracted content
+                markdown_content = result.markdown or ""
+                cleaned_html = result.cleaned_html or ""
                 
-                // Handle cookie banners
-                const dismissButtons = document.querySelectorAll(
-                    '[data-testid*="accept"], [data-testid*="dismiss"], [aria-label*="close"], ' +
-                    'button[class*="accept"], button[class*="dismiss"], .cookie-accept, .accept-cookies'
-                );
-                dismissButtons.forEach(btn => {
-                    try { btn.click(); } catch(e) {}
-                });
+                # Clean up markdown content
+                clean_markdown = re.sub(r'\[([^\]]*)\]\([^)]*\)', r'\1', markdown_content)
+                clean_markdown = re.sub(r'!\[([^\]]*)\]\([^)]*\)', '', clean_markdown)
+                clean_markdown = re.sub(r'#{1,6}\s*', '', clean_markdown)
+                clean_markdown = re.sub(r'\*+', '', clean_markdown)
+                clean_markdown = re.sub(r'\s+', ' ', clean_markdown).strip()
                 
-                // Wait for dynamic content to load
-                await new Promise(resolve => setTimeout(resolve, 3000));
+                # Extract text from HTML
+                clean_html_text = ""
+                try:
+                    soup = BeautifulSoup(cleaned_html, 'html.parser')
+                    for element in soup(['script', 'style', 'nav', 'footer', 'aside', 'header']):
+                        element.decompose()
+                    clean_html_text = soup.get_text(separator=' ', strip=True)
+                    clean_html_text = re.sub(r'\s+', ' ', clean_html_text).strip()
+                except Exception as e:
+                    print(f"⚠️ HTML parsing error: {e}")
                 
-                // Trigger lazy loading by scrolling
-                window.scrollTo(0, document.body.scrollHeight / 2);
-                await new Promise(resolve => setTimeout(resolve, 1000));
-                window.scrollTo(0, document.body.scrollHeight);
-                await new Promise(resolve => setTimeout(resolve, 1000));
-                """
+                # Choose the best content
+                candidates = [
+                    ('cleaned_markdown', clean_markdown),
+                    ('cleaned_html_text', clean_html_text),
+                    ('raw_markdown', markdown_content),
+                ]
                 
-                result = await crawler.arun(
-                    url=url,
-                    config=crawler_config.clone(js_code=js_code)
-                )
+                best_content = ""
+                for method, candidate in candidates:
+                    if len(candidate) > 500 and len(candidate.split()) > 50:
+                        best_content = candidate
+                        break
+                
+                # Fallback to raw HTML if needed
+                if not best_content and result.html:
+                    best_content = result.html
+                
+                return {
+                    'content': best_content,
+                    'title': result.metadata.get('title', 'No title'),
+                    'url': url,
+                    'method': 'Crawl4AI (Dynamic)',
+                    'success': True
+                }
+            else:
+                return {
+                    'success': False,
+                    'error': result.error_message or "Unknown error",
+                    'method': 'Crawl4AI (Dynamic)'
+                }
                 
-                if result.success:
-                    # Process the extracted content
-                    markdown_content = result.markdown or ""
-                    cleaned_html = result.cleaned_html or ""
-                    
-                    # Clean up markdown content
-                    clean_markdown = re.sub(r'\[([^\]]*)\]\([^)]*\)', r'\1', markdown_content)
-                    clean_markdown = re.sub(r'!\[([^\]]*)\]\([^)]*\)', '', clean_markdown)
-                    clean_markdown = re.sub(r'#{1,6}\s*', '', clean_markdown)
-                    clean_markdown = re.sub(r'\*+', '', clean_markdown)
-                    clean_markdown = re.sub(r'\s+', ' ', clean_markdown).strip()
-                    
-                    # Extract text from HTML
-                    clean_html_text = ""
-                    try:
-                        soup = BeautifulSoup(cleaned_html, 'html.parser')
-                        for element in soup(['script', 'style', 'nav', 'footer', 'aside', 'header']):
-                            element.decompose()
-                        clean_html_text = soup.get_text(separator=' ', strip=True)
-                        clean_html_text = re.sub(r'\s+', ' ', clean_html_text).strip()
-                    except Exception as e:
-                        print(f"⚠️ HTML parsing error: {e}")
-                    
-                    # Choose the best content
-                    candidates = [
-                        ('cleaned_markdown', clean_markdown),
-                        ('cleaned_html_text', clean_html_text),
-                        ('raw_markdown', markdown_content),
-                    ]
-                    
-                    best_content = ""
-                    for method, candidate in candidates:
-                        if len(candidate) > 500 and len(candidate.split()) > 50:
-                            best_content = candidate
-                            break
-                    
-                    # Fallback to raw HTML if needed
-                    if not best_content and result.html:
-                        best_content = result.html
-                    
-                    return {
-                        'content': best_content,
-                        'title': result.metadata.get('title', 'No title'),
-                        'url': url,
-                        'method': 'Crawl4AI (Dynamic)',
-                        'success': True
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'error': result.error_message or "Unknown error",
-                        'method': 'Crawl4AI (Dynamic)'
-                    }
-                    
         except Exception as e:
             return {
                 'success': False,
@@ -387,8 +402,8 @@ class ChatAgent:
                     progress_callback(session_id, 'processing', 20, "� Using deep content extraction (Crawl4AI)...", '')
                 
                 try:
-                    # Run Crawl4AI in async context
-                    crawl_result = asyncio.run(self.scrape_with_crawl4ai(url))
+                    # Crawl4AI on the worker's shared browser
+                    crawl_result = self.scrape_with_crawl4ai(url)
                     
                     if crawl_result['success'] and len(crawl_result['content']) > 200:
                         content = crawl_result['content']
@@ -411,6 +426,8 @@ class ChatAgent:
                         }
                         print(f"DEBUG: Session {session_id} created with Crawl4AI, content length: {len(content)}")
                         print(f"DEBUG: Total sessions now: {len(self.sessions)}")
+                        if RETRIEVAL_CONFIG['enabled']:
+                            self.get_retrieval_index(self.sessions[session_id])  # Index once, before the first question
                         
                         # Mark analysis as complete
                         if session_id in self.analyzing_sessions:
@@ -464,6 +481,8 @@ class ChatAgent:
                 }
                 print(f"DEBUG: Session {session_id} created with basic requests, content length: {len(content)}")
                 print(f"DEBUG: Total sessions now: {len(self.sessions)}")
+                if RETRIEVAL_CONFIG['enabled']:
+                    self.get_retrieval_index(self.sessions[session_id])  # Index once, before the first question
                 
                 # Mark analysis as complete
                 if session_id in self.analyzing_sessions:
@@ -818,7 +837,7 @@ class ChatAgent:
         # Return original text if we can't clean it effectively
         return response if response else ""
     
-    def ask_question_streaming(self, session_id, question, analysis_mode='fast', progress_callback=None):
+    def ask_question_streaming(self, session_id, question, analysis_mode='fast', progress_callback=None, retrieve=True):
         """Ask a question with streaming response - supports both webpage analysis and general chat
         
         Args:
@@ -826,6 +845,7 @@ class ChatAgent:
             question: User's question
             analysis_mode: 'fast' (Webscout) or 'deep' (G4F)
             progress_callback: Progress callback function
+            retrieve: Send the page chunks matching the question (False: the head of the page, e.g. for summaries)
         """
         print(f"DEBUG: ask_question_streaming called with session_id={session_id}, mode={analysis_mode}, question='{question[:50]}...'")
         
@@ -834,8 +854,7 @@ class ChatAgent:
             return {'success': False, 'error': 'Task cancelled by user'}
         
         # Limit question length
-        if len(question) > 500:
-            question = question[:500] + "..."
+        question = self.fit_question(question)
         
         # Debug session state
         print(f"DEBUG: Sessions available: {list(self.sessions.keys())}")
@@ -859,15 +878,15 @@ class ChatAgent:
             
             # Use different analysis methods based on mode
             if analysis_mode == 'deep':
-                return self._ask_question_with_g4f(session_id, question, original_content, session_data, progress_callback)
+                return self._ask_question_with_g4f(session_id, question, original_content, session_data, progress_callback, retrieve)
             else:
-                return self._ask_question_with_webscout(session_id, question, original_content, session_data, progress_callback)
+                return self._ask_question_with_webscout(session_id, question, original_content, session_data, progress_callback, retrieve)
         else:
             # General chat mode (no webpage content)
             print(f"DEBUG: General chat mode")
             return self._handle_general_chat(session_id, question, analysis_mode, progress_callback)
     
-    def _ask_question_with_webscout(self, session_id, question, original_content, session_data, progress_callback):
+    def _ask_question_with_webscout(self, session_id, question, original_content, session_data, progress_callback, retrieve=True):
         """Handle question using Webscout providers (fast analysis)"""
         # Safety check for None content
         if original_content is None:
@@ -877,9 +896,8 @@ class ChatAgent:
             }
         
         # Limit content for Webscout providers
-        content = original_content
-        if len(content) > self.max_content_length_fast:
-            content = content[:self.max_content_length_fast] + "..."
+        content = self.fit_content(original_content, question, self.max_content_tokens_fast,
+                                   session_data if retrieve else None)
             
         print(f"DEBUG: Using Webscout analysis, truncated content length: {len(content)}")
         
@@ -984,9 +1002,6 @@ Analyze the webpage content provided above and answer the user's question. Be di
                                 clean_partial = self.clean_ai_response(answer)
                                 progress = min(80 + (word_count / 5), 95)
                                 progress_callback(session_id, 'word_streaming', progress, f"🗣️ {name} responding...", clean_partial)
-                            
-                            # Small delay between words for natural typing effect
-                            time.sleep(0.08)  # Slightly faster for better flow
                         
                         # Keep the last incomplete word for next iteration
                         accumulated_text = " ".join(words) if words else ""
@@ -1009,6 +1024,7 @@ Analyze the webpage content provided above and answer the user's question. Be di
                                 'provider': name,
                                 'timestamp': time.time()
                             })
+                            self.sessions.save(session_id, session_data)
                             
                             if progress_callback:
                                 progress_callback(session_id, 'complete', 100, f"✅ Answer from {name}", clean_answer)
@@ -1032,6 +1048,7 @@ Analyze the webpage content provided above and answer the user's question. Be di
                                 'provider': name,
                                 'timestamp': time.time()
                             })
+                            self.sessions.save(session_id, session_data)
                             
                             if progress_callback:
                                 progress_callback(session_id, 'complete', 100, f"✅ Answer from {name}", clean_answer)
@@ -1065,7 +1082,7 @@ Analyze the webpage content provided above and answer the user's question. Be di
             'error': error_msg
         }
     
-    def _ask_question_with_g4f(self, session_id, question, original_content, session_data, progress_callback):
+    def _ask_question_with_g4f(self, session_id, question, original_content, session_data, progress_callback, retrieve=True):
         """Handle question using G4F providers (deep analysis)"""
         # Safety check for None content
         if original_content is None:
@@ -1075,9 +1092,8 @@ Analyze the webpage content provided above and answer the user's question. Be di
             }
         
         # Use more content for G4F providers
-        content = original_content
-        if len(content) > self.max_content_length_deep:
-            content = content[:self.max_content_length_deep] + "..."
+        content = self.fit_content(original_content, question, self.max_content_tokens_deep,
+                                   session_data if retrieve else None)
             
         print(f"DEBUG: Using G4F deep analysis, content length: {len(content)}")
         
@@ -1143,125 +1159,77 @@ Provide a comprehensive, well-structured answer based on the webpage content. In
         if progress_callback:
             progress_callback(session_id, 'thinking', 60, f"🔍 Deep analysis in progress: '{question[:50]}{'...' if len(question) > 50 else ''}'", '')
         
-        # Use same model configs as webpage analyzer
-        for config_index, model_config in enumerate(self.model_configs):
-            if self.cancel_flags.get(session_id, False):
-                return {'success': False, 'error': 'Task cancelled by user'}
-            
-            model = model_config["model"]
-            provider = model_config["provider"]
-            model_name = model_config["name"]
-            
+        if self.cancel_flags.get(session_id, False):
+            return {'success': False, 'error': 'Task cancelled by user'}
+        
+        # The gateway orders the models, falls back on errors and hedges slow ones
+        def on_attempt(model_config, attempt):
+            print(f"DEBUG: Trying G4F model {model_config['name']} ({model_config['model']})...")
+            if progress_callback:
+                progress_callback(session_id, 'thinking', 70, f"🤖 Deep analysis with {model_config['name']}...", '')
+        
+        try:
+            clean_answer = None
             try:
-                print(f"DEBUG: Trying G4F model {model_name} ({model})...")
+                deltas, model_config = self.llm_gateway.stream_text(prompt, on_attempt=on_attempt)
+                model_name = model_config['name']
+                answer = ""
+                word_count = 0
                 
-                if progress_callback:
-                    progress_callback(session_id, 'thinking', 70, f"🤖 Deep analysis with {model_name}...", '')
-                
-                # Try streaming first
-                try:
-                    # Use provider if specified, otherwise let G4F auto-select
-                    create_params = {
-                        'model': model,
-                        'messages': [{"role": "user", "content": prompt}],
-                        'stream': True
-                    }
-                    if provider:
-                        create_params['provider'] = provider
-                    
-                    response = self.g4f_client.chat.completions.create(**create_params)
-                    
-                    answer = ""
-                    word_count = 0
-                    
-                    for chunk in response:
-                        if self.cancel_flags.get(session_id, False):
-                            return {'success': False, 'error': 'Task cancelled by user'}
-                        
-                        if hasattr(chunk, 'choices') and chunk.choices:
-                            delta_content = getattr(chunk.choices[0].delta, 'content', None)
-                            if delta_content:
-                                answer += delta_content
-                                word_count += len(delta_content.split())
-                                
-                                # Stream progress every few words
-                                if progress_callback and word_count % 5 == 0:
-                                    clean_partial = self.clean_ai_response(answer)
-                                    progress = min(80 + (word_count / 10), 95)
-                                    progress_callback(session_id, 'word_streaming', progress, f"🔍 {model} analyzing...", clean_partial)
-                                
-                                # Stop if content is too long
-                                if len(answer) > 2000:
-                                    break
+                for delta_content in deltas:
+                    if self.cancel_flags.get(session_id, False):
+                        return {'success': False, 'error': 'Task cancelled by user'}
                     
-                    if len(answer) > 20:  # Got a reasonable response
-                        clean_answer = self.clean_ai_response(answer)
-                        if clean_answer and len(clean_answer) > 20:
-                            # Add to chat history
-                            session_data['chat_history'].append({
-                                'question': question,
-                                'answer': clean_answer,
-                                'provider': model_name,
-                                'analysis_mode': 'deep',
-                                'timestamp': time.time()
-                            })
-                            
-                            if progress_callback:
-                                progress_callback(session_id, 'complete', 100, f"✅ Deep analysis complete with {model_name}", clean_answer)
-                            
-                            print(f"DEBUG: Success with G4F {model}, answer length: {len(clean_answer)}")
-                            return {
-                                'success': True,
-                                'answer': clean_answer,
-                                'provider': model_name,
-                                'analysis_mode': 'deep',
-                                'question': question
-                            }
+                    answer += delta_content
+                    word_count += len(delta_content.split())
                     
-                except Exception as streaming_error:
-                    print(f"DEBUG: Streaming failed for {model}, trying non-streaming: {streaming_error}")
-                    
-                    # Fallback to non-streaming
-                    create_params = {
-                        'model': model,
-                        'messages': [{"role": "user", "content": prompt}],
-                        'stream': False
-                    }
-                    if provider:
-                        create_params['provider'] = provider
+                    # Stream progress every few words
+                    if progress_callback and word_count % 5 == 0:
+                        clean_partial = self.clean_ai_response(answer)
+                        progress = min(80 + (word_count / 10), 95)
+                        progress_callback(session_id, 'word_streaming', progress, f"🔍 {model_name} analyzing...", clean_partial)
                     
-                    response = self.g4f_client.chat.completions.create(**create_params)
-                    
-                    if hasattr(response, 'choices') and response.choices:
-                        answer = response.choices[0].message.content
-                        if answer and len(answer) > 20:
-                            clean_answer = self.clean_ai_response(answer)
-                            if clean_answer:
-                                # Add to chat history
-                                session_data['chat_history'].append({
-                                    'question': question,
-                                    'answer': clean_answer,
-                                    'provider': model_name,
-                                    'analysis_mode': 'deep',
-                                    'timestamp': time.time()
-                                })
-                                
-                                if progress_callback:
-                                    progress_callback(session_id, 'complete', 100, f"✅ Deep analysis complete with {model_name}", clean_answer)
-                                
-                                return {
-                                    'success': True,
-                                    'answer': clean_answer,
-                                    'provider': model_name,
-                                    'analysis_mode': 'deep',
-                                    'question': question
-                                }
+                    # Stop if content is too long
+                    if len(answer) > 2000:
+                        break
+                
+                if len(answer) > 20:  # Got a reasonable response
+                    clean_answer = self.clean_ai_response(answer)
+            
+            except Exception as streaming_error:
+                print(f"DEBUG: Streaming failed, trying non-streaming: {streaming_error}")
+                answer, model_config = self.llm_gateway.complete_text(prompt, on_attempt=on_attempt)
+                model_name = model_config['name']
+                if answer and len(answer) > 20:
+                    clean_answer = self.clean_ai_response(answer)
+            
+            if clean_answer and len(clean_answer) > 20:
+                # Add to chat history
+                session_data['chat_history'].append({
+                    'question': question,
+                    'answer': clean_answer,
+                    'provider': model_name,
+                    'analysis_mode': 'deep',
+                    'timestamp': time.time()
+                })
+                self.sessions.save(session_id, session_data)
                 
-            except Exception as e:
-                print(f"DEBUG: G4F model {model} failed: {e}")
                 if progress_callback:
-                    progress_callback(session_id, 'provider_error', 75, f"❌ {model} failed, trying next...", '')
-                continue
+                    progress_callback(session_id, 'complete', 100, f"✅ Deep analysis complete with {model_name}", clean_answer)
+                
+                print(f"DEBUG: Success with G4F {model_name}, answer length: {len(clean_answer)}")
+                return {
+                    'success': True,
+                    'answer': clean_answer,
+                    'provider': model_name,
+                    'analysis_mode': 'deep',
+                    'question': question
+                }
+            
+        except Exception as e:
+            print(f"DEBUG: G4F models failed: {e}")
+            if progress_callback:
+                progress_callback(session_id, 'provider_error', 75, f"❌ All models failed: {str(e)}", '')
         
         # All G4F models failed
         error_msg = "💡 Deep analysis is currently unavailable. Please try Fast Analysis mode or try again later."
@@ -1376,8 +1344,6 @@ Please provide a direct, helpful answer:"""
                                 clean_partial = self.clean_ai_response(answer)
                                 progress = min(80 + (word_count / 5), 95)
                                 progress_callback(session_id, 'word_streaming', progress, f"🗣️ {name} responding...", clean_partial)
-                            
-                            time.sleep(0.08)
                         
                         accumulated_text = " ".join(words) if words else ""
                         
@@ -1398,6 +1364,7 @@ Please provide a direct, helpful answer:"""
                                 'mode': 'general_chat',
                                 'timestamp': time.time()
                             })
+                            self.sessions.save(session_id, session_data)
                             
                             if progress_callback:
                                 progress_callback(session_id, 'complete', 100, f"✅ Answer from {name}", clean_answer)
@@ -1422,6 +1389,7 @@ Please provide a direct, helpful answer:"""
                                 'mode': 'general_chat',
                                 'timestamp': time.time()
                             })
+                            self.sessions.save(session_id, session_data)
                             
                             if progress_callback:
                                 progress_callback(session_id, 'complete', 100, f"✅ Answer from {name}", clean_answer)
@@ -1459,121 +1427,74 @@ Please provide a direct, helpful answer:"""
         if progress_callback:
             progress_callback(session_id, 'thinking', 60, f"🔍 Deep analysis in progress: '{question[:50]}{'...' if len(question) > 50 else ''}'", '')
         
-        # Use same model configs as webpage analyzer
-        for config_index, model_config in enumerate(self.model_configs):
-            if self.cancel_flags.get(session_id, False):
-                return {'success': False, 'error': 'Task cancelled by user'}
-            
-            model = model_config["model"]
-            provider = model_config["provider"]
-            model_name = model_config["name"]
-            
+        if self.cancel_flags.get(session_id, False):
+            return {'success': False, 'error': 'Task cancelled by user'}
+        
+        # The gateway orders the models, falls back on errors and hedges slow ones
+        def on_attempt(model_config, attempt):
+            print(f"DEBUG: Trying G4F model {model_config['name']} for general chat...")
+            if progress_callback:
+                progress_callback(session_id, 'thinking', 70, f"🔍 {model_config['name']} thinking...", '')
+        
+        try:
+            clean_answer = None
             try:
-                print(f"DEBUG: Trying G4F model {model_name} for general chat...")
-                
-                if progress_callback:
-                    progress_callback(session_id, 'thinking', 70, f"🔍 {model_name} thinking...", '')
+                deltas, model_config = self.llm_gateway.stream_text(prompt, on_attempt=on_attempt)
+                model_name = model_config['name']
+                answer = ""
+                word_count = 0
                 
-                # Try streaming first
-                try:
-                    create_params = {
-                        'model': model,
-                        'messages': [{"role": "user", "content": prompt}],
-                        'stream': True
-                    }
-                    if provider:
-                        create_params['provider'] = provider
-                    
-                    response = self.g4f_client.chat.completions.create(**create_params)
-                    
-                    answer = ""
-                    word_count = 0
-                    
-                    for chunk in response:
-                        if self.cancel_flags.get(session_id, False):
-                            return {'success': False, 'error': 'Task cancelled by user'}
-                        
-                        if hasattr(chunk, 'choices') and chunk.choices:
-                            delta_content = getattr(chunk.choices[0].delta, 'content', None)
-                            if delta_content:
-                                answer += delta_content
-                                word_count += len(delta_content.split())
-                                
-                                if progress_callback and word_count % 5 == 0:
-                                    clean_partial = self.clean_ai_response(answer)
-                                    progress = min(80 + (word_count / 10), 95)
-                                    progress_callback(session_id, 'word_streaming', progress, f"🔍 {model_name} responding...", clean_partial)
-                                
-                                if len(answer) > 2000:
-                                    break
+                for delta_content in deltas:
+                    if self.cancel_flags.get(session_id, False):
+                        return {'success': False, 'error': 'Task cancelled by user'}
                     
-                    if len(answer) > 20:
-                        clean_answer = self.clean_ai_response(answer)
-                        if clean_answer and len(clean_answer) > 20:
-                            # Add to chat history
-                            session_data['chat_history'].append({
-                                'question': question,
-                                'answer': clean_answer,
-                                'provider': f'G4F ({model_name})',
-                                'mode': 'general_chat_deep',
-                                'timestamp': time.time()
-                            })
-                            
-                            if progress_callback:
-                                progress_callback(session_id, 'complete', 100, f"✅ Deep response from {model_name}", clean_answer)
-                            
-                            return {
-                                'success': True,
-                                'answer': clean_answer,
-                                'provider': f'G4F ({model_name})',
-                                'mode': 'general_chat_deep',
-                                'question': question
-                            }
+                    answer += delta_content
+                    word_count += len(delta_content.split())
                     
-                except Exception as streaming_error:
-                    print(f"DEBUG: G4F streaming failed for {model_name}, trying non-streaming: {streaming_error}")
+                    if progress_callback and word_count % 5 == 0:
+                        clean_partial = self.clean_ai_response(answer)
+                        progress = min(80 + (word_count / 10), 95)
+                        progress_callback(session_id, 'word_streaming', progress, f"🔍 {model_name} responding...", clean_partial)
                     
-                    # Fallback to non-streaming
-                    create_params = {
-                        'model': model,
-                        'messages': [{"role": "user", "content": prompt}],
-                        'stream': False
-                    }
-                    if provider:
-                        create_params['provider'] = provider
-                    
-                    response = self.g4f_client.chat.completions.create(**create_params)
-                    
-                    if hasattr(response, 'choices') and response.choices:
-                        answer = response.choices[0].message.content
-                        if answer and len(answer) > 20:
-                            clean_answer = self.clean_ai_response(answer)
-                            if clean_answer:
-                                # Add to chat history
-                                session_data['chat_history'].append({
-                                    'question': question,
-                                    'answer': clean_answer,
-                                    'provider': f'G4F ({model_name})',
-                                    'mode': 'general_chat_deep',
-                                    'timestamp': time.time()
-                                })
-                                
-                                if progress_callback:
-                                    progress_callback(session_id, 'complete', 100, f"✅ Deep response from {model_name}", clean_answer)
-                                
-                                return {
-                                    'success': True,
-                                    'answer': clean_answer,
-                                    'provider': f'G4F ({model_name})',
-                                    'mode': 'general_chat_deep',
-                                    'question': question
-                                }
+                    if len(answer) > 2000:
+                        break
+                
+                if len(answer) > 20:
+                    clean_answer = self.clean_ai_response(answer)
+            
+            except Exception as streaming_error:
+                print(f"DEBUG: G4F streaming failed, trying non-streaming: {streaming_error}")
+                answer, model_config = self.llm_gateway.complete_text(prompt, on_attempt=on_attempt)
+                model_name = model_config['name']
+                if answer and len(answer) > 20:
+                    clean_answer = self.clean_ai_response(answer)
+            
+            if clean_answer and len(clean_answer) > 20:
+                # Add to chat history
+                session_data['chat_history'].append({
+                    'question': question,
+                    'answer': clean_answer,
+                    'provider': f'G4F ({model_name})',
+                    'mode': 'general_chat_deep',
+                    'timestamp': time.time()
+                })
+                self.sessions.save(session_id, session_data)
                 
-            except Exception as e:
-                print(f"DEBUG: G4F model {model_name} failed: {e}")
                 if progress_callback:
-                    progress_callback(session_id, 'provider_error', 75, f"❌ {model_name} failed, trying next...", '')
-                continue
+                    progress_callback(session_id, 'complete', 100, f"✅ Deep response from {model_name}", clean_answer)
+                
+                return {
+                    'success': True,
+                    'answer': clean_answer,
+                    'provider': f'G4F ({model_name})',
+                    'mode': 'general_chat_deep',
+                    'question': question
+                }
+            
+        except Exception as e:
+            print(f"DEBUG: G4F models failed: {e}")
+            if progress_callback:
+                progress_callback(session_id, 'provider_error', 75, f"❌ All models failed: {str(e)}", '')
         
         # All G4F models failed, fallback to Webscout
         print("DEBUG: All G4F models failed, falling back to Webscout for general chat")
@@ -1625,13 +1546,14 @@ Please provide a direct, helpful answer:"""
         if session_id in self.cancel_flags:
             del self.cancel_flags[session_id]
     
-    def ask_question_word_stream(self, session_id, question, analysis_mode='fast'):
+    def ask_question_word_stream(self, session_id, question, analysis_mode='fast', cache_task=None):
         """Ask a question with word-by-word streaming generator - supports both webpage analysis and general chat
         
         Args:
             session_id: Session identifier
             question: User's question
             analysis_mode: 'fast' (Webscout) or 'deep' (G4F)
+            cache_task: Cache the answer under this task name (only for fixed questions such as the automatic summary)
         """
         # Debug session state
         if session_id in self.sessions:
@@ -1679,7 +1601,10 @@ Please provide a direct, helpful answer:"""
             len(str(session_data.get('content', ''))) > 0):
             # Webpage analysis mode
             original_content = session_data['content']
-            yield from self._handle_webpage_word_stream(session_id, question, analysis_mode, session_data, original_content)
+            if cache_task:
+                yield from self._cached_webpage_word_stream(cache_task, session_id, question, analysis_mode, session_data, original_content)
+            else:
+                yield from self._handle_webpage_word_stream(session_id, question, analysis_mode, session_data, original_content)
         else:
             # General chat mode (session not found, or session exists but has no valid content)
             if session_id in self.sessions:
@@ -1688,7 +1613,47 @@ Please provide a direct, helpful answer:"""
                 pass
             yield from self._handle_general_chat_word_stream(session_id, question, analysis_mode)
     
-    def _handle_webpage_word_stream(self, session_id, question, analysis_mode, session_data, original_content):
+    def _cached_webpage_word_stream(self, cache_task, session_id, question, analysis_mode, session_data, original_content):
+        """Replay a cached answer for this page and question, or stream a new one and cache it"""
+        if analysis_mode == 'deep':
+            models = [config['name'] for config in self.model_configs]
+        else:
+            models = [name for name, _, _ in self.ai_providers]
+        language = 'ar' if self.is_arabic_text(original_content) else 'en'
+        cache_key = make_cache_key(cache_task, f"{session_data['title']}\n{session_data['url']}\n{original_content}",
+                                   language, f"{analysis_mode}\n{question}")
+        cache = get_llm_cache()
+        
+        answer, provider = cache.get(cache_key, models)
+        if answer is not None:
+            print(f"♻️ Chat answer cache hit ({cache_task}, {provider})")
+            # Send the cached answer at once; the browser paces the typing effect
+            yield {
+                'type': 'streaming',
+                'text': answer,
+                'progress': 95,
+                'message': f"🗣️ {provider} responding..."
+            }
+            
+            session_data['chat_history'].append({
+                'question': question,
+                'answer': answer,
+                'provider': provider,
+                'analysis_mode': analysis_mode,
+                'timestamp': time.time()
+            })
+            self.sessions.save(session_id, session_data)
+            yield {'type': 'complete', 'answer': answer, 'provider': provider, 'question': question}
+            return
+        
+        # Fixed questions (summaries) cover the page as a whole rather than chunks matching their wording
+        for update in self._handle_webpage_word_stream(session_id, question, analysis_mode, session_data, original_content,
+                                                       retrieve=False):
+            if update.get('type') == 'complete' and update.get('provider') in models:
+                cache.put(cache_key, update['provider'], update['answer'])
+            yield update
+    
+    def _handle_webpage_word_stream(self, session_id, question, analysis_mode, session_data, original_content, retrieve=True):
         """Handle webpage analysis with word streaming"""
         
         # Safety check for content
@@ -1697,19 +1662,15 @@ Please provide a direct, helpful answer:"""
             yield {'type': 'error', 'message': 'Webpage content is not available. Please try analyzing the webpage again.'}
             return
         
-        # Use appropriate content length based on analysis mode
+        # Limit question length
+        question = self.fit_question(question)
+        
+        # Use appropriate content budget based on analysis mode
+        retrieval_session = session_data if retrieve else None
         if analysis_mode == 'deep':
-            content = original_content
-            if len(content) > self.max_content_length_deep:
-                content = content[:self.max_content_length_deep] + "..."
+            content = self.fit_content(original_content, question, self.max_content_tokens_deep, retrieval_session)
         else:
-            content = original_content  
-            if len(content) > self.max_content_length_fast:
-                content = content[:self.max_content_length_fast] + "..."
-        
-        # Limit question length
-        if len(question) > 500:
-            question = question[:500] + "..."
+            content = self.fit_content(original_content, question, self.max_content_tokens_fast, retrieval_session)
         
         # Detect language from both question AND content (prioritize content)
         is_arabic_question = self.is_arabic_text(question)
@@ -1883,9 +1844,6 @@ Analyze the webpage content provided above and answer the user's question. Be di
                                 }
                                 
                                 last_sent_length = len(complete_text)
-                                
-                                # Small delay for natural typing effect
-                                time.sleep(0.1)
                         
                         # Stop if we get enough content
                         if len(accumulated_text) > 2000:  # Limit by character count instead
@@ -1910,6 +1868,7 @@ Analyze the webpage content provided above and answer the user's question. Be di
                                 'provider': name,
                                 'timestamp': time.time()
                             })
+                            self.sessions.save(session_id, session_data)
                             
                             yield {
                                 'type': 'complete',
@@ -1924,26 +1883,13 @@ Analyze the webpage content provided above and answer the user's question. Be di
                     print(f"DEBUG: Got string response from {name}, length: {len(response)}")
                     clean_answer = self.clean_ai_response(response)
                     if clean_answer and len(clean_answer) > 10:
-                        # Send character by character to preserve formatting during streaming
-                        words = clean_answer.split()
-                        current_pos = 0
-                        
-                        for i, word in enumerate(words):
-                            # Find the actual position in original text to preserve spacing and newlines
-                            word_start = clean_answer.find(word, current_pos)
-                            word_end = word_start + len(word)
-                            current_text = clean_answer[:word_end]
-                            current_pos = word_end
-                            
-                            # Send update every 2-3 words to reduce flickering
-                            if i % 2 == 0 or i == len(words) - 1:
-                                yield {
-                                    'type': 'streaming',
-                                    'text': current_text,
-                                    'progress': min(80 + (i * 2), 95),
-                                    'message': f"🗣️ {name} responding..."
-                                }
-                                time.sleep(0.15)  # Slightly longer delay for smoother effect
+                        # Send the finished answer at once; the browser paces the typing effect
+                        yield {
+                            'type': 'streaming',
+                            'text': clean_answer,
+                            'progress': 95,
+                            'message': f"🗣️ {name} responding..."
+                        }
                         
                         # Add to chat history
                         session_data['chat_history'].append({
@@ -1952,6 +1898,7 @@ Analyze the webpage content provided above and answer the user's question. Be di
                             'provider': name,
                             'timestamp': time.time()
                         })
+                        self.sessions.save(session_id, session_data)
                         
                         yield {
                             'type': 'complete',
@@ -2032,145 +1979,79 @@ USER QUESTION:
 DEEP ANALYSIS TASK:
 Provide a comprehensive, well-structured answer based on the webpage content. Include detailed explanations, relevant context, and thorough analysis of the information related to the user's question:"""
 
-        # Use same model configs as webpage analyzer
-        for config_index, model_config in enumerate(self.model_configs):
-            if self.cancel_flags.get(session_id, False):
-                yield {'type': 'error', 'message': 'Task cancelled by user'}
-                return
-            
-            model = model_config["model"]
-            provider = model_config["provider"]
-            model_name = model_config["name"]
-            
+        if self.cancel_flags.get(session_id, False):
+            yield {'type': 'error', 'message': 'Task cancelled by user'}
+            return
+        
+        yield {'type': 'progress', 'message': "🔍 Deep analysis in progress...", 'progress': 70}
+        
+        # The gateway orders the models, falls back on errors and hedges slow ones
+        try:
+            clean_answer = None
             try:
-                yield {'type': 'progress', 'message': f"🔍 Deep analysis with {model_name}...", 'progress': 70}
+                deltas, model_config = self.llm_gateway.stream_text(prompt)
+                model_name = model_config['name']
+                accumulated_text = ""
                 
-                # Try streaming first
-                try:
-                    # Use provider if specified, otherwise let G4F auto-select
-                    create_params = {
-                        'model': model,
-                        'messages': [{"role": "user", "content": prompt}],
-                        'stream': True
-                    }
-                    if provider:
-                        create_params['provider'] = provider
-                    
-                    response = self.g4f_client.chat.completions.create(**create_params)
-                    
-                    accumulated_text = ""
-                    
-                    for chunk in response:
-                        if self.cancel_flags.get(session_id, False):
-                            yield {'type': 'error', 'message': 'Task cancelled by user'}
-                            return
-                        
-                        if hasattr(chunk, 'choices') and chunk.choices:
-                            delta_content = getattr(chunk.choices[0].delta, 'content', None)
-                            if delta_content:
-                                accumulated_text += delta_content
-                                
-                                # Stream each chunk immediately like fast mode
-                                yield {
-                                    'type': 'streaming',
-                                    'text': accumulated_text,
-                                    'progress': min(80 + len(accumulated_text) // 50, 95),
-                                    'message': f"🔍 {model_name} responding..."
-                                }
-                                
-                                # Small delay for natural typing effect  
-                                time.sleep(0.05)
-                                
-                                # Stop if we get enough content (but allow longer responses in deep mode)
-                                if len(accumulated_text) > 4000:
-                                    break
+                for delta_content in deltas:
+                    if self.cancel_flags.get(session_id, False):
+                        yield {'type': 'error', 'message': 'Task cancelled by user'}
+                        return
                     
-                    # Send final response
-                    if accumulated_text.strip():
-                        clean_answer = self.clean_ai_response(accumulated_text)
-                        if clean_answer and len(clean_answer) > 10:
-                            # Add to chat history
-                            session_data['chat_history'].append({
-                                'question': question,
-                                'answer': clean_answer,
-                                'provider': model_name,
-                                'analysis_mode': 'deep',
-                                'timestamp': time.time()
-                            })
-                            
-                            yield {
-                                'type': 'complete',
-                                'answer': clean_answer,
-                                'provider': model_name,
-                                'question': question
-                            }
-                            return
-                
-                except Exception as streaming_error:
-                    print(f"DEBUG: G4F streaming failed for {model_name}, trying non-streaming: {streaming_error}")
+                    accumulated_text += delta_content
                     
-                    # Fallback to non-streaming
-                    create_params = {
-                        'model': model,
-                        'messages': [{"role": "user", "content": prompt}],
-                        'stream': False
+                    # Stream each chunk immediately like fast mode
+                    yield {
+                        'type': 'streaming',
+                        'text': accumulated_text,
+                        'progress': min(80 + len(accumulated_text) // 50, 95),
+                        'message': f"🔍 {model_name} responding..."
                     }
-                    if provider:
-                        create_params['provider'] = provider
-                    
-                    response = self.g4f_client.chat.completions.create(**create_params)
                     
-                    if hasattr(response, 'choices') and response.choices:
-                        answer = response.choices[0].message.content
-                        if answer and len(answer) > 20:
-                            clean_answer = self.clean_ai_response(answer)
-                            if clean_answer:
-                                # Simulate streaming while preserving formatting
-                                words = clean_answer.split()
-                                current_pos = 0
-                                
-                                for i, word in enumerate(words):
-                                    # Find the actual position in original text to preserve spacing and newlines
-                                    word_start = clean_answer.find(word, current_pos)
-                                    word_end = word_start + len(word)
-                                    current_text = clean_answer[:word_end]
-                                    current_pos = word_end
-                                    
-                                    # Send update every 2-3 words
-                                    if i % 3 == 0 or i == len(words) - 1:
-                                        yield {
-                                            'type': 'streaming',
-                                            'text': current_text,
-                                            'progress': min(80 + (i * 2), 95),
-                                            'message': f"🔍 {model} analyzing..."
-                                        }
-                                        time.sleep(0.15)
-                                
-                                # Add to chat history
-                                session_data['chat_history'].append({
-                                    'question': question,
-                                    'answer': clean_answer,
-                                    'provider': model_name,
-                                    'analysis_mode': 'deep',
-                                    'timestamp': time.time()
-                                })
-                                
-                                yield {
-                                    'type': 'complete',
-                                    'answer': clean_answer,
-                                    'provider': model_name,
-                                    'question': question
-                                }
-                                return
-                
-            except Exception as e:
-                error_msg = str(e)
+                    # Stop if we get enough content (but allow longer responses in deep mode)
+                    if len(accumulated_text) > 4000:
+                        break
                 
-                # Check if it's a rate limit error
-                if "429" in error_msg or "rate limit" in error_msg.lower() or "too many requests" in error_msg.lower():
-                    yield {'type': 'progress', 'message': f"⏳ {model} is busy, trying next G4F model...", 'progress': 75}
+                if accumulated_text.strip():
+                    clean_answer = self.clean_ai_response(accumulated_text)
+            
+            except Exception as streaming_error:
+                print(f"DEBUG: G4F streaming failed, trying non-streaming: {streaming_error}")
+                answer, model_config = self.llm_gateway.complete_text(prompt)
+                model_name = model_config['name']
+                if answer and len(answer) > 20:
+                    clean_answer = self.clean_ai_response(answer)
+                    if clean_answer:
+                        # Send the finished answer at once; the browser paces the typing effect
+                        yield {
+                            'type': 'streaming',
+                            'text': clean_answer,
+                            'progress': 95,
+                            'message': f"🔍 {model_name} analyzing..."
+                        }
+            
+            # Send final response
+            if clean_answer and len(clean_answer) > 10:
+                # Add to chat history
+                session_data['chat_history'].append({
+                    'question': question,
+                    'answer': clean_answer,
+                    'provider': model_name,
+                    'analysis_mode': 'deep',
+                    'timestamp': time.time()
+                })
+                self.sessions.save(session_id, session_data)
                 
-                continue
+                yield {
+                    'type': 'complete',
+                    'answer': clean_answer,
+                    'provider': model_name,
+                    'question': question
+                }
+                return
+            
+        except Exception as e:
+            print(f"DEBUG: G4F models failed for deep analysis: {e}")
         
         # If all G4F models failed
         yield {'type': 'error', 'message': 'Deep analysis is currently unavailable. Please try Fast Analysis mode or wait and try again later.'}
@@ -2193,8 +2074,7 @@ Provide a comprehensive, well-structured answer based on the webpage content. In
         session_data = self.sessions[session_id]
         
         # Limit question length
-        if len(question) > 500:
-            question = question[:500] + "..."
+        question = self.fit_question(question)
         
         # Detect if question is in Arabic
         is_arabic_question = self.is_arabic_text(question)
@@ -2223,120 +2103,102 @@ USER QUESTION:
 RESPONSE TASK:
 Provide a comprehensive, well-structured answer. Include detailed explanations, relevant context, and thorough analysis of the topic:"""
 
-            # Try G4F models
-            for config_index, model_config in enumerate(self.model_configs):
-                if self.cancel_flags.get(session_id, False):
-                    yield {'type': 'error', 'message': 'Task cancelled by user'}
-                    return
+            if self.cancel_flags.get(session_id, False):
+                yield {'type': 'error', 'message': 'Task cancelled by user'}
+                return
+            
+            yield {'type': 'progress', 'message': "🔍 AI thinking...", 'progress': 70}
+            
+            # The gateway orders the models, falls back on errors and hedges slow ones
+            try:
+                deltas, model_config = self.llm_gateway.stream_text(prompt)
+                model_name = model_config['name']
+                print(f"DEBUG: G4F model {model_name} streaming general chat words...")
                 
-                model = model_config["model"]
-                provider = model_config["provider"]
-                model_name = model_config["name"]
+                accumulated_text = ""
+                last_sent_length = 0
                 
-                try:
-                    print(f"DEBUG: Trying G4F model {model_name} for general chat word streaming...")
-                    
-                    yield {'type': 'progress', 'message': f"🔍 {model_name} thinking...", 'progress': 70}
-                    
-                    create_params = {
-                        'model': model,
-                        'messages': [{"role": "user", "content": prompt}],
-                        'stream': True
-                    }
-                    if provider:
-                        create_params['provider'] = provider
+                for delta_content in deltas:
+                    if self.cancel_flags.get(session_id, False):
+                        yield {'type': 'error', 'message': 'Task cancelled by user'}
+                        return
                     
-                    response = self.g4f_client.chat.completions.create(**create_params)
+                    accumulated_text += delta_content
                     
-                    accumulated_text = ""
-                    last_sent_length = 0
-                    
-                    for chunk in response:
-                        if self.cancel_flags.get(session_id, False):
-                            yield {'type': 'error', 'message': 'Task cancelled by user'}
-                            return
+                    # Send progressive text updates while preserving original formatting
+                    words = accumulated_text.split()
+                    if len(words) > 1:  # At least 2 words (keep last as it might be incomplete)
+                        # Reconstruct text from complete words while preserving newlines
+                        complete_text = accumulated_text.rsplit(' ', 1)[0]  # Remove last incomplete word
                         
-                        if hasattr(chunk, 'choices') and chunk.choices:
-                            delta_content = getattr(chunk.choices[0].delta, 'content', None)
-                            if delta_content:
-                                accumulated_text += delta_content
-                                
-                                # Send progressive text updates while preserving original formatting
-                                words = accumulated_text.split()
-                                if len(words) > 1:  # At least 2 words (keep last as it might be incomplete)
-                                    # Reconstruct text from complete words while preserving newlines
-                                    complete_text = accumulated_text.rsplit(' ', 1)[0]  # Remove last incomplete word
-                                    
-                                    # Only send update if we have new content
-                                    if len(complete_text) > last_sent_length:
-                                        # Detect content type for proper display
-                                        content_type = self._detect_content_type(complete_text)
-                                        
-                                        if content_type == 'thinking':
-                                            # Stream thinking content to collapsible section
-                                            yield {
-                                                'type': 'thinking_content',
-                                                'text': complete_text,
-                                                'progress': min(80 + len(words) // 4, 90),
-                                                'message': f"🤔 {model_name} thinking..."
-                                            }
-                                        elif content_type == 'answer':
-                                            # Extract and stream final answer prominently
-                                            clean_text = self._extract_simple_response(complete_text)
-                                            if clean_text:
-                                                yield {
-                                                    'type': 'final_answer',
-                                                    'text': clean_text,
-                                                    'progress': min(85 + len(words) // 2, 95),
-                                                    'message': f"✨ {model_name} responding..."
-                                                }
-                                        else:
-                                            # Regular content - stream normally
-                                            yield {
-                                                'type': 'streaming',
-                                                'text': complete_text,
-                                                'progress': min(80 + len(words) // 2, 95),
-                                                'message': f"🔍 {model_name} responding..."
-                                            }
-                                        
-                                        last_sent_length = len(complete_text)
-                                        time.sleep(0.12)
-                                
-                                if len(accumulated_text) > 3000:  # Limit by character count
-                                    break
+                        # Only send update if we have new content
+                        if len(complete_text) > last_sent_length:
+                            # Detect content type for proper display
+                            content_type = self._detect_content_type(complete_text)
+                            
+                            if content_type == 'thinking':
+                                # Stream thinking content to collapsible section
+                                yield {
+                                    'type': 'thinking_content',
+                                    'text': complete_text,
+                                    'progress': min(80 + len(words) // 4, 90),
+                                    'message': f"🤔 {model_name} thinking..."
+                                }
+                            elif content_type == 'answer':
+                                # Extract and stream final answer prominently
+                                clean_text = self._extract_simple_response(complete_text)
+                                if clean_text:
+                                    yield {
+                                        'type': 'final_answer',
+                                        'text': clean_text,
+                                        'progress': min(85 + len(words) // 2, 95),
+                                        'message': f"✨ {model_name} responding..."
+                                    }
+                            else:
+                                # Regular content - stream normally
+                                yield {
+                                    'type': 'streaming',
+                                    'text': complete_text,
+                                    'progress': min(80 + len(words) // 2, 95),
+                                    'message': f"🔍 {model_name} responding..."
+                                }
+                            
+                            last_sent_length = len(complete_text)
                     
-                    # Send final accumulated text
-                    if accumulated_text.strip() and len(accumulated_text) > last_sent_length:
+                    if len(accumulated_text) > 3000:  # Limit by character count
+                        break
+                
+                # Send final accumulated text
+                if accumulated_text.strip() and len(accumulated_text) > last_sent_length:
+                    yield {
+                        'type': 'streaming',
+                        'text': accumulated_text.strip(),
+                        'progress': 95,
+                        'message': f"🔍 {model_name} finishing..."
+                    }
+                
+                if len(accumulated_text.strip()) > 10:  # Got a reasonable response
+                    clean_answer = self.clean_ai_response(accumulated_text)
+                    if clean_answer and len(clean_answer) > 10:
+                        session_data['chat_history'].append({
+                            'question': question,
+                            'answer': clean_answer,
+                            'provider': f'G4F ({model_name})',
+                            'mode': 'general_chat_deep',
+                            'timestamp': time.time()
+                        })
+                        self.sessions.save(session_id, session_data)
+                        
                         yield {
-                            'type': 'streaming',
-                            'text': accumulated_text.strip(),
-                            'progress': 95,
-                            'message': f"🔍 {model_name} finishing..."
+                            'type': 'complete',
+                            'answer': clean_answer,
+                            'provider': f'G4F ({model_name}) - General Chat',
+                            'question': question
                         }
-                    
-                    if len(accumulated_text.strip()) > 10:  # Got a reasonable response
-                        clean_answer = self.clean_ai_response(accumulated_text)
-                        if clean_answer and len(clean_answer) > 10:
-                            session_data['chat_history'].append({
-                                'question': question,
-                                'answer': clean_answer,
-                                'provider': f'G4F ({model_name})',
-                                'mode': 'general_chat_deep',
-                                'timestamp': time.time()
-                            })
-                            
-                            yield {
-                                'type': 'complete',
-                                'answer': clean_answer,
-                                'provider': f'G4F ({model_name}) - General Chat',
-                                'question': question
-                            }
-                            return
-                
-                except Exception as e:
-                    print(f"DEBUG: G4F model {model_name} failed for general chat: {e}")
-                    yield {'type': 'progress', 'message': f"⏳ {model_name} is busy, trying next...", 'progress': 75}
-                    continue
+                        return
+            
+            except Exception as e:
+                print(f"DEBUG: G4F models failed for general chat: {e}")
             
             # All G4F models failed, fallback to Webscout
             yield {'type': 'progress', 'message': f"🔄 Switching to fast mode...", 'progress': 80}
@@ -2379,19 +2241,17 @@ Please provide a direct, helpful answer:"""
                         
                         words = accumulated_text.split()
                         
-                        while len(words) > 1:
-                            word = words.pop(0)
-                            words_sent.append(word)
-                            current_text = " ".join(words_sent)
+                        if len(words) > 1:
+                            # Send all complete words of this chunk in one update
+                            words_sent.extend(words[:-1])
+                            words = words[-1:]
                             
                             yield {
                                 'type': 'streaming',
-                                'text': current_text,
+                                'text': " ".join(words_sent),
                                 'progress': min(80 + len(words_sent), 95),
                                 'message': f"🗣️ {name} responding..."
                             }
-                            
-                            time.sleep(0.1)
                         
                         accumulated_text = " ".join(words) if words else ""
                         
@@ -2419,6 +2279,7 @@ Please provide a direct, helpful answer:"""
                                 'mode': 'general_chat',
                                 'timestamp': time.time()
                             })
+                            self.sessions.save(session_id, session_data)
                             
                             yield {
                                 'type': 'complete',
@@ -2432,20 +2293,13 @@ Please provide a direct, helpful answer:"""
                 elif isinstance(response, str) and len(response) > 10:
                     clean_answer = self.clean_ai_response(response)
                     if clean_answer and len(clean_answer) > 10:
-                        # Simulate word-by-word for non-streaming responses
-                        words = clean_answer.split()
-                        current_text = ""
-                        for i, word in enumerate(words):
-                            current_text += (word + " " if i < len(words) - 1 else word)
-                            
-                            if i % 2 == 0 or i == len(words) - 1:
-                                yield {
-                                    'type': 'streaming',
-                                    'text': current_text,
-                                    'progress': min(80 + (i * 2), 95),
-                                    'message': f"🗣️ {name} responding..."
-                                }
-                                time.sleep(0.15)
+                        # Send the finished answer at once; the browser paces the typing effect
+                        yield {
+                            'type': 'streaming',
+                            'text': clean_answer,
+                            'progress': 95,
+                            'message': f"🗣️ {name} responding..."
+                        }
                         
                         session_data['chat_history'].append({
                             'question': question,
@@ -2454,6 +2308,7 @@ Please provide a direct, helpful answer:"""
                             'mode': 'general_chat',
                             'timestamp': time.time()
                         })
+                        self.sessions.save(session_id, session_data)
                         
                         yield {
                             'type': 'complete',
@@ -2492,4 +2347,4 @@ Please provide a direct, helpful answer:"""
         session_data = self.sessions[session_id]
         summary_question = "Please provide a comprehensive summary of this webpage content, highlighting the main points and key information."
         
-        return self.ask_question_streaming(session_id, summary_question)
\ No newline at end of file
+        return self.ask_question_streaming(session_id, summary_question, retrieve=False)
\ No newline at end of file
@@ -0,0 +1,457 @@
+"""
+Clip plan repair for shorts.
+Turns the clip candidates proposed by the AI into a plan that satisfies the shorts rules
+(no clips in the intro, minimum gaps, real speech throughout and at the start, clip count)
+by moving, resizing and dropping candidates against a per-second speech index of the
+transcript. Only when no candidate can be repaired is the model asked again, with feedback
+naming the problems and the speech-dense windows it can choose from.
+Timestamped transcripts are sent to the model as compact lines prefixed with their start
+second, so it can pick exact times instead of guessing them.
+"""
+
+import re
+import json
+import math
+import queue
+
+from .config import CLIP_PLAN_CONFIG
+from .token_budget import count_tokens
+
+# Caption tags and phrases that are not speech ([Music], (applause), "background music", ...)
+NON_SPEECH_RE = re.compile(r'\[[^\]]*\]|\([^)]*\)|\b(?:music playing|background music|intro music|outro music)\b', re.I)
+TIME_RE = re.compile(r'^(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)$')
+CLIPS_KEY_RE = re.compile(r'"clips"\s*:\s*$')
+
+
+class ClipPlanError(ValueError):
+    """The AI answer cannot be turned into a valid plan; feedback says what to change"""
+
+    def __init__(self, message, feedback):
+        super().__init__(message)
+        self.feedback = feedback
+
+
+def speech_word_count(text):
+    """Number of spoken words in a caption (non-speech tags removed)"""
+    return len(NON_SPEECH_RE.sub(' ', text or '').split())
+
+
+def parse_seconds(value):
+    """Seconds from a number or an 'm:ss' / 'h:mm:ss' string (None if unparseable)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value or '').strip().rstrip('s')
+    match = TIME_RE.match(value)
+    if match:
+        hours, minutes, seconds = match.groups()
+        return int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _clean_words(text, fillers):
+    """Speech words of a caption without non-speech tags, filler words and stuttered repeats"""
+    words = []
+    for word in NON_SPEECH_RE.sub(' ', text or '').split():
+        bare = word.strip('.,!?;:\u060C\u061F').lower()
+        if bare in fillers or (words and bare and bare == words[-1].strip('.,!?;:\u060C\u061F').lower()):
+            continue
+        words.append(word)
+    return words
+
+
+def _drop_overlap(previous, words, max_words=12):
+    """Words of a caption without the text repeated from the end of the previous one (rolling captions)"""
+    for size in range(min(len(previous), len(words), max_words), 0, -1):
+        if previous[-size:] == words[:size]:
+            return words[size:]
+    return words
+
+
+def _format_lines(lines):
+    return '\n'.join(f"{start}| {' '.join(words)}" for start, words in lines)
+
+
+def encode_timestamped_transcript(segments, max_tokens=None, settings=None):
+    """Compact prompt transcript: one line per 5-10s of captions, prefixed with its start second.
+
+    Non-speech tags, filler words and repeated caption text are removed and lines without
+    speech are left out. If the result is over max_tokens every line is shortened by the
+    same share, so the whole timeline stays visible to the model. Returns (text, tokens).
+    """
+    settings = {**CLIP_PLAN_CONFIG, **(settings or {})}
+    max_tokens = max_tokens or settings['transcript_tokens']
+    fillers = set(settings['filler_words'])
+
+    lines = []  # [start second, words]
+    previous = []
+    line_start = line_end = None
+    for segment in segments:
+        start = segment['start']
+        end = segment.get('end', start + segment.get('duration', 0))
+        words = _drop_overlap(previous, _clean_words(segment.get('text', ''), fillers))
+        previous = (previous + words)[-12:]
+        if not words:
+            continue
+        if (line_start is None or line_end - line_start >= settings['line_min_seconds']
+                or end - line_start > settings['line_max_seconds']):
+            lines.append([int(start), []])
+            line_start = start
+        lines[-1][1].extend(words)
+        line_end = end
+
+    text = _format_lines(lines)
+    tokens = count_tokens(text)
+    for _ in range(3):
+        if tokens <= max_tokens:
+            break
+        # Keep the same share of every line (with a little headroom for the estimate)
+        share = max_tokens / tokens * 0.95
+        lines = [[start, words[:max(1, int(len(words) * share))]] for start, words in lines]
+        text = _format_lines(lines)
+        tokens = count_tokens(text)
+    return text, tokens
+
+
+class SpeechIndex:
+    """Speech words per second of a video, with O(1) window counts"""
+
+    def __init__(self, transcript, duration_seconds=None):
+        if isinstance(transcript, list) and transcript and isinstance(transcript[0], dict):
+            segments = [(seg['start'], seg.get('end', seg['start'] + seg.get('duration', 0)), seg.get('text', ''))
+                        for seg in transcript]
+        else:
+            # Plain text: spread sentences evenly over the estimated duration
+            sentences = [s for s in re.split(r'(?<=[.!?\u061F\u06D4])\s+', transcript or '') if s.strip()]
+            total_words = max(sum(len(s.split()) for s in sentences), 1)
+            duration = duration_seconds or max(total_words / 2.5, 60)
+            segments = []
+            position = 0.0
+            for sentence in sentences:
+                length = duration * len(sentence.split()) / total_words
+                segments.append((position, position + length, sentence))
+                position += length
+
+        self.duration = max([duration_seconds or 0] + [end for _, end, _ in segments])
+        self.words = [0.0] * (int(math.ceil(self.duration)) + 1)
+        self.speech_starts = []  # Start times of segments with speech (natural cut points)
+        for start, end, text in segments:
+            count = speech_word_count(text)
+            if not count:
+                continue
+            self.speech_starts.append(start)
+            if end - start <= 0:
+                self.words[min(int(start), len(self.words) - 1)] += count
+                continue
+            for second in range(int(start), min(int(math.ceil(end)), len(self.words))):
+                overlap = min(end, second + 1) - max(start, second)
+                if overlap > 0:
+                    self.words[second] += count * overlap / (end - start)
+        self.speech_starts.sort()
+
+        self._prefix = [0.0]
+        for count in self.words:
+            self._prefix.append(self._prefix[-1] + count)
+        self.words_per_second = self._prefix[-1] / self.duration if self.duration else 0.0
+
+    def _cumulative(self, position):
+        position = min(max(position, 0.0), len(self.words))
+        second = int(position)
+        partial = self.words[second] * (position - second) if second < len(self.words) else 0.0
+        return self._prefix[second] + partial
+
+    def count(self, start, end):
+        """Speech words between two times"""
+        return self._cumulative(end) - self._cumulative(start)
+
+
+class ClipPlanOptimizer:
+    """Deterministic repair of AI clip candidates against a speech index"""
+
+    def __init__(self, index, max_clips, language='en', settings=None):
+        self.index = index
+        self.max_clips = max_clips
+        self.language = language
+        self.settings = {**CLIP_PLAN_CONFIG, **(settings or {})}
+        self.start()
+
+    def _intro(self, length):
+        # Short videos cannot fit a clip after a full intro: keep what room there is
+        return min(self.settings['intro_seconds'], max(0.0, self.index.duration - length))
+
+    def _speech_problem(self, start, end):
+        """Why a window is not usable as a clip (None if it is)"""
+        settings = self.settings
+        words = self.index.count(start, end)
+        if words < settings['min_speech_words']:
+            return f'only {words:.0f} spoken words'
+        expected = (end - start) * self.index.words_per_second
+        if expected and words / expected < settings['min_speech_density']:
+            return f'mostly silent ({words / expected:.0%} of the usual speech)'
+        start_words = self.index.count(start, min(start + settings['start_window_seconds'], end))
+        if start_words < settings['min_start_words']:
+            return 'starts without speech'
+        return None
+
+    def _gap_ok(self, start, end, placed):
+        gap = self.settings['min_gap_seconds']
+        return all(start >= other['end_time'] + gap or end + gap <= other['start_time'] for other in placed)
+
+    def _problems(self, start, end, placed):
+        """Rule violations of a clip at its proposed position"""
+        problems = []
+        length = end - start
+        if length < self.settings['min_clip_seconds'] or length > self.settings['max_clip_seconds']:
+            problems.append(f'{length:.0f}s long')
+        if start < self._intro(length):
+            problems.append('starts in the intro')
+        if end > self.index.duration:
+            problems.append('ends after the video')
+        if not self._gap_ok(start, end, placed):
+            problems.append(f"less than {self.settings['min_gap_seconds']}s from another clip")
+        speech = self._speech_problem(start, end)
+        if speech:
+            problems.append(speech)
+        return problems
+
+    def _place(self, start, length, placed):
+        """Best valid start near the proposed one (None if there is none within max_shift_seconds)"""
+        settings = self.settings
+        low = max(self._intro(length), start - settings['max_shift_seconds'])
+        high = min(self.index.duration - length, start + settings['max_shift_seconds'])
+        if high < low:
+            return None
+        # Prefer cutting where a caption starts; fall back to whole seconds without timestamps
+        options = [s for s in self.index.speech_starts if low <= s <= high]
+        options += [float(s) for s in range(int(math.ceil(low)), int(high) + 1)] if len(options) < 3 else []
+        options.append(min(max(start, low), high))
+
+        best = None
+        best_score = None
+        average = self.index.words_per_second or 1.0
+        for option in options:
+            end = option + length
+            if not self._gap_ok(option, end, placed) or self._speech_problem(option, end):
+                continue
+            density = self.index.count(option, end) / length / average
+            score = density - settings['shift_penalty'] * abs(option - start) / settings['max_shift_seconds']
+            if best_score is None or score > best_score:
+                best, best_score = option, score
+        return best
+
+    def start(self):
+        """Forget the clips accepted so far (before a new AI answer)"""
+        self.placed = []
+        self.notes = []
+        self.rejected = []
+
+    def add(self, clip, position):
+        """Repair one candidate against the clips accepted so far.
+
+        Returns the accepted clip (numbered in acceptance order) or None if it was dropped.
+        """
+        settings = self.settings
+        if len(self.placed) >= self.max_clips:
+            self.notes.append(f'clip {position} dropped (limit of {self.max_clips} clips)')
+            return None
+        if not isinstance(clip, dict):
+            self.rejected.append(f'clip {position}: not an object')
+            return None
+        start = parse_seconds(clip.get('start_time'))
+        end = parse_seconds(clip.get('end_time'))
+        if start is None:
+            self.rejected.append(f'clip {position}: missing start_time')
+            return None
+        if end is None or end <= start:
+            end = start + settings['min_clip_seconds']
+        length = min(max(end - start, settings['min_clip_seconds']), settings['max_clip_seconds'])
+
+        problems = self._problems(start, end, self.placed)
+        if not problems:
+            new_start, new_end = start, end
+        else:
+            new_start = self._place(start, length, self.placed)
+            if new_start is None:
+                self.rejected.append(f"clip {position} at {start:.0f}-{end:.0f}s: {', '.join(problems)}")
+                return None
+            new_end = new_start + length
+            self.notes.append(f"clip {position} moved {start:.0f}-{end:.0f}s -> {new_start:.0f}-{new_end:.0f}s "
+                              f"({', '.join(problems)})")
+        accepted = {**clip, 'clip_number': len(self.placed) + 1, 'start_time': round(new_start, 1),
+                    'end_time': round(new_end, 1), 'duration': round(new_end - new_start, 1)}
+        self.placed.append(accepted)
+        return accepted
+
+    def finish(self, renumber=True):
+        """(clips, notes) of the accepted clips, sorted by start and renumbered unless renumber=False.
+
+        Raises ClipPlanError with targeted feedback if no candidate could be used.
+        """
+        if not self.placed:
+            raise ClipPlanError(
+                'No clip candidate could be repaired' + (': ' + '; '.join(self.rejected) if self.rejected else ''),
+                self.feedback(self.rejected or ['no clips were returned']))
+
+        notes = self.notes + [f'{reason} (dropped)' for reason in self.rejected]
+        if not renumber:
+            return list(self.placed), notes
+        placed = sorted(self.placed, key=lambda clip: clip['start_time'])
+        for number, clip in enumerate(placed, 1):
+            clip['clip_number'] = number
+        return placed, notes
+
+    def repair(self, candidates):
+        """Valid clip plan from the AI candidates.
+
+        Returns (clips, notes). Raises ClipPlanError with targeted feedback if no
+        candidate can be used.
+        """
+        self.start()
+        for position, clip in enumerate(candidates, 1):
+            self.add(clip, position)
+        return self.finish()
+
+    def dense_windows(self, length=None):
+        """Non-overlapping speech-dense windows after the intro, densest first"""
+        settings = self.settings
+        length = length or settings['min_clip_seconds'] + 5
+        intro = self._intro(length)
+        options = [s for s in self.index.speech_starts if intro <= s <= self.index.duration - length]
+        if not options:
+            options = [float(s) for s in range(int(math.ceil(intro)), int(self.index.duration - length) + 1, 5)]
+        ranked = sorted(options, key=lambda s: self.index.count(s, s + length), reverse=True)
+        windows = []
+        for start in ranked:
+            if len(windows) >= settings['feedback_windows']:
+                break
+            candidate = {'start_time': start, 'end_time': start + length}
+            if not self._speech_problem(start, start + length) and self._gap_ok(start, start + length, windows):
+                windows.append(candidate)
+        return sorted(windows, key=lambda window: window['start_time'])
+
+    def feedback(self, problems):
+        """Instructions for a new AI attempt naming what was wrong and where the speech is"""
+        settings = self.settings
+        intro = self._intro(settings['min_clip_seconds'])
+        windows = ', '.join(f"{w['start_time']:.0f}-{w['end_time']:.0f}s" for w in self.dense_windows())
+        if self.language == 'ar':
+            return (f"⚠️ لم يكن من الممكن استخدام إجابتك السابقة: {'؛ '.join(problems)}.\n"
+                    f"اختر مقاطع تبدأ بعد {intro:.0f} ثانية، مدتها {settings['min_clip_seconds']}-{settings['max_clip_seconds']} ثانية، "
+                    f"بينها {settings['min_gap_seconds']} ثانية على الأقل، وتحتوي على كلام متواصل."
+                    + (f"\nأكثر الفترات كلاماً: {windows}." if windows else '')
+                    + "\nأعد JSON صالحاً فقط بنفس الصيغة.")
+        return (f"⚠️ Your previous answer could not be used: {'; '.join(problems)}.\n"
+                f"Choose clips that start after {intro:.0f}s, last {settings['min_clip_seconds']}-{settings['max_clip_seconds']}s, "
+                f"are at least {settings['min_gap_seconds']}s apart and contain continuous speech."
+                + (f"\nThe windows with the most speech are: {windows}." if windows else '')
+                + "\nReturn valid JSON only, in the same format.")
+
+
+def parse_clip_candidates(analysis_result, optimizer):
+    """Clip candidates from the AI answer (raises ClipPlanError if there is no usable JSON)"""
+    json_start = analysis_result.find('{')
+    json_end = analysis_result.rfind('}') + 1
+    if json_start == -1 or json_end <= json_start:
+        raise ClipPlanError('No JSON found in response', optimizer.feedback(['it contained no JSON']))
+    try:
+        clips_data = json.loads(analysis_result[json_start:json_end])
+    except json.JSONDecodeError as e:
+        raise ClipPlanError(f'Invalid JSON in response: {e}', optimizer.feedback([f'the JSON was invalid ({e})']))
+    clips = clips_data.get('clips') if isinstance(clips_data, dict) else None
+    if not isinstance(clips, list) or not clips:
+        raise ClipPlanError('No clips in response', optimizer.feedback(['it contained no clips']))
+    return clips_data, clips
+
+
+class ClipStreamParser:
+    """Incremental JSON scanner that returns each object of the "clips" array as soon as it closes"""
+
+    def __init__(self):
+        self.buffer = ''
+        self.position = 0
+        self.started = False  # Text before the first '{' (prose, code fences) is skipped
+        self.in_string = False
+        self.escape = False
+        self.depth = 0
+        self.array_depth = None  # Nesting depth of the clips array while inside it
+        self.object_start = None
+        self.done = False
+
+    def feed(self, text):
+        """Add streamed text; returns the clip objects completed by it"""
+        self.buffer += text
+        clips = []
+        while self.position < len(self.buffer) and not self.done:
+            char = self.buffer[self.position]
+            if not self.started:
+                self.started = char == '{'
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.started:
+                self.in_string = True
+            elif char in '{[' and self.started:
+                self.depth += 1
+                if (char == '[' and self.array_depth is None
+                        and CLIPS_KEY_RE.search(self.buffer[max(self.position - 40, 0):self.position])):
+                    self.array_depth = self.depth
+                elif char == '{' and self.array_depth is not None and self.depth == self.array_depth + 1:
+                    self.object_start = self.position
+            elif char in '}]' and self.started:
+                if self.array_depth is not None:
+                    if char == '}' and self.object_start is not None and self.depth == self.array_depth + 1:
+                        try:
+                            clips.append(json.loads(self.buffer[self.object_start:self.position + 1]))
+                        except json.JSONDecodeError:
+                            pass
+                        self.object_start = None
+                    elif char == ']' and self.depth == self.array_depth:
+                        self.done = True
+                self.depth -= 1
+            self.position += 1
+        return clips
+
+
+class ClipStream:
+    """Accepted clips handed from a streaming clip analysis to the render stage.
+
+    Iterating blocks until the next clip arrives and ends when the analysis closes the
+    stream (re-raising its error, if any). len() is the expected clip count until then.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.expected = 0
+        self.count = 0
+        self.closed = False
+        self.error = None
+
+    def expect(self, count):
+        self.expected = count
+
+    def put(self, clip):
+        self.count += 1
+        self._queue.put(clip)
+
+    def close(self, error=None):
+        self.error = error
+        self.closed = True
+        self._queue.put(None)
+
+    def __len__(self):
+        return self.count if self.closed else max(self.expected, self.count)
+
+    def __iter__(self):
+        while True:
+            clip = self._queue.get()
+            if clip is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield clip
@@ -0,0 +1,138 @@
+"""
+Local pre-ranking of clip windows for long videos.
+Scores sliding windows of the timestamped transcript on speech density, hook words,
+question/answer structure and lexical novelty (vectorized with NumPy over per-second
+arrays), so that only an outline of the video and its most promising windows are
+sent to the AI instead of the whole transcript.
+"""
+
+import re
+import numpy as np
+
+from .config import CLIP_PLAN_CONFIG
+from .caption_generator import HOOK_WORDS
+from .clip_plan import NON_SPEECH_RE, encode_timestamped_transcript
+from .token_budget import count_tokens
+
+WORD_RE = re.compile(r'\w+')
+QUESTION_RE = re.compile(r'[?\u061F]')
+
+
+def _zscore(values):
+    spread = values.std()
+    return (values - values.mean()) / spread if spread > 0 else np.zeros_like(values)
+
+
+def _format_time(seconds):
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+
+class ClipWindowRanker:
+    """Scores sliding transcript windows and picks the best non-overlapping ones"""
+
+    def __init__(self, segments, settings=None):
+        self.settings = {**CLIP_PLAN_CONFIG, **(settings or {})}
+        self.segments = segments
+        starts = np.array([seg['start'] for seg in segments], dtype=float)
+        ends = np.array([seg.get('end', seg['start'] + seg.get('duration', 0)) for seg in segments], dtype=float)
+        self.duration = float(ends.max()) if len(ends) else 0.0
+
+        tokens = [WORD_RE.findall(NON_SPEECH_RE.sub(' ', seg.get('text', '')).lower()) for seg in segments]
+        features = {
+            'words': np.array([len(words) for words in tokens], dtype=float),
+            'hooks': np.array([sum(1 for word in words if word in HOOK_WORDS or word.isdigit()) for words in tokens],
+                              dtype=float),
+            'questions': np.array([len(QUESTION_RE.findall(seg.get('text', ''))) for seg in segments], dtype=float),
+        }
+        # Lexical novelty: how rare the window's content words (4+ letters) are in the whole video
+        content = [[word for word in words if len(word) >= 4] for words in tokens]
+        flat = [word for words in content for word in words]
+        novel = np.zeros(len(segments))
+        if flat:
+            owner = np.repeat(np.arange(len(segments)), [len(words) for words in content])
+            _, inverse, counts = np.unique(np.array(flat), return_inverse=True, return_counts=True)
+            rarity = np.log(len(flat) / counts[inverse])
+            novel = np.bincount(owner, weights=rarity, minlength=len(segments))
+        features['novel'] = novel
+
+        # Segment features are counted in the second of the segment's midpoint
+        seconds = int(np.ceil(self.duration)) + 1
+        bins = np.clip(((starts + ends) / 2).astype(int), 0, seconds - 1)
+        self._cumulative = {
+            name: np.concatenate(([0.0], np.cumsum(np.bincount(bins, weights=values, minlength=seconds))))
+            for name, values in features.items()
+        }
+
+    def _sum(self, name, start, end):
+        """Feature totals of windows [start, end) given as arrays of whole seconds"""
+        cumulative = self._cumulative[name]
+        last = len(cumulative) - 1
+        return cumulative[np.clip(end, 0, last)] - cumulative[np.clip(start, 0, last)]
+
+    def score_windows(self, length=None):
+        """(window starts, scores) of all sliding windows; windows with too little speech score -inf"""
+        settings = self.settings
+        length = int(length or settings['prerank_window_seconds'])
+        last_start = max(int(self.duration) - length, 0)
+        first_start = min(settings['intro_seconds'], last_start)
+        starts = np.arange(first_start, last_start + 1, settings['prerank_step_seconds'])
+        ends = starts + length
+        middles = starts + length // 2
+
+        words = self._sum('words', starts, ends)
+        spoken = np.maximum(words, 1.0)
+        density = words / length
+        hooks = self._sum('hooks', starts, ends) / spoken
+        novelty = self._sum('novel', starts, ends) / spoken
+        # A question in the first half answered with speech in the second half
+        answered = np.minimum(self._sum('questions', starts, middles), 1.0) * self._sum('words', middles, ends) / spoken
+
+        weights = settings['prerank_weights']
+        scores = (weights['density'] * _zscore(density) + weights['hooks'] * _zscore(hooks)
+                  + weights['qa'] * _zscore(answered) + weights['novelty'] * _zscore(novelty))
+        scores[words < settings['min_speech_words']] = -np.inf
+        return starts, scores
+
+    def top_windows(self, count=None, length=None):
+        """Best non-overlapping windows as [(start, end, score)], in video order"""
+        length = int(length or self.settings['prerank_window_seconds'])
+        count = count or self.settings['prerank_top_k']
+        starts, scores = self.score_windows(length)
+        chosen = []
+        for index in np.argsort(-scores, kind='stable'):
+            if len(chosen) >= count or not np.isfinite(scores[index]):
+                break
+            start = int(starts[index])
+            if all(abs(start - other) >= length for other, _, _ in chosen):
+                chosen.append((start, start + length, float(scores[index])))
+        return sorted(chosen)
+
+    def outline(self):
+        """One short line per section of the video, so the AI knows the overall flow"""
+        settings = self.settings
+        sections = max(1, min(settings['outline_sections'], int(self.duration // 60) or 1))
+        size = self.duration / sections
+        lines = []
+        for number in range(sections):
+            start, end = number * size, (number + 1) * size
+            text = ' '.join(seg.get('text', '') for seg in self.segments if start <= seg['start'] < end)
+            words = NON_SPEECH_RE.sub(' ', text).split()[:settings['outline_words']]
+            if words:
+                lines.append(f"{_format_time(start)}-{_format_time(end)}: {' '.join(words)} ...")
+        return '\n'.join(lines)
+
+    def prompt_transcript(self, count=None):
+        """Outline plus the timestamped text of the top windows (padded for context).
+
+        Returns (text, tokens, windows).
+        """
+        padding = self.settings['prerank_padding_seconds']
+        windows = self.top_windows(count)
+        parts = [f"VIDEO OUTLINE:\n{self.outline()}", "MOST PROMISING WINDOWS (choose clips inside these):"]
+        for number, (start, end, _) in enumerate(windows, 1):
+            low, high = max(start - padding, 0), end + padding
+            lines, _ = encode_timestamped_transcript(
+                [seg for seg in self.segments if low <= seg['start'] < high])
+            parts.append(f"Window {number} ({start}-{end}s):\n{lines}")
+        text = '\n\n'.join(parts)
+        return text, count_tokens(text), windows
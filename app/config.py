@@ -3,6 +3,8 @@ Configuration module for YouTube Transcript & Summary application.
 Contains all constants, model configurations, and shared settings.
 """
 
+import os
+import tempfile
 import g4f
 from g4f.client import Client
 
@@ -21,40 +23,47 @@ MODEL_CONFIGS = [
     {
         "model": "deepseek-ai/DeepSeek-V3-0324-Turbo",
         "provider": g4f.Provider.DeepInfra,
-        "name": "deepseek"
+        "name": "deepseek",
+        "context_tokens": 128000
     },
 
     {
         "model": "gpt-4o-mini",
         "provider": g4f.Provider.DeepInfra,  
-        "name": "GPT-4o Mini"
+        "name": "GPT-4o Mini",
+        "context_tokens": 128000
     },
     {
         "model": "Mistral-Small-3.2-24B-Instruct-2506",
         "provider": g4f.Provider.DeepInfra,  # Auto-select provider
-        "name": "Mistral-Small-3.2-24B-Instruct-2506"
+        "name": "Mistral-Small-3.2-24B-Instruct-2506",
+        "context_tokens": 128000
     },
     
     {
         "model": "openai/gpt-oss-120b",
         "provider": g4f.Provider.DeepInfra,
-        "name": "openai/gpt-oss-120b"
+        "name": "openai/gpt-oss-120b",
+        "context_tokens": 128000
     },
 
     {
         "model": "qwen3-235b-a22b",
         "provider": g4f.Provider.Qwen,
-        "name": "qwen3-235b-a22b"
+        "name": "qwen3-235b-a22b",
+        "context_tokens": 128000
     },
     {
         "model": "Qwen/Qwen3-32Bg",
         "provider": g4f.Provider.DeepInfra,
-        "name": "Qwen/Qwen3-32Bg"
+        "name": "Qwen/Qwen3-32Bg",
+        "context_tokens": 32000
     },
     {
         "model": "gpt-4",
         "provider": None,  # Auto-select provider
-        "name": "GPT-4 Auto"
+        "name": "GPT-4 Auto",
+        "context_tokens": 8192
     }
 ]
 
@@ -164,6 +173,227 @@ MAX_CONTENT_LENGTH = 20000  # Maximum content length for single AI call
 MAX_PDF_PAGES = 50  # Maximum PDF pages to analyze
 MAX_PDF_CHARS = 200000  # Maximum PDF characters to analyze
 
+# Shared LLM gateway: circuit breaker and cross-worker model health state
+LLM_GATEWAY_CONFIG = {
+    'failure_threshold': 3,  # Consecutive failures before a model is skipped
+    'cooldown_seconds': 60,  # How long a failing model is skipped before a half-open probe
+    'max_cooldown_seconds': 600,  # Cooldown doubles after each failed probe up to this limit
+    'probe_timeout_seconds': 60,  # A half-open probe claimed by one request blocks others this long
+    'state_file': os.environ.get('LLM_HEALTH_STATE_FILE', os.path.join(tempfile.gettempdir(), 'ai_studio_llm_health.json')),
+    'state_refresh_seconds': 1.0,  # Minimum interval between reads of the shared state file
+    'state_persist_seconds': 5.0,  # Minimum interval between writes of latency averages
+    # Latency-aware ranking (EWMAs of stream TTFT and tokens/sec, non-streaming latency and error rate)
+    'ewma_alpha': 0.3,
+    'prior_ttft': 5.0,  # Assumed for models without measurements
+    'prior_tokens_per_sec': 30.0,
+    'ranking_output_tokens': 400,  # Typical answer length used to weigh throughput against TTFT
+    'error_penalty_seconds': 30.0,  # Added per unit of error rate
+    'priority_bias_seconds': 0.5,  # Per position in MODEL_CONFIGS, keeps configured order as tie-breaker
+    # Hedged streams: start the next model if the current one has not produced a first token in time
+    'hedging_enabled': True,
+    'max_hedges': 1,  # Extra concurrent requests allowed per call (bounds cost)
+    'hedge_default_delay': 8.0,  # Seconds to wait before hedging when a model has too few streaming TTFT samples
+    'hedge_min_delay': 2.0,
+    'hedge_max_delay': 30.0,
+    'hedge_percentile': 0.9,  # Hedge after this percentile of the model's observed time to first token
+    'hedge_min_samples': 5,
+    'hedge_workers': 32,  # Thread pool for hedge attempts in the process (hedges are skipped while it is full)
+}
+
+# Asyncio streaming path: LLM token streams run as coroutines on one event loop thread per worker
+ASYNC_LLM_CONFIG = {
+    'enabled': True,  # Requires g4f's AsyncClient; otherwise streams use the threaded gateway
+    'max_concurrent_streams': 2000,  # Open streams per worker process
+    'first_token_timeout': 30.0,  # Seconds to wait for a model's first chunk before trying the next one
+    'progress_update_interval': 0.1,  # Minimum seconds between progress updates while text streams in
+}
+
+# Shared headless browser for Crawl4AI extraction (one Chromium per worker process)
+BROWSER_POOL_CONFIG = {
+    'max_contexts': 4,  # Pages loading at the same time, each in its own browser context
+    'recycle_after_pages': 20,  # A context is closed and replaced after this many pages (memory, cookies)
+    'crawl_timeout': 60,  # Seconds a request waits for a page, including the wait for a free context
+    'restart_after_failures': 3,  # Consecutive failed pages before the browser is relaunched
+    'idle_close_seconds': 300,  # The browser is closed after this long without crawls (0: keep it open)
+    # Rendering profile from CRAWL_PROFILES ('text' once scripts/benchmark_crawl_profiles.py confirms it)
+    'profile': os.environ.get('CRAWL_PROFILE', 'full'),
+    'user_agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+}
+
+# Ad and tracker hosts (and their subdomains) whose requests the 'text' crawl profile aborts
+AD_TRACKER_HOSTS = (
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com', 'adservice.google.com',
+    'google-analytics.com', 'googletagmanager.com', 'googletagservices.com', 'amazon-adsystem.com',
+    'adnxs.com', 'criteo.com', 'criteo.net', 'taboola.com', 'outbrain.com', 'rubiconproject.com',
+    'pubmatic.com', 'openx.net', 'casalemedia.com', 'moatads.com', 'scorecardresearch.com',
+    'quantserve.com', 'facebook.net', 'connect.facebook.net', 'hotjar.com', 'mixpanel.com',
+    'segment.io', 'segment.com', 'nr-data.net', 'chartbeat.com', 'adsafeprotected.com', 'yieldmo.com',
+)
+
+# Headless rendering profiles: 'text' loads only what text extraction needs, 'full' renders everything
+CRAWL_PROFILES = {
+    'full': {
+        'viewport_width': 1920,
+        'viewport_height': 1080,
+        'light_mode': False,
+        'blocked_resource_types': (),
+        'blocked_hosts': (),
+        'extra_args': [],
+    },
+    'text': {
+        'viewport_width': 1280,  # Smaller viewport: less layout and paint work per page
+        'viewport_height': 800,
+        'light_mode': True,  # Crawl4AI: switches off background browser features
+        'blocked_resource_types': ('image', 'media', 'font'),  # Aborted at request interception
+        'blocked_hosts': AD_TRACKER_HOSTS,
+        'extra_args': ['--disable-gpu', '--blink-settings=imagesEnabled=false', '--disable-remote-fonts',
+                       '--mute-audio', '--autoplay-policy=user-gesture-required', '--disable-extensions',
+                       '--disable-sync', '--disable-background-networking', '--disable-component-update',
+                       '--no-first-run'],
+    },
+}
+
+# Adaptive page readiness for Crawl4AI: wait for DOM and network quiet instead of a fixed delay
+PAGE_READINESS_CONFIG = {
+    'quiet_ms': 500,  # A page has settled after this long without DOM changes or network requests
+    'max_wait_ms': 7000,  # Hard cap, from navigation start (the old fixed waits added up to 7 s)
+    'min_cap_ms': 1500,  # Lowest cap learned for a domain
+    'headroom': 2.0,  # Learned cap = the domain's usual settle time x headroom (+ quiet_ms)
+    'profile_alpha': 0.3,  # Weight of the newest page in a domain's settle time average
+    'wait_margin_ms': 3000,  # Crawl4AI wait_for timeout beyond the cap (the page script enforces the cap)
+    # Measurement mode: log every page's settle time and always wait up to max_wait_ms
+    'measure': os.environ.get('PAGE_READINESS_MEASURE', '').lower() in ('1', 'true', 'yes'),
+    'measure_log': os.path.join(tempfile.gettempdir(), 'ai_studio_page_settle.jsonl'),
+}
+
+# Offline stand-ins for benchmarks: replayed LLM streams, a local transcript/webpage fixture
+# server and local media files instead of DeepInfra/Qwen/Webscout, youtubetotranscript.com and yt-dlp
+OFFLINE_CONFIG = {
+    'enabled': os.environ.get('AI_STUDIO_OFFLINE', '').lower() in ('1', 'true', 'yes'),
+    'mode': os.environ.get('AI_STUDIO_OFFLINE_MODE', 'replay'),  # 'replay', or 'record' to save live model streams
+    'recordings_file': os.environ.get('AI_STUDIO_RECORDINGS', os.path.join('data', 'offline', 'llm_recordings.jsonl')),
+    'fixtures_dir': os.environ.get('AI_STUDIO_FIXTURES', os.path.join('data', 'offline', 'fixtures')),  # transcripts/, pages/, media/, llm_rules.json
+    'fixture_url': os.environ.get('AI_STUDIO_FIXTURE_URL'),  # External fixture server; None starts one in-process
+    'fixture_host': '127.0.0.1',
+    'fixture_port': 0,  # 0 = any free port
+    'fixture_latency_seconds': 0.0,  # Added to every fixture server response
+    'ttft_seconds': 0.5,  # Replayed time to first token
+    'tokens_per_second': 50.0,  # Replayed output rate after the first token
+    'chunk_tokens': 4,  # Tokens per replayed stream chunk
+    'failure_rate': 0.0,  # Share of (prompt, model) pairs that fail before the first token (deterministic)
+    'synthetic_tokens': 300,  # Length of generated answers for prompts without a recording or rule
+    'model_overrides': {},  # model -> {'ttft_seconds', 'tokens_per_second', 'failure_rate'}
+    'seed': 1234,
+}
+
+# Incremental (windowed) summarization for long videos
+INCREMENTAL_SUMMARY_CONFIG = {
+    'enabled': True,
+    'window_seconds': 600,  # Transcript time covered by each window summary
+    'min_duration_seconds': 1800,  # Shorter videos are summarized in a single call
+    'max_parallel_windows': 3,  # Concurrent window summary requests
+}
+
+# Content-addressed cache for deterministic LLM results (summaries, clip plans, automatic chat summaries)
+LLM_CACHE_CONFIG = {
+    'enabled': True,
+    'memory_max_bytes': 32 * 1024 * 1024,  # In-memory LRU tier (per worker)
+    'disk_dir': os.environ.get('LLM_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ai_studio_llm_cache')),
+    'disk_max_bytes': 512 * 1024 * 1024,  # Disk tier shared by all workers; oldest entries evicted first
+    'ttl_seconds': 7 * 24 * 3600,
+    'replay_chunk_chars': 400,  # Cached results are replayed through the streaming path in chunks this size
+    'replay_chunk_delay': 0,  # Seconds between replayed chunks (typing pacing is done in the browser)
+    # Bump a version when a prompt changes in a way its template text does not show (e.g. post-processing)
+    'template_versions': {
+        'youtube_summary': 1,
+        'clip_plan': 1,
+        'webpage_summary': 1,
+        'chat_summary': 1,
+        'chunk_summary': 1,
+        'window_summary': 1,
+    },
+}
+
+# Token accounting and prompt budgets (sizes are in tokens, not characters)
+TOKEN_BUDGET_CONFIG = {
+    'encoding': 'o200k_base',  # tiktoken BPE encoding; a script-aware estimate is used without tiktoken
+    'default_context_tokens': 32000,  # For model configs without a 'context_tokens' entry
+    'planning_context_tokens': 32000,  # Prompts are planned for at most this window so fallbacks still fit
+    'reserve_output_tokens': 2000,  # Kept free for the answer
+    'safety_margin': 0.05,  # Share of the window left unused to absorb tokenizer differences between models
+    'history_share': 0.25,  # Maximum share of the free budget used for conversation history
+    'chat_fast_content_tokens': 1200,  # Page content in fast chat answers
+    'chat_deep_content_tokens': 4500,  # Page content in deep research answers
+    'chat_question_tokens': 200,  # Longer questions are cut
+    'log_requests': True,  # Print prompt/completion token counts for every LLM request
+}
+
+# Chat agent retrieval: questions get the best-matching chunks of the page instead of its head
+RETRIEVAL_CONFIG = {
+    'enabled': True,
+    'chunk_tokens': 250,  # Chunks end on paragraph or sentence boundaries
+    'k1': 1.5,  # BM25 term frequency saturation
+    'b': 0.75,  # BM25 length normalization
+    'include_first_chunk': True,  # Always send the opening of the page (if it is small)
+    # Video chat: transcript segments indexed as timestamped windows
+    'window_seconds': 45,  # Transcript covered by one indexed window
+    'line_seconds': 15,  # A [m:ss] marker starts a new line inside a window this often
+    'video_chat_tokens': 3000,  # Transcript excerpt sent with each video chat question
+}
+
+# In-memory chat and video chat sessions (per worker)
+SESSION_STORE_CONFIG = {
+    'max_bytes': 256 * 1024 * 1024,  # Least recently used sessions are evicted beyond this (estimated size)
+    'max_entries': 5000,
+    'ttl_seconds': 6 * 3600,  # Sessions idle this long are dropped
+    'max_history_turns': 50,  # Older chat turns are dropped (prompts only keep the newest ones anyway)
+    'intern_fields': ('content', 'transcript', 'timed_transcript', 'summary'),  # Identical texts are stored once across sessions
+    'intern_min_chars': 1024,  # Shorter texts are not worth hashing
+    # SQLite file shared by the workers of a node, so any worker can serve any session (None: per-worker only)
+    'persist_path': os.environ.get('SESSION_STORE_PATH', os.path.join(tempfile.gettempdir(), 'ai_studio_sessions.sqlite3')),
+    'transient_fields': ('retrieval_index',),  # Rebuilt from the stored text instead of being persisted
+    'refresh_seconds': 1.0,  # A worker rechecks a session against the shared file at most this often
+}
+
+# Map-reduce summarization for content too long for a single AI call
+MAP_REDUCE_CONFIG = {
+    'enabled': True,
+    'single_call_tokens': 6000,  # Longer content is split into chunks and summarized in parallel
+    'chunk_tokens': 3000,  # Target chunk size; chunks end on paragraph or sentence boundaries
+    'max_parallel_chunks': 4,  # Concurrent chunk summary requests per job
+    'max_levels': 3,  # Reduce rounds over chunk notes before the final summary
+}
+
+# Local repair of AI clip plans for shorts (candidates are moved/dropped instead of failing the job)
+CLIP_PLAN_CONFIG = {
+    'intro_seconds': 60,  # No clip starts inside the intro
+    'min_gap_seconds': 30,  # Minimum time between the end of one clip and the start of the next
+    'min_clip_seconds': 30,
+    'max_clip_seconds': 60,
+    'max_shift_seconds': 90,  # How far a candidate may be moved to repair it
+    'shift_penalty': 0.5,  # Speech density traded for moving a clip the full max_shift_seconds
+    'min_speech_words': 15,  # Speech words a clip must contain
+    'min_speech_density': 0.2,  # Clip words per second relative to the video average
+    'start_window_seconds': 5,
+    'min_start_words': 3,  # Speech words in the first start_window_seconds
+    'reprompt_attempts': 1,  # Extra AI calls (with feedback) when no candidate can be repaired
+    'feedback_windows': 6,  # Speech-dense windows suggested in the feedback
+    'line_min_seconds': 5,  # Timestamped transcript lines in the prompt cover 5-10s of captions
+    'line_max_seconds': 10,
+    'transcript_tokens': 12000,  # Budget of the timestamped transcript; lines are shortened evenly to fit
+    'filler_words': ['um', 'uh', 'uhm', 'umm', 'erm', 'er', 'ah', 'hmm', 'mm', 'eh',
+                     '\u0627\u0645\u0645', '\u0627\u0647'],  # Dropped from the prompt (Arabic: "umm", "ah")
+    'prerank_min_tokens': 6000,  # Longer timestamped transcripts are pre-ranked locally before the AI call
+    'prerank_window_seconds': 45,
+    'prerank_step_seconds': 5,
+    'prerank_top_k': 10,  # Windows sent to the AI (twice the largest clip count)
+    'prerank_padding_seconds': 15,  # Context added around each window
+    'prerank_weights': {'density': 1.0, 'hooks': 0.7, 'qa': 0.5, 'novelty': 0.8},
+    'outline_sections': 12,  # Outline lines describing the whole video
+    'outline_words': 15,
+    'stream_clips': True,  # Stream the clip plan and render each clip as soon as it is accepted
+}
+
 # Rate limiting configuration
 RATE_LIMITS = {
     'global_default': "500 per hour",
@@ -335,7 +565,23 @@ LANGUAGE_TEMPLATES = {
 المحتوى:
 {{content}}
 
-الملخص:"""
+الملخص:""",
+
+        'window_template': """هذا جزء من نص فيديو يوتيوب طويل (من {start} إلى {end}).
+اكتب من 3 إلى 6 نقاط موجزة باللغة العربية فقط تغطي أهم الحقائق والأفكار والأسماء والأرقام المذكورة في هذا الجزء فقط. لا تكتب مقدمة أو خاتمة.
+
+نص الجزء:
+{content}
+
+ملاحظات الجزء:""",
+        
+        'chunk_template': """هذا الجزء {index} من {total} من محتوى طويل (نص فيديو أو صفحة ويب أو ملف PDF أو ملاحظات أجزاء سابقة).
+اكتب نقاطاً موجزة باللغة العربية فقط تغطي كل الحقائق والأفكار والأسماء والأرقام المهمة في هذا الجزء فقط، بنفس ترتيب ورودها. لا تكتب مقدمة أو خاتمة.
+
+محتوى الجزء:
+{content}
+
+ملاحظات الجزء:"""
     },
     
     'en': {
@@ -508,6 +754,22 @@ Title: {title}
 Content:
 {content}
 
-Summary:"""
+Summary:""",
+
+        'window_template': """This is one section of a longer YouTube video transcript ({start} - {end}).
+Write 3-6 concise bullet points in English covering the key facts, arguments, names and numbers mentioned in this section only. Do not add an introduction or conclusion.
+
+Transcript section:
+{content}
+
+Section notes:""",
+        
+        'chunk_template': """This is part {index} of {total} of a long piece of content (a video transcript, webpage, PDF or notes on earlier parts).
+Write concise bullet points in English covering every important fact, argument, name and number in this part only, in the order they appear. Do not add an introduction or conclusion.
+
+Part content:
+{content}
+
+Part notes:"""
     }
 }
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Shared language detection module.
+Fast Arabic/English detection used by the YouTube, webpage and chat agent pipelines.
+"""
+
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Maximum characters inspected per call; longer texts are sampled evenly across their length
+SAMPLE_CHARS = 20000
+SAMPLE_SLICES = 10
+
+# Number of distinct texts whose detection result is remembered
+CACHE_SIZE = 512
+
+# Arabic letters: 0x0600-0x06FF (Arabic), 0x0750-0x077F (Arabic Supplement)
+ARABIC_LETTER_RANGES = [(0x0600, 0x06FF), (0x0750, 0x077F)]
+# Any Arabic script character including presentation forms (used for short chat texts)
+ARABIC_SCRIPT_RANGES = [(0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF)]
+
+
+def _run_pattern(ranges, predicate=None):
+    """Compile a regex matching runs of characters in `ranges` (optionally filtered by predicate)"""
+    spans = []
+    for low, high in ranges:
+        for code in range(low, high + 1):
+            if predicate and not predicate(chr(code)):
+                continue
+            if spans and spans[-1][1] == code - 1:
+                spans[-1][1] = code
+            else:
+                spans.append([code, code])
+    char_class = ''.join(f"\\u{a:04X}-\\u{b:04X}" if a != b else f"\\u{a:04X}" for a, b in spans)
+    return re.compile(f"[{char_class}]+")
+
+
+# Matching whole runs keeps the per-match overhead per word instead of per character
+_ARABIC_LETTER_RE = _run_pattern(ARABIC_LETTER_RANGES, str.isalpha)
+_ARABIC_SCRIPT_RE = _run_pattern(ARABIC_SCRIPT_RANGES)
+_LATIN_LETTER_RE = re.compile(r'[A-Za-z]+')
+
+ARABIC_INDICATORS = ['في', 'من', 'إلى', 'على', 'هذا', 'التي', 'الذي', 'وهو', 'ولا', 'أن', 'كان', 'هي', 'له', 'أو', 'قال', 'بين', 'عند', 'غير', 'بعد', 'حول', 'أول', 'كل', 'لم', 'قد', 'لا', 'ما', 'ان']
+ARABIC_PATTERNS = ['===', 'فيديو', 'VIDEO']  # Common in mixed transcripts
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def _to_text(text):
+    """Convert a timestamped transcript (list of segment dicts) to plain text"""
+    if isinstance(text, list):
+        return ' '.join(seg.get('text', '') if isinstance(seg, dict) else str(seg) for seg in text)
+    return text or ''
+
+
+def _sample(text, budget=SAMPLE_CHARS, slices=SAMPLE_SLICES):
+    """Take evenly spaced slices across the text so long inputs cost a bounded amount of work"""
+    if len(text) <= budget:
+        return text
+    slice_len = budget // slices
+    step = (len(text) - slice_len) / (slices - 1)
+    return ' '.join(text[int(i * step):int(i * step) + slice_len] for i in range(slices))
+
+
+def _count(pattern, text):
+    """Count characters covered by the pattern's matches"""
+    return sum(map(len, pattern.findall(text)))
+
+
+def _content_key(kind, text):
+    """Content hash used as the memo key"""
+    digest = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+    return f"{kind}:{len(text)}:{digest}"
+
+
+def _cached(key, compute):
+    """Return the memoized value for key, computing and storing it on a miss"""
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _cache_stats['hits'] += 1
+            return _cache[key]
+        _cache_stats['misses'] += 1
+
+    value = compute()
+
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def analyze_text(text, script=False):
+    """Return character statistics for (a bounded sample of) the text"""
+    sample = _sample(_to_text(text))
+    stats = {'letters': sum(map(str.isalpha, sample)), 'sample': sample}
+    if script:
+        stats['arabic_script'] = _count(_ARABIC_SCRIPT_RE, sample)
+    else:
+        stats['arabic_letters'] = _count(_ARABIC_LETTER_RE, sample)
+        stats['latin_letters'] = _count(_LATIN_LETTER_RE, sample)
+    return stats
+
+
+def _detect(text_content):
+    """Uncached Arabic/English decision (same thresholds as the original per-character detector)"""
+    stats = analyze_text(text_content)
+    total_chars = stats['letters']
+    if total_chars == 0:
+        return 'en'
+
+    arabic_ratio = stats['arabic_letters'] / total_chars
+    english_ratio = stats['latin_letters'] / total_chars
+    print(f"Language detection - Arabic: {arabic_ratio:.2%}, English: {english_ratio:.2%} ({total_chars} letters sampled)")
+
+    # If more than 25% Arabic characters, consider it Arabic (lowered threshold for mixed content)
+    if arabic_ratio > 0.25:
+        return 'ar'
+    if english_ratio > 0.6:  # Need higher threshold for English to be confident
+        return 'en'
+    if arabic_ratio <= 0.1:
+        return 'en'
+
+    # Mixed content: look for Arabic words and transcript patterns, stopping as soon as we have enough
+    if any(pattern in text_content for pattern in ARABIC_PATTERNS):
+        return 'ar'
+    sample = stats['sample']
+    arabic_word_count = 0
+    for word in ARABIC_INDICATORS:
+        arabic_word_count += sample.count(word)
+        if arabic_word_count > 2:
+            return 'ar'
+    return 'en'
+
+
+def detect_language(text):
+    """Detect if the text is Arabic ('ar') or English ('en')
+
+    Args:
+        text: Either a string (plain text) OR list of dicts with timestamps
+              [{'start': 1.36, 'duration': 1.68, 'text': '...'}]
+    """
+    text_content = _to_text(text)
+    if not text_content:
+        return 'en'
+    return _cached(_content_key('lang', text_content), lambda: _detect(text_content))
+
+
+def is_arabic_text(text, threshold=0.3):
+    """Detect if more than `threshold` of the alphabetic characters are Arabic script"""
+    text_content = _to_text(text)
+    if not text_content:
+        return False
+
+    def compute():
+        stats = analyze_text(text_content, script=True)
+        if stats['letters'] > 0:
+            return stats['arabic_script'] / stats['letters']
+        return 0.0
+
+    return _cached(_content_key('script', text_content), compute) > threshold
+
+
+def get_cache_stats():
+    """Return memo hit/miss counters and current size"""
+    with _cache_lock:
+        return {**_cache_stats, 'size': len(_cache), 'max_size': CACHE_SIZE}
+
+
+def clear_cache():
+    """Drop all memoized detection results"""
+    with _cache_lock:
+        _cache.clear()
+        _cache_stats['hits'] = 0
+        _cache_stats['misses'] = 0
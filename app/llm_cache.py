@@ -0,0 +1,296 @@
+"""
+Content-addressed LLM result cache.
+Deterministic generations are stored under (task, template version, content hash,
+language, model) in an in-memory LRU in front of a disk tier shared by all workers.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from .config import LLM_CACHE_CONFIG
+
+
+def _digest(text, size=16):
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=size).hexdigest()
+
+
+def make_cache_key(task, content, language, template=''):
+    """Model-independent part of a cache key.
+
+    The template text is hashed into the version so editing a prompt invalidates its entries.
+    """
+    version = LLM_CACHE_CONFIG['template_versions'].get(task, 1)
+    return f"{task}:v{version}.{_digest(template, 6)}:{language}:{_digest(content)}"
+
+
+def replay_text(text, chunk_chars=None, delay=None):
+    """Yield a cached result in small pieces, paced like a live stream"""
+    chunk_chars = chunk_chars or LLM_CACHE_CONFIG['replay_chunk_chars']
+    delay = LLM_CACHE_CONFIG['replay_chunk_delay'] if delay is None else delay
+    for start in range(0, len(text), chunk_chars):
+        if start and delay:
+            time.sleep(delay)
+        yield text[start:start + chunk_chars]
+
+
+def replay_stream(text):
+    """Cached result as stream chunks shaped like G4F's (chunk.choices[0].delta.content)"""
+    for piece in replay_text(text):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+
+def replay_response(text):
+    """Cached result as a non-streaming G4F-style response (response.choices[0].message.content)"""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class LLMResultCache:
+    """Two-tier (memory LRU + disk) cache with TTL and byte-based eviction.
+
+    The lock only guards the memory tier and counters; disk reads, writes and sweeps run outside it.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = {**LLM_CACHE_CONFIG, **(settings or {})}
+        self.enabled = self.settings['enabled']
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # entry id -> {'text', 'model', 'created_at', 'size'}
+        self._memory_bytes = 0
+        self._disk_bytes = None  # Measured lazily on first write
+        self._sweeping = False  # A background disk sweep is running
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._task_stats = {}  # task -> {'hits', 'misses'}
+
+        self.disk_dir = self.settings['disk_dir']
+        if self.enabled and self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+            except OSError as e:
+                print(f"⚠️ LLM cache disk tier disabled: {e}")
+                self.disk_dir = None
+
+    # ----- Helpers -----
+
+    def _entry_id(self, key, model):
+        return _digest(f"{key}|{model}")
+
+    def _path(self, entry_id):
+        return os.path.join(self.disk_dir, f"{entry_id}.json")
+
+    def _expired(self, created_at, now):
+        return now - created_at > self.settings['ttl_seconds']
+
+    def _count(self, key, hit):
+        task = key.split(':', 1)[0]
+        counters = self._task_stats.setdefault(task, {'hits': 0, 'misses': 0})
+        counters['hits' if hit else 'misses'] += 1
+
+    def _remember(self, entry_id, entry):
+        """Insert into the memory tier, evicting least recently used entries over the byte budget"""
+        previous = self._memory.pop(entry_id, None)
+        if previous:
+            self._memory_bytes -= previous['size']
+        if entry['size'] > self.settings['memory_max_bytes']:
+            return
+        self._memory[entry_id] = entry
+        self._memory_bytes += entry['size']
+        while self._memory_bytes > self.settings['memory_max_bytes']:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted['size']
+            self._stats['evictions'] += 1
+
+    def _read_disk(self, entry_id, now):
+        if not self.disk_dir:
+            return None
+        path = self._path(entry_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry.get('created_at', 0), now):
+            self._remove_file(path)
+            return None
+        entry['size'] = len(entry['text'].encode('utf-8'))
+        return entry
+
+    def _remove_file(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def _write_disk(self, entry_id, entry):
+        if not self.disk_dir:
+            return
+        path = self._path(entry_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'text': entry['text'], 'model': entry['model'], 'created_at': entry['created_at']},
+                          f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write LLM cache entry: {e}")
+            return
+        if self._disk_bytes is None:
+            total = self._scan_disk()[1]
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = total
+        with self._lock:
+            self._disk_bytes += size
+            sweep = self._disk_bytes > self.settings['disk_max_bytes'] and not self._sweeping
+            if sweep:
+                self._sweeping = True
+        if sweep:
+            threading.Thread(target=self._sweep_disk, name='llm-cache-sweep', daemon=True).start()
+
+    def _scan_disk(self):
+        """Return ([(mtime, size, path)], total bytes) for all disk entries"""
+        files = []
+        total = 0
+        try:
+            names = os.listdir(self.disk_dir)
+        except OSError:
+            return files, total
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        return files, total
+
+    def _sweep_disk(self):
+        """Drop expired entries, then the oldest ones until the disk tier is back under 80% of its budget (background thread)"""
+        now = time.time()
+        files, total = self._scan_disk()
+        files.sort()
+        target = self.settings['disk_max_bytes'] * 0.8
+        removed = 0
+        for mtime, size, path in files:
+            if total <= target and not self._expired(mtime, now):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats['evictions'] += removed
+            self._sweeping = False
+        print(f"🧹 LLM cache disk sweep removed {removed} entries ({total / 1024 / 1024:.1f} MB kept)")
+
+    # ----- Public API -----
+
+    def get(self, key, models):
+        """Return (text, model) for the first of `models` with a cached result, else (None, None)"""
+        if not self.enabled or key is None:
+            return None, None
+        now = time.time()
+        with self._lock:
+            for model in models:
+                entry_id = self._entry_id(key, model)
+                entry = self._memory.get(entry_id)
+                if entry and not self._expired(entry['created_at'], now):
+                    self._memory.move_to_end(entry_id)
+                    self._stats['memory_hits'] += 1
+                    self._count(key, hit=True)
+                    return entry['text'], entry['model']
+
+        for model in models:
+            entry_id = self._entry_id(key, model)
+            entry = self._read_disk(entry_id, now)
+            if entry:
+                with self._lock:
+                    self._remember(entry_id, entry)
+                    self._stats['disk_hits'] += 1
+                    self._count(key, hit=True)
+                return entry['text'], entry['model']
+
+        with self._lock:
+            self._stats['misses'] += 1
+            self._count(key, hit=False)
+        return None, None
+
+    def put(self, key, model, text):
+        """Store a complete result produced by `model`"""
+        if not self.enabled or key is None or not text or not text.strip():
+            return
+        entry = {'text': text, 'model': model, 'created_at': time.time(), 'size': len(text.encode('utf-8'))}
+        entry_id = self._entry_id(key, model)
+        with self._lock:
+            self._remember(entry_id, entry)
+            self._stats['stores'] += 1
+        self._write_disk(entry_id, entry)
+
+    def discard(self, key, models):
+        """Forget a result (e.g. a clip plan that failed validation) so the next request regenerates it"""
+        if not self.enabled or key is None:
+            return
+        entry_ids = [self._entry_id(key, model) for model in models]
+        with self._lock:
+            for entry_id in entry_ids:
+                entry = self._memory.pop(entry_id, None)
+                if entry:
+                    self._memory_bytes -= entry['size']
+        if self.disk_dir:
+            for entry_id in entry_ids:
+                self._remove_file(self._path(entry_id))
+
+    def get_stats(self):
+        """Hit/miss counters overall and per task, plus tier sizes"""
+        with self._lock:
+            lookups = self._stats['memory_hits'] + self._stats['disk_hits'] + self._stats['misses']
+            hits = lookups - self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'by_task': {task: dict(counters) for task, counters in self._task_stats.items()},
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes,
+                'enabled': self.enabled,
+            }
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.disk_dir:
+            for _, _, path in self._scan_disk()[0]:
+                self._remove_file(path)
+        with self._lock:
+            self._disk_bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Get the process-wide LLM result cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResultCache()
+    return _cache
@@ -0,0 +1,683 @@
+"""
+Unified LLM gateway module.
+Owns pooled G4F clients, process-wide model health state (shared across workers
+through a state file) and the fallback chain used by every subsystem.
+"""
+
+import os
+import json
+import time
+import queue
+import inspect
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from g4f.client import Client
+
+from .config import MODEL_CONFIGS, LLM_GATEWAY_CONFIG, TOKEN_BUDGET_CONFIG
+from .llm_cache import get_llm_cache, replay_stream, replay_response
+from .token_budget import count_tokens, count_message_tokens, context_tokens
+from .llm_metrics import (call_labels, llm_feature, bind_llm_context, observe_attempt, observe_error,
+                          observe_fallback_depth)
+from .offline import make_llm_client
+
+# File locking for the cross-worker state file (POSIX only)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+def config_key(config):
+    """Stable identifier for a (model, provider) pair"""
+    provider = config.get('provider')
+    provider_name = getattr(provider, '__name__', None) or (str(provider) if provider else 'auto')
+    return f"{config['model']}@{provider_name}"
+
+
+def extract_stream_text(chunk):
+    """Return the text delta of a streaming chunk (or '' if it has none)"""
+    if hasattr(chunk, 'choices') and chunk.choices:
+        delta = getattr(chunk.choices[0], 'delta', None)
+        if delta is not None:
+            return getattr(delta, 'content', None) or ''
+    return ''
+
+
+class SharedHealthStore:
+    """Model health records persisted to a JSON file so all workers on a node see the same state"""
+
+    def __init__(self, path, refresh_seconds=1.0):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.enabled = FCNTL_AVAILABLE and bool(path)
+        self._last_mtime = None
+        self._last_check = 0
+
+    def _locked(self, exclusive):
+        lock_file = open(self.path + '.lock', 'a+')
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return lock_file
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load_if_changed(self):
+        """Return the shared records if the file changed since the last read, else None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        if now - self._last_check < self.refresh_seconds:
+            return None
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        if mtime == self._last_mtime:
+            return None
+        try:
+            lock_file = self._locked(exclusive=False)
+            try:
+                self._last_mtime = mtime
+                return self._read()
+            finally:
+                lock_file.close()
+        except OSError as e:
+            print(f"⚠️ Could not read LLM health state: {e}")
+            return None
+
+    def update(self, key, record):
+        """Write one model's record into the shared file (unless it already holds a newer one)"""
+        if not self.enabled:
+            return
+        try:
+            lock_file = self._locked(exclusive=True)
+            try:
+                records = self._read()
+                # Records are written after the gateway lock is released, so an older copy can arrive late
+                if records.get(key, {}).get('updated_at', 0) > record.get('updated_at', 0):
+                    return
+                records[key] = record
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(records, f)
+                os.replace(tmp_path, self.path)
+                self._last_mtime = os.path.getmtime(self.path)
+            finally:
+                lock_file.close()
+        except OSError as e:
+            print(f"⚠️ Could not persist LLM health state: {e}")
+
+
+class LLMGateway:
+    """Single entry point for chat completions with shared fallback and circuit breaker state"""
+
+    def __init__(self, model_configs=None, settings=None):
+        self.model_configs = model_configs or MODEL_CONFIGS
+        self.settings = {**LLM_GATEWAY_CONFIG, **(settings or {})}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._health = {}
+        self._ttft_samples = {}  # config key -> recent time-to-first-token samples (seconds)
+        self._store = SharedHealthStore(self.settings['state_file'], self.settings['state_refresh_seconds'])
+        self._persisted_at = {}  # config key -> last time its record was written to the shared store
+        self._probe_claims = {}  # config key -> time a request claimed the half-open probe
+        self._token_usage = {}  # config key -> {'requests', 'prompt_tokens', 'completion_tokens'} (this worker)
+        self._hedge_pool = None
+        self._hedges_running = 0
+
+    # ----- Clients -----
+
+    def _client(self):
+        """One reusable G4F client per thread instead of one per request"""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = make_llm_client(Client)
+            self._local.client = client
+        return client
+
+    # ----- Health state and ranking -----
+
+    def _record(self, key):
+        record = self._health.get(key)
+        if record is None:
+            record = {
+                'consecutive_failures': 0,
+                'open_until': 0,
+                'open_count': 0,
+                'total_successes': 0,
+                'total_failures': 0,
+                'ewma_ttft': None,  # Streams: time to first token
+                'ewma_tokens_per_sec': None,  # Streams: output rate after the first token
+                'ewma_latency': None,  # Non-streaming calls: time to the complete answer
+                'ewma_error_rate': 0.0,
+                'last_error': None,
+                'updated_at': 0,
+            }
+            self._health[key] = record
+        return record
+
+    def _ewma(self, previous, value):
+        alpha = self.settings['ewma_alpha']
+        return value if previous is None else alpha * value + (1 - alpha) * previous
+
+    def _snapshot_to_persist(self, key, record, force=False):
+        """Copy of a record to share with other workers, or None (immediately on state changes, throttled otherwise).
+
+        Called with self._lock held; the caller writes the copy with _persist() after releasing it,
+        so requests never wait for the state file's flock and disk write.
+        """
+        now = time.time()
+        if force or now - self._persisted_at.get(key, 0) >= self.settings['state_persist_seconds']:
+            self._persisted_at[key] = now
+            return dict(record)
+        return None
+
+    def _persist(self, key, snapshot):
+        if snapshot is not None:
+            self._store.update(key, snapshot)
+
+    def _sync_from_store(self):
+        records = self._store.load_if_changed()
+        if not records:
+            return
+        with self._lock:
+            for key, shared in records.items():
+                local = self._record(key)
+                # Newest writer wins so a recovery seen by another worker closes our breaker too
+                if shared.get('updated_at', 0) > local.get('updated_at', 0):
+                    local.update(shared)
+
+    def circuit_state(self, record, now=None):
+        """'closed', 'open' or 'half_open' (cooldown over, waiting for a probe request)"""
+        if record['consecutive_failures'] < self.settings['failure_threshold']:
+            return 'closed'
+        return 'open' if record['open_until'] > (now or time.time()) else 'half_open'
+
+    def record_success(self, config, ttft=None, latency=None):
+        """Mark a model healthy, close its circuit breaker and update latency averages.
+
+        ttft is a stream's time to first token (the hedge delay samples), latency the
+        duration of a non-streaming call.
+        """
+        key = config_key(config)
+        with self._lock:
+            if ttft is not None:
+                self._ttft_samples.setdefault(key, deque(maxlen=50)).append(ttft)
+            record = self._record(key)
+            was_failing = record['consecutive_failures'] > 0
+            record['consecutive_failures'] = 0
+            record['open_until'] = 0
+            record['open_count'] = 0
+            record['total_successes'] += 1
+            record['ewma_error_rate'] = self._ewma(record['ewma_error_rate'], 0.0)
+            if ttft is not None:
+                record['ewma_ttft'] = self._ewma(record['ewma_ttft'], ttft)
+            if latency is not None:
+                record['ewma_latency'] = self._ewma(record['ewma_latency'], latency)
+            record['updated_at'] = time.time()
+            self._probe_claims.pop(key, None)
+            if was_failing:
+                print(f"✅ Model {config['name']} recovered")
+            snapshot = self._snapshot_to_persist(key, record, force=was_failing)
+        self._persist(key, snapshot)
+
+    def record_throughput(self, config, output_tokens, seconds):
+        """Update the output tokens/sec average once a stream has been fully received (seconds from its first token)"""
+        if seconds <= 0 or output_tokens <= 0:
+            return
+        tokens_per_sec = output_tokens / seconds
+        key = config_key(config)
+        with self._lock:
+            record = self._record(key)
+            record['ewma_tokens_per_sec'] = self._ewma(record['ewma_tokens_per_sec'], tokens_per_sec)
+            record['updated_at'] = time.time()
+            snapshot = self._snapshot_to_persist(key, record)
+        self._persist(key, snapshot)
+
+    def record_usage(self, config, prompt_tokens, completion_tokens):
+        """Add a request's token counts to the per-model totals and log them"""
+        key = config_key(config)
+        with self._lock:
+            usage = self._token_usage.setdefault(key, {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            usage['requests'] += 1
+            usage['prompt_tokens'] += prompt_tokens
+            usage['completion_tokens'] += completion_tokens
+        if TOKEN_BUDGET_CONFIG['log_requests']:
+            print(f"🧮 Tokens {config['name']}: {prompt_tokens} prompt + {completion_tokens} completion")
+
+    def record_failure(self, config, error):
+        """Count a failure and open the circuit breaker after repeated failures"""
+        key = config_key(config)
+        now = time.time()
+        with self._lock:
+            record = self._record(key)
+            record['consecutive_failures'] += 1
+            record['total_failures'] += 1
+            record['ewma_error_rate'] = self._ewma(record['ewma_error_rate'], 1.0)
+            record['last_error'] = str(error)[:200]
+            record['updated_at'] = now
+            observe_error(call_labels(config), error)
+            self._probe_claims.pop(key, None)
+            if record['consecutive_failures'] >= self.settings['failure_threshold']:
+                # Failed probes back off exponentially
+                cooldown = min(self.settings['cooldown_seconds'] * (2 ** record['open_count']),
+                               self.settings['max_cooldown_seconds'])
+                record['open_until'] = now + cooldown
+                record['open_count'] += 1
+                print(f"⛔ Circuit open for {config['name']} for {cooldown:.0f}s ({record['consecutive_failures']} consecutive failures)")
+            snapshot = self._snapshot_to_persist(key, record, force=True)
+        self._persist(key, snapshot)
+
+    def _score(self, record, position):
+        """Expected seconds to a complete answer; lower ranks first.
+
+        Streams measure the time to first token and the output rate after it separately, so
+        their sum estimates the answer time. A non-streaming call's latency already includes
+        the generation and is only used for models without streaming measurements.
+        """
+        settings = self.settings
+        if record['ewma_ttft'] is None and record['ewma_latency'] is not None:
+            answer_seconds = record['ewma_latency']
+        else:
+            ttft = record['ewma_ttft'] if record['ewma_ttft'] is not None else settings['prior_ttft']
+            tokens_per_sec = record['ewma_tokens_per_sec'] or settings['prior_tokens_per_sec']
+            answer_seconds = ttft + settings['ranking_output_tokens'] / tokens_per_sec
+        return (answer_seconds
+                + record['ewma_error_rate'] * settings['error_penalty_seconds']
+                + position * settings['priority_bias_seconds'])
+
+    def _claim_probe(self, key, now):
+        """Allow one request at a time to probe a half-open model"""
+        claimed_at = self._probe_claims.get(key)
+        if claimed_at and now - claimed_at < self.settings['probe_timeout_seconds']:
+            return False
+        self._probe_claims[key] = now
+        return True
+
+    def get_candidates(self, prompt_tokens=None):
+        """Model configs to try: a half-open probe first, then healthy models ranked by expected latency.
+
+        With prompt_tokens, models whose context window cannot hold the prompt plus the
+        reserved answer are moved to the end of the list.
+        """
+        self._sync_from_store()
+        now = time.time()
+        probes, ranked, blocked, too_small = [], [], [], []
+        needed = prompt_tokens + TOKEN_BUDGET_CONFIG['reserve_output_tokens'] if prompt_tokens else 0
+        with self._lock:
+            for position, config in enumerate(self.model_configs):
+                key = config_key(config)
+                record = self._record(key)
+                state = self.circuit_state(record, now)
+                if needed > context_tokens(config):
+                    too_small.append(config)
+                elif state == 'closed':
+                    ranked.append((self._score(record, position), config))
+                elif state == 'half_open' and not probes and self._claim_probe(key, now):
+                    print(f"🔎 Probing half-open model {config['name']}")
+                    probes.append(config)
+                else:
+                    blocked.append((record['open_until'], config))
+
+        candidates = probes + [config for _, config in sorted(ranked, key=lambda item: item[0])]
+        if candidates:
+            return candidates + too_small
+        # Everything is failing: try the model whose breaker closes soonest rather than failing outright
+        return [config for _, config in sorted(blocked, key=lambda item: item[0])] + too_small
+
+    def get_ranking(self):
+        """Live ranking of all configured models with their health and latency averages"""
+        self._sync_from_store()
+        now = time.time()
+        ranking = []
+        with self._lock:
+            for position, config in enumerate(self.model_configs):
+                key = config_key(config)
+                record = dict(self._record(key))
+                record.update({
+                    'name': config['name'],
+                    'key': key,
+                    'configured_priority': position + 1,
+                    'circuit_state': self.circuit_state(record, now),
+                    'score_seconds': round(self._score(record, position), 3),
+                    'ttft_samples': len(self._ttft_samples.get(key, ())),
+                    'context_tokens': context_tokens(config),
+                    'token_usage': dict(self._token_usage.get(key, {})),
+                })
+                ranking.append(record)
+        ranking.sort(key=lambda r: (r['circuit_state'] != 'closed', r['score_seconds']))
+        for rank, record in enumerate(ranking, 1):
+            record['rank'] = rank
+        return ranking
+
+    def hedge_delay(self, config):
+        """Seconds to wait for a first token from this model before starting a hedge"""
+        settings = self.settings
+        with self._lock:
+            samples = sorted(self._ttft_samples.get(config_key(config), ()))
+        if len(samples) < settings['hedge_min_samples']:
+            return settings['hedge_default_delay']
+        index = min(int(len(samples) * settings['hedge_percentile']), len(samples) - 1)
+        return min(max(samples[index], settings['hedge_min_delay']), settings['hedge_max_delay'])
+
+    # ----- Requests -----
+
+    def create(self, config, messages, stream=False, prompt_tokens=None, attempt=None):
+        """Single attempt against one model config; records the outcome in the shared health state.
+
+        Streaming responses are checked up to the first chunk so that provider errors surface
+        here (and can trigger a fallback) instead of in the middle of the caller's loop.
+        Callers running their own fallback loop pass attempt (1-based) for the fallback depth metric.
+        """
+        if prompt_tokens is None:
+            prompt_tokens = count_message_tokens(messages)
+        create_params = {'model': config['model'], 'messages': messages, 'stream': stream}
+        if config.get('provider'):
+            create_params['provider'] = config['provider']
+
+        labels = call_labels(config)
+        started = time.time()
+        try:
+            response = self._client().chat.completions.create(**create_params)
+            if not stream:
+                elapsed = time.time() - started
+                self.record_success(config, latency=elapsed)
+                try:
+                    completion_tokens = count_tokens(response.choices[0].message.content or '')
+                except (AttributeError, IndexError, TypeError):
+                    completion_tokens = 0
+                self.record_usage(config, prompt_tokens, completion_tokens)
+                observe_attempt(labels, 'success', ttft=elapsed, duration=elapsed,
+                                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                if attempt:
+                    observe_fallback_depth(labels, attempt)
+                return response
+
+            chunks = iter(response)
+            first_chunk = next(chunks)
+        except StopIteration:
+            error = Exception(f"Empty response from {config['name']}")
+            self.record_failure(config, error)
+            observe_attempt(labels, 'error', duration=time.time() - started, prompt_tokens=prompt_tokens)
+            raise error
+        except Exception as e:
+            self.record_failure(config, e)
+            observe_attempt(labels, 'error', duration=time.time() - started, prompt_tokens=prompt_tokens)
+            raise
+
+        ttft = time.time() - started
+        self.record_success(config, ttft=ttft)
+        if attempt:
+            observe_fallback_depth(labels, attempt)
+        return self._stream(config, first_chunk, chunks, prompt_tokens, labels, started, ttft)
+
+    def _stream(self, config, first_chunk, chunks, prompt_tokens=0, labels=None, started=None, ttft=None):
+        """Yield the already-received first chunk, then the rest of the stream"""
+        first_token_at = time.time()
+        parts = [extract_stream_text(first_chunk)]
+        outcome = 'cancelled'
+        try:
+            yield first_chunk
+            for chunk in chunks:
+                parts.append(extract_stream_text(chunk))
+                yield chunk
+            self.record_throughput(config, count_tokens(''.join(parts)), time.time() - first_token_at)
+            outcome = 'success'
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            outcome = 'error'
+            self.record_failure(config, e)
+            raise
+        finally:
+            # Tokens received before a cancel or error count as used too
+            completion_tokens = count_tokens(''.join(parts))
+            self.record_usage(config, prompt_tokens, completion_tokens)
+            if labels is not None:
+                observe_attempt(labels, outcome, ttft=ttft, duration=time.time() - started,
+                                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            # Release the provider connection when the caller stops early or a hedge loses
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+
+    def request(self, prompt=None, messages=None, stream=False, on_attempt=None, cache_key=None):
+        """Send a request through the fallback chain.
+
+        Returns (response, config) where response is the G4F response object, or a
+        generator of stream chunks when stream=True. on_attempt(config, attempt_number)
+        is called before each model is tried. With a cache_key (see llm_cache.make_cache_key)
+        a cached result is replayed instead, and a new complete result is stored.
+        """
+        # Calls with a cache key are labelled with its task (e.g. chunk_summary) in the metrics
+        with llm_feature(cache_key.split(':', 1)[0] if cache_key else None):
+            return self._cached_request(prompt, messages, stream, on_attempt, cache_key)
+
+    def _cached_request(self, prompt, messages, stream, on_attempt, cache_key):
+        if cache_key is None:
+            return self._request(prompt, messages, stream, on_attempt)
+
+        cache = get_llm_cache()
+        keys = {config_key(config): config for config in self.model_configs}
+        text, model = cache.get(cache_key, list(keys))
+        if text is not None:
+            config = keys[model]
+            print(f"♻️ LLM cache hit ({cache_key.split(':', 1)[0]}, {config['name']})")
+            return (replay_stream(text) if stream else replay_response(text)), config
+
+        response, config = self._request(prompt, messages, stream, on_attempt)
+        if stream:
+            return self._store_stream(cache, cache_key, config, response), config
+        try:
+            cache.put(cache_key, config_key(config), response.choices[0].message.content)
+        except (AttributeError, IndexError, TypeError):
+            pass
+        return response, config
+
+    def _store_stream(self, cache, cache_key, config, chunks):
+        """Pass a stream through, caching the full text once it completes"""
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(extract_stream_text(chunk))
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+        # Only reached when the caller consumed the whole stream (not on cancel or error)
+        cache.put(cache_key, config_key(config), ''.join(parts))
+
+    def _request(self, prompt, messages, stream, on_attempt):
+        if messages is None:
+            messages = [{"role": "user", "content": prompt}]
+
+        prompt_tokens = count_message_tokens(messages)
+        candidates = self.get_candidates(prompt_tokens)
+        # Only streams are hedged: a hedge races for the first token and the loser's stream is closed.
+        # A non-streaming call cannot be stopped once sent, so it only falls back on failure
+        if (stream and self.settings['hedging_enabled'] and self.settings['max_hedges'] > 0
+                and len(candidates) > 1):
+            return self._hedged_request(candidates, messages, stream, on_attempt, prompt_tokens)
+
+        last_error = None
+        for attempt, config in enumerate(candidates, 1):
+            if on_attempt:
+                on_attempt(config, attempt)
+            try:
+                response = self.create(config, messages, stream=stream, prompt_tokens=prompt_tokens)
+                print(f"✅ Success with model: {config['name']}")
+                observe_fallback_depth(call_labels(config), attempt)
+                return response, config
+            except Exception as e:
+                last_error = e
+                print(f"❌ Model {config['name']} failed: {str(e)}")
+
+        print(f"💥 All {len(candidates)} models failed")
+        if last_error:
+            raise last_error
+        raise Exception("All AI models are currently unavailable. Please try again later.")
+
+    def _hedged_request(self, candidates, messages, stream, on_attempt, prompt_tokens=None):
+        """Fallback chain for streams that races the next model when the current one is slow to respond.
+
+        A hedge starts when the newest attempt has not produced a first token within its
+        hedge_delay (or immediately when it fails). At most 1 + max_hedges attempts run at
+        once. The first attempt to respond wins and every other attempt is closed.
+        The calling thread only waits for results so it can return whichever attempt wins;
+        the main attempt runs on its own thread and only hedges use the shared hedge pool.
+        """
+        if self._hedge_pool is None:
+            with self._lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=self.settings['hedge_workers'],
+                                                          thread_name_prefix='llm-hedge')
+
+        results = queue.Queue()
+        state = {'winner': None}
+        state_lock = threading.Lock()
+
+        def discard(response):
+            # A stream generator that was never started skips its finally block on close(), which
+            # records usage and closes the provider stream, so start it first
+            if inspect.isgenerator(response) and inspect.getgeneratorstate(response) == inspect.GEN_CREATED:
+                try:
+                    next(response)
+                except Exception:
+                    pass
+            close = getattr(response, 'close', None)
+            if close:
+                close()
+
+        def run(config, hedge):
+            try:
+                try:
+                    response = self.create(config, messages, stream=stream, prompt_tokens=prompt_tokens)
+                except Exception as e:
+                    results.put(('error', config, e))
+                    return
+                with state_lock:
+                    lost = state['winner'] is not None
+                    if not lost:
+                        results.put(('ok', config, response))
+                if lost:
+                    print(f"✂️ Hedge loser {config['name']} closed")
+                    discard(response)
+            finally:
+                if hedge:
+                    with self._lock:
+                        self._hedges_running -= 1
+
+        max_in_flight = 1 + self.settings['max_hedges']
+        next_index = 0
+        in_flight = 0
+        last_error = None
+        newest = None
+
+        def launch():
+            nonlocal next_index, in_flight, newest
+            hedge = in_flight > 0
+            if hedge:
+                # Hedges are optional: skip them when the pool is busy rather than queue behind other calls
+                with self._lock:
+                    if self._hedges_running >= self.settings['hedge_workers']:
+                        return False
+                    self._hedges_running += 1
+            config = candidates[next_index]
+            next_index += 1
+            in_flight += 1
+            newest = (config, time.time())
+            if on_attempt:
+                on_attempt(config, next_index)
+            task = bind_llm_context(run)
+            if hedge:
+                print(f"🏁 Hedging with {config['name']} (no first token yet from earlier attempt)")
+                self._hedge_pool.submit(task, config, True)
+            else:
+                threading.Thread(target=task, args=(config, False), name='llm-attempt', daemon=True).start()
+            return True
+
+        launch()
+        while in_flight:
+            timeout = None
+            if in_flight < max_in_flight and next_index < len(candidates):
+                config, started = newest
+                timeout = max(0.0, self.hedge_delay(config) - (time.time() - started))
+
+            try:
+                kind, config, payload = results.get(timeout=timeout)
+            except queue.Empty:
+                if not launch():
+                    newest = (newest[0], time.time())  # Try the hedge again after another delay
+                continue
+
+            in_flight -= 1
+            if kind == 'ok':
+                with state_lock:
+                    state['winner'] = config
+                # Attempts that finished at the same moment lose too
+                while not results.empty():
+                    other_kind, other_config, other_payload = results.get_nowait()
+                    if other_kind == 'ok':
+                        print(f"✂️ Hedge loser {other_config['name']} closed")
+                        discard(other_payload)
+                print(f"✅ Success with model: {config['name']}")
+                observe_fallback_depth(call_labels(config), candidates.index(config) + 1)
+                return payload, config
+
+            last_error = payload
+            print(f"❌ Model {config['name']} failed: {str(payload)}")
+            if in_flight == 0 and next_index < len(candidates):
+                launch()
+
+        print(f"💥 All {len(candidates)} models failed")
+        if last_error:
+            raise last_error
+        raise Exception("All AI models are currently unavailable. Please try again later.")
+
+    def discard_cached(self, cache_key):
+        """Drop a cached result for every configured model (e.g. when the output failed validation)"""
+        get_llm_cache().discard(cache_key, [config_key(config) for config in self.model_configs])
+
+    def complete_text(self, prompt=None, messages=None, on_attempt=None, cache_key=None):
+        """Non-streaming request returning (text, config)"""
+        response, config = self.request(prompt, messages, stream=False, on_attempt=on_attempt, cache_key=cache_key)
+        return response.choices[0].message.content, config
+
+    def stream_text(self, prompt=None, messages=None, on_attempt=None, cache_key=None):
+        """Streaming request returning (generator of text deltas, config)"""
+        chunks, config = self.request(prompt, messages, stream=True, on_attempt=on_attempt, cache_key=cache_key)
+        return self._stream_text(chunks), config
+
+    def _stream_text(self, chunks):
+        try:
+            for chunk in chunks:
+                text = extract_stream_text(chunk)
+                if text:
+                    yield text
+        finally:
+            # Closing the text stream (e.g. the caller stops early) closes the provider stream too
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    """Get the process-wide LLM gateway (created lazily, after gunicorn forks)"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
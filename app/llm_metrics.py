@@ -0,0 +1,209 @@
+"""
+LLM call instrumentation.
+Records time to first token, latency, output tokens/sec, prompt size, fallback depth and
+error class per (model, provider, feature) as Prometheus metrics, and keeps a per-task
+breakdown for /api/debug/tasks. The feature and task of a call come from a context
+variable set where the work starts (see set_llm_context).
+"""
+
+import os
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Import prometheus_client with fallback
+try:
+    from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+    print("⚠️ prometheus_client not available - LLM metrics only in /api/debug/tasks")
+
+LABELS = ('model', 'provider', 'feature')
+
+_llm_context = contextvars.ContextVar('llm_context', default=None)
+
+if PROMETHEUS_AVAILABLE:
+    TTFT_SECONDS = Histogram('llm_time_to_first_token_seconds', 'Time until the first token (or full answer) arrived',
+                             LABELS, buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60))
+    LATENCY_SECONDS = Histogram('llm_request_duration_seconds', 'Total time of one model attempt',
+                                LABELS, buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 90, 120, 300))
+    TOKENS_PER_SECOND = Histogram('llm_output_tokens_per_second', 'Output tokens per second after the first token',
+                                  LABELS, buckets=(5, 10, 20, 30, 50, 75, 100, 150, 250, 500))
+    PROMPT_TOKENS = Histogram('llm_prompt_tokens', 'Prompt size in tokens',
+                              LABELS, buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000))
+    FALLBACK_DEPTH = Histogram('llm_fallback_depth', 'Position in the fallback chain of the model that answered',
+                               ('feature',), buckets=(1, 2, 3, 4, 5, 6, 7, 8))
+    REQUESTS = Counter('llm_requests_total', 'Model attempts by outcome', LABELS + ('outcome',))
+    ERRORS = Counter('llm_errors_total', 'Failed model attempts by error class', LABELS + ('error_class',))
+    TOKENS = Counter('llm_tokens_total', 'Prompt and completion tokens', LABELS + ('kind',))
+
+_task_lock = threading.Lock()
+_task_metrics = {}  # task id -> {(feature, model, provider): aggregate}
+
+
+def set_llm_context(feature, task_id=None):
+    """Label LLM calls made from the current thread (or async task) with a feature and task id"""
+    return _llm_context.set({'feature': feature, 'task_id': task_id})
+
+
+def get_llm_context():
+    """Current {'feature', 'task_id'} labels (empty values when unset)"""
+    return _llm_context.get() or {'feature': None, 'task_id': None}
+
+
+@contextmanager
+def llm_feature(feature):
+    """Label calls inside the block with a more specific feature (e.g. a cache task), keeping the task id"""
+    if not feature:
+        yield
+        return
+    token = _llm_context.set({**get_llm_context(), 'feature': feature})
+    try:
+        yield
+    finally:
+        _llm_context.reset(token)
+
+
+def bind_llm_context(function):
+    """Wrap a callable so it runs with the caller's LLM context (for thread pool workers)"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+def call_labels(config, feature=None):
+    """Metric labels for a call to `config` (explicit feature, else the context's, else 'other')"""
+    context = get_llm_context()
+    provider = config.get('provider')
+    return {
+        'model': config['model'],
+        'provider': getattr(provider, '__name__', None) or (str(provider) if provider else 'auto'),
+        'feature': feature or context['feature'] or 'other',
+        'task_id': context['task_id'],
+    }
+
+
+def error_class(error):
+    """Coarse error category for the errors counter"""
+    message = str(error).lower()
+    if 'rate limit' in message or '429' in message:
+        return 'rate_limit'
+    if 'timeout' in message or 'timed out' in message or isinstance(error, TimeoutError):
+        return 'timeout'
+    if 'empty response' in message:
+        return 'empty_response'
+    return type(error).__name__
+
+
+def _task_entry(labels):
+    task_id = labels['task_id']
+    if not task_id:
+        return None
+    key = (labels['feature'], labels['model'], labels['provider'])
+    entries = _task_metrics.setdefault(task_id, {})
+    entry = entries.get(key)
+    if entry is None:
+        entry = entries[key] = {
+            'feature': labels['feature'], 'model': labels['model'], 'provider': labels['provider'],
+            'attempts': 0, 'successes': 0, 'errors': {}, 'ttft_total': 0.0, 'ttft_count': 0,
+            'latency_total': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0,
+            'tokens_per_sec_max': 0.0, 'max_fallback_depth': 0,
+        }
+    return entry
+
+
+def observe_attempt(labels, outcome, ttft=None, duration=None, prompt_tokens=0, completion_tokens=0):
+    """Record one finished model attempt ('success', 'error' or 'cancelled')"""
+    tokens_per_sec = None
+    if outcome == 'success' and completion_tokens and duration:
+        generation = duration - ttft if ttft is not None and duration - ttft > 0.05 else duration
+        tokens_per_sec = completion_tokens / generation
+
+    if PROMETHEUS_AVAILABLE:
+        metric_labels = (labels['model'], labels['provider'], labels['feature'])
+        REQUESTS.labels(*metric_labels, outcome).inc()
+        if ttft is not None:
+            TTFT_SECONDS.labels(*metric_labels).observe(ttft)
+        if duration is not None:
+            LATENCY_SECONDS.labels(*metric_labels).observe(duration)
+        if tokens_per_sec is not None:
+            TOKENS_PER_SECOND.labels(*metric_labels).observe(tokens_per_sec)
+        if prompt_tokens:
+            PROMPT_TOKENS.labels(*metric_labels).observe(prompt_tokens)
+            TOKENS.labels(*metric_labels, 'prompt').inc(prompt_tokens)
+        if completion_tokens:
+            TOKENS.labels(*metric_labels, 'completion').inc(completion_tokens)
+
+    with _task_lock:
+        entry = _task_entry(labels)
+        if entry is None:
+            return
+        entry['attempts'] += 1
+        if outcome == 'success':
+            entry['successes'] += 1
+        if ttft is not None:
+            entry['ttft_total'] += ttft
+            entry['ttft_count'] += 1
+        if duration is not None:
+            entry['latency_total'] += duration
+        entry['prompt_tokens'] += prompt_tokens
+        entry['completion_tokens'] += completion_tokens
+        if tokens_per_sec is not None:
+            entry['tokens_per_sec_max'] = max(entry['tokens_per_sec_max'], tokens_per_sec)
+
+
+def observe_error(labels, error):
+    """Count a failed attempt by error class"""
+    category = error_class(error)
+    if PROMETHEUS_AVAILABLE:
+        ERRORS.labels(labels['model'], labels['provider'], labels['feature'], category).inc()
+    with _task_lock:
+        entry = _task_entry(labels)
+        if entry is not None:
+            entry['errors'][category] = entry['errors'].get(category, 0) + 1
+
+
+def observe_fallback_depth(labels, depth):
+    """Record which position in the fallback chain produced the answer (1 = first choice)"""
+    if PROMETHEUS_AVAILABLE:
+        FALLBACK_DEPTH.labels(labels['feature']).observe(depth)
+    with _task_lock:
+        entry = _task_entry(labels)
+        if entry is not None:
+            entry['max_fallback_depth'] = max(entry['max_fallback_depth'], depth)
+
+
+def get_task_breakdown(task_id):
+    """Per (feature, model) LLM call summary for one task"""
+    with _task_lock:
+        entries = [dict(entry, errors=dict(entry['errors'])) for entry in _task_metrics.get(task_id, {}).values()]
+    breakdown = []
+    for entry in entries:
+        ttft_count = entry.pop('ttft_count')
+        ttft_total = entry.pop('ttft_total')
+        latency_total = entry.pop('latency_total')
+        entry['avg_ttft_seconds'] = round(ttft_total / ttft_count, 3) if ttft_count else None
+        entry['total_latency_seconds'] = round(latency_total, 3)
+        entry['tokens_per_sec_max'] = round(entry['tokens_per_sec_max'], 1)
+        breakdown.append(entry)
+    breakdown.sort(key=lambda entry: entry['total_latency_seconds'], reverse=True)
+    return breakdown
+
+
+def discard_task_metrics(task_id):
+    """Forget a finished task's breakdown"""
+    with _task_lock:
+        _task_metrics.pop(task_id, None)
+
+
+def render_metrics():
+    """Prometheus exposition text (aggregated over workers when PROMETHEUS_MULTIPROC_DIR is set)"""
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
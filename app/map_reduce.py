@@ -0,0 +1,157 @@
+"""
+Map-reduce summarization engine.
+Splits content that is too long for one AI call on paragraph/sentence boundaries,
+summarizes the chunks in parallel (cached by content hash) and reduces the notes
+hierarchically until they fit into the final summary prompt.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .config import LANGUAGE_TEMPLATES, MAP_REDUCE_CONFIG
+from .llm_cache import make_cache_key
+from .llm_gateway import get_llm_gateway
+from .token_budget import count_tokens, chars_per_token
+from .llm_metrics import bind_llm_context
+
+PARAGRAPH_BREAK_RE = re.compile(r'\n\s*\n')
+# Sentence ends in English and Arabic text (period, !, ?, Arabic question mark and full stop)
+SENTENCE_END_RE = re.compile(r'(?<=[.!?\u061F\u06D4])\s+')
+
+
+def _pack(units, chunk_chars, separator):
+    """Greedily pack consecutive units into chunks of at most chunk_chars"""
+    chunks = []
+    current = []
+    size = 0
+    for unit in units:
+        if current and size + len(separator) + len(unit) > chunk_chars:
+            chunks.append(separator.join(current))
+            current = []
+            size = 0
+        current.append(unit)
+        size += len(unit) + (len(separator) if size else 0)
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def split_text(text, chunk_chars):
+    """Split text into chunks that end on paragraph, then sentence, then word boundaries"""
+    units = []
+    for paragraph in PARAGRAPH_BREAK_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= chunk_chars:
+            units.append(paragraph)
+            continue
+        # Oversized paragraph (e.g. a transcript without line breaks): fall back to sentences
+        for sentence_chunk in _pack(SENTENCE_END_RE.split(paragraph), chunk_chars, ' '):
+            if len(sentence_chunk) <= chunk_chars:
+                units.append(sentence_chunk)
+            else:
+                # A single run-on "sentence" (unpunctuated captions): cut between words
+                for word_chunk in _pack(sentence_chunk.split(' '), chunk_chars, ' '):
+                    units.extend(word_chunk[i:i + chunk_chars] for i in range(0, len(word_chunk), chunk_chars))
+    return _pack(units, chunk_chars, '\n\n')
+
+
+class MapReduceSummarizer:
+    """Condenses oversized content into ordered notes that fit a single summary prompt"""
+
+    def __init__(self, llm_gateway=None, settings=None):
+        self.llm_gateway = llm_gateway or get_llm_gateway()
+        self.settings = {**MAP_REDUCE_CONFIG, **(settings or {})}
+
+    def needs_reduction(self, text):
+        """True if the text is too long for one AI call"""
+        return self.settings['enabled'] and count_tokens(text) > self.settings['single_call_tokens']
+
+    def _split(self, text):
+        """Split text into chunks of about chunk_tokens (converted with the text's own chars/token ratio)"""
+        return split_text(text, max(int(self.settings['chunk_tokens'] * chars_per_token(text)), 1000))
+
+    def _summarize_chunk(self, chunk, index, total, language, progress=None):
+        """Summarize one chunk (runs in a worker thread); identical chunks are served from the cache"""
+        if progress and progress.is_cancelled():
+            return ""
+        template = LANGUAGE_TEMPLATES[language]['chunk_template']
+        prompt = template.format(index=index, total=total, content=chunk)
+        cache_key = make_cache_key('chunk_summary', chunk, language, template)
+        try:
+            notes, _ = self.llm_gateway.complete_text(prompt, cache_key=cache_key)
+            return notes.strip()
+        except Exception as e:
+            print(f"⚠️ Chunk {index}/{total} summary failed: {e}")
+            # Keep the start of the raw chunk so this part is still represented in the reduce step
+            return chunk[:1500]
+
+    def _map(self, chunks, language, progress, level, progress_range):
+        """Summarize all chunks in parallel, returning notes in the original order (None if cancelled)"""
+        notes = [None] * len(chunks)
+        start, end = progress_range
+        task = bind_llm_context(self._summarize_chunk)  # Keep the job's metric labels in worker threads
+        with ThreadPoolExecutor(max_workers=self.settings['max_parallel_chunks']) as executor:
+            futures = {
+                executor.submit(task, chunk, index + 1, len(chunks), language, progress): index
+                for index, chunk in enumerate(chunks)
+            }
+            done = 0
+            for future in as_completed(futures):
+                if progress and progress.is_cancelled():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return None
+                notes[futures[future]] = future.result()
+                done += 1
+                if progress:
+                    percentage = start + (end - start) * done / len(chunks)
+                    if language == 'ar':
+                        message = f'تلخيص الأجزاء... ({done}/{len(chunks)})'
+                    else:
+                        message = f'Summarizing sections... ({done}/{len(chunks)})'
+                    if level > 1:
+                        message += f' [{level}]'
+                    progress.update('map_reduce', percentage, message)
+        return notes
+
+    def condense(self, text, language='en', progress=None, progress_range=(40, 60)):
+        """Reduce text to ordered section notes no longer than single_call_tokens.
+
+        Returns the notes, the unchanged text if it already fits, or None if the task was cancelled.
+        """
+        if not self.needs_reduction(text):
+            return text
+
+        limit = self.settings['single_call_tokens']
+        chunks = self._split(text)
+        print(f"🧩 Map-reduce: {count_tokens(text)} tokens ({len(text)} chars) split into {len(chunks)} chunks")
+
+        start, end = progress_range
+        for level in range(1, self.settings['max_levels'] + 1):
+            level_range = (start + (end - start) * (level - 1) / self.settings['max_levels'],
+                           start + (end - start) * level / self.settings['max_levels'])
+            notes = self._map(chunks, language, progress, level, level_range)
+            if notes is None:
+                return None
+            text = '\n\n'.join(note for note in notes if note)
+            note_tokens = count_tokens(text)
+            print(f"🧩 Map-reduce level {level}: {len(chunks)} chunks -> {note_tokens} tokens of notes")
+            if note_tokens <= limit or len(chunks) == 1:
+                return text
+            # Notes are still too long: group them and summarize the groups
+            chunks = self._split(text)
+
+        print(f"⚠️ Map-reduce notes still {note_tokens} tokens after {self.settings['max_levels']} levels")
+        return text
+
+
+_summarizer = None
+
+
+def get_map_reduce_summarizer():
+    """Get the shared map-reduce summarizer"""
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = MapReduceSummarizer()
+    return _summarizer
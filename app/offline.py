@@ -0,0 +1,589 @@
+"""
+Offline stand-ins for deterministic benchmarks.
+Replaces the live LLM providers (G4F and Webscout) with recorded or generated token streams
+paced by a configurable time to first token and token rate, serves transcript pages and
+webpages from a local fixture server and resolves YouTube URLs to local media files.
+Enabled with AI_STUDIO_OFFLINE=1; AI_STUDIO_OFFLINE_MODE=record saves live model answers
+for later replay instead.
+"""
+
+import os
+import re
+import html
+import json
+import time
+import random
+import asyncio
+import hashlib
+import inspect
+import mimetypes
+import threading
+import subprocess
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .config import OFFLINE_CONFIG
+from .token_budget import count_tokens
+
+VIDEO_ID_RE = re.compile(r'(?:v=|youtu\.be/|embed/|shorts/)([\w-]+)')
+WORD_RE = re.compile(r'[^\W\d_]{4,}')
+MEDIA_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.mov')
+
+
+def offline_enabled():
+    """True if external services are replaced by the offline stand-ins"""
+    return OFFLINE_CONFIG['enabled']
+
+
+def replay_enabled():
+    """True if model answers are replayed instead of requested live"""
+    return OFFLINE_CONFIG['enabled'] and OFFLINE_CONFIG['mode'] != 'record'
+
+
+def prompt_key(messages):
+    """Recording key of a prompt (the same for every model)"""
+    payload = json.dumps([[message.get('role'), message.get('content')] for message in messages], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _delta_text(chunk):
+    if hasattr(chunk, 'choices') and chunk.choices:
+        delta = getattr(chunk.choices[0], 'delta', None)
+        if delta is not None:
+            return getattr(delta, 'content', None) or ''
+    return ''
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=None)])
+
+
+def _completion(text, model):
+    message = SimpleNamespace(role='assistant', content=text)
+    return SimpleNamespace(model=model, choices=[SimpleNamespace(message=message, finish_reason='stop')])
+
+
+def split_chunks(text, chunk_tokens):
+    """Split text into stream chunks of about chunk_tokens tokens (whole words)"""
+    words = re.findall(r'\S+\s*|\s+', text)
+    chunks = []
+    current = ''
+    for word in words:
+        current += word
+        if count_tokens(current) >= chunk_tokens:
+            chunks.append(current)
+            current = ''
+    if current:
+        chunks.append(current)
+    return chunks or ['']
+
+
+# ----- Recorded and generated answers -----
+
+class RecordingStore:
+    """Recorded answers in a JSON lines file (key, model, chunks, ttft, seconds), loaded on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None  # prompt key -> {model -> entry}
+
+    def _load(self):
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries.setdefault(entry['key'], {})[entry['model']] = entry
+        except OSError:
+            pass
+        print(f"📼 Loaded {len(entries)} recorded prompts from {self.path}")
+        return entries
+
+    def get(self, key, model):
+        """Recording of a prompt, preferring the same model"""
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            models = self._entries.get(key)
+        if not models:
+            return None
+        return models.get(model) or next(iter(models.values()))
+
+    def add(self, entry):
+        """Append a recording"""
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            self._entries.setdefault(entry['key'], {})[entry['model']] = entry
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+class ReplayEngine:
+    """Decides what a stand-in model answers and how fast.
+
+    Answers come from the recordings file, else from the first llm_rules.json rule whose
+    'contains' text appears in the prompt, else from deterministic filler built from the
+    prompt's own words. Failures are drawn per (prompt, model) from the seed, so a benchmark
+    run always fails over at the same places.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = {**OFFLINE_CONFIG, **(settings or {})}
+        self.recordings = RecordingStore(self.settings['recordings_file'])
+        self._rules = None
+
+    def _timing(self, model):
+        timing = {key: self.settings[key] for key in ('ttft_seconds', 'tokens_per_second', 'failure_rate')}
+        timing.update(self.settings['model_overrides'].get(model, {}))
+        return timing
+
+    def _fails(self, key, model, failure_rate):
+        if failure_rate <= 0:
+            return False
+        digest = hashlib.sha256(f"{self.settings['seed']}:{key}:{model}".encode('utf-8')).hexdigest()
+        return int(digest[:8], 16) / 0xFFFFFFFF < failure_rate
+
+    def _load_rules(self):
+        path = os.path.join(self.settings['fixtures_dir'], 'llm_rules.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+            print(f"📼 Loaded {len(rules)} offline answer rules from {path}")
+            return rules
+        except (OSError, ValueError):
+            return []
+
+    def _answer_text(self, prompt, key):
+        if self._rules is None:
+            self._rules = self._load_rules()
+        for rule in self._rules:
+            if rule.get('contains', '') in prompt:
+                return rule['text']
+
+        rng = random.Random(f"{self.settings['seed']}:{key}")
+        vocabulary = WORD_RE.findall(prompt)[-2000:] or ['offline', 'benchmark', 'answer']
+        sentences = []
+        tokens = 0
+        while tokens < self.settings['synthetic_tokens']:
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(8, 16))]
+            sentence = ' '.join(words).capitalize() + '.'
+            if rng.random() < 0.2:
+                sentence = '- ' + sentence + '\n'
+            sentences.append(sentence)
+            tokens += count_tokens(sentence)
+        return ' '.join(sentences)
+
+    def plan(self, messages, model):
+        """(ttft, [(chunk, seconds to produce it)], error) for one attempt of a model on a prompt"""
+        key = prompt_key(messages)
+        timing = self._timing(model)
+        if self._fails(key, model, timing['failure_rate']):
+            return timing['ttft_seconds'], [], Exception(f"Offline stand-in: simulated 429 rate limit for {model}")
+
+        recorded = self.recordings.get(key, model)
+        if recorded is not None:
+            pieces = recorded['chunks']
+        else:
+            prompt = (messages[-1].get('content') or '') if messages else ''
+            pieces = split_chunks(self._answer_text(prompt, key), self.settings['chunk_tokens'])
+        rate = timing['tokens_per_second']
+        return timing['ttft_seconds'], [(piece, count_tokens(piece) / rate if rate else 0) for piece in pieces], None
+
+    def record(self, messages, model, chunks, ttft, seconds):
+        """Save a live answer for replay"""
+        if not ''.join(chunks).strip():
+            return
+        self.recordings.add({
+            'key': prompt_key(messages),
+            'model': model,
+            'chunks': chunks,
+            'ttft': round(ttft, 3) if ttft is not None else None,
+            'seconds': round(seconds, 3),
+            'recorded_at': time.time(),
+        })
+
+
+# ----- G4F client stand-ins -----
+
+class ReplayClient:
+    """Stand-in for g4f.client.Client that replays answers at the configured pace"""
+
+    def __init__(self, engine=None):
+        self.engine = engine or get_replay_engine()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        ttft, pieces, error = self.engine.plan(messages, model)
+        if not stream:
+            time.sleep(ttft)
+            if error:
+                raise error
+            time.sleep(sum(seconds for _, seconds in pieces))
+            return _completion(''.join(piece for piece, _ in pieces), model)
+        return self._stream(ttft, pieces, error)
+
+    def _stream(self, ttft, pieces, error):
+        time.sleep(ttft)
+        if error:
+            raise error
+        for index, (piece, seconds) in enumerate(pieces):
+            if index:
+                time.sleep(seconds)
+            yield _chunk(piece)
+
+
+class AsyncReplayClient:
+    """Stand-in for g4f.client.AsyncClient that replays answers at the configured pace"""
+
+    def __init__(self, engine=None):
+        self.engine = engine or get_replay_engine()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, stream=False, **kwargs):
+        ttft, pieces, error = self.engine.plan(messages, model)
+        if not stream:
+            await asyncio.sleep(ttft)
+            if error:
+                raise error
+            await asyncio.sleep(sum(seconds for _, seconds in pieces))
+            return _completion(''.join(piece for piece, _ in pieces), model)
+        return self._stream(ttft, pieces, error)
+
+    async def _stream(self, ttft, pieces, error):
+        await asyncio.sleep(ttft)
+        if error:
+            raise error
+        for index, (piece, seconds) in enumerate(pieces):
+            if index:
+                await asyncio.sleep(seconds)
+            yield _chunk(piece)
+
+
+class RecordingClient:
+    """Wraps a live G4F client and saves every completed answer to the recordings file"""
+
+    def __init__(self, client, engine=None):
+        self.client = client
+        self.engine = engine or get_replay_engine()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        started = time.time()
+        response = self.client.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        if not stream:
+            elapsed = time.time() - started
+            self.engine.record(messages, model, [response.choices[0].message.content or ''], elapsed, elapsed)
+            return response
+        return self._stream(response, messages, model, started)
+
+    def _stream(self, response, messages, model, started):
+        chunks = []
+        ttft = None
+        for chunk in response:
+            text = _delta_text(chunk)
+            if text:
+                ttft = time.time() - started if ttft is None else ttft
+                chunks.append(text)
+            yield chunk
+        self.engine.record(messages, model, chunks, ttft, time.time() - started)
+
+
+class AsyncRecordingClient:
+    """Wraps a live G4F AsyncClient and saves every completed answer to the recordings file"""
+
+    def __init__(self, client, engine=None):
+        self.client = client
+        self.engine = engine or get_replay_engine()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, stream=False, **kwargs):
+        started = time.time()
+        response = self.client.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        if inspect.isawaitable(response):
+            response = await response
+        if not stream:
+            elapsed = time.time() - started
+            self.engine.record(messages, model, [response.choices[0].message.content or ''], elapsed, elapsed)
+            return response
+        return self._stream(response, messages, model, started)
+
+    async def _stream(self, response, messages, model, started):
+        chunks = []
+        ttft = None
+        async for chunk in response:
+            text = _delta_text(chunk)
+            if text:
+                ttft = time.time() - started if ttft is None else ttft
+                chunks.append(text)
+            yield chunk
+        self.engine.record(messages, model, chunks, ttft, time.time() - started)
+
+
+def make_llm_client(factory, is_async=False):
+    """G4F client for the gateway or the async streamer: live, recording or replaying"""
+    if not OFFLINE_CONFIG['enabled']:
+        return factory()
+    if OFFLINE_CONFIG['mode'] == 'record':
+        return AsyncRecordingClient(factory()) if is_async else RecordingClient(factory())
+    return AsyncReplayClient() if is_async else ReplayClient()
+
+
+# ----- Webscout stand-ins -----
+
+class ReplayWebscoutProvider:
+    """Stand-in for a Webscout provider: chat/ask return a paced text stream"""
+
+    model = 'webscout'
+
+    def __init__(self, *args, **kwargs):
+        self.engine = get_replay_engine()
+
+    def chat(self, prompt, *args, **kwargs):
+        ttft, pieces, error = self.engine.plan([{'role': 'user', 'content': prompt}], self.model)
+        time.sleep(ttft)
+        if error:
+            raise error
+        return self._stream(pieces)
+
+    ask = chat
+
+    def _stream(self, pieces):
+        for index, (piece, seconds) in enumerate(pieces):
+            if index:
+                time.sleep(seconds)
+            yield piece
+
+
+def _recording_webscout_provider(name, provider_class, method_name):
+    """Provider class that calls the live Webscout provider and records its answers"""
+    engine = get_replay_engine()
+    model = f'webscout/{name}'
+
+    class RecordingWebscoutProvider:
+        def __init__(self, *args, **kwargs):
+            self.provider = provider_class(*args, **kwargs)
+
+        def call(self, prompt, *args, **kwargs):
+            messages = [{'role': 'user', 'content': prompt}]
+            started = time.time()
+            response = getattr(self.provider, method_name)(prompt, *args, **kwargs)
+            if isinstance(response, str) or not hasattr(response, '__iter__'):
+                elapsed = time.time() - started
+                engine.record(messages, model, [str(response)], elapsed, elapsed)
+                return response
+            return self._stream(response, messages, started)
+
+        def _stream(self, response, messages, started):
+            chunks = []
+            ttft = None
+            for chunk in response:
+                ttft = time.time() - started if ttft is None else ttft
+                chunks.append(str(chunk))
+                yield chunk
+            engine.record(messages, model, chunks, ttft, time.time() - started)
+
+    setattr(RecordingWebscoutProvider, method_name, RecordingWebscoutProvider.call)
+    return RecordingWebscoutProvider
+
+
+def offline_webscout_providers(providers):
+    """Chat agent's (name, provider class, method) list with the offline stand-ins applied"""
+    if not OFFLINE_CONFIG['enabled']:
+        return providers
+    if OFFLINE_CONFIG['mode'] == 'record':
+        return [(name, _recording_webscout_provider(name, provider_class, method_name), method_name)
+                for name, provider_class, method_name in providers]
+    return [('Offline', ReplayWebscoutProvider, 'chat')]
+
+
+# ----- Fixture server (transcript pages, oEmbed, webpages) -----
+
+def extract_video_id(url):
+    """Video id of a YouTube URL (or the value itself if it is already an id)"""
+    match = VIDEO_ID_RE.search(url or '')
+    return match.group(1) if match else url
+
+
+def load_video_fixture(video_id):
+    """{'id', 'title', 'author', 'duration', 'segments'} from transcripts/<id>.json (or default.json)"""
+    directory = os.path.join(OFFLINE_CONFIG['fixtures_dir'], 'transcripts')
+    for name in (video_id, 'default'):
+        if not name or os.path.basename(name) != name:
+            continue
+        try:
+            with open(os.path.join(directory, f'{name}.json'), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, list):
+            data = {'segments': data}
+        segments = data.get('segments', [])
+        duration = data.get('duration') or (segments[-1]['start'] + segments[-1].get('duration', 0) if segments else 0)
+        return {
+            'id': video_id,
+            'title': data.get('title', f'Offline video {video_id}'),
+            'author': data.get('author', 'Offline fixtures'),
+            'duration': duration,
+            'segments': segments,
+        }
+    return None
+
+
+def render_transcript_page(video):
+    """HTML in the layout of a youtubetotranscript.com transcript page"""
+    spans = ''.join(
+        f'<span class="transcript-segment" data-start="{segment["start"]}" data-duration="{segment.get("duration", 0)}">'
+        f'<span class="inline NA text-primary-content">{html.escape(segment["text"])}</span></span>\n'
+        for segment in video['segments']
+    )
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(video["title"])}</title></head>'
+            f'<body><h1>{html.escape(video["title"])}</h1><div id="transcript">\n{spans}</div></body></html>')
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Serves /transcript?v=<id>, /oembed?url=<video url> and /pages/<file> from the fixtures directory"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, content_type, body):
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if OFFLINE_CONFIG['fixture_latency_seconds']:
+            time.sleep(OFFLINE_CONFIG['fixture_latency_seconds'])
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        if parsed.path == '/transcript':
+            video = load_video_fixture(query.get('v', [''])[0])
+            if video is None:
+                return self._send(404, 'text/html; charset=utf-8', '<html><body>Transcript not found</body></html>')
+            return self._send(200, 'text/html; charset=utf-8', render_transcript_page(video))
+
+        if parsed.path == '/oembed':
+            video = load_video_fixture(extract_video_id(query.get('url', [''])[0]))
+            if video is None:
+                return self._send(404, 'application/json', '{}')
+            return self._send(200, 'application/json', json.dumps({
+                'title': video['title'], 'author_name': video['author'], 'thumbnail_url': None,
+            }))
+
+        if parsed.path.startswith('/pages/'):
+            root = os.path.realpath(os.path.join(OFFLINE_CONFIG['fixtures_dir'], 'pages'))
+            path = os.path.realpath(os.path.join(root, parsed.path[len('/pages/'):]))
+            if path.startswith(root + os.sep) and os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    body = f.read()
+                content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                if content_type.startswith('text/'):
+                    content_type += '; charset=utf-8'
+                return self._send(200, content_type, body)
+
+        return self._send(404, 'text/plain; charset=utf-8', 'Not found')
+
+
+def start_fixture_server(host=None, port=None):
+    """Serve the fixtures directory on a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((host or OFFLINE_CONFIG['fixture_host'],
+                                  OFFLINE_CONFIG['fixture_port'] if port is None else port), FixtureRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='offline-fixtures', daemon=True).start()
+    print(f"🧪 Offline fixture server on http://{server.server_address[0]}:{server.server_address[1]} "
+          f"({OFFLINE_CONFIG['fixtures_dir']})")
+    return server
+
+
+_fixture_server = None
+_fixture_lock = threading.Lock()
+
+
+def fixture_base_url():
+    """Base URL of the fixture server (started in this process on first use unless fixture_url is set)"""
+    global _fixture_server
+    if OFFLINE_CONFIG['fixture_url']:
+        return OFFLINE_CONFIG['fixture_url'].rstrip('/')
+    if _fixture_server is None:
+        with _fixture_lock:
+            if _fixture_server is None:
+                _fixture_server = start_fixture_server()
+    host, port = _fixture_server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+# ----- Media source (replaces yt-dlp) -----
+
+def _probe_duration(path):
+    try:
+        result = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path],
+                                capture_output=True, text=True, timeout=10)
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return 0
+
+
+class OfflineMediaSource:
+    """Stand-in for TorYouTubeExtractor: resolves YouTube URLs to files in the fixtures media directory"""
+
+    def _media_path(self, video_id):
+        directory = os.path.join(OFFLINE_CONFIG['fixtures_dir'], 'media')
+        for name in (video_id, 'default'):
+            for extension in MEDIA_EXTENSIONS:
+                path = os.path.join(directory, name + extension)
+                if os.path.basename(name) == name and os.path.isfile(path):
+                    return os.path.abspath(path)
+        return None
+
+    def extract_video_info_with_tor(self, video_url, extract_info_only=True, max_retries=3):
+        """yt-dlp style info dict whose stream 'url' is the local media file"""
+        video_id = extract_video_id(video_url)
+        path = self._media_path(video_id)
+        if path is None:
+            raise Exception(f"No offline media fixture for {video_id} in {OFFLINE_CONFIG['fixtures_dir']}/media")
+        video = load_video_fixture(video_id) or {}
+        print(f"🧪 Offline media for {video_id}: {path}")
+        return {
+            'id': video_id,
+            'title': video.get('title', os.path.basename(path)),
+            'duration': _probe_duration(path) or video.get('duration', 0),
+            'uploader': video.get('author', 'Offline fixtures'),
+            'view_count': 0,
+            'thumbnail': None,
+            'description': '',
+            'url': path,
+            'ext': os.path.splitext(path)[1].lstrip('.'),
+        }
+
+    def get_robust_ydl_options_with_tor(self):
+        return {}
+
+    def request_new_tor_circuit(self):
+        return True
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_replay_engine():
+    """Get the process-wide replay engine"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ReplayEngine()
+    return _engine
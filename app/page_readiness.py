@@ -0,0 +1,166 @@
+"""
+Adaptive page readiness for Crawl4AI extraction.
+Instead of a fixed delay, a script injected into the page watches DOM changes and network
+requests and marks the page ready once both have been quiet for a short window, or when
+a hard cap is reached. The cap is learned per domain from how long its pages took to
+settle. Measurement mode logs every page's settle time (and always waits up to the cap).
+"""
+
+import re
+import json
+import time
+import threading
+from urllib.parse import urlparse
+
+from .config import PAGE_READINESS_CONFIG
+from .browser_pool import get_browser_pool
+
+SETTLE_RE = re.compile(r'data-ai-settle-ms="(\d+)"')
+CAPPED_RE = re.compile(r'data-ai-settle-capped="1"')
+
+# Marks the page ready after quiet_ms without DOM content changes or network activity (times in
+# ms since navigation start) and records when that happened on the <html> element
+READINESS_JS = """
+if (!window.__aiReadiness) {
+    const quietMs = %(quiet_ms)d, capMs = %(cap_ms)d;
+    const started = performance.now();
+    const state = window.__aiReadiness = {last: started, inflight: 0, ready: false};
+    const touch = () => { state.last = performance.now(); };
+    new MutationObserver(touch).observe(document.documentElement,
+        {childList: true, subtree: true, characterData: true});
+    try { new PerformanceObserver(touch).observe({type: 'resource'}); } catch (e) {}
+    const originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function () {
+            state.inflight++; touch();
+            return originalFetch.apply(this, arguments).finally(() => { state.inflight--; touch(); });
+        };
+    }
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        state.inflight++; touch();
+        this.addEventListener('loadend', () => { state.inflight--; touch(); });
+        return originalSend.apply(this, arguments);
+    };
+    const check = () => {
+        const now = performance.now();
+        const settled = state.inflight <= 0 && now - state.last >= quietMs && document.readyState !== 'loading';
+        const capped = now >= capMs && now - started >= quietMs;
+        if (settled || capped) {
+            state.ready = true;
+            document.documentElement.setAttribute('data-ai-settle-ms', Math.round(settled ? state.last : now));
+            document.documentElement.setAttribute('data-ai-settle-capped', settled ? '0' : '1');
+        } else {
+            setTimeout(check, 50);
+        }
+    };
+    check();
+}
+"""
+READY_CONDITION = "js:() => !!(window.__aiReadiness && window.__aiReadiness.ready)"
+
+
+def page_domain(url):
+    return urlparse(url).netloc.lower().removeprefix('www.')
+
+
+class PageReadiness:
+    """Per-domain settle-time profiles and the Crawl4AI settings that wait for a page to settle"""
+
+    def __init__(self, settings=None):
+        self.settings = {**PAGE_READINESS_CONFIG, **(settings or {})}
+        self._lock = threading.Lock()
+        self._profiles = {}  # domain -> {'settle_ms': moving average, 'pages', 'capped'}
+
+    def cap_ms(self, url):
+        """Longest wait for a page of this domain: its usual settle time with headroom, within the configured bounds"""
+        settings = self.settings
+        with self._lock:
+            profile = self._profiles.get(page_domain(url))
+        if settings['measure'] or profile is None:
+            return settings['max_wait_ms']
+        learned = profile['settle_ms'] * settings['headroom'] + settings['quiet_ms']
+        return int(min(max(learned, settings['min_cap_ms']), settings['max_wait_ms']))
+
+    def prepare(self, url, run_config):
+        """Copy of a CrawlerRunConfig that waits for the page to settle instead of a fixed delay"""
+        cap_ms = self.cap_ms(url)
+        scripts = run_config.js_code or []
+        if isinstance(scripts, str):
+            scripts = [scripts]
+        monitor = READINESS_JS % {'quiet_ms': self.settings['quiet_ms'], 'cap_ms': cap_ms}
+        return run_config.clone(
+            js_code=[monitor, *scripts],  # The monitor runs before the page's cleanup/scroll script
+            wait_for=READY_CONDITION,
+            wait_for_timeout=cap_ms + self.settings['wait_margin_ms'],
+            delay_before_return_html=0,
+        ), cap_ms
+
+    def observe(self, url, result, cap_ms, seconds):
+        """Learn from a crawled page how long its domain takes to settle"""
+        settings = self.settings
+        match = SETTLE_RE.search(getattr(result, 'html', None) or '')
+        if match is None:
+            return None
+        settle_ms = int(match.group(1))
+        capped = bool(CAPPED_RE.search(result.html))
+        # A capped page settles later than we waited, so the next cap for its domain grows
+        sample = cap_ms * settings['headroom'] if capped else settle_ms
+        domain = page_domain(url)
+        with self._lock:
+            profile = self._profiles.get(domain)
+            if profile is None:
+                profile = self._profiles[domain] = {'settle_ms': float(sample), 'pages': 0, 'capped': 0}
+            else:
+                profile['settle_ms'] += settings['profile_alpha'] * (sample - profile['settle_ms'])
+            profile['pages'] += 1
+            profile['capped'] += capped
+        if settings['measure']:
+            self._log({'time': time.time(), 'url': url, 'domain': domain, 'settle_ms': settle_ms,
+                       'capped': capped, 'cap_ms': cap_ms, 'crawl_seconds': round(seconds, 2)})
+        return settle_ms
+
+    def _log(self, entry):
+        print(f"⏱️ Page settled in {entry['settle_ms']} ms{' (cap reached)' if entry['capped'] else ''}: "
+              f"{entry['url']} (crawl {entry['crawl_seconds']}s)")
+        path = self.settings['measure_log']
+        if not path:
+            return
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            print(f"⚠️ Could not write page settle log: {e}")
+
+    def crawl(self, url, run_config):
+        """Crawl a page on the shared browser, returning as soon as it has settled"""
+        config, cap_ms = self.prepare(url, run_config)
+        started = time.time()
+        result = get_browser_pool().crawl(url, config)
+        self.observe(url, result, cap_ms, time.time() - started)
+        return result
+
+    def get_stats(self):
+        """Learned settle profiles of the most crawled domains"""
+        with self._lock:
+            profiles = sorted(self._profiles.items(), key=lambda item: -item[1]['pages'])[:50]
+            return {
+                'measure': self.settings['measure'],
+                'domains': {domain: {'settle_ms': round(profile['settle_ms']), 'pages': profile['pages'],
+                                     'capped': profile['capped']}
+                            for domain, profile in profiles},
+            }
+
+
+_readiness = None
+_readiness_lock = threading.Lock()
+
+
+def get_page_readiness():
+    """Get the process-wide page readiness profiles"""
+    global _readiness
+    if _readiness is None:
+        with _readiness_lock:
+            if _readiness is None:
+                _readiness = PageReadiness()
+    return _readiness
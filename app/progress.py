@@ -5,8 +5,13 @@ Handles real-time progress tracking with Server-Sent Events (SSE) support.
 
 import json
 import time
+import uuid
 import threading
 from threading import Thread, Event
+from urllib.parse import urlparse, urlunparse
+
+from .llm_metrics import discard_task_metrics
+from .stage_dag import expected_job_seconds
 
 # Progress tracking system for streaming updates
 progress_store = {}
@@ -28,6 +33,11 @@ CONCURRENT_PROCESSING_CONFIG = {
     'enable_concurrent_processing': True  # Feature flag
 }
 
+# Single-flight coalescing: identical requests attach to one in-flight job
+inflight_jobs = {}  # job key -> {'leader': task_id, 'progress': shared progress dict, 'subscribers': set of task_ids}
+task_job_keys = {}  # task_id (leader or attached follower) -> job key
+single_flight_lock = threading.Lock()
+
 class ProgressTracker:
     def __init__(self, task_id):
         self.task_id = task_id
@@ -91,6 +101,7 @@ class ProgressTracker:
             'queue_position': 0,
             'estimated_wait_minutes': 0
         })
+        release_job(self.task_id)
         
         # Mark task as complete in queue and start next
         next_task = complete_current_task(self.task_id)
@@ -106,6 +117,7 @@ class ProgressTracker:
             'queue_position': 0,
             'estimated_wait_minutes': 0
         })
+        release_job(self.task_id)
         
         # Remove from queue and start next
         next_task = complete_current_task(self.task_id)
@@ -122,6 +134,7 @@ class ProgressTracker:
             'estimated_wait_minutes': 0
         })
         cancelled_tasks.add(self.task_id)
+        release_job(self.task_id)
         
         # Remove from queue and start next
         next_task = remove_from_queue(self.task_id)
@@ -155,9 +168,115 @@ def cleanup_progress(task_id, delay=5):
         cancelled_tasks.discard(task_id)
         # Clean up stop signals to free memory
         task_stop_signals.pop(task_id, None)
+        with single_flight_lock:
+            task_job_keys.pop(task_id, None)
+        discard_task_metrics(task_id)
     
     Thread(target=cleanup, daemon=True).start()
 
+def canonical_url(url):
+    """Normalize a URL for job keys (case-insensitive scheme/host, no fragment or trailing slash)"""
+    parsed = urlparse(url.strip())
+    netloc = parsed.netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    return urlunparse((parsed.scheme.lower() or 'https', netloc, parsed.path.rstrip('/') or '/', '', parsed.query, ''))
+
+def make_job_key(operation, target, language='auto', **options):
+    """Key identifying identical jobs: (operation, video_id or canonical URL, language, options)"""
+    option_text = ','.join(f"{name}={options[name]}" for name in sorted(options))
+    return f"{operation}|{target}|{language}|{option_text}"
+
+def _attach(job_key):
+    """Attach a new subscriber to an unfinished job (caller holds single_flight_lock)"""
+    job = inflight_jobs.get(job_key)
+    if not job or job['progress'].get('completed', False):
+        return None
+    follower_id = str(uuid.uuid4())
+    # The follower's entry is the job's own progress dict, so every update reaches both streams
+    progress_store[follower_id] = job['progress']
+    task_job_keys[follower_id] = job_key
+    job['subscribers'].add(follower_id)
+    print(f"🔗 SINGLE-FLIGHT: Task {follower_id} attached to in-flight job {job['leader']} ({len(job['subscribers'])} subscribers)")
+    return follower_id
+
+def attach_to_job(job_key):
+    """Return a task_id attached to the identical in-flight job, or None if there is none"""
+    with single_flight_lock:
+        return _attach(job_key)
+
+def start_or_attach_job(job_key):
+    """Start a new job for job_key or attach to the identical one already in flight.
+    
+    Returns (task_id, tracker, attached). A new job gets a ProgressTracker; an attached
+    request gets its own task_id whose progress entry is the in-flight job's progress dict,
+    so /progress/<task_id> streams the shared job and it can be cancelled independently.
+    """
+    with single_flight_lock:
+        follower_id = _attach(job_key)
+        if follower_id:
+            return follower_id, None, True
+        
+        task_id = str(uuid.uuid4())
+        tracker = ProgressTracker(task_id)
+        inflight_jobs[job_key] = {'leader': task_id, 'progress': tracker.progress, 'subscribers': {task_id}}
+        task_job_keys[task_id] = job_key
+        return task_id, tracker, False
+
+def release_job(task_id):
+    """Stop accepting new subscribers once the job's leader finishes"""
+    with single_flight_lock:
+        job_key = task_job_keys.get(task_id)
+        job = inflight_jobs.get(job_key)
+        if job and job['leader'] == task_id:
+            inflight_jobs.pop(job_key, None)
+
+def detach_from_job(task_id):
+    """Detach one subscriber from a shared job without stopping it for the others.
+    
+    Returns True if the task was detached, False if it is the job's last subscriber
+    (the caller should then cancel the job itself).
+    """
+    with single_flight_lock:
+        job_key = task_job_keys.get(task_id)
+        job = inflight_jobs.get(job_key)
+        if not job or task_id not in job['subscribers'] or len(job['subscribers']) <= 1:
+            return False
+        job['subscribers'].discard(task_id)
+        # Give the detached subscriber its own finished entry so its stream ends
+        progress_store[task_id] = {
+            **job['progress'],
+            'status': 'cancelled',
+            'message': 'Task cancelled by user',
+            'completed': True,
+            'cancelled': True
+        }
+        print(f"🔗 SINGLE-FLIGHT: Task {task_id} detached from job {job['leader']} ({len(job['subscribers'])} subscribers remain)")
+        return True
+
+def get_job_leader(task_id):
+    """Task id that actually runs the job behind task_id (itself unless it is an attached follower)"""
+    with single_flight_lock:
+        job = inflight_jobs.get(task_job_keys.get(task_id))
+        return job['leader'] if job else task_id
+
+def get_job_subscriber_count(task_id):
+    """Number of requests sharing the job behind task_id (1 if it is not shared)"""
+    with single_flight_lock:
+        job = inflight_jobs.get(task_job_keys.get(task_id))
+        return len(job['subscribers']) if job else 1
+
+def get_active_task_ids():
+    """Task ids of unfinished jobs, counting each coalesced job once"""
+    seen = set()
+    active = []
+    for task_id, progress in list(progress_store.items()):
+        if progress.get('completed', False) or id(progress) in seen:
+            continue
+        seen.add(id(progress))
+        active.append(task_id)
+    return active
+
 def add_to_queue(task_id):
     """Add task to processing queue with concurrent processing support"""
     global processing_queue, active_processing_tasks
@@ -237,12 +356,14 @@ def get_estimated_wait_time(task_id):
     # With concurrent processing, estimate based on available slots
     config = CONCURRENT_PROCESSING_CONFIG
     if config['enable_concurrent_processing']:
-        # Estimate 2 minutes per task for concurrent processing (faster turnaround)
-        avg_task_time = 2
+        # Use the recorded stage timings of this job type, else 2 minutes per task
+        job_type = task_job_keys.get(task_id, '').split('|', 1)[0]
+        expected_seconds = expected_job_seconds(job_type) if job_type else None
+        avg_task_time = expected_seconds / 60 if expected_seconds else 2
         concurrent_slots = config['max_concurrent_tasks']
         
         # Calculate wait time based on position and available slots
-        wait_time = max(1, (position * avg_task_time) // concurrent_slots)
+        wait_time = max(1, int(position * avg_task_time // concurrent_slots))
         return wait_time
     else:
         # Single task processing - 3 minutes per task
@@ -406,6 +527,15 @@ def generate_progress_stream(task_id):
 
 def cancel_task_by_id(task_id):
     """Cancel a running task by ID - INSTANT signal, no polling!"""
+    # Other requests still share this job: only this subscriber stops listening
+    if detach_from_job(task_id):
+        return True
+    leader_id = get_job_leader(task_id)
+    if leader_id != task_id:
+        # Last subscriber of a shared job: stop the task that runs it
+        cancelled_tasks.add(leader_id)
+        if leader_id in task_stop_signals:
+            task_stop_signals[leader_id].set()
     if task_id in progress_store:
         # Mark as cancelled in the cancelled_tasks set
         cancelled_tasks.add(task_id)
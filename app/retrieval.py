@@ -0,0 +1,205 @@
+"""
+Per-session retrieval over extracted page content and video transcripts.
+The page is split once into chunks (on paragraph/sentence boundaries) and indexed with
+BM25; each chat question then gets the best-matching chunks that fit its token budget,
+in page order, instead of always the head of the page. Video transcripts are indexed as
+time windows whose lines carry [m:ss] markers, so answers can cite where things are said.
+"""
+
+import re
+import numpy as np
+
+from .config import RETRIEVAL_CONFIG
+from .map_reduce import split_text
+from .token_budget import count_tokens, chars_per_token
+
+TOKEN_RE = re.compile(r'\w+')
+TIME_RE = re.compile(r'\b(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\b')  # 5:30 or 1:05:30 in a question
+ARABIC_ARTICLE = 'ال'  # "al-" prefix
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'of', 'to', 'in', 'on', 'at', 'for', 'with', 'by', 'from',
+    'is', 'are', 'was', 'were', 'be', 'been', 'it', 'its', 'this', 'that', 'these', 'those', 'as',
+    'what', 'which', 'who', 'how', 'why', 'when', 'where', 'does', 'do', 'did', 'can', 'could', 'about',
+    'page', 'article', 'tell', 'me', 'please', 'say', 'says', 'i', 'you', 'we', 'they', 'there',
+    'في', 'من', 'على', 'إلى', 'عن',
+    'ما', 'هذا', 'هذه', 'التي',
+    'الذي', 'هل', 'كيف', 'لماذا',
+}  # Arabic: in, from, on, to, about, what, this (m/f), which (f/m), is?, how, why
+
+
+def _format_time(seconds):
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def terms(text):
+    """Index terms of a text: lowercased words without stopwords, with light English/Arabic stemming"""
+    result = []
+    for word in TOKEN_RE.findall(text.lower()):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 4 and word.startswith(ARABIC_ARTICLE):
+            word = word[2:]
+        elif len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        result.append(word)
+    return result
+
+
+class BM25Index:
+    """BM25 index over the chunks of one page"""
+
+    def __init__(self, text, settings=None):
+        self.settings = {**RETRIEVAL_CONFIG, **(settings or {})}
+        chunk_chars = max(int(self.settings['chunk_tokens'] * chars_per_token(text)), 200)
+        self._build(split_text(text, chunk_chars))
+
+    def _build(self, chunks):
+        self.chunks = chunks
+        self.chunk_tokens = np.array([count_tokens(chunk) for chunk in self.chunks])
+
+        postings = {}  # term -> {chunk index: term frequency}
+        lengths = []
+        for index, chunk in enumerate(self.chunks):
+            chunk_terms = terms(chunk)
+            lengths.append(len(chunk_terms))
+            for term in chunk_terms:
+                counts = postings.setdefault(term, {})
+                counts[index] = counts.get(index, 0) + 1
+        self.lengths = np.array(lengths, dtype=float)
+        average = self.lengths.mean() if lengths else 1.0
+        self._norm = 1 - self.settings['b'] + self.settings['b'] * self.lengths / (average or 1.0)
+        total = len(self.chunks)
+        self.postings = {
+            term: (np.fromiter(counts.keys(), dtype=int), np.fromiter(counts.values(), dtype=float),
+                   np.log(1 + (total - len(counts) + 0.5) / (len(counts) + 0.5)))
+            for term, counts in postings.items()
+        }
+
+    def scores(self, query):
+        """BM25 score of every chunk for a query"""
+        k1 = self.settings['k1']
+        scores = np.zeros(len(self.chunks))
+        for term in set(terms(query)):
+            if term not in self.postings:
+                continue
+            chunk_ids, frequencies, idf = self.postings[term]
+            scores[chunk_ids] += idf * frequencies * (k1 + 1) / (frequencies + k1 * self._norm[chunk_ids])
+        return scores
+
+    def select(self, query, max_tokens):
+        """Best-matching chunks for a query within max_tokens, joined in page order.
+
+        Returns None if no chunk matches the query (callers then fall back to the page head).
+        """
+        scores = self.scores(query)
+        if not len(scores) or scores.max() <= 0:
+            return None
+        separator_tokens = 3
+        chosen = []
+        used = 0
+        if self.settings['include_first_chunk'] and self.chunk_tokens[0] <= max_tokens / 4:
+            # The opening usually names what the page is about
+            chosen.append(0)
+            used += self.chunk_tokens[0] + separator_tokens
+        matched = 0
+        for index in np.argsort(-scores, kind='stable'):
+            if scores[index] <= 0:
+                break
+            if index in chosen:
+                matched += 1
+                continue
+            if used + self.chunk_tokens[index] + separator_tokens > max_tokens:
+                continue
+            chosen.append(int(index))
+            used += self.chunk_tokens[index] + separator_tokens
+            matched += 1
+        if not matched:
+            return None
+        return '\n\n[...]\n\n'.join(self.chunks[index] for index in sorted(chosen))
+
+    def head(self, max_tokens):
+        """Leading chunks within max_tokens (for questions that match nothing)"""
+        chosen = []
+        used = 0
+        for chunk, tokens in zip(self.chunks, self.chunk_tokens):
+            if chosen and used + tokens > max_tokens:
+                break
+            chosen.append(chunk)
+            used += tokens
+        return '\n\n'.join(chosen)
+
+
+class TranscriptIndex(BM25Index):
+    """BM25 index over time windows of a timestamped transcript.
+
+    Each window is a few lines starting with [m:ss] markers. A question that names a
+    time ("what happens at 12:30?") also matches the window covering that time.
+    """
+
+    def __init__(self, segments, settings=None):
+        # The video summary is sent with every question, so the opening window is not forced in
+        self.settings = {**RETRIEVAL_CONFIG, 'include_first_chunk': False, **(settings or {})}
+        window_seconds = self.settings['window_seconds']
+        line_seconds = self.settings['line_seconds']
+
+        chunks, starts, lines, words = [], [], [], []
+        window_start = line_start = None
+        for seg in segments:
+            text = seg.get('text', '').strip()
+            if not text:
+                continue
+            if window_start is not None and seg['start'] - window_start >= window_seconds:
+                lines.append(f"[{_format_time(line_start)}] {' '.join(words)}")
+                chunks.append('\n'.join(lines))
+                starts.append(window_start)
+                lines, words = [], []
+                window_start = None
+            if window_start is None:
+                window_start = line_start = seg['start']
+            elif seg['start'] - line_start >= line_seconds:
+                lines.append(f"[{_format_time(line_start)}] {' '.join(words)}")
+                words = []
+                line_start = seg['start']
+            words.append(text)
+        if words:
+            lines.append(f"[{_format_time(line_start)}] {' '.join(words)}")
+            chunks.append('\n'.join(lines))
+            starts.append(window_start)
+
+        self.window_starts = np.array(starts, dtype=float)
+        self._build(chunks)
+
+    def scores(self, query):
+        scores = super().scores(query)
+        if not len(scores):
+            return scores
+        for hours, minutes, secs in TIME_RE.findall(query):
+            seconds = int(hours or 0) * 3600 + int(minutes) * 60 + int(secs)
+            window = max(int(np.searchsorted(self.window_starts, seconds, side='right')) - 1, 0)
+            scores[window] = max(scores.max(), 0) + 1
+        return scores
+
+
+def pack_segments(segments):
+    """Transcript segments as compact text (one 'start end text' line each) for storing with a session"""
+    return '\n'.join(f"{seg['start']:.2f} {seg.get('end', seg['start']):.2f} {' '.join(seg.get('text', '').split())}"
+                     for seg in segments)
+
+
+def unpack_segments(packed):
+    """Segments from pack_segments() text ([] for an empty text)"""
+    segments = []
+    for line in (packed or '').splitlines():
+        start, end, text = line.split(' ', 2)
+        segments.append({'start': float(start), 'end': float(end), 'text': text})
+    return segments
+
+
+def build_transcript_index(transcript, segments=None):
+    """Timestamped window index if the transcript segments are known, else a plain chunk index"""
+    if segments:
+        return TranscriptIndex(segments)
+    return BM25Index(transcript)
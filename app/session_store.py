@@ -0,0 +1,480 @@
+"""
+Bounded session stores shared by all workers.
+Chat and video chat sessions are kept in a dict-like store with a byte budget, LRU and
+idle-TTL eviction. Large texts (page content, transcripts, summaries) are interned by
+hash so sessions on the same page or video share one copy, and objects derived from a
+text (such as its retrieval index) are shared the same way.
+
+Behind the memory tier, sessions are written to a SQLite file on the node (zlib-compressed
+JSON, each large text stored once by hash), so any gunicorn worker can serve a session
+another worker created without refetching the page or transcript.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from .config import SESSION_STORE_CONFIG
+
+_stores = {}  # name -> SessionStore, for the admin endpoint
+_stores_lock = threading.Lock()
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8'))
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class SQLiteSessionTier:
+    """Sessions of one store in a SQLite file shared by the workers of a node.
+
+    Rows hold the compressed session without its large texts, which live once per hash in
+    a contents table. Each save gets a new version so workers notice sessions that another
+    worker changed.
+    """
+
+    def __init__(self, path, store_name, ttl_seconds=None):
+        self.path = path
+        self.store_name = store_name
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._last_sweep = time.time()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sessions (store TEXT, id TEXT, data BLOB, contents TEXT, "
+                       "version TEXT, updated_at REAL, PRIMARY KEY (store, id))")
+            db.execute("CREATE TABLE IF NOT EXISTS contents (digest TEXT PRIMARY KEY, text BLOB)")
+
+    def _connect(self):
+        # One connection per thread and process (connections must not cross a gunicorn fork)
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _oldest_live(self):
+        """updated_at before which a row has expired (rows stay until the next sweep)"""
+        return time.time() - self.ttl_seconds if self.ttl_seconds else 0
+
+    def version(self, key, live=False):
+        """Current version of a session (with live=True, None once it has expired)"""
+        row = self._connect().execute("SELECT version FROM sessions WHERE store = ? AND id = ? AND updated_at >= ?",
+                                      (self.store_name, key, self._oldest_live() if live else 0)).fetchone()
+        return row[0] if row else None
+
+    def load(self, key):
+        """(session, version) or None"""
+        db = self._connect()
+        row = db.execute("SELECT data, contents, version FROM sessions WHERE store = ? AND id = ? AND updated_at >= ?",
+                         (self.store_name, key, self._oldest_live())).fetchone()
+        if row is None:
+            return None
+        value = _unpack(row[0])
+        for field, digest in json.loads(row[1]).items():
+            text = db.execute("SELECT text FROM contents WHERE digest = ?", (digest,)).fetchone()
+            if text is None:
+                return None  # Swept while the session row was being read
+            value[field] = zlib.decompress(text[0]).decode('utf-8')
+        return value, row[2]
+
+    def save(self, key, value, contents, transient_fields):
+        """Write a session; contents maps field -> digest of the large texts stored separately"""
+        if isinstance(value, dict):
+            data = {field: item for field, item in value.items() if field not in contents and field not in transient_fields}
+        else:
+            data = value
+        version = os.urandom(8).hex()
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for field, digest in contents.items():
+                # Texts are immutable per digest: only compress ones the file does not have yet
+                if db.execute("SELECT 1 FROM contents WHERE digest = ?", (digest,)).fetchone() is None:
+                    db.execute("INSERT INTO contents (digest, text) VALUES (?, ?)",
+                               (digest, zlib.compress(value[field].encode('utf-8', 'surrogatepass'))))
+            db.execute("INSERT OR REPLACE INTO sessions (store, id, data, contents, version, updated_at) "
+                       "VALUES (?, ?, ?, ?, ?, ?)",
+                       (self.store_name, key, _pack(data), json.dumps(contents), version, time.time()))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if self.ttl_seconds and time.time() - self._last_sweep > min(self.ttl_seconds, 600):
+            self.sweep()
+        return version
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM sessions WHERE store = ? AND id = ?", (self.store_name, key))
+
+    def sweep(self):
+        """Drop sessions idle past the TTL and texts no session refers to any more"""
+        self._last_sweep = time.time()
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            expired = db.execute("DELETE FROM sessions WHERE store = ? AND updated_at < ?",
+                                 (self.store_name, time.time() - self.ttl_seconds)).rowcount
+            used = set()
+            for (contents,) in db.execute("SELECT contents FROM sessions"):
+                used.update(json.loads(contents).values())
+            unused = [digest for (digest,) in db.execute("SELECT digest FROM contents") if digest not in used]
+            db.executemany("DELETE FROM contents WHERE digest = ?", [(digest,) for digest in unused])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if expired or unused:
+            print(f"🧹 Session store '{self.store_name}' swept {expired} idle sessions and {len(unused)} texts")
+
+
+def estimate_bytes(value, skip=(), seen=None):
+    """Approximate memory held by a value and everything it references (objects in skip are not counted)"""
+    if seen is None:
+        seen = set()
+    if id(value) in seen or id(value) in skip:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_bytes(k, skip, seen) + estimate_bytes(v, skip, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_bytes(item, skip, seen) for item in value)
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        size += estimate_bytes(vars(value), skip, seen)
+    return size
+
+
+class SessionStore(MutableMapping):
+    """Dict of session id -> session data with LRU/TTL eviction under a byte budget.
+
+    Callers that change a session in place (e.g. a new chat turn) call save() with it, which
+    re-measures it and lets other workers see the change; a worker compares its copy with
+    the shared tier at most every refresh_seconds. A session evicted from memory is
+    reloaded from the shared tier on its next use. Shared tier queries run outside the
+    store's lock, so a slow database only delays the request that needs it. Iteration and
+    len() cover this worker's memory only.
+    """
+
+    def __init__(self, name, settings=None):
+        self.name = name
+        self.settings = {**SESSION_STORE_CONFIG, **(settings or {})}
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # session id -> data, least recently used first
+        self._meta = {}  # session id -> {'touched', 'bytes', 'contents', 'version'}
+        self._contents = {}  # digest -> {'text', 'refs', 'bytes', 'derived'}
+        self._shared_ids = {}  # id() of interned texts and derived objects -> digest
+        self._checked = {}  # session id -> monotonic time this worker last compared it with the shared tier
+        self._session_bytes = 0
+        self._content_bytes = 0
+        self._stats = {'evicted_lru': 0, 'evicted_ttl': 0, 'intern_hits': 0, 'derived_hits': 0,
+                       'shared_loads': 0, 'shared_errors': 0, 'resaved_evicted': 0}
+        self._tier = None
+        if self.settings['persist_path']:
+            try:
+                self._tier = SQLiteSessionTier(self.settings['persist_path'], name, self.settings['ttl_seconds'])
+            except sqlite3.Error as e:
+                print(f"⚠️ Session store '{name}' shared tier disabled, sessions stay in this worker: {e}")
+        with _stores_lock:
+            _stores[name] = self
+
+    # ----- Mapping interface -----
+
+    def __getitem__(self, key):
+        self._refresh(key)
+        with self._lock:
+            value = self._entries[key]
+            self._entries.move_to_end(key)
+            self._meta[key]['touched'] = time.time()
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._insert(key, value)
+            pending = self._pending_write(key)
+            self._enforce()
+        self._write(key, pending)
+
+    def __delitem__(self, key):
+        with self._lock:
+            found = key in self._entries
+            if found:
+                self._remove(key)
+        if self._tier is not None:
+            found = found or self._shared(lambda: self._tier.version(key) is not None, False)
+            self._shared(lambda: self._tier.delete(key))
+        if not found:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        self._refresh(key)  # Loads a session another worker created; it is usually read right after
+        with self._lock:
+            return key in self._entries
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def save(self, key, value=None):
+        """Write a session changed in place (e.g. a new chat turn) to the shared tier.
+
+        Pass the session the caller changed: if it was evicted (or replaced by a reload)
+        since the caller read it, it is stored again instead of the change being lost.
+        """
+        with self._lock:
+            current = self._entries.get(key)
+            if value is None:
+                value = current
+            if value is None:
+                return
+            if current is value:
+                self._measure(key)
+            else:
+                if current is None:
+                    self._stats['resaved_evicted'] += 1
+                    print(f"♻️ Session store '{self.name}' stored session {key} again after it was evicted")
+                self._insert(key, value)
+            pending = self._pending_write(key)
+            self._enforce()
+        self._write(key, pending)
+
+    # ----- Shared tier -----
+
+    def _shared(self, operation, default=None):
+        """Run a shared tier operation; on a database error the worker carries on with its memory"""
+        try:
+            return operation()
+        except sqlite3.Error as e:
+            self._stats['shared_errors'] += 1
+            print(f"⚠️ Session store '{self.name}' shared tier error: {e}")
+            return default
+
+    def _pending_write(self, key):
+        """Copy what _write() needs of a session (called with the lock held)"""
+        if self._tier is None:
+            return None
+        value = self._entries[key]
+        self._checked[key] = time.monotonic()
+        meta = self._meta[key]
+        return meta, dict(value) if isinstance(value, dict) else value, dict(meta['contents'])
+
+    def _write(self, key, pending):
+        """Save a session to the shared tier (called without the lock)"""
+        if pending is None:
+            return
+        meta, value, contents = pending
+        version = self._shared(lambda: self._tier.save(key, value, contents, self.settings['transient_fields']))
+        with self._lock:
+            meta['version'] = version
+
+    def _due_check(self, key):
+        """True (and noted) if the shared tier was not consulted for this session in the last refresh_seconds"""
+        now = time.monotonic()
+        checked = self._checked.get(key)
+        if checked is not None and now - checked < self.settings['refresh_seconds']:
+            return False
+        if len(self._checked) > 2 * max(len(self._entries), 1000):
+            horizon = now - self.settings['refresh_seconds']
+            self._checked = {other: at for other, at in self._checked.items() if at >= horizon}
+        self._checked[key] = now
+        return True
+
+    def _refresh(self, key):
+        """Drop a session idle past the TTL, then load it if another worker created or changed it.
+
+        The shared tier is queried without the lock; the result is only applied if this worker
+        did not write or reload the session in the meantime.
+        """
+        with self._lock:
+            if self._expired(key, time.time()):
+                self._remove(key)
+                self._stats['evicted_ttl'] += 1
+            if self._tier is None or not self._due_check(key):
+                return
+            meta = self._meta.get(key)
+            known = meta['version'] if meta is not None else None
+        if meta is not None:
+            if known is None:
+                return  # Its first write has not finished yet
+            version = self._shared(lambda: self._tier.version(key), known)
+            if version == known:
+                return
+        if meta is not None and version is None:
+            loaded = None  # Cleared by another worker
+        else:
+            loaded = self._shared(lambda: self._tier.load(key))
+            if loaded is None:
+                return
+        with self._lock:
+            if self._meta.get(key) is not meta or (meta is not None and meta['version'] != known):
+                return
+            if loaded is None:
+                self._remove(key)
+                return
+            value, version = loaded
+            self._insert(key, value)
+            self._meta[key]['version'] = version
+            self._stats['shared_loads'] += 1
+            self._enforce()
+
+    # ----- Interning -----
+
+    def derived(self, text, name, factory):
+        """Object built from an interned text (e.g. its retrieval index), shared by all sessions holding that text"""
+        with self._lock:
+            digest = self._shared_ids.get(id(text))
+            record = self._contents.get(digest)
+            if record is None or record['text'] is not text:
+                return factory()
+            if name in record['derived']:
+                self._stats['derived_hits'] += 1
+                return record['derived'][name]
+        value = factory()  # Built outside the lock; a concurrent build of the same object is simply dropped
+        with self._lock:
+            record = self._contents.get(digest)
+            if record is None:
+                return value
+            if name not in record['derived']:
+                record['derived'][name] = value
+                size = estimate_bytes(value, skip=self._shared_ids)
+                record['bytes'] += size
+                self._content_bytes += size
+                self._shared_ids[id(value)] = digest
+            return record['derived'][name]
+
+    def _intern(self, text):
+        digest = _digest(text)
+        record = self._contents.get(digest)
+        if record is None:
+            record = self._contents[digest] = {'text': text, 'refs': 0, 'bytes': sys.getsizeof(text), 'derived': {}}
+            self._content_bytes += record['bytes']
+            self._shared_ids[id(text)] = digest
+        else:
+            self._stats['intern_hits'] += 1
+        record['refs'] += 1
+        return digest, record['text']
+
+    def _release(self, digest):
+        record = self._contents[digest]
+        record['refs'] -= 1
+        if record['refs'] <= 0:
+            del self._contents[digest]
+            self._content_bytes -= record['bytes']
+            for shared in [record['text'], *record['derived'].values()]:
+                self._shared_ids.pop(id(shared), None)
+
+    # ----- Accounting and eviction -----
+
+    def _insert(self, key, value):
+        previous = self._meta.pop(key, None)
+        if previous is not None:
+            del self._entries[key]
+            self._session_bytes -= previous['bytes']
+        self._entries[key] = value
+        self._meta[key] = {'touched': time.time(), 'bytes': 0, 'contents': {}, 'version': None}
+        self._measure(key)
+        if previous is not None:
+            # Released after the new data is interned, so a shared text and its derived objects survive
+            for digest in previous['contents'].values():
+                self._release(digest)
+
+    def _measure(self, key):
+        value = self._entries[key]
+        meta = self._meta[key]
+        contents = {}
+        if isinstance(value, dict):
+            history = value.get('chat_history')
+            if isinstance(history, list) and len(history) > self.settings['max_history_turns']:
+                del history[:-self.settings['max_history_turns']]
+            for field in self.settings['intern_fields']:
+                text = value.get(field)
+                if not isinstance(text, str) or len(text) < self.settings['intern_min_chars']:
+                    continue
+                digest = self._shared_ids.get(id(text))
+                if digest in self._contents and self._contents[digest]['text'] is text:
+                    self._contents[digest]['refs'] += 1
+                else:
+                    digest, value[field] = self._intern(text)
+                contents[field] = digest
+        for digest in meta['contents'].values():
+            self._release(digest)
+        meta['contents'] = contents
+        size = estimate_bytes(value, skip=self._shared_ids)
+        self._session_bytes += size - meta['bytes']
+        meta['bytes'] = size
+
+    def _expired(self, key, now):
+        ttl = self.settings['ttl_seconds']
+        meta = self._meta.get(key)
+        return bool(ttl) and meta is not None and now - meta['touched'] > ttl
+
+    def _remove(self, key):
+        del self._entries[key]
+        self._checked.pop(key, None)
+        meta = self._meta.pop(key)
+        self._session_bytes -= meta['bytes']
+        for digest in meta['contents'].values():
+            self._release(digest)
+
+    def _enforce(self):
+        now = time.time()
+        for key in list(self._entries):
+            if self._expired(key, now):
+                self._remove(key)
+                self._stats['evicted_ttl'] += 1
+        max_bytes = self.settings['max_bytes']
+        max_entries = self.settings['max_entries']
+        # The newest session is never evicted, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+                (max_bytes and self._session_bytes + self._content_bytes > max_bytes)
+                or (max_entries and len(self._entries) > max_entries)):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._stats['evicted_lru'] += 1
+            print(f"🧹 Session store '{self.name}' evicted least recently used session {key}")
+
+    def get_stats(self):
+        """Entry count, memory use and eviction/interning counters (sizes are estimates)"""
+        with self._lock:
+            self._enforce()
+            shared = [record for record in self._contents.values() if record['refs'] > 1]
+            return {
+                'entries': len(self._entries),
+                'bytes': self._session_bytes + self._content_bytes,
+                'session_bytes': self._session_bytes,
+                'content_bytes': self._content_bytes,
+                'interned_contents': len(self._contents),
+                'shared_contents': len(shared),
+                'bytes_saved_by_interning': sum((record['refs'] - 1) * record['bytes'] for record in shared),
+                'max_bytes': self.settings['max_bytes'],
+                'max_entries': self.settings['max_entries'],
+                'ttl_seconds': self.settings['ttl_seconds'],
+                'shared_tier': self._tier.path if self._tier is not None else None,
+                **self._stats,
+            }
+
+
+def get_session_store_stats():
+    """Stats of every session store in this worker, by store name"""
+    with _stores_lock:
+        stores = dict(_stores)
+    return {name: store.get_stats() for name, store in stores.items()}
@@ -0,0 +1,138 @@
+"""
+In-job stage DAG executor.
+Runs the stages of a single job (video metadata, transcript, stream resolution, ...) as
+soon as the stages they depend on have finished, so independent I/O overlaps instead of
+running in sequence. A failed stage or a cancelled task stops the stages that have not
+started yet and waits for the running ones. Stage timings are kept per job type and feed
+the queue wait estimate.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .llm_metrics import bind_llm_context
+
+STATS_ALPHA = 0.3  # Weight of the newest run in the per-stage moving averages
+
+_stage_stats = {}  # job type -> {stage name: {'seconds': moving average, 'runs': n, 'depends_on': [...]}}
+_stats_lock = threading.Lock()
+
+
+class StageCancelled(Exception):
+    """The task was cancelled while its stages were running"""
+
+
+class StageGraph:
+    """Stages of one job with their dependencies.
+
+    Each stage function receives a dict of the results of the stages finished so far.
+    run() returns all results, raises the first error of a stage, or raises
+    StageCancelled when the task is stopped.
+    """
+
+    def __init__(self, job_type, progress=None, max_workers=4):
+        self.job_type = job_type
+        self.progress = progress
+        self.max_workers = max_workers
+        self.stages = {}  # name -> (function, dependencies)
+        self.timings = {}  # name -> (start offset, seconds)
+
+    def add(self, name, function, depends_on=()):
+        for dependency in depends_on:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self.stages[name] = (function, tuple(depends_on))
+        return self
+
+    def _cancelled(self):
+        return bool(self.progress) and self.progress.is_cancelled()
+
+    def _timed(self, name, function, results, started):
+        stage_start = time.time()
+        try:
+            return function(results)
+        finally:
+            self.timings[name] = (stage_start - started, time.time() - stage_start)
+
+    def run(self):
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        started = time.time()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f'{self.job_type}-stage')
+        try:
+            while pending or running:
+                if self._cancelled():
+                    raise StageCancelled(f"{self.job_type} cancelled")
+                for name, (function, depends_on) in list(pending.items()):
+                    if all(dependency in results for dependency in depends_on):
+                        del pending[name]
+                        # Stages keep the job's LLM metric labels in their worker threads
+                        task = bind_llm_context(self._timed)
+                        running[executor.submit(task, name, function, dict(results), started)] = name
+                if not running:
+                    raise ValueError(f"Stages {', '.join(pending)} of {self.job_type} can never run (dependency cycle)")
+                # Short timeout so a stop request is noticed while long stages run
+                done, _ = wait(running, timeout=0.25, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()  # Re-raises the stage's error
+        finally:
+            # Stages that have not started are dropped. Running ones are waited for, so the job's
+            # temp files and processing slot are not released under them (long stages check for
+            # cancellation and stop quickly)
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._report(time.time() - started, complete=not pending and not running)
+        return results
+
+    def _report(self, total, complete):
+        summary = ', '.join(f"{name} {offset:.1f}+{seconds:.1f}s" for name, (offset, seconds) in self.timings.items())
+        print(f"⏱️ {self.job_type} stages ({total:.1f}s{'' if complete else ', stopped'}): {summary}")
+        if complete:
+            record_stage_timings(self.job_type, {name: seconds for name, (_, seconds) in self.timings.items()},
+                                 {name: depends_on for name, (_, depends_on) in self.stages.items()})
+
+
+def record_stage_timings(job_type, seconds, dependencies):
+    """Fold the stage durations of a finished run into the job type's moving averages"""
+    with _stats_lock:
+        stats = _stage_stats.setdefault(job_type, {})
+        for name, value in seconds.items():
+            entry = stats.get(name)
+            if entry is None:
+                entry = stats[name] = {'seconds': value, 'runs': 0}
+            else:
+                entry['seconds'] += STATS_ALPHA * (value - entry['seconds'])
+            entry['runs'] += 1
+            entry['depends_on'] = list(dependencies.get(name, ()))
+
+
+def expected_job_seconds(job_type):
+    """Expected duration of a job type's stages: the longest dependency chain (None if never run)"""
+    with _stats_lock:
+        stats = {name: dict(entry) for name, entry in _stage_stats.get(job_type, {}).items()}
+    if not stats:
+        return None
+
+    finish = {}
+
+    def finish_time(name, seen=()):
+        if name not in finish:
+            entry = stats.get(name)
+            if entry is None or name in seen:
+                return 0.0
+            finish[name] = entry['seconds'] + max(
+                (finish_time(dependency, seen + (name,)) for dependency in entry['depends_on']), default=0.0)
+        return finish[name]
+
+    return max(finish_time(name) for name in stats)
+
+
+def get_stage_stats():
+    """Moving-average stage durations per job type (for the debug endpoint)"""
+    with _stats_lock:
+        return {job_type: {name: {'seconds': round(entry['seconds'], 2), 'runs': entry['runs'],
+                                  'depends_on': entry['depends_on']}
+                           for name, entry in stats.items()}
+                for job_type, stats in _stage_stats.items()}
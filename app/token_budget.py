@@ -0,0 +1,168 @@
+"""
+Token accounting and prompt budget planning.
+Counts tokens with a local BPE tokenizer (tiktoken) when installed, otherwise with a
+script-aware estimate, and sizes the content and history parts of a prompt so that it
+fits the context window of the models it may be sent to.
+"""
+
+import re
+import threading
+
+from .config import MODEL_CONFIGS, TOKEN_BUDGET_CONFIG
+
+# Import tiktoken with fallback
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    print("⚠️ tiktoken not available - using estimated token counts")
+
+# Arabic, Syriac, Thaana and Arabic presentation forms tokenize at ~2.5 chars per token,
+# CJK at ~1 char per token and Latin text at ~4 chars per token
+ARABIC_RE = re.compile(r'[\u0600-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
+CJK_RE = re.compile(r'[\u3040-\u30FF\u3400-\u4DBF\u4E00-\u9FFF\uAC00-\uD7AF]')
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """Load the BPE encoding once (returns None if tiktoken is missing or cannot load it)"""
+    global _encoding, _encoding_failed
+    if not TIKTOKEN_AVAILABLE or _encoding_failed:
+        return None
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    _encoding = tiktoken.get_encoding(TOKEN_BUDGET_CONFIG['encoding'])
+                except Exception as e:
+                    # The encoding file is downloaded on first use and may be unavailable offline
+                    print(f"⚠️ Could not load {TOKEN_BUDGET_CONFIG['encoding']} encoding, estimating tokens: {e}")
+                    _encoding_failed = True
+    return _encoding
+
+
+def _estimate_tokens(text):
+    arabic = len(ARABIC_RE.findall(text))
+    cjk = len(CJK_RE.findall(text))
+    other = len(text) - arabic - cjk
+    return int(arabic / 2.5 + cjk + other / 4) + 1
+
+
+def count_tokens(text):
+    """Number of tokens in text"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _estimate_tokens(text)
+
+
+def count_message_tokens(messages):
+    """Tokens of a chat messages list, including ~4 tokens of per-message framing"""
+    return sum(count_tokens(message.get('content') or '') + 4 for message in messages) + 2
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to at most max_tokens, preferring to end on a word boundary"""
+    if not text or max_tokens <= 0:
+        return ''
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    else:
+        if _estimate_tokens(text) <= max_tokens:
+            return text
+        # Binary search for the longest prefix that fits
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if _estimate_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        cut = text[:low]
+
+    boundary = max(cut.rfind(' '), cut.rfind('\n'))
+    if boundary > len(cut) * 0.9:
+        cut = cut[:boundary]
+    return cut.rstrip()
+
+
+def chars_per_token(text):
+    """Average characters per token of text (used to turn token sizes into split points)"""
+    tokens = count_tokens(text)
+    return len(text) / tokens if tokens else 4.0
+
+
+def context_tokens(config):
+    """Context window of a model config"""
+    return config.get('context_tokens') or TOKEN_BUDGET_CONFIG['default_context_tokens']
+
+
+def prompt_context_tokens(model_configs=None):
+    """Context window that prompts are planned for.
+
+    The planning window is capped so that a fallback to most configured models still fits;
+    models with a smaller window are tried last by the gateway.
+    """
+    windows = [context_tokens(config) for config in (model_configs or MODEL_CONFIGS)]
+    return min(max(windows), TOKEN_BUDGET_CONFIG['planning_context_tokens'])
+
+
+def plan_prompt(fixed_text, content='', history=None, max_content_tokens=None, context_window=None,
+                reserve_output_tokens=None):
+    """Size the content and history parts of a prompt to fit a context window.
+
+    fixed_text is everything that is always sent (template, instructions, question).
+    history is a list of formatted conversation turns, oldest first; the newest turns
+    that fit in the history share of the budget are kept. Content gets the rest, capped
+    at max_content_tokens. Returns {'content', 'history', 'tokens'}.
+    """
+    settings = TOKEN_BUDGET_CONFIG
+    context_window = context_window or prompt_context_tokens()
+    reserve = settings['reserve_output_tokens'] if reserve_output_tokens is None else reserve_output_tokens
+    fixed_tokens = count_tokens(fixed_text)
+    available = max(int(context_window * (1 - settings['safety_margin'])) - reserve - fixed_tokens, 0)
+
+    kept_history = []
+    history_tokens = 0
+    if history:
+        history_budget = int(available * settings['history_share'])
+        for turn in reversed(history):
+            turn_tokens = count_tokens(turn)
+            if history_tokens + turn_tokens > history_budget:
+                break
+            kept_history.insert(0, turn)
+            history_tokens += turn_tokens
+
+    content_budget = available - history_tokens
+    if max_content_tokens is not None:
+        content_budget = min(content_budget, max_content_tokens)
+    content_tokens = count_tokens(content)
+    if content_tokens > content_budget:
+        content = truncate_to_tokens(content, content_budget)
+        fitted_tokens = count_tokens(content)
+        print(f"✂️ Prompt content trimmed from {content_tokens} to {fitted_tokens} tokens "
+              f"(window {context_window}, fixed {fixed_tokens}, history {history_tokens})")
+        content_tokens = fitted_tokens
+
+    return {
+        'content': content,
+        'history': kept_history,
+        'tokens': {
+            'context_window': context_window,
+            'fixed': fixed_tokens,
+            'history': history_tokens,
+            'content': content_tokens,
+            'reserved_output': reserve,
+            'total': fixed_tokens + history_tokens + content_tokens,
+        },
+    }
@@ -7,7 +7,6 @@ import os
 import tempfile
 import shutil
 import time
-import json
 import re
 from urllib.parse import urlparse, parse_qs
 import yt_dlp
@@ -18,8 +17,15 @@ import subprocess
 import cv2
 import numpy as np
 from typing import Dict, List, Optional, Tuple
-from .config import LANGUAGE_TEMPLATES
+from .config import LANGUAGE_TEMPLATES, CLIP_PLAN_CONFIG
+from .llm_cache import make_cache_key
+from .clip_plan import (SpeechIndex, ClipPlanOptimizer, ClipPlanError, ClipStreamParser, ClipStream,
+                        parse_clip_candidates, encode_timestamped_transcript)
+from .clip_ranking import ClipWindowRanker
 from .tor_youtube_extractor import TorYouTubeExtractor
+from .offline import offline_enabled, OfflineMediaSource
+from .llm_gateway import extract_stream_text
+from .llm_metrics import bind_llm_context
 
 # Global memory store for video clips
 video_clips_memory_store = {}
@@ -32,8 +38,8 @@ class VideoProcessor:
         self.max_file_size = 500 * 1024 * 1024  # 500MB max
         self.target_resolution = (1280, 720)  # 720p for faster processing
         
-        # Initialize Tor YouTube extractor for IP rotation
-        self.tor_extractor = TorYouTubeExtractor()
+        # Initialize Tor YouTube extractor for IP rotation (local media files in offline benchmark mode)
+        self.tor_extractor = OfflineMediaSource() if offline_enabled() else TorYouTubeExtractor()
         
         # Initialize face detection
         try:
@@ -415,7 +421,7 @@ class VideoProcessor:
             # Fallback to ideal time if analysis fails
             return min(ideal_end_time, max_end_time)
     
-    def analyze_transcript_for_clips(self, transcript, language='en', progress=None):
+    def analyze_transcript_for_clips(self, transcript, language='en', progress=None, clip_stream=None):
         """Use AI to analyze transcript and identify best segments for shorts
         
         Args:
@@ -423,6 +429,8 @@ class VideoProcessor:
                        [{'start': 1.36, 'duration': 1.68, 'end': 3.04, 'text': '...'}]
             language: Language code ('en' or 'ar')
             progress: Progress tracker
+            clip_stream: Optional ClipStream; the AI answer is then streamed and each clip is
+                         put on it as soon as it is complete and accepted
         """
         try:
             print(f"🔍 DEBUG: Starting transcript analysis for shorts")
@@ -434,8 +442,16 @@ class VideoProcessor:
             
             if has_timestamps:
                 print(f"✅ Using TIMESTAMPED transcript with {len(transcript)} segments")
-                # Extract plain text for AI analysis
+                # Plain text for word counts; the AI gets compact lines with their start seconds
                 transcript_text = ' '.join([seg['text'] for seg in transcript])
+                prompt_transcript, prompt_tokens = encode_timestamped_transcript(transcript)
+                print(f"🕒 Timestamped prompt transcript: {len(prompt_transcript.splitlines())} lines, {prompt_tokens} tokens")
+                transcript_note = ''
+                if prompt_tokens > CLIP_PLAN_CONFIG['prerank_min_tokens']:
+                    # Long video: send an outline and the best locally ranked windows instead of everything
+                    prompt_transcript, ranked_tokens, windows = ClipWindowRanker(transcript).prompt_transcript()
+                    transcript_note = f"\n- Transcript: outline of the whole video plus its {len(windows)} most promising windows"
+                    print(f"🏁 Pre-ranked {len(windows)} windows: prompt transcript {prompt_tokens} -> {ranked_tokens} tokens")
                 
                 # Calculate actual video duration from timestamps
                 last_segment = transcript[-1]
@@ -449,6 +465,8 @@ class VideoProcessor:
             else:
                 print(f"⚠️ Using PLAIN TEXT transcript (no timestamps)")
                 transcript_text = transcript
+                prompt_transcript = transcript_text
+                transcript_note = ''
                 
                 # Estimate duration from word count
                 words = transcript_text.split()
@@ -494,10 +512,10 @@ class VideoProcessor:
 - Duration: ~{estimated_duration_minutes:.1f} minutes
 - Suggested clip count: {suggested_clips} clips (prioritize quality over quantity)
 - Word count: {total_words} words
-- Timestamps available: {'YES - Use exact times' if has_timestamps else 'NO - Estimate times'}
+- Timestamps available: {'YES - Each line starts with its start time in seconds (e.g. 95| ...); use these exact times' if has_timestamps else 'NO - Estimate times'}{transcript_note}
 
 Transcript:
-{transcript_text}
+{prompt_transcript}
 
 🎯 CRITICAL INSTRUCTIONS: 
 - Create {suggested_clips} clips maximum
@@ -510,6 +528,8 @@ Transcript:
 Analysis (return valid JSON only):"""
 
             print(f"🔍 DEBUG: Prompt prepared, length: {len(prompt)} characters")
+            cache_key = make_cache_key('clip_plan', f"{estimated_duration_minutes:.1f}|{has_timestamps}\n{prompt_transcript}",
+                                       language, template)
             if progress:
                 progress.update('ai_analysis', 40, 'AI analyzing content...')
                 
@@ -518,379 +538,70 @@ Analysis (return valid JSON only):"""
                     print(f"🛑 CANCELLED: Task stopped before AI analysis")
                     return None
             
-            print(f"🔍 DEBUG: Calling make_ai_request_with_fallback...")
-            # Make AI request
-            response = processor.make_ai_request_with_fallback(prompt, progress, language, stream=False)
-            print(f"🔍 DEBUG: AI request completed, processing response...")
-            analysis_result = response.choices[0].message.content
-            print(f"🔍 DEBUG: Analysis result length: {len(analysis_result)} characters")
-            print(f"🔍 DEBUG: Full AI response:")
-            print(f"{'='*50}")
-            print(analysis_result)
-            print(f"{'='*50}")
-            
-            # Parse JSON response
-            try:
-                # Clean the response to extract JSON
-                json_start = analysis_result.find('{')
-                json_end = analysis_result.rfind('}') + 1
-                if json_start != -1 and json_end != -1:
-                    json_str = analysis_result[json_start:json_end]
-                    clips_data = json.loads(json_str)
-                    clips = clips_data.get('clips', [])
-                    
-                    print(f"✅ AI analysis successful! Found {len(clips)} clips")
-                    
-                    # ENHANCED VALIDATION: Strict checks for engagement and distribution
-                    if len(clips) > 0:
-                        # Rule 1: ABSOLUTELY NO clips in first 60 seconds
-                        early_clips = [clip for clip in clips if clip['start_time'] < 60]
-                        if early_clips:
-                            clip_times = [f"{clip['start_time']}s" for clip in early_clips]
-                            raise ValueError(
-                                f"AI selected clips from the first minute ({', '.join(clip_times)}), which is typically intro/setup content. "
-                                "The AI failed to find truly engaging peak moments. "
-                                "Please try a video with clearer climactic moments or dramatic peaks."
-                            )
-                        
-                        # Rule 2: Check for sequential patterns (clips too close together)
-                        sorted_clips = sorted(clips, key=lambda x: x['start_time'])
-                        for i in range(len(sorted_clips) - 1):
-                            time_gap = sorted_clips[i+1]['start_time'] - sorted_clips[i]['end_time']
-                            if time_gap < 30:  # Less than 30 seconds between clips
-                                raise ValueError(
-                                    f"AI selected clips too close together (gap: {time_gap}s between clips). "
-                                    "This suggests sequential cutting rather than finding scattered peak moments. "
-                                    "Please try a video with more distinct engaging segments."
-                                )
-                        
-                        # Rule 3: Ensure clips are well distributed across video
-                        video_duration_estimate = estimated_duration_minutes * 60  # Convert to seconds
-                        
-                        # DEBUG: Show what the AI actually selected
-                        print(f"🔍 AI CLIP SELECTION DEBUG:")
-                        print(f"   📊 Video duration estimate: {video_duration_estimate:.1f} seconds ({estimated_duration_minutes:.1f} minutes)")
-                        print(f"   📊 Total clips found: {len(clips)}")
-                        
-                        earliest_clip = min(clip['start_time'] for clip in clips)
-                        latest_clip = max(clip['start_time'] for clip in clips)
-                        print(f"   ⏰ Time range: {earliest_clip:.1f}s to {latest_clip:.1f}s")
-                        
-                        for i, clip in enumerate(clips):
-                            percentage_through = (clip['start_time'] / video_duration_estimate * 100) if video_duration_estimate > 0 else 0
-                            print(f"   🎥 Clip {i+1}: {clip['start_time']:.1f}s-{clip['end_time']:.1f}s ({percentage_through:.1f}% through video)")
-                            print(f"       📝 Title: {clip.get('title', 'No title')}")
-                            print(f"       📖 Reason: {clip.get('selection_reason', 'No reason provided')}")
-                        
-                        # Intelligent content-aware validation
-                        if video_duration_estimate > 300:  # Only for videos longer than 5 minutes
-                            
-                            # Analyze content type from transcript and AI selections
-                            content_indicators = {
-                                'educational': ['lesson', 'learn', 'teach', 'example', 'practice', 'study', 'tutorial'],
-                                'entertainment': ['funny', 'comedy', 'joke', 'entertainment', 'story', 'dramatic'],
-                                'business': ['meeting', 'strategy', 'sales', 'business', 'work', 'office'],
-                                'review': ['review', 'opinion', 'thoughts', 'rating', 'recommend'],
-                                'news': ['news', 'report', 'update', 'announcement', 'breaking']
-                            }
-                            
-                            # Check transcript and AI reasoning for content type
-                            transcript_lower = transcript_text.lower()  # Use transcript_text (converted to string)
-                            ai_reasoning = ' '.join([clip.get('selection_reason', '') + ' ' + clip.get('description', '') for clip in clips]).lower()
-                            
-                            content_scores = {}
-                            for content_type, keywords in content_indicators.items():
-                                score = sum(1 for keyword in keywords if keyword in transcript_lower or keyword in ai_reasoning)
-                                content_scores[content_type] = score
-                            
-                            detected_content_type = max(content_scores.items(), key=lambda x: x[1])[0] if max(content_scores.values()) > 0 else 'general'
-                            
-                            print(f"   � CONTENT TYPE ANALYSIS:")
-                            print(f"       Detected type: {detected_content_type}")
-                            print(f"       Content scores: {content_scores}")
-                            
-                            # Evaluate AI reasoning quality
-                            reasoning_quality_indicators = [
-                                'peak', 'climax', 'twist', 'reveal', 'surprise', 'emotional', 'dramatic',
-                                'engaging', 'viral', 'shareable', 'relatable', 'memorable', 'punchline',
-                                'insight', 'valuable', 'important', 'key moment', 'highlight'
-                            ]
-                            
-                            reasoning_quality_score = 0
-                            for clip in clips:
-                                reasoning_text = (clip.get('selection_reason', '') + ' ' + clip.get('description', '')).lower()
-                                reasoning_quality_score += sum(1 for indicator in reasoning_quality_indicators if indicator in reasoning_text)
-                            
-                            print(f"   🧠 AI REASONING QUALITY:")
-                            print(f"       Quality score: {reasoning_quality_score}/{len(clips) * 3} (good reasoning uses 2-3 quality indicators per clip)")
-                            
-                            # Content-type specific validation rules with special handling for very long videos
-                            sixty_percent_mark = video_duration_estimate * 0.6
-                            forty_percent_mark = video_duration_estimate * 0.4
-                            twenty_percent_mark = video_duration_estimate * 0.2
-                            
-                            # For very long videos (2+ hours), use much more flexible rules
-                            is_very_long_video = video_duration_estimate > 7200  # 2 hours
-                            
-                            print(f"   🎯 Video length category: {'Very Long (2+ hours)' if is_very_long_video else 'Standard'}")
-                            if is_very_long_video:
-                                print(f"   🎯 20% mark: {twenty_percent_mark:.1f}s, 40% mark: {forty_percent_mark:.1f}s")
-                            else:
-                                print(f"   🎯 40% mark: {forty_percent_mark:.1f}s, 60% mark: {sixty_percent_mark:.1f}s")
-                            print(f"   🎯 Latest clip starts at: {latest_clip:.1f}s")
-                            
-                            # Apply flexible validation based on content type, video length, and reasoning quality
-                            validation_passed = False
-                            validation_reason = ""
-                            
-                            if is_very_long_video:
-                                # Very long videos (2+ hours): Much more lenient rules
-                                print(f"   🕐 VERY LONG VIDEO RULES: Using flexible validation for {video_duration_estimate/3600:.1f}h video")
-                                
-                                if reasoning_quality_score >= len(clips):  # Just need decent reasoning
-                                    validation_passed = True
-                                    validation_reason = f"Very long video with decent AI reasoning (quality: {reasoning_quality_score})"
-                                elif latest_clip >= twenty_percent_mark:  # Or clips after first 20%
-                                    validation_passed = True
-                                    validation_reason = f"Very long video with clips beyond 20% mark"
-                                else:
-                                    # Even more lenient: check if clips are well-reasoned regardless of position
-                                    if any('viral' in clip.get('selection_reason', '').lower() or 
-                                          'peak' in clip.get('selection_reason', '').lower() or
-                                          'emotional' in clip.get('selection_reason', '').lower() for clip in clips):
-                                        validation_passed = True
-                                        validation_reason = f"Very long video with high-quality viral/emotional content identification"
-                                    else:
-                                        validation_reason = f"Very long video but clips lack strong viral indicators"
-                                        
-                            elif detected_content_type in ['educational', 'business', 'tutorial']:
-                                # Educational content often has examples/scenarios early on
-                                if latest_clip >= forty_percent_mark or reasoning_quality_score >= len(clips) * 2:
-                                    validation_passed = True
-                                    validation_reason = f"Educational content with good AI reasoning (quality: {reasoning_quality_score})"
-                                else:
-                                    validation_reason = f"Educational content but clips too early and weak reasoning"
-                                    
-                            elif detected_content_type in ['entertainment', 'story']:
-                                # Entertainment should have better distribution
-                                if latest_clip >= sixty_percent_mark:
-                                    validation_passed = True
-                                    validation_reason = "Entertainment content with good distribution"
-                                elif reasoning_quality_score >= len(clips) * 2:
-                                    validation_passed = True
-                                    validation_reason = f"Strong AI reasoning compensates for early clips (quality: {reasoning_quality_score})"
-                                else:
-                                    validation_reason = "Entertainment content needs better distribution or stronger reasoning"
-                                    
-                            else:  # General content
-                                # Flexible rules for general content
-                                if latest_clip >= forty_percent_mark and reasoning_quality_score >= len(clips):
-                                    validation_passed = True
-                                    validation_reason = f"General content with adequate distribution and reasoning"
-                                elif reasoning_quality_score >= len(clips) * 2:
-                                    validation_passed = True
-                                    validation_reason = f"Excellent AI reasoning compensates for distribution (quality: {reasoning_quality_score})"
-                                else:
-                                    validation_reason = f"Insufficient distribution and reasoning quality"
-                            
-                            print(f"   🎯 INTELLIGENT VALIDATION RESULT:")
-                            print(f"       Status: {'✅ PASSED' if validation_passed else '❌ FAILED'}")
-                            print(f"       Reason: {validation_reason}")
-                            
-                            if not validation_passed:
-                                print(f"   ⚠️ VALIDATION WARNING: {validation_reason}")
-                                print(f"   � PROCEEDING ANYWAY: Relaxing validation for user experience")
-                                print(f"   💡 Note: Clips may not have optimal distribution but will still be created")
-                                
-                                # Instead of failing, just proceed with a warning
-                                validation_reason = f"PROCEEDING WITH CAUTION: {validation_reason}"
-                                print(f"   ✅ CONTINUING: {validation_reason}")
-                            else:
-                                print(f"   ✅ VALIDATION PASSED: {validation_reason}")
-                        else:
-                            print(f"   ✅ SHORT VIDEO: No distribution validation required for videos under 5 minutes")
-                        
-                        # VALIDATION: Check if selected segments have actual speech content
-                        # More realistic validation based on actual transcript length
-                        words = transcript_text.split()
-                        total_words = len(words)
-                        
-                        # Estimate video duration from transcript (more flexible)
-                        # TED talks: ~120-150 words/minute, casual: ~150-180 words/minute
-                        estimated_duration = max(180, total_words / 1.5)  # Assume slower speech
-                        words_per_second = total_words / estimated_duration if total_words > 0 else 1
-                        
-                        print(f"🔍 DEBUG: Transcript has {total_words} words, estimated {estimated_duration:.0f}s duration, ~{words_per_second:.2f} words/second")
-                        
-                        # ENHANCED VALIDATION: Speech detection and silence filtering
-                        def analyze_transcript_segment(transcript, start_seconds, end_seconds, words_per_second):
-                            """Analyze a transcript segment to detect actual speech content, filtering out non-speech parts"""
-                            # Estimate which words fall in this time range
-                            start_word_idx = int(start_seconds * words_per_second)
-                            end_word_idx = int(end_seconds * words_per_second)
-                            
-                            # Get the relevant transcript portion
-                            transcript_words = transcript_text.split()
-                            segment_words = transcript_words[start_word_idx:end_word_idx] if start_word_idx < len(transcript_words) else []
-                            segment_text = ' '.join(segment_words).lower()
-                            
-                            # Define non-speech indicators to filter out (but not reject entire clip)
-                            non_speech_patterns = [
-                                '[music]', '[applause]', '[laughter]', '[silence]', 
-                                '[background music]', '[intro music]', '[outro music]',
-                                '[instrumental]', '[sound effects]', '[noise]', '[static]',
-                                'music playing', 'background music', 'intro music'
-                            ]
-                            
-                            # Filter out non-speech words, keeping only actual speech
-                            speech_words = []
-                            non_speech_count = 0
-                            
-                            for word in segment_words:
-                                word_lower = word.lower()
-                                is_non_speech = any(pattern in word_lower for pattern in non_speech_patterns)
-                                
-                                if is_non_speech:
-                                    non_speech_count += 1
-                                else:
-                                    speech_words.append(word)
-                            
-                            # Calculate speech density after filtering out non-speech
-                            actual_speech_count = len(speech_words)
-                            filtered_text = ' '.join(speech_words).lower()
-                            
-                            return {
-                                'word_count': actual_speech_count,
-                                'total_words': len(segment_words),
-                                'non_speech_indicators': non_speech_count,
-                                'segment_text': segment_text[:100] + '...' if len(segment_text) > 100 else segment_text,
-                                'filtered_speech_text': filtered_text[:100] + '...' if len(filtered_text) > 100 else filtered_text,
-                                'has_speech': actual_speech_count >= 15,  # At least 15 real speech words for 30 seconds
-                                'speech_percentage': (actual_speech_count / len(segment_words) * 100) if len(segment_words) > 0 else 0
-                            }
-                        
-                        clips_to_remove = []
-                        for clip in clips:
-                            duration = clip['end_time'] - clip['start_time']
-                            
-                            # Rule 1: Reject clips shorter than 30 seconds
-                            if duration < 30:
-                                clips_to_remove.append(clip['clip_number'])
-                                print(f"❌ REJECTED: Clip {clip['clip_number']} is too short ({duration}s < 30s minimum)")
-                                continue
-                            
-                            # Rule 2: Analyze actual speech content in this segment
-                            segment_analysis = analyze_transcript_segment(
-                                transcript_text, clip['start_time'], clip['end_time'], words_per_second
-                            )
-                            
-                            # Rule 3: Only reject if NO speech content at all
-                            if not segment_analysis['has_speech']:
-                                clips_to_remove.append(clip['clip_number'])
-                                print(f"❌ REJECTED: Clip {clip['clip_number']} has NO speech content")
-                                print(f"   📊 Analysis: {segment_analysis['word_count']} speech words out of {segment_analysis['total_words']} total")
-                                print(f"   📝 Filtered speech: {segment_analysis['filtered_speech_text']}")
-                                continue
-                            
-                            # Rule 4: Warn about non-speech content but don't reject (just inform)
-                            if segment_analysis['non_speech_indicators'] > 0:
-                                print(f"⚠️ NOTICE: Clip {clip['clip_number']} contains {segment_analysis['non_speech_indicators']} non-speech elements ({segment_analysis['speech_percentage']:.1f}% actual speech)")
-                                print(f"   🎤 Will use speech parts: {segment_analysis['filtered_speech_text']}")
-                            else:
-                                print(f"✅ CLEAN: Clip {clip['clip_number']} is pure speech content")
-                            
-                            # Rule 5: Check speech density using filtered speech words
-                            expected_words = duration * words_per_second
-                            actual_word_ratio = segment_analysis['word_count'] / expected_words if expected_words > 0 else 0
-                            
-                            # Only reject if extremely low speech density (less than 20% after filtering)
-                            if actual_word_ratio < 0.2:  # Less than 20% of expected words = truly silent
-                                clips_to_remove.append(clip['clip_number'])
-                                print(f"❌ REJECTED: Clip {clip['clip_number']} has extremely low speech density ({actual_word_ratio:.1%}) - likely mostly silent")
-                                continue
-                                
-                            # Rule 6: Special check for clip beginning (first 5 seconds must have actual speech)
-                            beginning_analysis = analyze_transcript_segment(
-                                transcript_text, clip['start_time'], min(clip['start_time'] + 5, clip['end_time']), words_per_second
-                            )
-                            
-                            if beginning_analysis['word_count'] < 3:  # Less than 3 actual speech words in first 5 seconds
-                                clips_to_remove.append(clip['clip_number'])
-                                print(f"❌ REJECTED: Clip {clip['clip_number']} starts with insufficient speech (first 5s: {beginning_analysis['word_count']} speech words)")
-                                print(f"   🎵 Raw start: {beginning_analysis['segment_text']}")
-                                print(f"   🎤 Filtered speech: {beginning_analysis['filtered_speech_text']}")
-                                continue
-                                
-                            print(f"✅ APPROVED: Clip {clip['clip_number']} - {duration}s, {segment_analysis['word_count']} speech words ({actual_word_ratio:.1%} speech density)")
-                            if beginning_analysis['non_speech_indicators'] > 0:
-                                print(f"   � Start has non-speech but good speech: {beginning_analysis['filtered_speech_text']}")
-                            else:
-                                print(f"   🎤 Clean speech start: {beginning_analysis['filtered_speech_text']}")
-                        
-                        # Remove rejected clips
-                        if clips_to_remove:
-                            original_count = len(clips_data['clips'])
-                            print(f"🔧 SPEECH FILTERING: Removing {len(clips_to_remove)} clips due to lack of speech content")
-                            print(f"   📋 Clips being removed: {clips_to_remove}")
-                            
-                            # Filter out rejected clips
-                            clips_data['clips'] = [clip for clip in clips if clip['clip_number'] not in clips_to_remove]
-                            
-                            # Update clip numbers to be sequential
-                            for i, clip in enumerate(clips_data['clips']):
-                                clip['clip_number'] = i + 1
-                            
-                            clips = clips_data['clips']  # Update local variable
-                            print(f"✅ After speech filtering: {len(clips)} clips remain (was {original_count})")
-                            
-                            # Debug: Show remaining clips
-                            for clip in clips:
-                                print(f"   ✅ APPROVED CLIP {clip['clip_number']}: {clip['start_time']}s-{clip['end_time']}s - {clip['title']}")
-                        
-                        # Check if we have any clips left after all filtering
-                        if len(clips_data['clips']) == 0:
-                            raise ValueError(
-                                "No suitable clips found after filtering. "
-                                "All segments were either too short (< 30s), had excessive silence (5+ sec gaps), "
-                                "or lacked sufficient speech content. "
-                                "Please try a video with more continuous, engaging dialogue."
-                            )
-                        
-                        # Final validation: Ensure clip count is reasonable for video length
-                        final_clip_count = len(clips_data['clips'])
-                        if estimated_duration_minutes < 2 and final_clip_count > 2:
-                            # Keep only best 2 clips for short videos
-                            clips_data['clips'] = clips_data['clips'][:2]
-                            print(f"🎯 Short video optimization: Reduced to {len(clips_data['clips'])} clips for {estimated_duration_minutes:.1f}-minute video")
-                        elif estimated_duration_minutes < 5 and final_clip_count > 4:
-                            # Keep only best 4 clips for medium videos
-                            clips_data['clips'] = clips_data['clips'][:4]
-                            print(f"🎯 Medium video optimization: Reduced to {len(clips_data['clips'])} clips for {estimated_duration_minutes:.1f}-minute video")
-                        
-                        # Final check after all optimizations
-                        if len(clips_data['clips']) == 0:
-                            raise ValueError(
-                                "No clips remain after quality filtering and optimization. "
-                                "This video may not have sufficient engaging content for shorts creation."
-                            )
-                    
-                    # Debug: show the final selected segments
-                    final_clips = clips_data.get('clips', [])
-                    for clip in final_clips:
-                        print(f"   Clip {clip['clip_number']}: {clip['start_time']}s-{clip['end_time']}s - {clip['title']}")
-                    
-                    print(f"🎬 Final result: {len(final_clips)} clips selected for {estimated_duration_minutes:.1f}-minute video")
+            # Repair the AI's candidates locally; only ask again (with feedback) if nothing can be repaired
+            speech_index = SpeechIndex(transcript, None if has_timestamps else estimated_duration_minutes * 60)
+            optimizer = ClipPlanOptimizer(speech_index, max_clips, language)
+            request_prompt = prompt
+            request_cache_key = cache_key
+            attempts = CLIP_PLAN_CONFIG['reprompt_attempts'] + 1
+            for attempt in range(1, attempts + 1):
+                print(f"🔍 DEBUG: Calling make_ai_request_with_fallback (clip plan attempt {attempt}/{attempts})...")
+                if clip_stream is None:
+                    response = processor.make_ai_request_with_fallback(request_prompt, progress, language, stream=False,
+                                                                       cache_key=request_cache_key)
+                    analysis_result = response.choices[0].message.content
                 else:
-                    raise ValueError("No JSON found in response")
-                    
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"❌ Failed to parse AI response as JSON: {e}")
-                print(f"Raw response: {analysis_result[:500]}...")
-                print(f"❌ AI FAILED TO DETECT ENGAGING PARTS - No fallback, returning error")
-                # Raise error instead of using fallback
-                raise ValueError(f"AI failed to properly analyze the video content. Please try again or use a different video. Error: {e}")
+                    analysis_result = self.stream_clip_candidates(processor, request_prompt, request_cache_key,
+                                                                  optimizer, clip_stream, language, progress)
+                print(f"🔍 DEBUG: Analysis result length: {len(analysis_result)} characters")
+                print(f"🔍 DEBUG: Full AI response:")
+                print(f"{'='*50}")
+                print(analysis_result)
+                print(f"{'='*50}")
+                
+                try:
+                    if clip_stream is None:
+                        clips_data, candidates = parse_clip_candidates(analysis_result, optimizer)
+                        print(f"✅ AI analysis successful! Found {len(candidates)} clip candidates")
+                        clips, notes = optimizer.repair(candidates)
+                    else:
+                        try:
+                            clips_data, _ = parse_clip_candidates(analysis_result, optimizer)
+                        except ClipPlanError:
+                            # A truncated answer is fine once some clips were accepted from the stream
+                            if not optimizer.placed:
+                                raise
+                            clips_data = {}
+                        # Clips already handed to rendering keep their numbers
+                        clips, notes = optimizer.finish(renumber=False)
+                    break
+                except ClipPlanError as e:
+                    print(f"❌ Clip plan unusable: {e}")
+                    # Don't replay a rejected plan on retry
+                    processor.llm_gateway.discard_cached(request_cache_key)
+                    if attempt == attempts:
+                        raise ValueError(f"AI failed to properly analyze the video content. Please try again or use a different video. Error: {e}")
+                    print(f"🔁 Asking the AI again with feedback: {e.feedback}")
+                    if progress:
+                        progress.update('ai_analysis', 42, 'Refining clip selection...')
+                        if progress.check_stop_at_breakpoint():
+                            print(f"🛑 CANCELLED: Task stopped before clip plan retry")
+                            return None
+                    request_prompt = f"{prompt}\n\n{e.feedback}"
+                    request_cache_key = make_cache_key('clip_plan_retry', request_prompt, language)
             
-            if progress:
+            for note in notes:
+                print(f"🔧 Clip plan repair: {note}")
+            clips_data['clips'] = clips
+            
+            # Debug: show the final selected segments
+            for clip in clips:
+                print(f"   Clip {clip['clip_number']}: {clip['start_time']}s-{clip['end_time']}s - {clip.get('title', '')}")
+            
+            print(f"🎬 Final result: {len(clips)} clips selected for {estimated_duration_minutes:.1f}-minute video "
+                  f"({len(notes)} adjustments)")
+            
+            if progress and clip_stream is None:
                 progress.update('analysis_complete', 55, 'Content analysis complete')
             
             return clips_data
@@ -900,6 +611,42 @@ Analysis (return valid JSON only):"""
             # Raise error instead of using fallback
             raise ValueError(f"Failed to analyze video content for engaging moments: {str(e)}")
     
+    def stream_clip_candidates(self, processor, prompt, cache_key, optimizer, clip_stream, language='en', progress=None):
+        """Stream the clip plan answer, accepting each clip as soon as its JSON object closes.
+
+        Accepted clips are put on clip_stream right away so rendering can start while the
+        AI is still writing. Returns the full answer text.
+        """
+        optimizer.start()
+        clip_stream.expect(optimizer.max_clips)
+        parser = ClipStreamParser()
+        parts = []
+        position = 0
+        started = time.time()
+        response = processor.make_ai_request_with_fallback(prompt, progress, language, stream=True, cache_key=cache_key)
+        for text in map(extract_stream_text, response):
+            if not text:
+                continue
+            if progress and progress.is_cancelled():
+                break
+            parts.append(text)
+            for candidate in parser.feed(text):
+                position += 1
+                clip = optimizer.add(candidate, position)
+                if clip:
+                    print(f"⚡ Clip {clip['clip_number']} accepted after {time.time() - started:.1f}s: "
+                          f"{clip['start_time']}s-{clip['end_time']}s")
+                    clip_stream.put(clip)
+        return ''.join(parts)
+    
+    def analyze_into_stream(self, transcript, language, progress, clip_stream):
+        """Run the clip analysis (in a background thread), feeding accepted clips to clip_stream"""
+        try:
+            self.analyze_transcript_for_clips(transcript, language, progress, clip_stream)
+            clip_stream.close()
+        except Exception as e:
+            clip_stream.close(e)
+    
     def fallback_clip_analysis(self, transcript):
         """
         DEPRECATED: This fallback method is no longer used.
@@ -994,7 +741,9 @@ Analysis (return valid JSON only):"""
         import os
         
         try:
-            if progress:
+            # With a ClipStream the analysis is still running: keep its progress until the first clip arrives
+            streaming = isinstance(clips_data.get('clips'), ClipStream)
+            if progress and not streaming:
                 progress.update('extraction', 60, 'Preparing in-memory video processing...')
             
             # Handle transcript format conversion for natural ending detection
@@ -1012,10 +761,11 @@ Analysis (return valid JSON only):"""
             clips = clips_data.get('clips', [])
             
             print(f"🎬 DEBUG: Starting clip extraction for {len(clips)} approved clips")
-            for i, clip in enumerate(clips):
-                print(f"   🎥 Clip {i+1}: {clip['start_time']}s-{clip['end_time']}s - {clip['title']}")
+            if not streaming:
+                for i, clip in enumerate(clips):
+                    print(f"   🎥 Clip {i+1}: {clip['start_time']}s-{clip['end_time']}s - {clip['title']}")
             
-            if progress:
+            if progress and not streaming:
                 progress.update('stream_ready', 65, 'Creating video clips in memory...')
             
             for i, clip_info in enumerate(clips):
@@ -1444,6 +1194,11 @@ Analysis (return valid JSON only):"""
                     print(f"❌ Failed to process clip {clip_num}: {e}")
                     continue
             
+            # The streaming analysis ends early when the task is stopped
+            if progress and progress.check_stop_at_breakpoint():
+                print(f"🛑 CANCELLED: Task stopped during clip analysis")
+                return None
+            
             # Final validation: Remove clips that failed to create proper video files
             valid_clips = []
             min_final_size = 200 * 1024  # 200KB minimum (was 500KB)
@@ -1540,29 +1295,47 @@ Analysis (return valid JSON only):"""
         except Exception as e:
             return None
     
-    def process_video_for_shorts(self, video_url, transcript, language='en', progress=None):
-        """Main method to process video and generate shorts clips using in-memory processing"""
+    def process_video_for_shorts(self, video_url, transcript, language='en', progress=None, video_info=None):
+        """Main method to process video and generate shorts clips using in-memory processing
+        
+        video_info: result of get_video_info_safe if the caller already fetched it (e.g. in parallel
+        with the transcript)
+        """
         try:
             # BREAKPOINT 1: Before video info (fast check)
             if progress and progress.check_stop_at_breakpoint():
                 return {'success': False, 'error': 'Task cancelled before video info'}
             
             # Step 1: Get video info (lightweight)
-            video_info = self.get_video_info_safe(video_url, progress)
+            if video_info is None:
+                video_info = self.get_video_info_safe(video_url, progress)
             
             # BREAKPOINT 2: Before AI analysis (natural stopping point)
             if progress and progress.check_stop_at_breakpoint():
                 return {'success': False, 'error': 'Task cancelled before AI analysis'}
             
             # Step 2: Analyze transcript for best clips (AI-powered)
-            clips_analysis = self.analyze_transcript_for_clips(transcript, language, progress)
-            
-            # BREAKPOINT 3: Before video processing (natural stopping point)
-            if progress and progress.check_stop_at_breakpoint():
-                return {'success': False, 'error': 'Task cancelled before video processing'}
+            clip_stream = None
+            if CLIP_PLAN_CONFIG['stream_clips']:
+                # Streamed analysis in the background: each clip is rendered as soon as it is accepted
+                clip_stream = ClipStream()
+                threading.Thread(target=bind_llm_context(self.analyze_into_stream),
+                                 args=(transcript, language, progress, clip_stream), daemon=True).start()
+                clips_analysis = {'clips': clip_stream}
+            else:
+                clips_analysis = self.analyze_transcript_for_clips(transcript, language, progress)
+                
+                # BREAKPOINT 3: Before video processing (natural stopping point)
+                if progress and progress.check_stop_at_breakpoint():
+                    return {'success': False, 'error': 'Task cancelled before video processing'}
             
             # Step 3: Extract clips using in-memory streaming (NO file downloads)
-            extracted_clips = self.extract_video_clips_streaming(video_url, clips_analysis, transcript, progress)
+            try:
+                extracted_clips = self.extract_video_clips_streaming(video_url, clips_analysis, transcript, progress)
+            except Exception:
+                if clip_stream is not None and clip_stream.error is not None:
+                    raise clip_stream.error  # Report the analysis failure itself
+                raise
             
             if progress:
                 progress.update('complete', 100, 'Shorts generation complete!')
@@ -6,25 +6,26 @@ Handles webpage content extraction, PDF processing, and AI-powered summarization
 import re
 import requests
 import random
-import asyncio
-import concurrent.futures
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 from requests_html import HTMLSession
 import PyPDF2
 from io import BytesIO
-import g4f
-from g4f.client import Client
 
-from .config import CRAWL4AI_AVAILABLE, MODEL_CONFIGS, SITE_PATTERNS, MAX_CONTENT_LENGTH, LANGUAGE_TEMPLATES
+from .config import CRAWL4AI_AVAILABLE, MODEL_CONFIGS, SITE_PATTERNS, LANGUAGE_TEMPLATES
+from .language_detector import detect_language
+from .llm_gateway import get_llm_gateway
+from .llm_cache import make_cache_key
+from .map_reduce import get_map_reduce_summarizer
+from .page_readiness import get_page_readiness
 
 if CRAWL4AI_AVAILABLE:
-    from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+    from crawl4ai import CrawlerRunConfig, CacheMode
 
 class WebPageAnalyzer:
     def __init__(self):
-        # Initialize G4F client for summarization
-        self.g4f_client = Client()
+        # Shared LLM gateway for summarization (pooled clients, process-wide model health)
+        self.llm_gateway = get_llm_gateway()
         
         # Primary and fallback configurations (same as YouTubeProcessor)
         self.model_configs = MODEL_CONFIGS
@@ -83,121 +84,38 @@ class WebPageAnalyzer:
         # Universal website-specific patterns for better extraction
         self.site_patterns = SITE_PATTERNS
 
-    def try_next_model(self):
-        """Switch to the next model configuration in the fallback chain"""
-        self.current_config_index += 1
-        if self.current_config_index < len(self.model_configs):
-            config = self.model_configs[self.current_config_index]
-            self.model = config["model"]
-            self.provider = config["provider"]
-            print(f"🔄 Switching to fallback model: {config['name']}")
-            return True
-        else:
-            print("❌ All fallback models exhausted")
-            return False
-    
-    def reset_to_primary_model(self):
-        """Reset to the primary model configuration"""
-        self.current_config_index = 0
-        config = self.model_configs[0]
-        self.model = config["model"]
-        self.provider = config["provider"]
-        print(f"✅ Reset to primary model: {config['name']}")
-    
     def get_current_model_name(self):
-        """Get the name of the currently active model"""
+        """Get the name of the model that served the last request"""
         return self.model_configs[self.current_config_index]["name"]
     
-    def make_ai_request_with_fallback(self, prompt, progress=None, language='en', stream=False):
-        """Make AI request with automatic fallback through all configured models"""
-        last_error = None
-        original_config_index = self.current_config_index
-        
-        # Try each model in the fallback chain
-        while self.current_config_index < len(self.model_configs):
-            try:
-                config = self.model_configs[self.current_config_index]
-                print(f"🤖 Trying model: {config['name']}")
-                
-                # Update progress with random engaging message
-                if progress:
-                    model_attempt = self.current_config_index + 1
-                    total_models = len(self.model_configs)
-                    random_message = self._get_random_progress_message(language, config["name"])
-                    progress.update('ai_request', 65 + (model_attempt * 5), random_message)
-                
-                # Make the request
-                if stream:
-                    response = self.g4f_client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        provider=self.provider,
-                        stream=True
-                    )
-                else:
-                    response = self.g4f_client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        provider=self.provider
-                    )
-                
-                print(f"✅ Success with model: {config['name']}")
-                return response
-                
-            except Exception as e:
-                last_error = e
-                error_msg = str(e).lower()
-                config = self.model_configs[self.current_config_index]
-                
-                print(f"❌ Model {config['name']} failed: {str(e)}")
-                
-                # Check if this is a retryable error
-                if any(keyword in error_msg for keyword in ['rate limit', 'quota', 'timeout', 'connection', 'unavailable']):
-                    print(f"🔄 Retryable error detected, trying next model...")
-                    if not self.try_next_model():
-                        break
-                else:
-                    # Non-retryable error, but still try next model
-                    print(f"⚠️ Non-retryable error, but trying next model anyway...")
-                    if not self.try_next_model():
-                        break
+    def make_ai_request_with_fallback(self, prompt, progress=None, language='en', stream=False, cache_key=None):
+        """Make AI request through the shared LLM gateway (automatic fallback through all configured models)"""
+        def on_attempt(config, model_attempt):
+            print(f"🤖 Trying model: {config['name']}")
+            
+            # Update progress with random engaging message
+            if progress:
+                random_message = self._get_random_progress_message(language, config["name"])
+                progress.update('ai_request', 65 + (model_attempt * 5), random_message)
         
-        # If we get here, all models failed
-        print(f"💥 All {len(self.model_configs)} models failed")
+        response, config = self.llm_gateway.request(prompt, stream=stream, on_attempt=on_attempt, cache_key=cache_key)
         
-        # Reset to original configuration for next attempt
-        self.current_config_index = original_config_index
-        config = self.model_configs[self.current_config_index]
+        # Remember which model served the request
+        if config in self.model_configs:
+            self.current_config_index = self.model_configs.index(config)
         self.model = config["model"]
         self.provider = config["provider"]
-        
-        # Raise the last error encountered
-        if last_error:
-            raise last_error
-        else:
-            raise Exception("All AI models are currently unavailable. Please try again later.")
+        return response
 
-    async def scrape_with_crawl4ai(self, url):
+    def scrape_with_crawl4ai(self, url):
         """Advanced web scraping using Crawl4AI with our proven configuration"""
         try:
-            # Minimal browser configuration - headless only
-            browser_config = BrowserConfig(
-                browser_type="chromium",
-                headless=True,  # Pure headless mode
-                viewport_width=1920,
-                viewport_height=1080,
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                verbose=False  # Minimal logging
-            )
-            
             # Universal crawler configuration - optimized for all website types
             crawler_config = CrawlerRunConfig(
                 # Get fresh content
                 cache_mode=CacheMode.BYPASS,
                 # Generous timeout for various website types
                 page_timeout=40000,  # 40 seconds for complex sites
-                # Wait for dynamic content to fully load
-                delay_before_return_html=4.0,
                 # Remove unwanted elements but keep main content
                 excluded_tags=['script', 'style', 'noscript'],
                 # No screenshot needed for text extraction
@@ -208,119 +126,112 @@ class WebPageAnalyzer:
                 js_only=False
             )
 
-            async with AsyncWebCrawler(config=browser_config) as crawler:
-                # Universal JavaScript for better content extraction across all sites
-                js_code = """
-                // Universal content cleanup for all website types
-                const unwantedSelectors = [
-                    '[data-module="Advertisement"]', '.ad', '.advertisement', '.banner', '.ads',
-                    '.overlay', '.modal', '.popup', '.cookie-banner', '.newsletter-signup',
-                    '.social-share', '.sidebar-ads', '[id*="ad"]', '[class*="ad-"]',
-                    '.promo', '.promotion', '.sponsored', '.related-ads', '.google-ads'
-                ];
-                
-                unwantedSelectors.forEach(selector => {
-                    document.querySelectorAll(selector).forEach(el => {
-                        try { el.remove(); } catch(e) {}
-                    });
-                });
-                
-                // Close any modal dialogs that might be blocking content
-                document.querySelectorAll('[role="dialog"], .dialog, .modal-backdrop').forEach(el => {
+            # Universal JavaScript for better content extraction across all sites
+            js_code = """
+            // Universal content cleanup for all website types
+            const unwantedSelectors = [
+                '[data-module="Advertisement"]', '.ad', '.advertisement', '.banner', '.ads',
+                '.overlay', '.modal', '.popup', '.cookie-banner', '.newsletter-signup',
+                '.social-share', '.sidebar-ads', '[id*="ad"]', '[class*="ad-"]',
+                '.promo', '.promotion', '.sponsored', '.related-ads', '.google-ads'
+            ];
+            
+            unwantedSelectors.forEach(selector => {
+                document.querySelectorAll(selector).forEach(el => {
                     try { el.remove(); } catch(e) {}
                 });
+            });
+            
+            // Close any modal dialogs that might be blocking content
+            document.querySelectorAll('[role="dialog"], .dialog, .modal-backdrop').forEach(el => {
+                try { el.remove(); } catch(e) {}
+            });
+            
+            // Click away cookie banners and consent forms
+            const dismissButtons = document.querySelectorAll(
+                '[data-testid*="accept"], [data-testid*="dismiss"], [aria-label*="close"], ' +
+                'button[class*="accept"], button[class*="dismiss"], .cookie-accept, .accept-cookies'
+            );
+            dismissButtons.forEach(btn => {
+                try { btn.click(); } catch(e) {}
+            });
+            
+            // Trigger any lazy loading by scrolling (the crawl then waits for it to settle)
+            window.scrollTo(0, document.body.scrollHeight / 2);
+            """
+            
+            # Shared browser; returns once the page's DOM and network have gone quiet
+            result = get_page_readiness().crawl(url, crawler_config.clone(js_code=js_code))
+            
+            if result.success:
+                # Extract and clean text content
+                markdown_content = result.markdown or ""
+                cleaned_html = result.cleaned_html or ""
+                
+                print(f"📄 Raw markdown length: {len(markdown_content)} characters")
+                print(f"🧹 Cleaned HTML length: {len(cleaned_html)} characters")
+                
+                # Extract readable text from the content
+                
+                # Method 1: Clean up markdown by removing links and formatting
+                clean_markdown = re.sub(r'\[([^\]]*)\]\([^)]*\)', r'\1', markdown_content)  # Remove markdown links
+                clean_markdown = re.sub(r'!\[([^\]]*)\]\([^)]*\)', '', clean_markdown)  # Remove images
+                clean_markdown = re.sub(r'#{1,6}\s*', '', clean_markdown)  # Remove headers
+                clean_markdown = re.sub(r'\*+', '', clean_markdown)  # Remove bold/italic
+                clean_markdown = re.sub(r'\s+', ' ', clean_markdown).strip()  # Normalize whitespace
+                
+                # Method 2: Extract text from HTML
+                clean_html_text = ""
+                try:
+                    soup = BeautifulSoup(cleaned_html, 'html.parser')
+                    # Remove unwanted elements
+                    for element in soup(['script', 'style', 'nav', 'footer', 'aside', 'header']):
+                        element.decompose()
+                    clean_html_text = soup.get_text(separator=' ', strip=True)
+                    clean_html_text = re.sub(r'\s+', ' ', clean_html_text).strip()
+                except Exception as e:
+                    print(f"⚠️ HTML parsing error: {e}")
+                
+                # Choose the best content source
+                candidates = [
+                    ('cleaned_markdown', clean_markdown),
+                    ('cleaned_html_text', clean_html_text),
+                    ('raw_markdown', markdown_content),
+                ]
+                
+                # Select the content with the most meaningful text
+                best_content = ""
+                best_method = ""
+                for method, candidate in candidates:
+                    if len(candidate) > 500 and len(candidate.split()) > 50:  # Has substantial content
+                        best_content = candidate
+                        best_method = method
+                        break
                 
-                // Click away cookie banners and consent forms
-                const dismissButtons = document.querySelectorAll(
-                    '[data-testid*="accept"], [data-testid*="dismiss"], [aria-label*="close"], ' +
-                    'button[class*="accept"], button[class*="dismiss"], .cookie-accept, .accept-cookies'
-                );
-                dismissButtons.forEach(btn => {
-                    try { btn.click(); } catch(e) {}
-                });
-                
-                // Wait for dynamic content and any lazy loading
-                await new Promise(resolve => setTimeout(resolve, 2000));
-                
-                // Trigger any lazy loading by scrolling
-                window.scrollTo(0, document.body.scrollHeight / 2);
-                await new Promise(resolve => setTimeout(resolve, 1000));
-                """
-                
-                result = await crawler.arun(
-                    url=url,
-                    config=crawler_config.clone(js_code=js_code)
-                )
+                # Fallback if no good content found
+                if not best_content and result.html:
+                    print("⚠️ Using raw HTML as final fallback")
+                    best_content = result.html
+                    best_method = "raw_html"
+                
+                print(f"✅ Selected {best_method}: {len(best_content)} characters")
+                print(f"📝 Content preview: {best_content[:300]}...")
+                
+                return {
+                    'content': best_content,
+                    'title': result.metadata.get('title', 'No title'),
+                    'url': url,
+                    'method': 'Advanced Web Scraping',
+                    'content_length': len(result.markdown),
+                    'success': True
+                }
+            else:
+                return {
+                    'success': False,
+                    'error': result.error_message or "Unknown error",
+                    'method': 'Advanced Web Scraping'
+                }
                 
-                if result.success:
-                    # Extract and clean text content
-                    markdown_content = result.markdown or ""
-                    cleaned_html = result.cleaned_html or ""
-                    
-                    print(f"📄 Raw markdown length: {len(markdown_content)} characters")
-                    print(f"🧹 Cleaned HTML length: {len(cleaned_html)} characters")
-                    
-                    # Extract readable text from the content
-                    
-                    # Method 1: Clean up markdown by removing links and formatting
-                    clean_markdown = re.sub(r'\[([^\]]*)\]\([^)]*\)', r'\1', markdown_content)  # Remove markdown links
-                    clean_markdown = re.sub(r'!\[([^\]]*)\]\([^)]*\)', '', clean_markdown)  # Remove images
-                    clean_markdown = re.sub(r'#{1,6}\s*', '', clean_markdown)  # Remove headers
-                    clean_markdown = re.sub(r'\*+', '', clean_markdown)  # Remove bold/italic
-                    clean_markdown = re.sub(r'\s+', ' ', clean_markdown).strip()  # Normalize whitespace
-                    
-                    # Method 2: Extract text from HTML
-                    clean_html_text = ""
-                    try:
-                        soup = BeautifulSoup(cleaned_html, 'html.parser')
-                        # Remove unwanted elements
-                        for element in soup(['script', 'style', 'nav', 'footer', 'aside', 'header']):
-                            element.decompose()
-                        clean_html_text = soup.get_text(separator=' ', strip=True)
-                        clean_html_text = re.sub(r'\s+', ' ', clean_html_text).strip()
-                    except Exception as e:
-                        print(f"⚠️ HTML parsing error: {e}")
-                    
-                    # Choose the best content source
-                    candidates = [
-                        ('cleaned_markdown', clean_markdown),
-                        ('cleaned_html_text', clean_html_text),
-                        ('raw_markdown', markdown_content),
-                    ]
-                    
-                    # Select the content with the most meaningful text
-                    best_content = ""
-                    best_method = ""
-                    for method, candidate in candidates:
-                        if len(candidate) > 500 and len(candidate.split()) > 50:  # Has substantial content
-                            best_content = candidate
-                            best_method = method
-                            break
-                    
-                    # Fallback if no good content found
-                    if not best_content and result.html:
-                        print("⚠️ Using raw HTML as final fallback")
-                        best_content = result.html
-                        best_method = "raw_html"
-                    
-                    print(f"✅ Selected {best_method}: {len(best_content)} characters")
-                    print(f"📝 Content preview: {best_content[:300]}...")
-                    
-                    return {
-                        'content': best_content,
-                        'title': result.metadata.get('title', 'No title'),
-                        'url': url,
-                        'method': 'Advanced Web Scraping',
-                        'content_length': len(result.markdown),
-                        'success': True
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'error': result.error_message or "Unknown error",
-                        'method': 'Advanced Web Scraping'
-                    }
-                    
         except Exception as e:
             return {
                 'success': False,
@@ -330,62 +241,10 @@ class WebPageAnalyzer:
 
     def detect_language(self, text):
         """Detect if the text is Arabic or English based on character analysis"""
-        if not text:
-            return 'en'
-        
-        # Count Arabic characters (Unicode range for Arabic script)
-        arabic_chars = 0
-        english_chars = 0
-        total_chars = 0
-        
-        for char in text:
-            if char.isalpha():
-                total_chars += 1
-                # Arabic Unicode ranges: 0x0600-0x06FF (Arabic), 0x0750-0x077F (Arabic Supplement)
-                if '\u0600' <= char <= '\u06FF' or '\u0750' <= char <= '\u077F':
-                    arabic_chars += 1
-                elif 'A' <= char <= 'Z' or 'a' <= char <= 'z':
-                    english_chars += 1
-        
-        if total_chars == 0:
-            return 'en'
-        
-        arabic_ratio = arabic_chars / total_chars
-        english_ratio = english_chars / total_chars
-        
-        print(f"Web content language detection - Arabic: {arabic_ratio:.2%}, English: {english_ratio:.2%}")
-        
-        # Enhanced logic for mixed content detection
-        print(f"Total characters analyzed: {total_chars}")
-        
-        # If more than 25% Arabic characters, consider it Arabic (lowered threshold for mixed content)
-        if arabic_ratio > 0.25:
-            return 'ar'
-        elif english_ratio > 0.6:  # Need higher threshold for English to be confident
-            return 'en'
-        else:
-            # Enhanced fallback: check for Arabic words and patterns
-            arabic_indicators = ['في', 'من', 'إلى', 'على', 'هذا', 'التي', 'الذي', 'وهو', 'ولا', 'أن', 'كان', 'هي', 'له', 'أو', 'قال', 'بين', 'عند', 'غير', 'بعد', 'حول', 'أول', 'كل', 'لم', 'قد', 'لا', 'ما', 'ان']
-            
-            # Count Arabic word occurrences (case-insensitive)
-            arabic_word_count = 0
-            for word in arabic_indicators:
-                arabic_word_count += text.count(word)
-            
-            # Also check for Arabic sentence patterns
-            arabic_patterns = ['===', 'فيديو', 'VIDEO']  # Common in mixed transcripts
-            pattern_count = sum(1 for pattern in arabic_patterns if pattern in text)
-            
-            print(f"Arabic words found: {arabic_word_count}, patterns: {pattern_count}")
-            
-            # If we found Arabic words or patterns, and Arabic ratio is not negligible
-            if (arabic_word_count > 2 or pattern_count > 0) and arabic_ratio > 0.1:
-                return 'ar'
-            else:
-                return 'en'
+        return detect_language(text)
 
     def summarize_content_with_g4f(self, content, title="", custom_prompt=None, target_language=None, progress=None):
-        """Summarize extracted content using G4F with intelligent content compression to preserve all information"""
+        """Summarize extracted content using G4F; long content is map-reduced so nothing is dropped"""
         try:
             if progress:
                 # Language-specific progress messages
@@ -394,22 +253,21 @@ class WebPageAnalyzer:
                 else:
                     progress.update('processing', 20, 'Processing...')
             
-            # Intelligent content optimization for long content
-            max_content_length = MAX_CONTENT_LENGTH
-            if len(content) > max_content_length:
+            # Long content: summarize chunks in parallel and summarize their notes instead of truncating
+            map_reduce = get_map_reduce_summarizer()
+            if map_reduce.needs_reduction(content):
                 if progress:
                     if target_language == 'ar':
                         progress.update('compressing', 40, 'جاري المعالجة...')
                     else:
                         progress.update('compressing', 40, 'Processing...')
-                print(f"📄 Content is {len(content)} chars, using intelligent compression...")
-                content = self._intelligent_content_compression(content, max_content_length, progress)
-                print(f"📄 Compressed content to {len(content)} chars (preserved all key information)")
-                if progress:
-                    if target_language == 'ar':
-                        progress.update('compressed', 60, 'جاري المعالجة...')
-                    else:
-                        progress.update('compressed', 60, 'Processing...')
+                chunk_language = target_language if target_language in ['ar', 'en'] else self.detect_language(content)
+                print(f"📄 Content is {len(content)} chars, using map-reduce summarization...")
+                original_length = len(content)
+                content = map_reduce.condense(content, chunk_language, progress, progress_range=(40, 78))
+                if content is None:
+                    return {'success': False, 'error': 'Task cancelled by user'}
+                print(f"📄 Condensed {original_length} chars into {len(content)} chars of section notes")
             
             # Use standard summarization
             if progress:
@@ -436,142 +294,6 @@ class WebPageAnalyzer:
                 'method': 'g4f_main_error'
             }
 
-    def _intelligent_content_compression(self, content, target_length, progress=None):
-        """Intelligently compress content by removing redundant information while preserving meaning"""
-        try:
-            print("🔄 Applying intelligent content compression...")
-            
-            # Step 1: Remove redundant whitespace and formatting
-            import re
-            
-            # Normalize whitespace
-            content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)  # Multiple newlines → double newline
-            content = re.sub(r' +', ' ', content)  # Multiple spaces → single space
-            content = re.sub(r'\t+', ' ', content)  # Tabs → spaces
-            
-            # Step 2: Remove navigation and menu items (common website clutter)
-            navigation_patterns = [
-                r'(?i)(?:home|about|contact|menu|login|register|sign up|sign in|subscribe|follow)\s*[|\-•]\s*',
-                r'(?i)(?:facebook|twitter|instagram|linkedin|youtube|tiktok)\s*[|\-•]\s*',
-                r'(?i)(?:privacy policy|terms of service|cookie policy|disclaimer)\s*[|\-•]\s*',
-                r'(?i)(?:©|copyright|all rights reserved).*?\d{4}',
-                r'(?i)(?:share|like|comment|subscribe|follow us)(?:\s+[^\w\s])*',
-            ]
-            
-            for pattern in navigation_patterns:
-                content = re.sub(pattern, '', content)
-            
-            # Step 3: Remove duplicate sentences (common in web scraping)
-            sentences = content.split('.')
-            seen_sentences = set()
-            unique_sentences = []
-            
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if len(sentence) > 10:  # Skip very short fragments
-                    # Create a normalized version for comparison
-                    normalized = re.sub(r'[^\w\s]', '', sentence.lower())
-                    if normalized not in seen_sentences:
-                        seen_sentences.add(normalized)
-                        unique_sentences.append(sentence)
-            
-            content = '. '.join(unique_sentences)
-            
-            # Step 4: Smart paragraph compression - keep most informative paragraphs
-            paragraphs = content.split('\n\n')
-            if len(paragraphs) > 10 and len(content) > target_length:
-                
-                # Score paragraphs by information density
-                scored_paragraphs = []
-                for i, para in enumerate(paragraphs):
-                    if len(para.strip()) > 20:  # Skip very short paragraphs
-                        score = self._score_paragraph_importance(para, i, len(paragraphs))
-                        scored_paragraphs.append((score, para))
-                
-                # Sort by importance and take the best ones
-                scored_paragraphs.sort(key=lambda x: x[0], reverse=True)
-                
-                # Keep paragraphs until we approach target length
-                selected_paragraphs = []
-                current_length = 0
-                
-                for score, para in scored_paragraphs:
-                    if current_length + len(para) <= target_length * 0.95:  # Leave some buffer
-                        selected_paragraphs.append(para)
-                        current_length += len(para)
-                    elif len(selected_paragraphs) == 0:  # Always keep at least one paragraph
-                        selected_paragraphs.append(para[:target_length//2])
-                        break
-                
-                content = '\n\n'.join(selected_paragraphs)
-            
-            # Step 5: Final length check - if still too long, smart truncation
-            if len(content) > target_length:
-                print("📄 Applying final smart truncation...")
-                # Keep first 80% and last 20% to preserve context
-                first_part = int(target_length * 0.8)
-                last_part = target_length - first_part - 50  # 50 chars for separator
-                
-                content = content[:first_part] + "\n[...]\n" + content[-last_part:]
-            
-            print(f"✅ Compression complete: {len(content)} chars")
-            return content
-            
-        except Exception as e:
-            print(f"⚠️ Compression failed, using simple truncation: {e}")
-            # Fallback to simple truncation
-            return content[:target_length]
-
-    def _score_paragraph_importance(self, paragraph, position, total_paragraphs):
-        """Score a paragraph's importance for content selection"""
-        score = 0
-        para_lower = paragraph.lower()
-        
-        # Length-based scoring (medium length is best)
-        para_len = len(paragraph)
-        if 100 <= para_len <= 500:
-            score += 10
-        elif 50 <= para_len <= 1000:
-            score += 5
-        elif para_len < 50:
-            score -= 5
-        
-        # Position-based scoring (beginning and end are important)
-        if position < total_paragraphs * 0.2:  # First 20%
-            score += 8
-        elif position > total_paragraphs * 0.8:  # Last 20%
-            score += 6
-        else:
-            score += 3  # Middle content
-        
-        # Content quality indicators
-        quality_indicators = [
-            'important', 'key', 'main', 'primary', 'essential', 'crucial', 'significant',
-            'conclusion', 'summary', 'result', 'finding', 'research', 'study', 'analysis',
-            'because', 'therefore', 'however', 'although', 'furthermore', 'moreover',
-            'example', 'instance', 'specifically', 'particular', 'details'
-        ]
-        
-        for indicator in quality_indicators:
-            if indicator in para_lower:
-                score += 2
-        
-        # Penalize navigation/menu content
-        navigation_words = [
-            'click', 'menu', 'navigation', 'home', 'contact', 'about', 'login',
-            'register', 'subscribe', 'follow', 'share', 'like', 'comment'
-        ]
-        
-        nav_count = sum(1 for word in navigation_words if word in para_lower)
-        score -= nav_count * 3
-        
-        # Reward informative punctuation
-        sentence_count = paragraph.count('.') + paragraph.count('!') + paragraph.count('?')
-        if sentence_count > 1:
-            score += min(sentence_count, 5)
-        
-        return score
-
     def _standard_summarize(self, content, title="", custom_prompt=None, target_language=None, progress=None):
         """Standard summarization for content ≤ 20K characters"""
         try:
@@ -596,10 +318,11 @@ class WebPageAnalyzer:
             
             # Create language-specific summarization prompt
             if custom_prompt:
-                prompt = custom_prompt.format(content=content, title=title)
+                template = custom_prompt
             else:
                 template = LANGUAGE_TEMPLATES[detected_language]['webpage_template']
-                prompt = template.format(content=content, title=title)
+            prompt = template.format(content=content, title=title)
+            cache_key = make_cache_key('webpage_summary', f"{title}\n{content}", detected_language, template)
 
             # Check for cancellation before AI processing
             if progress and progress.is_cancelled():
@@ -649,7 +372,7 @@ class WebPageAnalyzer:
                 
                 print(f"🔍 DEBUG: Calling G4F with stream=True...")
                 # Attempt streaming with smart fallback
-                response = self.make_ai_request_with_fallback(prompt, progress, 'en', stream=True)
+                response = self.make_ai_request_with_fallback(prompt, progress, 'en', stream=True, cache_key=cache_key)
                 print(f"🔍 DEBUG: G4F streaming call successful, processing chunks...")
                 
                 # Process stream with consistent word-by-word streaming for both languages
@@ -691,35 +414,12 @@ class WebPageAnalyzer:
                     progress.update('fallback', 89, 'Streaming failed, using standard generation...')
                 
                 print(f"🔍 DEBUG: Attempting fallback non-streaming call...")
-                response = self.make_ai_request_with_fallback(prompt, progress, 'en', stream=False)
+                response = self.make_ai_request_with_fallback(prompt, progress, 'en', stream=False, cache_key=cache_key)
                 summary = response.choices[0].message.content
                 
-                # Real-time word-by-word streaming simulation
+                # Send the finished summary at once; the browser paces the typing effect
                 if progress and summary:
-                    import time
-                    
-                    # Split into words for realistic typing effect
-                    words = summary.split()
-                    accumulated = ""
-                    
-                    # Stream word by word for true real-time effect
-                    for i, word in enumerate(words):
-                        # Check for cancellation during word streaming
-                        if progress and progress.is_cancelled():
-                            print("❌ Task cancelled during word-by-word streaming")
-                            return {'success': False, 'error': 'Task cancelled by user'}
-                            
-                        accumulated += word + " "
-                        
-                        percentage = 90 + (i / len(words) * 7)  # Progress from 90% to 97%
-                        
-                        # Send every single word for smooth word-by-word display
-                        progress.update('word_by_word', percentage, 
-                                      f'Streaming word {i+1}/{len(words)}...', 
-                                      accumulated.strip())
-                        
-                        # Very fast word-by-word streaming for smooth experience
-                        time.sleep(0.04)  # 40ms per word = ~900 WPM (very fast streaming)
+                    progress.update('word_by_word', 97, 'Complete summary received', summary)
             
             if progress:
                 progress.update('finalizing', 98, 'Complete', summary)
@@ -775,21 +475,8 @@ class WebPageAnalyzer:
                 
                 print(f"Using Crawl4AI to scrape: {url}")
                 
-                # Run Crawl4AI in async context with proper error handling
-                try:
-                    # Check if we're already in an async context
-                    try:
-                        loop = asyncio.get_running_loop()
-                        # We're in an async context, create a new thread
-                        with concurrent.futures.ThreadPoolExecutor() as executor:
-                            future = executor.submit(asyncio.run, self.scrape_with_crawl4ai(url))
-                            crawl_result = future.result(timeout=30)
-                    except RuntimeError:
-                        # No running loop, we can run directly
-                        crawl_result = asyncio.run(self.scrape_with_crawl4ai(url))
-                except Exception as async_error:
-                    print(f"Async execution error: {async_error}")
-                    crawl_result = {'success': False, 'error': str(async_error)}
+                # Crawl4AI on the worker's shared browser (safe from any thread)
+                crawl_result = self.scrape_with_crawl4ai(url)
                 
                 if crawl_result.get('success'):
                     content = crawl_result['content']
@@ -5,20 +5,50 @@ Handles video ID extraction, transcript retrieval, and AI-powered summarization.
 
 import re
 import json
+import html
 import requests
 import time
 import random
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bs4 import BeautifulSoup
-import g4f
-from g4f.client import Client
 
-from .config import MODEL_CONFIGS, USER_AGENTS, PROXY_LIST, LANGUAGE_TEMPLATES
+from .config import MODEL_CONFIGS, USER_AGENTS, PROXY_LIST, LANGUAGE_TEMPLATES, INCREMENTAL_SUMMARY_CONFIG
+from .language_detector import detect_language
+from .llm_gateway import get_llm_gateway
+from .llm_cache import make_cache_key
+from .map_reduce import get_map_reduce_summarizer
+from .async_llm import get_async_llm
+from .llm_metrics import bind_llm_context
+from .offline import offline_enabled, fixture_base_url
+
+# Timestamped segments on youtubetotranscript.com: <span class="transcript-segment" data-start=".." data-duration="..">
+TRANSCRIPT_SEGMENT_RE = re.compile(r'<span\b([^>]*\btranscript-segment\b[^>]*)>(.*?)</span>', re.S)
+SEGMENT_ATTR_RE = re.compile(r'data-(start|duration)=["\']([^"\']*)["\']')
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def transcript_page_url(video_id):
+    """youtubetotranscript.com page of a video (served by the fixture server in offline mode)"""
+    if offline_enabled():
+        return f"{fixture_base_url()}/transcript?v={video_id}"
+    return f"https://youtubetotranscript.com/transcript?v={video_id}"
+
+
+def format_timestamp(seconds):
+    """Format seconds as M:SS or H:MM:SS"""
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
 
 class YouTubeProcessor:
     def __init__(self):
-        # G4F Direct client configuration
-        self.g4f_client = Client()
+        # Shared LLM gateway (pooled clients, process-wide model health)
+        self.llm_gateway = get_llm_gateway()
         
         # Primary and fallback configurations
         self.model_configs = MODEL_CONFIGS
@@ -54,123 +84,47 @@ class YouTubeProcessor:
             ]
         return random.choice(messages)
 
-    def try_next_model(self):
-        """Switch to the next model configuration in the fallback chain"""
-        self.current_config_index += 1
-        if self.current_config_index < len(self.model_configs):
-            config = self.model_configs[self.current_config_index]
-            self.model = config["model"]
-            self.provider = config["provider"]
-            print(f"🔄 Switching to fallback model: {config['name']}")
-            return True
-        else:
-            print("❌ All fallback models exhausted")
-            return False
+    def get_current_model_name(self):
+        """Get the name of the model that served the last request"""
+        return self.model_configs[self.current_config_index]["name"]
     
-    def reset_to_primary_model(self):
-        """Reset to the primary model configuration"""
-        self.current_config_index = 0
-        config = self.model_configs[0]
+    def _use_config(self, config):
+        """Remember which model served the last request"""
+        if config in self.model_configs:
+            self.current_config_index = self.model_configs.index(config)
         self.model = config["model"]
         self.provider = config["provider"]
-        print(f"✅ Reset to primary model: {config['name']}")
     
-    def get_current_model_name(self):
-        """Get the name of the currently active model"""
-        return self.model_configs[self.current_config_index]["name"]
-    
-    def make_ai_request_with_fallback(self, prompt, progress=None, language='en', stream=False):
-        """Make AI request with automatic fallback through all configured models"""
+    def make_ai_request_with_fallback(self, prompt, progress=None, language='en', stream=False, cache_key=None):
+        """Make AI request through the shared LLM gateway (automatic fallback through all configured models)"""
         print(f"🔍 DEBUG: Starting AI request with fallback, stream={stream}")
-        last_error = None
-        original_config_index = self.current_config_index
         
-        # Try each model in the fallback chain
-        while self.current_config_index < len(self.model_configs):
-            try:
-                config = self.model_configs[self.current_config_index]
-                print(f"🤖 Trying model: {config['name']}")
-                print(f"🔍 DEBUG: Model config - provider: {config.get('provider')}, model: {config.get('model')}")
-                
-                # Update progress with random engaging message
-                if progress:
-                    model_attempt = self.current_config_index + 1
-                    total_models = len(self.model_configs)
-                    random_message = self._get_random_progress_message(language, config["name"])
-                    
-                    # Detect context based on current progress to avoid conflicts
-                    # Safely check if progress has a progress attribute (for ProgressTracker objects)
-                    if hasattr(progress, 'progress') and progress.progress:
-                        current_progress = progress.progress.get('percentage', 0)
-                        if current_progress < 50:
-                            # Shorts generation context (40-60% range)
-                            ai_progress = 40 + (model_attempt * 3)  # 40%, 43%, 46%, etc.
-                        else:
-                            # Summary generation context (65%+ range)
-                            ai_progress = 65 + (model_attempt * 5)
+        def on_attempt(config, model_attempt):
+            print(f"🤖 Trying model: {config['name']}")
+            
+            # Update progress with random engaging message
+            if progress and hasattr(progress, 'update'):
+                random_message = self._get_random_progress_message(language, config["name"])
+                
+                # Detect context based on current progress to avoid conflicts
+                # Safely check if progress has a progress attribute (for ProgressTracker objects)
+                if hasattr(progress, 'progress') and progress.progress:
+                    current_progress = progress.progress.get('percentage', 0)
+                    if current_progress < 50:
+                        # Shorts generation context (40-60% range)
+                        ai_progress = 40 + (model_attempt * 3)  # 40%, 43%, 46%, etc.
                     else:
-                        # Default progress for simple progress objects
+                        # Summary generation context (65%+ range)
                         ai_progress = 65 + (model_attempt * 5)
-                    
-                    # Only call update if the progress object has an update method
-                    if hasattr(progress, 'update'):
-                        progress.update('ai_request', ai_progress, random_message)
-                
-                print(f"🔍 DEBUG: About to create chat completion...")
-                
-                # Make the request (removed signal timeout as it doesn't work in threads)
-                if stream:
-                    print(f"🔍 DEBUG: Creating streaming chat completion...")
-                    response = self.g4f_client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        provider=self.provider,
-                        stream=True
-                    )
                 else:
-                    print(f"🔍 DEBUG: Creating non-streaming chat completion...")
-                    response = self.g4f_client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        provider=self.provider
-                    )
-                
-                print(f"🔍 DEBUG: Chat completion created successfully")
-                print(f"✅ Success with model: {config['name']}")
-                return response
+                    # Default progress for simple progress objects
+                    ai_progress = 65 + (model_attempt * 5)
                 
-            except Exception as e:
-                last_error = e
-                error_msg = str(e).lower()
-                config = self.model_configs[self.current_config_index]
-                
-                print(f"❌ Model {config['name']} failed: {str(e)}")
-                
-                # Check if this is a retryable error
-                if any(keyword in error_msg for keyword in ['rate limit', 'quota', 'timeout', 'connection', 'unavailable']):
-                    print(f"🔄 Retryable error detected, trying next model...")
-                    if not self.try_next_model():
-                        break
-                else:
-                    # Non-retryable error, but still try next model
-                    print(f"⚠️ Non-retryable error, but trying next model anyway...")
-                    if not self.try_next_model():
-                        break
-        
-        # If we get here, all models failed
-        print(f"💥 All {len(self.model_configs)} models failed")
-        
-        # Reset to original configuration for next attempt
-        self.current_config_index = original_config_index
-        config = self.model_configs[self.current_config_index]
-        self.model = config["model"]
-        self.provider = config["provider"]
+                progress.update('ai_request', ai_progress, random_message)
         
-        # Raise the last error encountered
-        if last_error:
-            raise last_error
-        else:
-            raise Exception("All AI models are currently unavailable. Please try again later.")
+        response, config = self.llm_gateway.request(prompt, stream=stream, on_attempt=on_attempt, cache_key=cache_key)
+        self._use_config(config)
+        return response
 
     def extract_video_id(self, url):
         """Extract video ID from YouTube URL"""
@@ -238,7 +192,7 @@ class YouTubeProcessor:
                 session.timeout = approach.get('timeout', 15)
                 
                 # Step 1: Build the transcript service URL (much simpler!)
-                transcript_service_url = f"https://youtubetotranscript.com/transcript?v={video_id}"
+                transcript_service_url = transcript_page_url(video_id)
                 
                 print(f"Analyzing video content...")
                 
@@ -250,8 +204,10 @@ class YouTubeProcessor:
                 if progress and progress.is_cancelled():
                     raise Exception("Task cancelled by user")
                 
-                # Reduced delays for Cloud Run timeout optimization
-                if approach.get('proxy'):
+                # Reduced delays for Cloud Run timeout optimization (none against the offline fixture server)
+                if offline_enabled():
+                    pass
+                elif approach.get('proxy'):
                     time.sleep(random.uniform(0.5, 1.5))  # Shorter delay for proxy requests
                 else:
                     time.sleep(random.uniform(0.2, 0.8))  # Very short delay for direct requests
@@ -465,14 +421,16 @@ class YouTubeProcessor:
                 session.timeout = approach.get('timeout', 15)
                 
                 # Build URL
-                transcript_service_url = f"https://youtubetotranscript.com/transcript?v={video_id}"
+                transcript_service_url = transcript_page_url(video_id)
                 
                 # Check for cancellation before HTTP request
                 if progress and progress.is_cancelled():
                     raise Exception("Task cancelled by user")
                 
-                # Small delay
-                if approach.get('proxy'):
+                # Small delay (none against the offline fixture server)
+                if offline_enabled():
+                    pass
+                elif approach.get('proxy'):
                     time.sleep(random.uniform(0.5, 1.5))
                 else:
                     time.sleep(random.uniform(0.2, 0.8))
@@ -587,6 +545,93 @@ class YouTubeProcessor:
             "Timestamps are required for accurate shorts generation."
         )
 
+    def iter_transcript_segments(self, video_id, progress=None):
+        """
+        Stream the timestamped transcript page and yield segments while it downloads.
+        Yields dicts with 'start', 'duration', 'end', 'text' (same shape as get_transcript_with_timestamps).
+        """
+        approaches = [
+            {'name': 'Direct YouTubeToTranscript (streamed)', 'proxy': None, 'timeout': 15},
+            {'name': 'Malaysia Proxy (streamed)', 'proxy': PROXY_LIST[0], 'timeout': 12},
+        ]
+        
+        for approach in approaches:
+            if progress and progress.is_cancelled():
+                raise Exception("Task cancelled by user")
+            
+            yielded = 0
+            try:
+                session = requests.Session()
+                session.headers.update({
+                    'User-Agent': random.choice(USER_AGENTS),
+                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                    'Accept-Language': 'en-US,en;q=0.9',
+                    'Accept-Encoding': 'gzip, deflate',
+                    'Connection': 'keep-alive',
+                    'Upgrade-Insecure-Requests': '1',
+                    'Referer': 'https://www.google.com/',
+                })
+                if approach.get('proxy'):
+                    session.proxies.update(approach['proxy'])
+                
+                transcript_service_url = transcript_page_url(video_id)
+                print(f"📡 Streaming transcript segments ({approach['name']})...")
+                response = session.get(transcript_service_url, stream=True, timeout=approach['timeout'])
+                
+                if response.status_code != 200:
+                    print(f"Failed to get transcript page: {response.status_code}")
+                    continue
+                
+                if 'charset' not in response.headers.get('Content-Type', '').lower():
+                    response.encoding = 'utf-8'
+                
+                buffer = ""
+                for chunk in response.iter_content(chunk_size=16384, decode_unicode=True):
+                    if progress and progress.is_cancelled():
+                        response.close()
+                        raise Exception("Task cancelled by user")
+                    
+                    buffer += chunk
+                    last_end = 0
+                    for match in TRANSCRIPT_SEGMENT_RE.finditer(buffer):
+                        last_end = match.end()
+                        segment = self._parse_segment_match(match)
+                        if segment:
+                            yielded += 1
+                            yield segment
+                    
+                    if last_end:
+                        buffer = buffer[last_end:]
+                    elif len(buffer) > 65536:
+                        # Keep only a possibly incomplete segment tag at the end of the buffer
+                        open_tag = buffer.rfind('<span')
+                        buffer = buffer[open_tag:] if open_tag != -1 else buffer[-256:]
+                
+                if yielded:
+                    print(f"✅ Streamed {yielded} timestamped segments")
+                    return
+                print("❌ No timestamped segments found in streamed page")
+                
+            except Exception as e:
+                # Segments already handed to the caller cannot be replayed from another source
+                if yielded or "cancelled" in str(e).lower():
+                    raise
+                print(f"Approach '{approach['name']}' failed: {e}")
+                continue
+
+    def _parse_segment_match(self, match):
+        """Convert a transcript-segment regex match to a segment dict"""
+        attrs = dict(SEGMENT_ATTR_RE.findall(match.group(1)))
+        text = html.unescape(HTML_TAG_RE.sub('', match.group(2))).strip()
+        try:
+            start = float(attrs.get('start', ''))
+            duration = float(attrs['duration']) if attrs.get('duration') else 0.0
+        except ValueError:
+            return None
+        if not text:
+            return None
+        return {'start': start, 'duration': duration, 'end': start + duration, 'text': text}
+
     def _try_caption_url(self, session, caption_url):
         """Try to fetch and parse captions from a URL"""
         try:
@@ -646,77 +691,13 @@ class YouTubeProcessor:
             text: Either a string (plain text) OR list of dicts with timestamps
                   [{'start': 1.36, 'duration': 1.68, 'text': '...'}]
         """
-        if not text:
-            return 'en'
-        
-        # Handle timestamped transcript (list of dicts)
-        if isinstance(text, list) and len(text) > 0 and isinstance(text[0], dict):
-            # Extract plain text from timestamped segments
-            text_content = ' '.join([seg.get('text', '') for seg in text])
-            print(f"🔍 Language detection: Converting timestamped transcript to text ({len(text)} segments)")
-        else:
-            # Handle plain text
-            text_content = text
-            print(f"🔍 Language detection: Using plain text ({len(text)} chars)")
-        
-        if not text_content:
-            return 'en'
-        
-        # Count Arabic characters (Unicode range for Arabic script)
-        arabic_chars = 0
-        english_chars = 0
-        total_chars = 0
-        
-        for char in text_content:
-            if char.isalpha():
-                total_chars += 1
-                # Arabic Unicode ranges: 0x0600-0x06FF (Arabic), 0x0750-0x077F (Arabic Supplement)
-                if '\u0600' <= char <= '\u06FF' or '\u0750' <= char <= '\u077F':
-                    arabic_chars += 1
-                elif 'A' <= char <= 'Z' or 'a' <= char <= 'z':
-                    english_chars += 1
-        
-        if total_chars == 0:
-            return 'en'
-        
-        arabic_ratio = arabic_chars / total_chars
-        english_ratio = english_chars / total_chars
-        
-        print(f"Language detection - Arabic: {arabic_ratio:.2%}, English: {english_ratio:.2%}")
-        
-        # Enhanced logic for mixed content detection
-        print(f"Total characters analyzed: {total_chars}")
-        
-        # If more than 25% Arabic characters, consider it Arabic (lowered threshold for mixed content)
-        if arabic_ratio > 0.25:
-            return 'ar'
-        elif english_ratio > 0.6:  # Need higher threshold for English to be confident
-            return 'en'
-        else:
-            # Enhanced fallback: check for Arabic words and patterns
-            arabic_indicators = ['في', 'من', 'إلى', 'على', 'هذا', 'التي', 'الذي', 'وهو', 'ولا', 'أن', 'كان', 'هي', 'له', 'أو', 'قال', 'بين', 'عند', 'غير', 'بعد', 'حول', 'أول', 'كل', 'لم', 'قد', 'لا', 'ما', 'ان']
-            
-            # Count Arabic word occurrences (case-insensitive)
-            arabic_word_count = 0
-            for word in arabic_indicators:
-                arabic_word_count += text_content.count(word)
-            
-            # Also check for Arabic sentence patterns
-            arabic_patterns = ['===', 'فيديو', 'VIDEO']  # Common in mixed transcripts
-            pattern_count = sum(1 for pattern in arabic_patterns if pattern in text_content)
-            
-            print(f"Arabic words found: {arabic_word_count}, patterns: {pattern_count}")
-            
-            # If we found Arabic words or patterns, and Arabic ratio is not negligible
-            if (arabic_word_count > 2 or pattern_count > 0) and arabic_ratio > 0.1:
-                return 'ar'
-            else:
-                return 'en'
+        return detect_language(text)
 
     def get_video_info(self, video_id):
         """Get basic video information from YouTube oEmbed"""
         try:
-            oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
+            oembed_base = f"{fixture_base_url()}/oembed" if offline_enabled() else "https://www.youtube.com/oembed"
+            oembed_url = f"{oembed_base}?url=https://www.youtube.com/watch?v={video_id}&format=json"
             response = requests.get(oembed_url)
             
             if response.status_code == 200:
@@ -754,54 +735,93 @@ class YouTubeProcessor:
             else:
                 raise Exception(f"Failed to generate summary: {error_msg}")
     
-    def summarize_with_g4f_language(self, transcript, language='en', progress=None):
-        """Generate summary using advanced AI with language-specific optimization"""
-        try:
-            # Check for cancellation at start
-            if progress and progress.is_cancelled():
-                return "Task cancelled by user"
-            
-            # Get template for the detected/specified language
-            template = LANGUAGE_TEMPLATES[language]['youtube_template']
-            
-            prompt = f"""{template}
+    def prepare_summary_prompt(self, transcript, language='en', progress=None, content_label='Transcript'):
+        """Build the summary prompt (condensing oversized transcripts first); returns (prompt, cache_key) or None if cancelled"""
+        # Check for cancellation at start
+        if progress and progress.is_cancelled():
+            return None
+        
+        # Too long for one prompt: summarize chunks in parallel and summarize their notes instead
+        map_reduce = get_map_reduce_summarizer()
+        if map_reduce.needs_reduction(transcript):
+            transcript = map_reduce.condense(transcript, language, progress, progress_range=(50, 61))
+            if transcript is None:
+                return None
+            content_label = f'{content_label} notes (in order)'
+        
+        # Get template for the detected/specified language
+        template = LANGUAGE_TEMPLATES[language]['youtube_template']
+        
+        prompt = f"""{template}
 
-Transcript:
+{content_label}:
 {transcript}
 
 Summary:"""
+        cache_key = make_cache_key('youtube_summary', transcript, language, f"{template}\n{content_label}")
 
-            # Check for cancellation before AI call
-            if progress and progress.is_cancelled():
+        # Check for cancellation before AI call
+        if progress and progress.is_cancelled():
+            return None
+            
+        # Show content preview logic - avoid showing Arabic content to English users
+        if progress and len(transcript) > 500:
+            # Detect if transcript contains Arabic characters for preview decision
+            arabic_char_count = sum(1 for char in transcript[:500] if '\u0600' <= char <= '\u06FF' or '\u0750' <= char <= '\u077F')
+            has_arabic_content = arabic_char_count > 10  # If more than 10 Arabic characters in first 500
+            
+            if language == 'ar':
+                # Arabic UI
+                if progress and hasattr(progress, 'update'):
+                    progress.update('analyzing', 62, 'تحليل المحتوى...')
+            elif language == 'en' and not has_arabic_content:
+                # English UI with English content - show preview (keep this for user engagement)
+                content_preview = transcript[:300] + "..." if len(transcript) > 300 else transcript
+                if progress and hasattr(progress, 'update'):
+                    progress.update('analyzing', 62, 'Analyzing content...', content_preview)
+            else:
+                # English UI with other content
+                if progress and hasattr(progress, 'update'):
+                    progress.update('analyzing', 62, 'Analyzing content...')
+        elif progress:
+            # Fallback for short content
+            if language == 'ar':
+                if hasattr(progress, 'update'):
+                    progress.update('analyzing', 62, 'تحليل المحتوى...')
+            else:
+                if hasattr(progress, 'update'):
+                    progress.update('analyzing', 62, 'Analyzing content...')
+        
+        return prompt, cache_key
+    
+    def summarize_async(self, transcript, language, progress, on_complete, on_error, content_label='Transcript'):
+        """Prepare the summary prompt in the calling thread, then stream the answer on the async loop.
+
+        Returns as soon as the stream has started so the calling thread is released;
+        on_complete(summary) or on_error(exception) is called from the loop when it ends.
+        """
+        prepared = self.prepare_summary_prompt(transcript, language, progress, content_label)
+        if prepared is None:
+            progress.cancel()
+            return
+        prompt, cache_key = prepared
+        
+        message = 'إنشاء الملخص...' if language == 'ar' else 'Creating summary...'
+        progress.update('streaming_start', 65, message, '')
+        
+        def on_text(summary):
+            percentage = min(65 + (len(summary) / 20), 95)
+            progress.update('streaming', percentage, f'{message} {percentage:.0f}%', summary)
+        
+        get_async_llm().stream_to_progress(prompt, progress, on_text, on_complete, on_error, cache_key=cache_key)
+    
+    def summarize_with_g4f_language(self, transcript, language='en', progress=None, content_label='Transcript'):
+        """Generate summary using advanced AI with language-specific optimization"""
+        try:
+            prepared = self.prepare_summary_prompt(transcript, language, progress, content_label)
+            if prepared is None:
                 return "Task cancelled by user"
-                
-            # Show content preview logic - avoid showing Arabic content to English users
-            if progress and len(transcript) > 500:
-                # Detect if transcript contains Arabic characters for preview decision
-                arabic_char_count = sum(1 for char in transcript[:500] if '\u0600' <= char <= '\u06FF' or '\u0750' <= char <= '\u077F')
-                has_arabic_content = arabic_char_count > 10  # If more than 10 Arabic characters in first 500
-                
-                if language == 'ar':
-                    # Arabic UI
-                    if progress and hasattr(progress, 'update'):
-                        progress.update('analyzing', 62, 'تحليل المحتوى...')
-                elif language == 'en' and not has_arabic_content:
-                    # English UI with English content - show preview (keep this for user engagement)
-                    content_preview = transcript[:300] + "..." if len(transcript) > 300 else transcript
-                    if progress and hasattr(progress, 'update'):
-                        progress.update('analyzing', 62, 'Analyzing content...', content_preview)
-                else:
-                    # English UI with other content
-                    if progress and hasattr(progress, 'update'):
-                        progress.update('analyzing', 62, 'Analyzing content...')
-            elif progress:
-                # Fallback for short content
-                if language == 'ar':
-                    if hasattr(progress, 'update'):
-                        progress.update('analyzing', 62, 'تحليل المحتوى...')
-                else:
-                    if hasattr(progress, 'update'):
-                        progress.update('analyzing', 62, 'Analyzing content...')
+            prompt, cache_key = prepared
             
             # Try streaming first, fallback to regular if it fails
             summary = ""
@@ -822,7 +842,7 @@ Summary:"""
                 
                 print(f"🔍 DEBUG: Calling G4F with stream=True for YouTube...")
                 # Attempt streaming with smart fallback
-                response = self.make_ai_request_with_fallback(prompt, progress, language, stream=True)
+                response = self.make_ai_request_with_fallback(prompt, progress, language, stream=True, cache_key=cache_key)
                 print(f"🔍 DEBUG: G4F streaming call successful, processing chunks...")
                 
                 # Process stream with consistent word-by-word streaming for both languages
@@ -885,55 +905,21 @@ Summary:"""
                             progress.update('fallback', 70, 'Creating summary...')
                 
                 print(f"🔍 DEBUG: Attempting fallback non-streaming call for YouTube...")
-                response = self.make_ai_request_with_fallback(prompt, progress, language, stream=False)
+                response = self.make_ai_request_with_fallback(prompt, progress, language, stream=False, cache_key=cache_key)
                 summary = response.choices[0].message.content
                 
-                # Real-time word-by-word streaming simulation
+                # Send the finished summary at once; the browser paces the typing effect
                 if progress and hasattr(progress, 'update') and summary:
-                    import time
-                    
-                    # Split into words for realistic typing effect
-                    words = summary.split()
-                    accumulated = ""
-                    
-                    # Stream word by word for true real-time effect
-                    for i, word in enumerate(words):
-                        # Check for cancellation during word streaming
-                        if progress and hasattr(progress, 'is_cancelled') and progress.is_cancelled():
-                            print("❌ Task cancelled during word-by-word streaming")
-                            return "Task cancelled by user"
-                            
-                        accumulated += word + " "
-                        
-                        # Detect context based on current progress
-                        # Safely check if progress has a progress attribute (for ProgressTracker objects)
-                        if hasattr(progress, 'progress') and progress.progress:
-                            current_progress = progress.progress.get('percentage', 0)
-                            if current_progress < 50:
-                                # Shorts generation context (45-55% range for word display)
-                                percentage = 45 + (i / len(words) * 10)
-                                context_msg = 'تحليل المحتوى...' if language == 'ar' else 'Analyzing content...'
-                            else:
-                                # Summary generation context (70-95% range)
-                                percentage = 70 + (i / len(words) * 25)
-                                context_msg = 'إنشاء الملخص...' if language == 'ar' else 'Creating summary...'
-                        else:
-                            # Default context for simple progress objects
-                            percentage = 70 + (i / len(words) * 25)
-                            context_msg = 'إنشاء الملخص...' if language == 'ar' else 'Creating summary...'
-                        
-                        # Send every single word for smooth word-by-word display
-                        if language == 'ar':
-                            progress.update('word_by_word', percentage, 
-                                          f'{context_msg} {percentage:.0f}%', 
-                                          accumulated.strip())
-                        else:
-                            progress.update('word_by_word', percentage, 
-                                          f'{context_msg} {percentage:.0f}%', 
-                                          accumulated.strip())
-                        
-                        # Very fast word-by-word streaming for smooth experience
-                        time.sleep(0.04)  # 40ms per word = ~900 WPM (very fast streaming)
+                    # Safely check if progress has a progress attribute (for ProgressTracker objects)
+                    if hasattr(progress, 'progress') and progress.progress and progress.progress.get('percentage', 0) < 50:
+                        # Shorts generation context
+                        percentage = 55
+                        context_msg = 'تحليل المحتوى...' if language == 'ar' else 'Analyzing content...'
+                    else:
+                        # Summary generation context
+                        percentage = 95
+                        context_msg = 'إنشاء الملخص...' if language == 'ar' else 'Creating summary...'
+                    progress.update('word_by_word', percentage, f'{context_msg} {percentage:.0f}%', summary)
             
             if progress and hasattr(progress, 'update'):
                 if language == 'ar':
@@ -952,4 +938,117 @@ Summary:"""
             elif "model" in error_msg.lower():
                 raise Exception("AI model is currently unavailable.")
             else:
-                raise Exception(f"Failed to generate summary: {error_msg}")
\ No newline at end of file
+                raise Exception(f"Failed to generate summary: {error_msg}")
+    
+    def summarize_incremental(self, video_id, language='auto', progress=None):
+        """
+        Summarize a video while its transcript is still being parsed.
+        Segments are grouped into time windows as they arrive and long videos get concurrent
+        window summaries; the caller streams the final summary from the window notes (the reduce step).
+        Returns dict with 'transcript', 'language' and, for long videos, 'section_notes' and 'windows',
+        or None if no timestamped transcript is available.
+        """
+        config = INCREMENTAL_SUMMARY_CONFIG
+        window_seconds = config['window_seconds']
+        
+        segments = []
+        windows = []  # (start, end, text) for each closed window
+        window_segments = []
+        futures = {}
+        executor = None
+        summarize_window = bind_llm_context(self._summarize_window)  # Keep the job's metric labels in worker threads
+        
+        def close_window():
+            if window_segments:
+                windows.append((window_segments[0]['start'], window_segments[-1]['end'],
+                                ' '.join(seg['text'] for seg in window_segments)))
+        
+        def submit_pending():
+            for index in range(len(futures), len(windows)):
+                start, end, text = windows[index]
+                futures[executor.submit(summarize_window, text, start, end, language, progress)] = index
+        
+        try:
+            for segment in self.iter_transcript_segments(video_id, progress):
+                if progress and progress.is_cancelled():
+                    return {'transcript': '', 'language': language}
+                
+                if window_segments and segment['start'] - window_segments[0]['start'] >= window_seconds:
+                    close_window()
+                    window_segments = []
+                window_segments.append(segment)
+                segments.append(segment)
+                
+                # Long video: start summarizing closed windows while the rest is still downloading
+                if executor is None and segment['end'] >= config['min_duration_seconds']:
+                    if language == 'auto':
+                        language = self.detect_language(segments)
+                    print(f"⏱️ Long video detected, summarizing {window_seconds}s windows incrementally ({language})")
+                    executor = ThreadPoolExecutor(max_workers=config['max_parallel_windows'])
+                
+                if executor is not None:
+                    submit_pending()
+                    if progress and len(segments) % 50 == 0:
+                        progress.update('getting_transcript', 55,
+                                        'جاري تحليل الأجزاء...' if language == 'ar' else 'Processing video sections...')
+            
+            if not segments:
+                return None
+            
+            close_window()
+            transcript = ' '.join(seg['text'] for seg in segments)
+            if language == 'auto' and len(transcript.strip()) >= 50:
+                language = self.detect_language(transcript)
+            
+            if executor is None:
+                # Short video: a single summary call over the transcript is faster than map + reduce
+                return {'transcript': transcript, 'language': language}
+            
+            submit_pending()
+            notes = {}
+            for future in as_completed(futures):
+                if progress and progress.is_cancelled():
+                    return {'transcript': transcript, 'language': language}
+                
+                index = futures[future]
+                notes[index] = future.result()
+                
+                # Show section notes as they finish so the user sees output before the final summary
+                if progress:
+                    percentage = 55 + (len(notes) / len(windows)) * 7
+                    message = (f'تم تحليل {len(notes)}/{len(windows)} من الأجزاء...' if language == 'ar'
+                               else f'Summarized {len(notes)}/{len(windows)} sections...')
+                    progress.update('window_summaries', percentage, message,
+                                    self._format_window_notes(windows, notes))
+            
+            return {'transcript': transcript, 'language': language, 'windows': len(windows),
+                    'section_notes': self._format_window_notes(windows, notes)}
+        
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _summarize_window(self, text, start, end, language, progress=None):
+        """Summarize one transcript window (runs in a worker thread)"""
+        if progress and progress.is_cancelled():
+            return ""
+        
+        template = LANGUAGE_TEMPLATES[language]['window_template']
+        prompt = template.format(start=format_timestamp(start), end=format_timestamp(end), content=text)
+        
+        try:
+            cache_key = make_cache_key('window_summary', text, language, f"{template}\n{start}-{end}")
+            notes, _ = self.llm_gateway.complete_text(prompt, cache_key=cache_key)
+            return notes.strip()
+        except Exception as e:
+            print(f"⚠️ Window {format_timestamp(start)}-{format_timestamp(end)} summary failed: {e}")
+            # Keep the raw excerpt so the reduce step still covers this part of the video
+            return text[:1500]
+
+    def _format_window_notes(self, windows, notes):
+        """Join finished window notes in chronological order with their time ranges"""
+        parts = []
+        for index, (start, end, _) in enumerate(windows):
+            if index in notes and notes[index]:
+                parts.append(f"[{format_timestamp(start)} - {format_timestamp(end)}]\n{notes[index]}")
+        return '\n\n'.join(parts)
@@ -53,4 +53,13 @@ def pre_fork(server, worker):
     server.log.info(f"👤 Worker {worker.pid} spawned")
 
 def post_fork(server, worker):
-    server.log.info(f"✅ Worker {worker.pid} ready to serve requests")
\ No newline at end of file
+    server.log.info(f"✅ Worker {worker.pid} ready to serve requests")
+
+def child_exit(server, worker):
+    # Drop a dead worker's live gauges when Prometheus multiprocess mode is on (PROMETHEUS_MULTIPROC_DIR)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        try:
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(worker.pid)
+        except ImportError:
+            pass
\ No newline at end of file
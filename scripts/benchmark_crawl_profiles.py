@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Bytes transferred and render time of the headless crawl profiles (full vs text) against
+local fixture sites. Each fixture page has an article plus large images, a web font, an
+autoplaying video and a third-party ad script that loads more ads and a tracking beacon.
+Ad requests go to ads.tracker.localhost, which Chromium resolves to the local server.
+
+Usage:
+    python scripts/benchmark_crawl_profiles.py [--profiles full,text] [--pages N] [--rounds N]
+        [--image-kb KB] [--video-kb KB]
+
+Needs Crawl4AI and a Playwright Chromium (playwright install chromium); no network access.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+from pathlib import Path
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+AD_HOST = 'tracker.localhost'
+WORDS = ('crawl render page text browser network image font video script extraction latency bytes '
+         'profile headless context article section paragraph result measure').split()
+
+
+def make_sites(directory, pages, image_kb, video_kb, seed=11):
+    """Write the fixture pages and their heavy assets"""
+    rng = random.Random(seed)
+    root = Path(directory)
+    (root / 'assets').mkdir(parents=True, exist_ok=True)
+    for index in range(4):
+        (root / 'assets' / f'photo{index}.jpg').write_bytes(rng.randbytes(image_kb * 1024))
+    (root / 'assets' / 'font.woff2').write_bytes(rng.randbytes(120 * 1024))
+    (root / 'assets' / 'clip.mp4').write_bytes(rng.randbytes(video_kb * 1024))
+    (root / 'assets' / 'ads.js').write_text(
+        "for (let i = 0; i < 3; i++) {\n"
+        "  const slot = document.createElement('div'); slot.className = 'ad';\n"
+        "  slot.innerHTML = '<img src=\"/assets/photo' + i + '.jpg?ad=' + i + '\">';\n"
+        "  document.body.appendChild(slot);\n"
+        "}\n"
+        "fetch('/beacon?event=view').catch(() => {});\n", encoding='utf-8')
+    for page in range(pages):
+        paragraphs = '\n'.join(
+            f'<h2>Section {number + 1}</h2><p>' + ' '.join(rng.choice(WORDS) for _ in range(90)) + '.</p>'
+            + (f'<img src="/assets/photo{number % 4}.jpg?p={page}" width="800">' if number % 3 == 0 else '')
+            for number in range(10))
+        (root / f'page{page}.html').write_text(
+            '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Fixture page</title>'
+            '<style>@font-face { font-family: Fixture; src: url(/assets/font.woff2); } body { font-family: Fixture; }</style>'
+            '</head><body><article><h1>Fixture page</h1>\n' + paragraphs + '\n</article>'
+            '<video src="/assets/clip.mp4" autoplay muted preload="auto"></video>'
+            f'<script src="http://ads.{AD_HOST}:{{port}}/assets/ads.js"></script>'
+            '</body></html>', encoding='utf-8')
+
+
+class CountingHandler(SimpleHTTPRequestHandler):
+    """Static file handler that counts requests and body bytes sent"""
+    counters = {'requests': 0, 'bytes': 0}
+    lock = threading.Lock()
+    port = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/beacon':
+            body = b'ok'
+        else:
+            file_path = Path(self.directory) / path.lstrip('/')
+            if not file_path.is_file():
+                self.send_error(404)
+                return
+            body = file_path.read_bytes()
+            if file_path.suffix == '.html':
+                body = body.replace(b'{port}', str(self.port).encode())
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path) if path != '/beacon' else 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters['bytes'] += len(body)
+
+
+def serve(directory):
+    handler = lambda *args, **kwargs: CountingHandler(*args, directory=directory, **kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    CountingHandler.port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def run_profile(name, urls, rounds):
+    """Crawl every URL `rounds` times on a fresh pool with the given profile"""
+    from crawl4ai import CrawlerRunConfig, CacheMode
+    from app.config import CRAWL_PROFILES
+    from app.browser_pool import BrowserPool
+    from app.page_readiness import PageReadiness
+
+    profile = dict(CRAWL_PROFILES[name])
+    if profile['blocked_hosts']:
+        profile['blocked_hosts'] = (*profile['blocked_hosts'], AD_HOST)  # Stands in for the real ad networks
+    pool = BrowserPool({'profile': profile, 'max_contexts': 1})
+    readiness = PageReadiness({'measure': False})
+    run_config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS, page_timeout=40000,
+                                  excluded_tags=['script', 'style', 'noscript'], verbose=False)
+
+    started = time.time()
+    pool.crawl(urls[0], run_config)  # Browser launch is not part of the per-page numbers
+    launch_seconds = time.time() - started
+
+    seconds, transferred, requests, text_chars = [], [], [], []
+    for _ in range(rounds):
+        for url in urls:
+            with CountingHandler.lock:
+                before = dict(CountingHandler.counters)
+            config, cap_ms = readiness.prepare(url, run_config)
+            page_started = time.time()
+            result = pool.crawl(url, config)
+            elapsed = time.time() - page_started
+            readiness.observe(url, result, cap_ms, elapsed)
+            time.sleep(0.2)  # Let aborted or trailing requests finish before reading the counters
+            with CountingHandler.lock:
+                transferred.append(CountingHandler.counters['bytes'] - before['bytes'])
+                requests.append(CountingHandler.counters['requests'] - before['requests'])
+            seconds.append(elapsed)
+            text_chars.append(len(str(result.markdown or '')) if result.success else 0)
+    stats = pool.get_stats()
+    pool.close()
+    return {
+        'launch': launch_seconds,
+        'p50': statistics.median(seconds),
+        'p95': percentile(seconds, 0.95),
+        'kb': statistics.mean(transferred) / 1024,
+        'requests': statistics.mean(requests),
+        'text': statistics.mean(text_chars),
+        'blocked': sum(stats['blocked_requests'].values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', default='full,text')
+    parser.add_argument('--pages', type=int, default=5, help='Fixture pages')
+    parser.add_argument('--rounds', type=int, default=3, help='Times each page is crawled per profile')
+    parser.add_argument('--image-kb', type=int, default=300)
+    parser.add_argument('--video-kb', type=int, default=2048)
+    parser.add_argument('--verbose', action='store_true', help='Show application logs')
+    args = parser.parse_args()
+
+    from app.config import CRAWL4AI_AVAILABLE
+    if not CRAWL4AI_AVAILABLE:
+        print("❌ Crawl4AI is not installed (pip install crawl4ai && playwright install chromium)")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory(prefix='ai_studio_crawl_bench_') as directory:
+        make_sites(directory, args.pages, args.image_kb, args.video_kb)
+        server = serve(directory)
+        urls = [f"http://127.0.0.1:{CountingHandler.port}/page{page}.html" for page in range(args.pages)]
+        print(f"⚙️ Crawl profile benchmark: {args.pages} pages x {args.rounds} rounds, "
+              f"images {args.image_kb} KB, video {args.video_kb} KB")
+        print(f"{'profile':<8} {'launch':>7} {'page p50':>9} {'page p95':>9} {'KB/page':>9} "
+              f"{'reqs/page':>9} {'blocked':>8} {'text chars':>10}")
+        try:
+            for name in args.profiles.split(','):
+                name = name.strip()
+                with open(os.devnull, 'w') as devnull:
+                    stdout = sys.stdout
+                    if not args.verbose:
+                        sys.stdout = devnull
+                    try:
+                        result = run_profile(name, urls, args.rounds)
+                    finally:
+                        sys.stdout = stdout
+                print(f"{name:<8} {result['launch']:>6.2f}s {result['p50']:>8.2f}s {result['p95']:>8.2f}s "
+                      f"{result['kb']:>9.0f} {result['requests']:>9.1f} {result['blocked']:>8} {result['text']:>10.0f}")
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
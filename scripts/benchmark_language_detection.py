@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark the shared language detector against the original per-character implementation.
+
+Usage:
+    python scripts/benchmark_language_detection.py [--repeat N]
+"""
+
+import sys
+import time
+import random
+import argparse
+import importlib.util
+from pathlib import Path
+
+# Load the detector module directly so the benchmark runs without the Flask/G4F stack
+project_root = Path(__file__).resolve().parent.parent
+spec = importlib.util.spec_from_file_location('language_detector', project_root / 'app' / 'language_detector.py')
+language_detector = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(language_detector)
+
+ENGLISH_WORDS = ('so today we are going to talk about how the model learns from data and why '
+                 'that matters for everyone building products with machine learning right now').split()
+ARABIC_WORDS = ('في هذا الفيديو سوف نتحدث عن الذكاء الاصطناعي وكيف يمكن أن يساعدنا على '
+                'فهم البيانات بشكل أفضل من قبل مع أمثلة عملية لكل خطوة').split()
+
+
+def legacy_detect_language(text):
+    """Original YouTubeProcessor.detect_language (prints removed)"""
+    if not text:
+        return 'en'
+    if isinstance(text, list) and len(text) > 0 and isinstance(text[0], dict):
+        text_content = ' '.join([seg.get('text', '') for seg in text])
+    else:
+        text_content = text
+    if not text_content:
+        return 'en'
+    arabic_chars = 0
+    english_chars = 0
+    total_chars = 0
+    for char in text_content:
+        if char.isalpha():
+            total_chars += 1
+            if '\u0600' <= char <= '\u06FF' or '\u0750' <= char <= '\u077F':
+                arabic_chars += 1
+            elif 'A' <= char <= 'Z' or 'a' <= char <= 'z':
+                english_chars += 1
+    if total_chars == 0:
+        return 'en'
+    arabic_ratio = arabic_chars / total_chars
+    english_ratio = english_chars / total_chars
+    if arabic_ratio > 0.25:
+        return 'ar'
+    elif english_ratio > 0.6:
+        return 'en'
+    arabic_word_count = 0
+    for word in language_detector.ARABIC_INDICATORS:
+        arabic_word_count += text_content.count(word)
+    pattern_count = sum(1 for pattern in language_detector.ARABIC_PATTERNS if pattern in text_content)
+    if (arabic_word_count > 2 or pattern_count > 0) and arabic_ratio > 0.1:
+        return 'ar'
+    return 'en'
+
+
+def make_segments(word_count, arabic_share, seed):
+    """Build a synthetic timestamped transcript with the given share of Arabic words"""
+    rng = random.Random(seed)
+    segments = []
+    start = 0.0
+    words = []
+    for _ in range(word_count):
+        words.append(rng.choice(ARABIC_WORDS if rng.random() < arabic_share else ENGLISH_WORDS))
+        if len(words) == 12:
+            duration = round(rng.uniform(2.0, 5.0), 2)
+            segments.append({'start': start, 'duration': duration, 'end': start + duration, 'text': ' '.join(words)})
+            start += duration
+            words = []
+    return segments
+
+
+def build_fixtures():
+    """Fixture transcripts from a short clip up to a ~200k character multi-hour transcript"""
+    fixtures = []
+    for label, words in (('short', 300), ('medium', 6000), ('long', 35000)):
+        for lang, share in (('en', 0.0), ('ar', 1.0), ('mixed', 0.35)):
+            segments = make_segments(words, share, seed=f"{label}-{lang}")
+            fixtures.append((f"{label}-{lang}-text", ' '.join(seg['text'] for seg in segments)))
+            fixtures.append((f"{label}-{lang}-segments", segments))
+    return fixtures
+
+
+def time_call(func, value, repeat):
+    """Return the best wall time in milliseconds over `repeat` runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(value)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Language detection benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    # Silence the detector's diagnostic print while timing
+    language_detector.print = lambda *a, **k: None
+
+    print(f"{'fixture':<24}{'chars':>9}{'legacy ms':>11}{'cold ms':>10}{'memo ms':>10}  result")
+    mismatches = 0
+    for name, value in build_fixtures():
+        chars = len(value) if isinstance(value, str) else sum(len(seg['text']) + 1 for seg in value)
+        legacy_ms = time_call(legacy_detect_language, value, args.repeat)
+
+        def cold(v):
+            language_detector.clear_cache()
+            return language_detector.detect_language(v)
+
+        cold_ms = time_call(cold, value, args.repeat)
+        memo_ms = time_call(language_detector.detect_language, value, args.repeat)
+
+        expected = legacy_detect_language(value)
+        actual = language_detector.detect_language(value)
+        status = 'ok' if expected == actual else f'MISMATCH (legacy={expected})'
+        mismatches += expected != actual
+        print(f"{name:<24}{chars:>9}{legacy_ms:>11.2f}{cold_ms:>10.2f}{memo_ms:>10.3f}  {actual} {status}")
+
+    print(f"\nCache: {language_detector.get_cache_stats()}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
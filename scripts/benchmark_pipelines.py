@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency and throughput benchmark of the summarize, chat and shorts pipelines
+against the offline stand-ins (replayed LLM streams, local fixture server, local media).
+Needs no network access; requests go through the Flask app exactly like browser requests.
+
+Usage:
+    python scripts/benchmark_pipelines.py [--pipelines summarize,chat,shorts] [--requests N]
+        [--concurrency N] [--ttft SECONDS] [--tokens-per-second N] [--failure-rate R]
+        [--fixtures DIR] [--recordings FILE] [--cache]
+
+Without --fixtures a synthetic fixture set is generated in a temporary directory. The shorts
+benchmark needs ffmpeg to generate its test video. Progress streams are polled every 0.5s
+by the app, so latencies include up to half a second of SSE polling.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+BROWSER_USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                      'Chrome/120.0.0.0 Safari/537.36')
+VIDEO_SECONDS = 300
+WORDS = ('the model learns from data and we explain why that matters for teams building products '
+         'with machine learning today including evaluation latency costs privacy and the surprising '
+         'result we found when the dataset doubled').split()
+CLIP_PLAN = {
+    'clips': [
+        {'clip_number': 1, 'title': 'The surprising result', 'start_time': 75, 'end_time': 110, 'duration': 35,
+         'description': 'Why doubling the dataset changed everything', 'selection_reason': 'Revelation'},
+        {'clip_number': 2, 'title': 'What it costs', 'start_time': 180, 'end_time': 215, 'duration': 35,
+         'description': 'Latency and cost trade-offs', 'selection_reason': 'Key insight'},
+    ]
+}
+
+
+def make_fixtures(directory, seed=7):
+    """Write a transcript, a webpage, answer rules and (with ffmpeg) a test video"""
+    rng = random.Random(seed)
+    root = Path(directory)
+    for name in ('transcripts', 'pages', 'media'):
+        (root / name).mkdir(parents=True, exist_ok=True)
+
+    segments = []
+    start = 0.0
+    while start < VIDEO_SECONDS:
+        duration = round(rng.uniform(2.5, 4.5), 2)
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(7, 12))).capitalize() + '.'
+        segments.append({'start': round(start, 2), 'duration': duration, 'text': text})
+        start += duration
+    (root / 'transcripts' / 'default.json').write_text(json.dumps(
+        {'title': 'Offline benchmark talk', 'author': 'Fixtures', 'segments': segments}), encoding='utf-8')
+
+    paragraphs = '\n'.join(
+        f'<h2>Section {index + 1}</h2>\n<p>' + ' '.join(rng.choice(WORDS) for _ in range(120)) + '.</p>'
+        for index in range(12))
+    (root / 'pages' / 'article.html').write_text(
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Offline benchmark article</title></head>'
+        f'<body><article><h1>Offline benchmark article</h1>\n{paragraphs}\n</article></body></html>',
+        encoding='utf-8')
+
+    (root / 'llm_rules.json').write_text(json.dumps([
+        {'contains': 'Analysis (return valid JSON only):', 'text': json.dumps(CLIP_PLAN, indent=2)},
+    ]), encoding='utf-8')
+
+    if shutil.which('ffmpeg'):
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error',
+                        '-f', 'lavfi', '-i', f'testsrc=size=640x360:rate=25:duration={VIDEO_SECONDS}',
+                        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={VIDEO_SECONDS}',
+                        '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest',
+                        str(root / 'media' / 'default.mp4')], check=True)
+    return segments
+
+
+def read_events(response):
+    """Yield the JSON payloads of an SSE response"""
+    buffer = ''
+    try:
+        for chunk in response.response:
+            buffer += chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+            while '\n\n' in buffer:
+                event, buffer = buffer.split('\n\n', 1)
+                if event.startswith('data: '):
+                    yield json.loads(event[len('data: '):])
+    finally:
+        response.close()
+
+
+def follow_progress(client, task_id, started):
+    """(seconds to first streamed text, seconds to completion, ok) of a progress-tracked task"""
+    first_output = None
+    response = client.get(f'/progress/{task_id}', buffered=False)
+    for event in read_events(response):
+        partial = event.get('partial_result')
+        if first_output is None and isinstance(partial, str) and partial.strip():
+            first_output = time.time() - started
+        if event.get('completed'):
+            total = time.time() - started
+            return first_output or total, total, event.get('status') == 'completed'
+    total = time.time() - started
+    return first_output or total, total, False
+
+
+def run_summarize(client, index, segments):
+    text = f'Session {index}. ' + ' '.join(segment['text'] for segment in segments)
+    started = time.time()
+    response = client.post('/api/summarize', json={'transcript': text, 'language': 'en'})
+    if response.status_code != 200:
+        return None, time.time() - started, False
+    return follow_progress(client, response.get_json()['task_id'], started)
+
+
+def run_shorts(client, index, segments):
+    started = time.time()
+    response = client.post('/api/generate-shorts-stream',
+                           json={'url': f'https://www.youtube.com/watch?v=bench{index:04d}', 'language': 'en'})
+    if response.status_code != 200:
+        return None, time.time() - started, False
+    return follow_progress(client, response.get_json()['task_id'], started)
+
+
+def stream_chat(client, path, params, done_types, started):
+    first_output = None
+    ok = False
+    for event in read_events(client.get(path, query_string=params, buffered=False)):
+        kind = event.get('type', '')
+        if first_output is None and kind.endswith('streaming'):
+            first_output = time.time() - started
+        if kind.endswith('error'):
+            break
+        if kind in done_types:
+            ok = True
+    total = time.time() - started
+    return first_output or total, total, ok
+
+
+def run_chat(client, index, fixture_url):
+    """Analyze the fixture page (with its automatic summary), then ask one question"""
+    session_id = f'bench-{index}-{time.time()}'
+    page_url = f'{fixture_url}/pages/article.html?r={index}'
+    started = time.time()
+    _, _, ok = stream_chat(client, '/api/chat-agent/analyze', {'url': page_url, 'session_id': session_id},
+                           ('summary_complete',), started)
+    if not ok:
+        return None, time.time() - started, False
+    started = time.time()
+    return stream_chat(client, '/api/chat-agent/ask',
+                       {'question': f'What does section {index % 12 + 1} say about latency?', 'session_id': session_id},
+                       ('complete', 'final_answer'), started)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def report(name, results, wall_seconds):
+    ok = [result for result in results if result[2]]
+    first = [result[0] for result in ok if result[0] is not None]
+    total = [result[1] for result in ok]
+    print(f"{name:<10} {len(results):>5} {len(ok):>5} "
+          f"{percentile(first, 0.5):>9.2f} {percentile(first, 0.95):>9.2f} "
+          f"{percentile(total, 0.5):>9.2f} {percentile(total, 0.95):>9.2f} "
+          f"{(statistics.mean(total) if total else 0):>9.2f} {len(ok) / wall_seconds:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pipelines', default='summarize,chat,shorts')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per pipeline')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--ttft', type=float, default=0.5, help='Replayed time to first token (seconds)')
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of model attempts that fail')
+    parser.add_argument('--fixtures', help='Fixture directory (default: generated)')
+    parser.add_argument('--recordings', help='Recorded LLM answers to replay (JSON lines)')
+    parser.add_argument('--cache', action='store_true', help='Keep the LLM response cache enabled')
+    parser.add_argument('--verbose', action='store_true', help='Show application logs')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='ai_studio_bench_')
+    fixtures = args.fixtures or os.path.join(work_dir, 'fixtures')
+    if not args.fixtures:
+        make_fixtures(fixtures)
+    segments = json.loads(Path(fixtures, 'transcripts', 'default.json').read_text(encoding='utf-8'))['segments']
+
+    # Configuration is read at import time, so the environment is set before importing the app
+    os.environ['AI_STUDIO_OFFLINE'] = '1'
+    os.environ['AI_STUDIO_OFFLINE_MODE'] = 'replay'
+    os.environ['AI_STUDIO_FIXTURES'] = fixtures
+    os.environ['AI_STUDIO_RECORDINGS'] = args.recordings or os.path.join(work_dir, 'llm_recordings.jsonl')
+    os.environ['LLM_CACHE_DIR'] = os.path.join(work_dir, 'llm_cache')
+    os.environ['LLM_HEALTH_STATE_FILE'] = os.path.join(work_dir, 'llm_health.json')
+
+    from app.config import OFFLINE_CONFIG, LLM_CACHE_CONFIG
+    OFFLINE_CONFIG.update({'ttft_seconds': args.ttft, 'tokens_per_second': args.tokens_per_second,
+                           'failure_rate': args.failure_rate})
+    LLM_CACHE_CONFIG['enabled'] = args.cache
+
+    from app.app import app, limiter
+    from app.offline import fixture_base_url
+    limiter.enabled = False
+    fixture_url = fixture_base_url()
+
+    client = app.test_client()
+    client.environ_base['HTTP_USER_AGENT'] = BROWSER_USER_AGENT
+    runners = {
+        'summarize': lambda index: run_summarize(client, index, segments),
+        'chat': lambda index: run_chat(client, index, fixture_url),
+        'shorts': lambda index: run_shorts(client, index, segments),
+    }
+
+    print(f"⚙️ Offline benchmark: {args.requests} requests per pipeline, concurrency {args.concurrency}, "
+          f"TTFT {args.ttft}s, {args.tokens_per_second} tokens/s, failure rate {args.failure_rate}")
+    print(f"{'pipeline':<10} {'reqs':>5} {'ok':>5} {'first p50':>9} {'first p95':>9} "
+          f"{'total p50':>9} {'total p95':>9} {'mean':>9} {'ok/s':>8}")
+    try:
+        for name in args.pipelines.split(','):
+            name = name.strip()
+            if name == 'shorts' and not shutil.which('ffmpeg'):
+                print(f"{name:<10} skipped (ffmpeg is needed for the test video and clip rendering)")
+                continue
+            started = time.time()
+            with open(os.devnull, 'w') as devnull:
+                stdout = sys.stdout
+                if not args.verbose:
+                    sys.stdout = devnull
+                try:
+                    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                        results = list(executor.map(runners[name], range(args.requests)))
+                finally:
+                    sys.stdout = stdout
+            report(name, results, time.time() - started)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
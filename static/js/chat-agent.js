@@ -1264,10 +1264,13 @@ class ChatAgent {
             if (isStreaming) {
                 // Word-by-word streaming effect
                 this.typeWriterEffect(textEl, content);
+            } else if (textEl._typing && textEl._typing.running) {
+                // Let the typing effect catch up, then show the final content
+                textEl._typing.target = content;
+                textEl._typing.final = content;
             } else {
                 // Final content update - convert markdown to HTML
-                textEl.innerHTML = this.convertMarkdownToHtml(content);
-                textEl.classList.remove('streaming-text');
+                this.finishTypedMessage(textEl, content);
             }
         }
         
@@ -1285,13 +1288,50 @@ class ChatAgent {
         // Add streaming class for cursor effect
         textEl.classList.add('streaming-text');
         
-        // Always update with formatted content during streaming
-        textEl.innerHTML = this.convertMarkdownToHtml(newContent);
-        
-        // Smooth scroll to bottom without jarring movement
-        requestAnimationFrame(() => {
+        // The server sends text as soon as it has it (whole answers when cached or not streamed),
+        // so the typing pace is set here, a few words per animation frame
+        if (!textEl._typing) {
+            textEl._typing = { shown: 0, target: '', running: false, final: null };
+        }
+        const typing = textEl._typing;
+        typing.target = newContent;
+        if (!typing.running) {
+            typing.running = true;
+            requestAnimationFrame(() => this.typeWriterStep(textEl));
+        }
+    }
+    
+    typeWriterStep(textEl) {
+        const typing = textEl._typing;
+        if (!typing) return;
+        const target = typing.target;
+        
+        if (typing.shown < target.length) {
+            // Reveal at least ~4 words per frame and catch up faster when far behind
+            let next = typing.shown + Math.max(24, Math.ceil((target.length - typing.shown) / 20));
+            const wordEnd = target.indexOf(' ', next);
+            next = wordEnd === -1 ? target.length : wordEnd;
+            typing.shown = next;
+            textEl.innerHTML = this.convertMarkdownToHtml(target.substring(0, next));
             this.scrollToBottom();
-        });
+            requestAnimationFrame(() => this.typeWriterStep(textEl));
+            return;
+        }
+        
+        typing.running = false;
+        if (typing.final !== null) {
+            this.finishTypedMessage(textEl, typing.final);
+        } else {
+            typing.shown = target.length;
+            textEl.innerHTML = this.convertMarkdownToHtml(target);
+        }
+    }
+    
+    finishTypedMessage(textEl, content) {
+        textEl._typing = null;
+        textEl.innerHTML = this.convertMarkdownToHtml(content);
+        textEl.classList.remove('streaming-text');
+        this.scrollToBottom();
     }
     
     addSystemMessage(message) {